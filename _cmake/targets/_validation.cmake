@@ -12,6 +12,7 @@ local_pybind11_add_module(
   _validation OpenMP::OpenMP_CXX
   ../onnx_extended/validation/cpu/_validation.cpp
   ../onnx_extended/validation/cpu/vector_sum.cpp)
+target_include_directories(_validation PRIVATE "${CPP_INCLUDE_DIR}")
 message(STATUS "    LINK _validation <- lib_validation_cpp")
 target_link_libraries(_validation PRIVATE lib_validation_cpp)
 
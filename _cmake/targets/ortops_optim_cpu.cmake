@@ -0,0 +1,22 @@
+#
+# module: onnx_extended.ortops.optim.cpu
+#
+message(STATUS "+ KERNEL onnx_extended.ortops.optim.cpu")
+
+ort_add_custom_op(
+  ortops_optim_cpu
+  "CPU"
+  ../onnx_extended/ortops/optim/cpu
+  ../onnx_extended/reference/c_ops/cpu/c_op_common.cpp
+  ../onnx_extended/ortops/common/common_kernels.cc
+  ../onnx_extended/ortops/optim/cpu/tree_ensemble.cc
+  ../onnx_extended/ortops/optim/cpu/ort_optim_cpu_lib.cc)
+# needed to include helpers.h and the tree ensemble engine
+target_include_directories(
+  ortops_optim_cpu
+  PRIVATE
+  "${ROOT_INCLUDE_PATH}"
+  "${ORTAPI_INCLUDE_DIR}"
+  "${ORTOPS_INCLUDE_DIR}")
+message(STATUS "    LINK ortops_optim_cpu <- OpenMP::OpenMP_CXX")
+target_link_libraries(ortops_optim_cpu PRIVATE OpenMP::OpenMP_CXX)
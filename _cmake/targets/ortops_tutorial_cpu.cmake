@@ -7,12 +7,15 @@ ort_add_custom_op(
   ortops_tutorial_cpu
   "CPU"
   ../onnx_extended/ortops/tutorial/cpu
+  ../onnx_extended/ortops/common/common_kernels.cc
   ../onnx_extended/ortops/tutorial/cpu/my_kernel.cc
   ../onnx_extended/ortops/tutorial/cpu/my_kernel_attr.cc
+  ../onnx_extended/ortops/tutorial/cpu/my_kernel_elementwise.cc
   ../onnx_extended/ortops/tutorial/cpu/ort_tutorial_cpu_lib.cc)
-# needed to include helpers.h
+# needed to include helpers.h and cpu_features.h
 target_include_directories(
   ortops_tutorial_cpu
   PRIVATE
+  "${CPP_INCLUDE_DIR}"
   "${ORTAPI_INCLUDE_DIR}"
   "${ORTOPS_INCLUDE_DIR}")
@@ -93,5 +93,6 @@ epkg_dictionary = {
     "scipy": "https://scipy.org/",
     "sphinx-gallery": "https://github.com/sphinx-gallery/sphinx-gallery",
     "torch": "https://pytorch.org/docs/stable/torch.html",
+    "Treebeard": "https://github.com/asprasad/treebeard",
     "WSL": "https://docs.microsoft.com/en-us/windows/wsl/install",
 }
@@ -114,3 +114,63 @@ piv = df.pivot(index="dim", columns="name", values="average")
 fig, ax = plt.subplots(1, 1)
 piv.plot(ax=ax, title="Binding Comparison", logy=True, logx=True)
 fig.savefig("plot_bench_ort.png")
+
+########################################
+# Overhead per input
+# ++++++++++++++++++
+#
+# The computation is negligible compared to the time spent in the
+# bindings. The model sums *n* small inputs. *ext_out* writes the output
+# into an array allocated once with :meth:`bind_outputs
+# <onnx_extended.ortcy.wrap.ortinf.OrtSession.bind_outputs>`.
+
+
+def make_sum_model(n):
+    inputs = [
+        make_tensor_value_info(f"X{i}", TensorProto.FLOAT, [None, None])
+        for i in range(n)
+    ]
+    Y = make_tensor_value_info("Y", TensorProto.FLOAT, [None, None])
+    node = make_node("Sum", [f"X{i}" for i in range(n)], ["Y"])
+    graph = make_graph([node], "sum", inputs, [Y])
+    return make_model(graph, opset_imports=[make_opsetid("", 18)], ir_version=8)
+
+
+data = []
+x = numpy.random.randn(2, 2).astype(numpy.float32)
+for n in tqdm([1, 2, 4, 8, 16, 32]):
+    model = make_sum_model(n).SerializeToString()
+    sess_ort = InferenceSession(model, providers=["CPUExecutionProvider"])
+    sess_ext = OrtSession(model)
+    feeds = {f"X{i}": x for i in range(n)}
+    xs = [x for i in range(n)]
+
+    t_ort = measure_time(lambda: sess_ort.run(None, feeds), number=100, repeat=20)
+    t_ort["name"] = "ort"
+    t_ort["n_inputs"] = n
+    data.append(t_ort)
+
+    t_ext = measure_time(lambda: sess_ext.run(xs), number=100, repeat=20)
+    t_ext["name"] = "ext"
+    t_ext["n_inputs"] = n
+    data.append(t_ext)
+
+    sess_ext.bind_outputs([numpy.empty(x.shape, dtype=x.dtype)])
+    t_ext = measure_time(lambda: sess_ext.run(xs), number=100, repeat=20)
+    t_ext["name"] = "ext_out"
+    t_ext["n_inputs"] = n
+    data.append(t_ext)
+
+    if unit_test_going() and n >= 4:
+        break
+
+df = DataFrame(data)
+piv = df.pivot(index="n_inputs", columns="name", values="average")
+piv
+
+###############################
+# Plots.
+
+fig, ax = plt.subplots(1, 1)
+piv.plot(ax=ax, title="Overhead depending on the number of inputs", logy=True)
+fig.savefig("plot_bench_ort_inputs.png")
@@ -0,0 +1,126 @@
+"""
+.. _l-example-bench-ort-load:
+
+Measuring the cost of loading a model with onnxruntime
+======================================================
+
+:class:`OrtSession <onnx_extended.ortcy.wrap.ortinf.OrtSession>` can load
+a model from a file, from bytes, from a memory mapped file, and it can
+take the initializers stored as external data from memory mapped arrays
+(see :func:`mmap_external_initializers
+<onnx_extended.ortcy.mmap_external_initializers>`).
+The following code measures the loading time and the peak memory
+of every option. Every measure runs in a separate process
+because the peak memory of a process never decreases.
+
+A big model
++++++++++++
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import numpy
+from pandas import DataFrame
+import matplotlib.pyplot as plt
+import onnx
+from onnx import TensorProto
+from onnx.helper import (
+    make_model,
+    make_node,
+    make_graph,
+    make_tensor_value_info,
+    make_opsetid,
+)
+from onnx.numpy_helper import from_array
+from onnx_extended.ext_test_case import unit_test_going
+
+dim = 256 if unit_test_going() else 2048
+n_layers = 4 if unit_test_going() else 16
+
+X = make_tensor_value_info("X", TensorProto.FLOAT, [None, dim])
+Y = make_tensor_value_info("Y", TensorProto.FLOAT, [None, dim])
+nodes = []
+inits = []
+for i in range(n_layers):
+    nodes.append(make_node("MatMul", [f"X{i}" if i else "X", f"A{i}"], [f"X{i + 1}"]))
+    inits.append(
+        from_array(numpy.random.randn(dim, dim).astype(numpy.float32), name=f"A{i}")
+    )
+nodes.append(make_node("Identity", [f"X{n_layers}"], ["Y"]))
+graph = make_graph(nodes, "mm", [X], [Y], inits)
+onnx_model = make_model(graph, opset_imports=[make_opsetid("", 18)], ir_version=8)
+
+temp = tempfile.mkdtemp()
+model_file = os.path.join(temp, "model.onnx")
+onnx.save(onnx_model, model_file)
+external_file = os.path.join(temp, "external.onnx")
+onnx.save(
+    onnx_model,
+    external_file,
+    save_as_external_data=True,
+    all_tensors_to_one_file=True,
+    location="external.data",
+    size_threshold=0,
+)
+print(f"model size: {os.stat(model_file).st_size / 2**20:1.1f} Mb")
+
+#########################################
+# Loading
+# +++++++
+
+scripts = {
+    "file": "OrtSession(model_file)",
+    "bytes": "\n".join(
+        ["with open(model_file, 'rb') as f:", "    data = f.read()", "OrtSession(data)"]
+    ),
+    "mmap": "OrtSession(model_file, use_mmap=True)",
+    "external+mmap": (
+        "inits = mmap_external_initializers(external_file)\n"
+        "OrtSession(external_file, use_mmap=True, external_initializers=inits)"
+    ),
+}
+
+template = """
+import json
+import resource
+import time
+from onnx_extended.ortcy import mmap_external_initializers
+from onnx_extended.ortcy.wrap.ortinf import OrtSession
+model_file = {model_file!r}
+external_file = {external_file!r}
+begin = time.perf_counter()
+{script}
+duration = time.perf_counter() - begin
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+print(json.dumps(dict(duration=duration, peak=peak)))
+"""
+
+data = []
+if sys.platform != "win32":
+    for name, script in scripts.items():
+        code = template.format(
+            model_file=model_file, external_file=external_file, script=script
+        )
+        out = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        res = json.loads(out.stdout.strip().split("\n")[-1])
+        data.append(
+            dict(name=name, load_time=res["duration"], peak_mb=res["peak"] / 2**20)
+        )
+
+df = DataFrame(data)
+df
+
+########################################
+# Plots
+# +++++
+
+if data:
+    fig, ax = plt.subplots(1, 2, figsize=(10, 4))
+    df.set_index("name")[["load_time"]].plot.bar(ax=ax[0], title="Loading time (s)")
+    df.set_index("name")[["peak_mb"]].plot.bar(ax=ax[1], title="Peak memory (Mb)")
+    fig.tight_layout()
+    fig.savefig("plot_bench_ort_load.png")
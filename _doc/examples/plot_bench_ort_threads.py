@@ -0,0 +1,180 @@
+"""
+.. _l-example-bench-ort-threads:
+
+Measuring onnxruntime throughput with many python threads
+=========================================================
+
+:class:`OrtSession <onnx_extended.ortcy.wrap.ortinf.OrtSession>` releases
+the GIL while onnxruntime computes the outputs. Many python threads can
+share the same session and run it at the same time. The following code
+measures the number of inferences per second depending on the number
+of python threads calling the same session. It is compared to
+:meth:`run_many <onnx_extended.ortcy.wrap.ortinf.OrtSession.run_many>`
+which runs a list of requests on threads created in C++ and
+to :class:`OrtSessionPool <onnx_extended.ortcy.OrtSessionPool>`
+which dispatches the runs on several replicas of the same model.
+
+A simple onnx model
++++++++++++++++++++
+
+Every session is restricted to one thread so that the parallelism
+only comes from the python threads.
+"""
+import gc
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy
+import psutil
+from pandas import DataFrame
+import matplotlib.pyplot as plt
+from onnx import numpy_helper, TensorProto
+from onnx.helper import (
+    make_model,
+    make_node,
+    make_graph,
+    make_tensor_value_info,
+    make_opsetid,
+)
+from onnx.checker import check_model
+from onnxruntime import InferenceSession, SessionOptions
+from onnx_extended.ortcy import OrtSessionPool
+from onnx_extended.ortcy.wrap.ortinf import OrtSession
+from onnx_extended.ext_test_case import unit_test_going
+
+dim = 256
+A = numpy_helper.from_array(
+    numpy.random.randn(dim, dim).astype(numpy.float32), name="A"
+)
+X = make_tensor_value_info("X", TensorProto.FLOAT, [None, None])
+Y = make_tensor_value_info("Y", TensorProto.FLOAT, [None, None])
+node1 = make_node("MatMul", ["X", "A"], ["XA"])
+node2 = make_node("Tanh", ["XA"], ["Y"])
+graph = make_graph([node1, node2], "mm", [X], [Y], [A])
+onnx_model = make_model(graph, opset_imports=[make_opsetid("", 18)], ir_version=8)
+check_model(onnx_model)
+
+opts = SessionOptions()
+opts.intra_op_num_threads = 1
+opts.inter_op_num_threads = 1
+sess_ort = InferenceSession(
+    onnx_model.SerializeToString(), opts, providers=["CPUExecutionProvider"]
+)
+sess_ext = OrtSession(
+    onnx_model.SerializeToString(), intra_op_num_threads=1, inter_op_num_threads=1
+)
+
+x = numpy.random.randn(dim, dim).astype(numpy.float32)
+d = numpy.abs(sess_ort.run(None, {"X": x})[0] - sess_ext.run_1_1(x)).max()
+print(f"Discrepancies: {d}")
+
+#########################################
+# Throughput
+# ++++++++++
+#
+# Every thread runs the same session *n_runs* times.
+
+
+def throughput(fct, n_threads, n_runs):
+    def loop():
+        for _ in range(n_runs):
+            fct()
+
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        begin = time.perf_counter()
+        futures = [executor.submit(loop) for _ in range(n_threads)]
+        for f in futures:
+            f.result()
+        duration = time.perf_counter() - begin
+    return n_threads * n_runs / duration
+
+
+n_runs = 5 if unit_test_going() else 50
+data = []
+for n_threads in [1, 2, 4] if unit_test_going() else [1, 2, 4, 8]:
+    data.append(
+        dict(
+            name="ort",
+            n_threads=n_threads,
+            throughput=throughput(
+                lambda: sess_ort.run(None, {"X": x}), n_threads, n_runs
+            ),
+        )
+    )
+    data.append(
+        dict(
+            name="ext",
+            n_threads=n_threads,
+            throughput=throughput(lambda: sess_ext.run_1_1(x), n_threads, n_runs),
+        )
+    )
+    # run_many loops over the requests in C++ and dispatches them
+    # on n_threads threads, there is no python thread.
+    requests = [[x] for _ in range(n_threads * n_runs)]
+    begin = time.perf_counter()
+    sess_ext.run_many(requests, n_threads=n_threads)
+    duration = time.perf_counter() - begin
+    data.append(
+        dict(
+            name="ext_many",
+            n_threads=n_threads,
+            throughput=len(requests) / duration,
+        )
+    )
+    # a pool holds one replica per thread
+    pool = OrtSessionPool(
+        onnx_model, n_replicas=n_threads, intra_op_num_threads=1, inter_op_num_threads=1
+    )
+    data.append(
+        dict(
+            name="pool",
+            n_threads=n_threads,
+            throughput=throughput(lambda p=pool: p.run([x]), n_threads, n_runs),
+        )
+    )
+
+df = DataFrame(data)
+df
+
+########################################
+# Plots
+# +++++
+#
+# The throughput should increase with the number of threads
+# until every core is busy.
+
+piv = df.pivot(index="n_threads", columns="name", values="throughput")
+
+fig, ax = plt.subplots(1, 1)
+piv.plot(ax=ax, title="Inferences per second, one shared session", logx=True)
+fig.savefig("plot_bench_ort_threads.png")
+
+########################################
+# Memory per replica
+# ++++++++++++++++++
+#
+# The replicas of :class:`OrtSessionPool <onnx_extended.ortcy.OrtSessionPool>`
+# share the initializers and their prepacked version by default.
+# The following code measures the memory added by every replica
+# with and without sharing.
+
+mem_data = []
+for share_weights in [True, False]:
+    for n_replicas in [1, 4] if unit_test_going() else [1, 4, 16]:
+        gc.collect()
+        before = psutil.Process().memory_info().rss
+        mem_pool = OrtSessionPool(
+            onnx_model, n_replicas=n_replicas, share_weights=share_weights
+        )
+        mem_pool.run([x])
+        after = psutil.Process().memory_info().rss
+        mem_data.append(
+            dict(
+                share_weights=share_weights,
+                n_replicas=n_replicas,
+                memory_per_replica=(after - before) / n_replicas,
+            )
+        )
+        del mem_pool
+
+mem_df = DataFrame(mem_data)
+mem_df
@@ -0,0 +1,199 @@
+"""
+.. _l-example-bench-ortops-elementwise:
+
+Elementwise custom kernels compared to onnxruntime
+==================================================
+
+:mod:`onnx_extended.ortops.tutorial.cpu` implements elementwise kernels
+with numpy broadcasting: *CustomAdd* computes `X + Y + cst`,
+*AddRelu* computes `Relu(X + Y)` and *MulSigmoid* computes
+`Sigmoid(X * Y)`. The loops are compiled for AVX2 and AVX-512, the
+best version is chosen at runtime, and big tensors are split into
+chunks processed by several threads. The following code compares
+them to the operators onnxruntime implements, *Add*
+and the sequences *Add* + *Relu*, *Mul* + *Sigmoid*. Float 16 is not
+measured, onnxruntime does not implement all these operators
+for float 16 on CPU.
+
+The models
+++++++++++
+"""
+import time
+import numpy
+from pandas import DataFrame
+import matplotlib.pyplot as plt
+from onnx import TensorProto
+from onnx.helper import (
+    make_graph,
+    make_model,
+    make_node,
+    make_opsetid,
+    make_tensor_value_info,
+)
+from onnxruntime import InferenceSession, SessionOptions
+from onnx_extended.ortops.tutorial.cpu import get_ort_ext_libs
+from onnx_extended.ext_test_case import unit_test_going
+
+domain = "onnx_extented.ortops.tutorial.cpu"
+
+
+def make_onnx_model(nodes, itype):
+    X = make_tensor_value_info("X", itype, None)
+    A = make_tensor_value_info("A", itype, None)
+    Y = make_tensor_value_info("Y", itype, None)
+    graph = make_graph(nodes, "ew", [X, A], [Y])
+    return make_model(
+        graph,
+        opset_imports=[make_opsetid("", 18), make_opsetid(domain, 1)],
+        ir_version=8,
+    )
+
+
+def ort_models(itype, suffix, n_threads):
+    return {
+        "Add": (
+            make_onnx_model([make_node("Add", ["X", "A"], ["Y"])], itype),
+            make_onnx_model(
+                [
+                    make_node(
+                        f"CustomAdd{suffix}",
+                        ["X", "A"],
+                        ["Y"],
+                        domain=domain,
+                        n_threads=n_threads,
+                    )
+                ],
+                itype,
+            ),
+        ),
+        "AddRelu": (
+            make_onnx_model(
+                [
+                    make_node("Add", ["X", "A"], ["xa"]),
+                    make_node("Relu", ["xa"], ["Y"]),
+                ],
+                itype,
+            ),
+            make_onnx_model(
+                [
+                    make_node(
+                        f"AddRelu{suffix}",
+                        ["X", "A"],
+                        ["Y"],
+                        domain=domain,
+                        n_threads=n_threads,
+                    )
+                ],
+                itype,
+            ),
+        ),
+        "MulSigmoid": (
+            make_onnx_model(
+                [
+                    make_node("Mul", ["X", "A"], ["xa"]),
+                    make_node("Sigmoid", ["xa"], ["Y"]),
+                ],
+                itype,
+            ),
+            make_onnx_model(
+                [
+                    make_node(
+                        f"MulSigmoid{suffix}",
+                        ["X", "A"],
+                        ["Y"],
+                        domain=domain,
+                        n_threads=n_threads,
+                    )
+                ],
+                itype,
+            ),
+        ),
+    }
+
+
+#########################################
+# Measures
+# ++++++++
+#
+# Both sessions use the same number of threads.
+
+
+def measure(sess, feeds, repeat):
+    sess.run(None, feeds)
+    begin = time.perf_counter()
+    for _ in range(repeat):
+        sess.run(None, feeds)
+    return (time.perf_counter() - begin) / repeat
+
+
+n_threads = 4
+sizes = (
+    [2**10, 2**16, 2**20]
+    if unit_test_going()
+    else [2**k for k in range(8, 25, 2)]
+)
+types = [
+    ("Float", TensorProto.FLOAT, numpy.float32),
+    ("Double", TensorProto.DOUBLE, numpy.float64),
+]
+
+data = []
+for suffix, itype, dtype in types:
+    for name, (model_ort, model_ext) in ort_models(itype, suffix, n_threads).items():
+        opts = SessionOptions()
+        opts.intra_op_num_threads = n_threads
+        sess_ort = InferenceSession(
+            model_ort.SerializeToString(), opts, providers=["CPUExecutionProvider"]
+        )
+        opts = SessionOptions()
+        opts.intra_op_num_threads = n_threads
+        opts.register_custom_ops_library(get_ort_ext_libs()[0])
+        sess_ext = InferenceSession(
+            model_ext.SerializeToString(), opts, providers=["CPUExecutionProvider"]
+        )
+        for size in sizes:
+            for broadcast in [False, True]:
+                # a matrix with 256 columns, broadcast adds a row
+                x = numpy.random.randn(size // 256 or 1, 256).astype(dtype)
+                a = numpy.random.randn(*((1, 256) if broadcast else x.shape)).astype(
+                    dtype
+                )
+                feeds = {"X": x, "A": a}
+                repeat = (
+                    max(5, min(1000, 2**20 // size)) if not unit_test_going() else 5
+                )
+                t_ort = measure(sess_ort, feeds, repeat)
+                t_ext = measure(sess_ext, feeds, repeat)
+                data.append(
+                    dict(
+                        op=name,
+                        dtype=suffix,
+                        size=x.size,
+                        broadcast=broadcast,
+                        ort=t_ort,
+                        ext=t_ext,
+                        speedup=t_ort / t_ext,
+                    )
+                )
+
+df = DataFrame(data)
+df
+
+########################################
+# Plots
+# +++++
+#
+# A speedup above 1 means the custom kernel is faster.
+
+fig, ax = plt.subplots(len(types), 2, figsize=(10, 4 * len(types)), squeeze=False)
+for i, (suffix, _, _) in enumerate(types):
+    for j, broadcast in enumerate([False, True]):
+        sub = df[(df.dtype == suffix) & (df.broadcast == broadcast)]
+        piv = sub.pivot(index="size", columns="op", values="speedup")
+        piv.plot(
+            ax=ax[i, j],
+            logx=True,
+            title=f"{suffix} speedup{' broadcast' if broadcast else ''}",
+        )
+fig.tight_layout()
+fig.savefig("plot_bench_ortops_elementwise.png")
@@ -0,0 +1,160 @@
+"""
+.. _l-example-bench-tree-ensemble-optim:
+
+TreeEnsemble optimized for onnxruntime
+======================================
+
+:mod:`onnx_extended.ortops.optim.cpu` implements operators
+*TreeEnsembleRegressor* and *TreeEnsembleClassifier* with the
+tree engine this package uses for the reference implementation.
+:func:`change_onnx_operator_domain
+<onnx_extended.ortops.optim.optimize.change_onnx_operator_domain>`
+replaces the standard operators from domain `ai.onnx.ml` in a model.
+The following code compares both implementations and the influence
+of the parameters driving the parallelization. It also compares
+the trees compiled into C code by :func:`compile_tree_ensemble
+<onnx_extended.ortops.optim.tree_codegen.compile_tree_ensemble>`
+and run by kernel `onnx_extented.ortops.tutorial.cpu.MyCustomOp`.
+
+A model
++++++++
+"""
+import sys
+import time
+import numpy
+from pandas import DataFrame
+import matplotlib.pyplot as plt
+from sklearn.datasets import make_regression
+from sklearn.ensemble import RandomForestRegressor
+from skl2onnx import to_onnx
+from onnx import TensorProto
+from onnx.helper import (
+    make_graph,
+    make_model,
+    make_node,
+    make_opsetid,
+    make_tensor_value_info,
+)
+from onnxruntime import InferenceSession, SessionOptions
+from onnx_extended.ortops.optim.cpu import get_ort_ext_libs
+from onnx_extended.ortops.optim.optimize import change_onnx_operator_domain
+from onnx_extended.ortops.optim.tree_codegen import compile_tree_ensemble
+from onnx_extended.ortops.tutorial.cpu import (
+    get_ort_ext_libs as get_ort_ext_libs_tutorial,
+)
+from onnx_extended.ext_test_case import unit_test_going
+
+n_features = 50
+n_trees = 10 if unit_test_going() else 200
+max_depth = 5 if unit_test_going() else 10
+batch_size = 1000 if unit_test_going() else 10000
+
+X, y = make_regression(batch_size + 2000, n_features=n_features, random_state=0)
+X = X.astype(numpy.float32)
+X_train, X_test = X[:2000], X[2000:]
+rf = RandomForestRegressor(n_estimators=n_trees, max_depth=max_depth, n_jobs=-1)
+rf.fit(X_train, y[:2000])
+onx = to_onnx(rf, X_train[:1])
+
+#################################
+# The same model with the custom kernel, different settings
+# for the parallelization.
+
+settings = {
+    "ort": None,
+    "optim-default": {},
+    "optim-by-rows": dict(parallel_tree=1000000, parallel_N=1, batch_size_rows=2),
+    "optim-by-trees": dict(parallel_tree=1, parallel_N=1000000, batch_size_tree=2),
+    "optim-node3": dict(use_node3=1),
+}
+
+opts = SessionOptions()
+opts.register_custom_ops_library(get_ort_ext_libs()[0])
+sessions = {}
+for name, kwargs in settings.items():
+    if kwargs is None:
+        sessions[name] = InferenceSession(
+            onx.SerializeToString(), providers=["CPUExecutionProvider"]
+        )
+        continue
+    new_onx = change_onnx_operator_domain(
+        onx,
+        op_type="TreeEnsembleRegressor",
+        op_domain="ai.onnx.ml",
+        new_op_domain="onnx_extented.ortops.optim.cpu",
+        **kwargs,
+    )
+    sessions[name] = InferenceSession(
+        new_onx.SerializeToString(), opts, providers=["CPUExecutionProvider"]
+    )
+
+#################################
+# The trees compiled into C code, the kernel splits the rows
+# in batches of the size given when the code is generated.
+
+if sys.platform != "win32":
+    lib = compile_tree_ensemble(onx, batch_size=64, trees_per_function=4)
+    node = make_node(
+        "MyCustomOp",
+        ["X"],
+        ["variable"],
+        domain="onnx_extented.ortops.tutorial.cpu",
+        model_path=lib,
+    )
+    graph = make_graph(
+        [node],
+        "codegen",
+        [make_tensor_value_info("X", TensorProto.FLOAT, [None, n_features])],
+        [make_tensor_value_info("variable", TensorProto.FLOAT, [None, 1])],
+    )
+    codegen_onx = make_model(
+        graph,
+        opset_imports=[make_opsetid("onnx_extented.ortops.tutorial.cpu", 1)],
+        ir_version=8,
+    )
+    opts_tutorial = SessionOptions()
+    opts_tutorial.register_custom_ops_library(get_ort_ext_libs_tutorial()[0])
+    sessions["codegen"] = InferenceSession(
+        codegen_onx.SerializeToString(),
+        opts_tutorial,
+        providers=["CPUExecutionProvider"],
+    )
+
+expected = sessions["ort"].run(None, {"X": X_test})[0]
+for name, sess in sessions.items():
+    got = sess.run(None, {"X": X_test})[0]
+    print(f"{name}: discrepancies={numpy.abs(expected - got).max()}")
+
+#################################
+# Time measurement
+# ++++++++++++++++
+
+repeat = 5 if unit_test_going() else 20
+data = []
+for n_rows in [1, 10, 100, batch_size]:
+    feeds = {"X": X_test[:n_rows]}
+    for name, sess in sessions.items():
+        sess.run(None, feeds)
+        begin = time.perf_counter()
+        for _ in range(repeat):
+            sess.run(None, feeds)
+        duration = (time.perf_counter() - begin) / repeat
+        data.append(dict(name=name, n_rows=n_rows, average=duration))
+
+df = DataFrame(data)
+df
+
+#################################
+# Plots
+# +++++
+
+piv = df.pivot(index="n_rows", columns="name", values="average")
+ratio = piv.copy()
+for c in ratio.columns:
+    ratio[c] = piv["ort"] / piv[c]
+
+fig, ax = plt.subplots(1, 2, figsize=(10, 4))
+piv.plot(ax=ax[0], title="Average time (s)", logx=True, logy=True)
+ratio.plot(ax=ax[1], title="Speed up compared to onnxruntime", logx=True)
+fig.tight_layout()
+fig.savefig("plot_bench_tree_ensemble_optim.png")
@@ -165,7 +165,8 @@ for scale in tqdm(scales):
     w, b, new_onx = modify(onx, scale)
     n_denorm = (w == denorm(w)).astype(numpy.int32).sum() / w.size
 
-    # sess1 = CReferenceEvaluator(new_onx)
+    sess1 = CReferenceEvaluator(new_onx)
+    sess5 = CReferenceEvaluator(new_onx, denormal_as_zero=True)
     sess2 = InferenceSession(
         new_onx.SerializeToString(), sess_options, providers=["CPUExecutionProvider"]
     )
@@ -176,14 +177,17 @@ for scale in tqdm(scales):
         new_onx.SerializeToString(), sess_options0, providers=["CPUExecutionProvider"]
     )
 
-    # sess1.run(None, feeds)
+    sess1.run(None, feeds)
+    got5 = sess5.run(None, feeds)[0]
+    diff5 = numpy.abs(got5 / scale - expected).max()
     got = sess2.run(None, feeds)[0]
     diff = numpy.abs(got / scale - expected).max()
     sess3.run(None, feeds)
     got0 = sess4.run(None, feeds)[0]
     diff0 = numpy.abs(got0 / scale - expected).max()
 
-    # t1 = measure_time(lambda: sess1.run(None, feeds), repeat=2, number=5)
+    t1 = measure_time(lambda: sess1.run(None, feeds), repeat=2, number=5)
+    t5 = measure_time(lambda: sess5.run(None, feeds), repeat=2, number=5)
     t2 = measure_time(lambda: sess2.run(None, feeds), repeat=2, number=5)
     t3 = measure_time(lambda: sess3.run(None, feeds), repeat=2, number=5)
     t4 = measure_time(lambda: sess4.run(None, feeds), repeat=2, number=5)
@@ -192,10 +196,12 @@ for scale in tqdm(scales):
         ort=t2["average"],
         diff=diff,
         diff0=diff0,
+        diff5=diff5,
         ort0=t4["average"],
         n_denorm=n_denorm,
     )
-    # obs["ref"]=t1["average"]
+    obs["ref"] = t1["average"]
+    obs["ref-ftz"] = t5["average"]
     obs["ort-opt"] = t3["average"]
 
     if torch is not None:
@@ -237,7 +243,7 @@ df
 ##########################################
 # Finally.
 
-dfp = df.drop(["diff", "diff0", "n_denorm"], axis=1).set_index("scale")
+dfp = df.drop(["diff", "diff0", "diff5", "n_denorm"], axis=1).set_index("scale")
 fig, ax = plt.subplots(1, 2, figsize=(10, 4))
 dfp.plot(ax=ax[0], logx=True, logy=True, title="Comparison of Conv processing time")
 df[["n_denorm"]].plot(
@@ -252,4 +258,8 @@ fig.savefig("plot_conv_denorm.png")
 # Conclusion
 # ++++++++++
 #
-# Denormalized numbers should be avoided.
+# Denormalized numbers should be avoided. If they cannot,
+# option ``session.set_denormal_as_zero`` for onnxruntime or
+# parameter *denormal_as_zero* for
+# :class:`CReferenceEvaluator <onnx_extended.reference.CReferenceEvaluator>`
+# flushes them to zero and removes the slowdown (curves *ort0* and *ref-ftz*).
@@ -66,6 +66,442 @@ class TestOrtCy(ExtTestCase):
         self.assertEqual(len(got), 1)
         self.assertEqualArray(got[0], x + y)
 
+        # the number of inputs is checked
+        self.assertRaise(lambda: session.run_1_1(x), RuntimeError)
+
+    def test_session_many_inputs(self):
+        from onnx_extended.ortcy.wrap.ortinf import OrtSession
+
+        n = 12
+        inputs = [
+            make_tensor_value_info(f"X{i}", TensorProto.FLOAT, [None, 3])
+            for i in range(n)
+        ]
+        outputs = [
+            make_tensor_value_info(f"Y{i}", TensorProto.FLOAT, [None, 3])
+            for i in range(n)
+        ]
+        nodes = [make_node("Neg", [f"X{i}"], [f"Y{i}"]) for i in range(n)]
+        graph = make_graph(nodes, "neg", inputs, outputs)
+        onnx_model = make_model(
+            graph, opset_imports=[make_opsetid("", 18)], ir_version=8
+        )
+        session = OrtSession(onnx_model.SerializeToString())
+        self.assertEqual(session.get_input_names(), [f"X{i}" for i in range(n)])
+        self.assertEqual(session.get_output_names(), [f"Y{i}" for i in range(n)])
+        self.assertEqual(session.get_input_types(), [TensorProto.FLOAT] * n)
+        self.assertEqual(session.get_output_types(), [TensorProto.FLOAT] * n)
+        self.assertEqual(session.get_input_shapes(), [(-1, 3)] * n)
+
+        xs = [numpy.random.randn(2, 3).astype(numpy.float32) for i in range(n)]
+        got = session.run(xs)
+        self.assertEqual(len(got), n)
+        for x, g in zip(xs, got):
+            self.assertEqualArray(-x, g)
+
+        xs[5] = xs[5].astype(numpy.float64)
+        self.assertRaise(lambda: session.run(xs), TypeError)
+
+    def test_session_zero_copy(self):
+        from onnx_extended.ortcy.wrap.ortinf import OrtCpuValueOwner, OrtSession
+
+        X = make_tensor_value_info("X", TensorProto.FLOAT, [None, None])
+        Y = make_tensor_value_info("Y", TensorProto.FLOAT, [None, None])
+        Z = make_tensor_value_info("Z", TensorProto.FLOAT, [None, None])
+        node = make_node("Add", ["X", "Y"], ["Z"])
+        graph = make_graph([node], "add", [X, Y], [Z])
+        onnx_model = make_model(
+            graph, opset_imports=[make_opsetid("", 18)], ir_version=8
+        )
+        session = OrtSession(onnx_model.SerializeToString())
+
+        x = numpy.random.randn(2, 3).astype(numpy.float32)
+        y = numpy.random.randn(2, 3).astype(numpy.float32)
+        got = [session.run_2(x, y)[0], session.run([x, y])[0]]
+        for g in got:
+            # the array shares the memory allocated by onnxruntime
+            self.assertFalse(g.flags.owndata)
+            self.assertIsInstance(g.base, OrtCpuValueOwner)
+            self.assertEqualArray(x + y, numpy.from_dlpack(g))
+
+        # outputs remain valid after the session is deleted
+        del session
+        for g in got:
+            self.assertEqualArray(x + y, g)
+
+    def test_session_bind_outputs(self):
+        from onnx_extended.ortcy.wrap.ortinf import OrtSession
+
+        X = make_tensor_value_info("X", TensorProto.FLOAT, [None, None])
+        Y = make_tensor_value_info("Y", TensorProto.FLOAT, [None, None])
+        Z = make_tensor_value_info("Z", TensorProto.FLOAT, [None, None])
+        node = make_node("Add", ["X", "Y"], ["Z"])
+        graph = make_graph([node], "add", [X, Y], [Z])
+        onnx_model = make_model(
+            graph, opset_imports=[make_opsetid("", 18)], ir_version=8
+        )
+        session = OrtSession(onnx_model.SerializeToString())
+
+        x = numpy.random.randn(2, 3).astype(numpy.float32)
+        y = numpy.random.randn(2, 3).astype(numpy.float32)
+        z = numpy.empty((2, 3), dtype=numpy.float32)
+        got = session.run([x, y], out=[z])
+        self.assertIs(got[0], z)
+        self.assertEqualArray(x + y, z)
+
+        z = numpy.empty((2, 3), dtype=numpy.float32)
+        session.bind_outputs([z])
+        got = session.run_2(x, y)
+        self.assertIs(got[0], z)
+        self.assertEqualArray(x + y, z)
+        got = session.run_2(x * 2, y)
+        self.assertIs(got[0], z)
+        self.assertEqualArray(x * 2 + y, z)
+
+        session.bind_outputs(None)
+        got = session.run_2(x, y)
+        self.assertIsNot(got[0], z)
+        self.assertEqualArray(x + y, got[0])
+
+        self.assertRaise(lambda: session.bind_outputs([z, z]), ValueError)
+        self.assertRaise(lambda: session.bind_outputs([z.T]), ValueError)
+
+    def test_session_run_many(self):
+        from onnx_extended.ortcy.wrap.ortinf import OrtSession
+
+        X = make_tensor_value_info("X", TensorProto.FLOAT, [None, None])
+        Y = make_tensor_value_info("Y", TensorProto.FLOAT, [None, None])
+        Z = make_tensor_value_info("Z", TensorProto.FLOAT, [None, None])
+        node = make_node("Add", ["X", "Y"], ["Z"])
+        graph = make_graph([node], "add", [X, Y], [Z])
+        onnx_model = make_model(
+            graph, opset_imports=[make_opsetid("", 18)], ir_version=8
+        )
+        session = OrtSession(onnx_model.SerializeToString())
+
+        requests = [
+            [
+                numpy.random.randn(i + 1, 3).astype(numpy.float32),
+                numpy.random.randn(i + 1, 3).astype(numpy.float32),
+            ]
+            for i in range(7)
+        ]
+        expected = [x + y for x, y in requests]
+        for n_threads in [1, 3]:
+            got = session.run_many(requests, n_threads=n_threads)
+            self.assertEqual(len(got), len(requests))
+            for e, g in zip(expected, got):
+                self.assertEqual(len(g), 1)
+                self.assertEqualArray(e, g[0])
+
+        z = numpy.empty((28, 3), dtype=numpy.float32)
+        got = session.run_many(requests, out=[z], n_threads=2)
+        self.assertIs(got[0], z)
+        self.assertEqualArray(numpy.vstack(expected), z)
+        self.assertRaise(
+            lambda: session.run_many(
+                requests, out=[numpy.empty((27, 3), dtype=numpy.float32)]
+            ),
+            ValueError,
+        )
+
+        got = list(session.run_stream(iter(requests), batch_size=3))
+        self.assertEqual(len(got), len(requests))
+        for e, g in zip(expected, got):
+            self.assertEqualArray(e, g[0])
+        self.assertEqual(session.run_many([]), [])
+
+    def test_session_run_async(self):
+        import asyncio
+        from onnx_extended.ortcy.wrap.ortinf import OrtSession
+
+        X = make_tensor_value_info("X", TensorProto.FLOAT, [None, None])
+        Y = make_tensor_value_info("Y", TensorProto.FLOAT, [None, None])
+        Z = make_tensor_value_info("Z", TensorProto.FLOAT, [None, None])
+        node = make_node("Add", ["X", "Y"], ["Z"])
+        graph = make_graph([node], "add", [X, Y], [Z])
+        onnx_model = make_model(
+            graph, opset_imports=[make_opsetid("", 18)], ir_version=8
+        )
+        session = OrtSession(onnx_model.SerializeToString())
+        x = numpy.random.randn(2, 3).astype(numpy.float32)
+        y = numpy.random.randn(2, 3).astype(numpy.float32)
+
+        async def main():
+            return await asyncio.gather(
+                *[session.run_async([x * i, y]) for i in range(10)]
+            )
+
+        got = asyncio.run(main())
+        self.assertEqual(len(got), 10)
+        for i, g in enumerate(got):
+            self.assertEqualArray(x * i + y, g[0])
+
+        async def main_out(z):
+            return await session.run_async([x, y], out=[z])
+
+        z = numpy.empty((2, 3), dtype=numpy.float32)
+        got = asyncio.run(main_out(z))
+        self.assertIs(got[0], z)
+        self.assertEqualArray(x + y, z)
+
+        async def main_error():
+            return await session.run_async(
+                [x, numpy.random.randn(4, 5).astype(numpy.float32)]
+            )
+
+        self.assertRaise(lambda: asyncio.run(main_error()), RuntimeError)
+        self.assertRaise(lambda: session.run_async([x, y]), RuntimeError)
+
+    def test_session_run_async_conversion_error(self):
+        import asyncio
+        from onnx_extended.ortcy import OrtSessionPool
+        from onnx_extended.ortcy.wrap.ortinf import OrtSession
+
+        # numpy has no bfloat16, the output cannot be converted
+        X = make_tensor_value_info("X", TensorProto.FLOAT, [None, None])
+        Y = make_tensor_value_info("Y", TensorProto.BFLOAT16, [None, None])
+        node = make_node("Cast", ["X"], ["Y"], to=TensorProto.BFLOAT16)
+        graph = make_graph([node], "cast", [X], [Y])
+        onnx_model = make_model(
+            graph, opset_imports=[make_opsetid("", 18)], ir_version=8
+        )
+        x = numpy.random.randn(2, 3).astype(numpy.float32)
+
+        session = OrtSession(onnx_model.SerializeToString())
+
+        async def main():
+            return await asyncio.wait_for(session.run_async([x]), timeout=10)
+
+        self.assertRaise(lambda: asyncio.run(main()), KeyError)
+
+        pool = OrtSessionPool(onnx_model, n_replicas=2)
+
+        async def main_pool():
+            return await asyncio.gather(
+                *[pool.run_async([x]) for i in range(4)], return_exceptions=True
+            )
+
+        got = asyncio.run(asyncio.wait_for(main_pool(), timeout=10))
+        self.assertEqual(len(got), 4)
+        for g in got:
+            self.assertIsInstance(g, KeyError)
+        self.assertEqual(pool.get_in_flight(), [0, 0])
+
+    def test_session_pool(self):
+        import asyncio
+        from onnx_extended.ortcy import OrtSessionPool
+
+        X = make_tensor_value_info("X", TensorProto.FLOAT, [None, None])
+        Y = make_tensor_value_info("Y", TensorProto.FLOAT, [None, None])
+        A = numpy.random.randn(16, 16).astype(numpy.float32)
+        node = make_node("MatMul", ["X", "A"], ["Y"])
+        graph = make_graph([node], "mm", [X], [Y], [from_array(A, name="A")])
+        onnx_model = make_model(
+            graph, opset_imports=[make_opsetid("", 18)], ir_version=8
+        )
+        x = numpy.random.randn(5, 16).astype(numpy.float32)
+
+        for share_weights in [True, False]:
+            pool = OrtSessionPool(onnx_model, n_replicas=3, share_weights=share_weights)
+            self.assertEqual(len(pool), 3)
+            got = pool.run([x])
+            self.assertEqualArray(x @ A, got[0], atol=1e-4)
+            self.assertEqual(pool.get_in_flight(), [0, 0, 0])
+
+        self.assertIsNone(pool.initializers)
+        pool = OrtSessionPool(onnx_model.SerializeToString(), n_replicas=2)
+        self.assertEqual(list(pool.initializers), ["A"])
+
+        async def main():
+            return await asyncio.gather(*[pool.run_async([x]) for i in range(6)])
+
+        got = asyncio.run(main())
+        for g in got:
+            self.assertEqualArray(x @ A, g[0], atol=1e-4)
+        self.assertEqual(pool.get_in_flight(), [0, 0])
+        self.assertRaise(lambda: OrtSessionPool(onnx_model, n_replicas=0), ValueError)
+
+    def test_session_run_stats(self):
+        from onnx_extended.ortcy.wrap.ortinf import OrtSession
+
+        X = make_tensor_value_info("X", TensorProto.FLOAT, [None, None])
+        Y = make_tensor_value_info("Y", TensorProto.FLOAT, [None, None])
+        node = make_node("Neg", ["X"], ["Y"])
+        graph = make_graph([node], "neg", [X], [Y])
+        onnx_model = make_model(
+            graph, opset_imports=[make_opsetid("", 18)], ir_version=8
+        )
+        session = OrtSession(onnx_model.SerializeToString())
+        stats = session.get_run_stats()
+        self.assertEqual(stats["run_count"], 0)
+        self.assertEqual(stats["p50_latency"], 0)
+
+        x = numpy.random.randn(4, 5).astype(numpy.float32)
+        for _ in range(10):
+            session.run_1_1(x)
+        stats = session.get_run_stats()
+        self.assertEqual(stats["run_count"], 10)
+        self.assertEqual(stats["bytes_in"], 10 * x.nbytes)
+        self.assertEqual(stats["bytes_out"], 10 * x.nbytes)
+        self.assertGreater(stats["p50_latency"], 0)
+        self.assertLessEqual(stats["p50_latency"], stats["p99_latency"])
+        self.assertLessEqual(stats["p99_latency"], stats["max_latency"] * 1.1)
+        self.assertLessEqual(stats["max_latency"], stats["total_latency"])
+        session.reset_run_stats()
+        self.assertEqual(session.get_run_stats()["run_count"], 0)
+
+    def test_session_profiling(self):
+        import json
+        import tempfile
+        from onnx_extended.ortcy.wrap.ortinf import OrtSession
+
+        X = make_tensor_value_info("X", TensorProto.FLOAT, [None, None])
+        Y = make_tensor_value_info("Y", TensorProto.FLOAT, [None, None])
+        node = make_node("Neg", ["X"], ["Y"])
+        graph = make_graph([node], "neg", [X], [Y])
+        onnx_model = make_model(
+            graph, opset_imports=[make_opsetid("", 18)], ir_version=8
+        )
+        with tempfile.TemporaryDirectory() as temp:
+            session = OrtSession(
+                onnx_model.SerializeToString(),
+                profiling=True,
+                profile_prefix=os.path.join(temp, "prof"),
+            )
+            session.set_run_tag("test")
+            session.run_1_1(numpy.random.randn(4, 5).astype(numpy.float32))
+            filename = session.end_profiling()
+            self.assertTrue(os.path.exists(filename))
+            self.assertTrue(os.path.basename(filename).startswith("prof"))
+            with open(filename, "r") as f:
+                content = json.load(f)
+            self.assertIsInstance(content, list)
+            self.assertGreater(len(content), 0)
+
+    def test_session_mmap(self):
+        import mmap
+        import tempfile
+        from onnx import save
+        from onnx_extended.ortcy import mmap_external_initializers
+        from onnx_extended.ortcy.wrap.ortinf import OrtSession
+
+        X = make_tensor_value_info("X", TensorProto.FLOAT, [None, None])
+        Y = make_tensor_value_info("Y", TensorProto.FLOAT, [None, None])
+        A = numpy.random.randn(64, 32).astype(numpy.float32)
+        B = numpy.random.randn(32).astype(numpy.float32)
+        graph = make_graph(
+            [
+                make_node("MatMul", ["X", "A"], ["XA"]),
+                make_node("Add", ["XA", "B"], ["Y"]),
+            ],
+            "mm",
+            [X],
+            [Y],
+            [from_array(A, name="A"), from_array(B, name="B")],
+        )
+        onnx_model = make_model(
+            graph, opset_imports=[make_opsetid("", 18)], ir_version=8
+        )
+        x = numpy.random.randn(5, 64).astype(numpy.float32)
+        expected = x @ A + B
+
+        with tempfile.TemporaryDirectory() as temp:
+            filename = os.path.join(temp, "model.onnx")
+            with open(filename, "wb") as f:
+                f.write(onnx_model.SerializeToString())
+            session = OrtSession(filename, use_mmap=True)
+            self.assertEqualArray(expected, session.run_1_1(x), atol=1e-4)
+            with open(filename, "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    session = OrtSession(data)
+            self.assertEqualArray(expected, session.run_1_1(x), atol=1e-4)
+
+            external = os.path.join(temp, "external.onnx")
+            save(
+                onnx_model,
+                external,
+                save_as_external_data=True,
+                all_tensors_to_one_file=True,
+                location="external.data",
+                size_threshold=0,
+            )
+            inits = mmap_external_initializers(external)
+            self.assertEqual(set(inits), {"A", "B"})
+            self.assertEqualArray(A, numpy.asarray(inits["A"]))
+            self.assertEqualArray(B, numpy.asarray(inits["B"]))
+            session = OrtSession(external, use_mmap=True, external_initializers=inits)
+            self.assertEqualArray(expected, session.run_1_1(x), atol=1e-4)
+            del session, inits
+
+    def test_session_global_threads(self):
+        from onnx_extended.ortcy import configure_global_threads
+        from onnx_extended.ortcy.wrap.ortinf import OrtSession
+
+        X = make_tensor_value_info("X", TensorProto.FLOAT, [None, None])
+        Y = make_tensor_value_info("Y", TensorProto.FLOAT, [None, None])
+        node = make_node("Exp", ["X"], ["Y"])
+        graph = make_graph([node], "exp", [X], [Y])
+        onnx_model = make_model(
+            graph, opset_imports=[make_opsetid("", 18)], ir_version=8
+        )
+        sessions = [
+            OrtSession(onnx_model.SerializeToString(), use_global_threads=True)
+            for i in range(3)
+        ]
+        x = numpy.random.randn(10, 10).astype(numpy.float32)
+        for session in sessions:
+            self.assertEqualArray(numpy.exp(x), session.run_1_1(x), atol=1e-6)
+
+        # too late, the thread pools were created with the first session
+        self.assertRaise(lambda: configure_global_threads(2, 1), RuntimeError)
+
+    def test_session_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from onnx_extended.ortcy.wrap.ortinf import OrtSession
+
+        X = make_tensor_value_info("X", TensorProto.FLOAT, [None, None])
+        Y = make_tensor_value_info("Y", TensorProto.FLOAT, [None, None])
+        node = make_node("Exp", ["X"], ["Y"])
+        graph = make_graph([node], "exp", [X], [Y])
+        onnx_model = make_model(
+            graph, opset_imports=[make_opsetid("", 18)], ir_version=8
+        )
+        session = OrtSession(onnx_model.SerializeToString())
+
+        xs = [numpy.random.randn(100, 10).astype(numpy.float32) for i in range(20)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            got = list(executor.map(session.run_1_1, xs))
+        for x, g in zip(xs, got):
+            self.assertEqualArray(numpy.exp(x), g, atol=1e-6)
+
+        # the number of inputs is checked
+        self.assertRaise(lambda: session.run_2(xs[0], xs[1]), RuntimeError)
+
+    def test_session_run_tag_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from onnx_extended.ortcy.wrap.ortinf import OrtSession
+
+        X = make_tensor_value_info("X", TensorProto.FLOAT, [None, None])
+        Y = make_tensor_value_info("Y", TensorProto.FLOAT, [None, None])
+        node = make_node("Exp", ["X"], ["Y"])
+        graph = make_graph([node], "exp", [X], [Y])
+        onnx_model = make_model(
+            graph, opset_imports=[make_opsetid("", 18)], ir_version=8
+        )
+        session = OrtSession(onnx_model.SerializeToString())
+
+        # the tag changes while other threads are running the model
+        def run(i):
+            session.set_run_tag(f"tag{i}")
+            return session.run_1_1(xs[i])
+
+        xs = [numpy.random.randn(100, 10).astype(numpy.float32) for i in range(40)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            got = list(executor.map(run, range(len(xs))))
+        for x, g in zip(xs, got):
+            self.assertEqualArray(numpy.exp(x), g, atol=1e-6)
+
     def test_my_custom_ops_cy(self):
         from onnx_extended.ortcy.wrap.ortinf import OrtSession
         from onnx_extended.ortops.tutorial.cpu import get_ort_ext_libs
@@ -0,0 +1,246 @@
+import unittest
+import numpy
+from sklearn.datasets import make_classification, make_regression
+from sklearn.ensemble import (
+    GradientBoostingClassifier,
+    RandomForestClassifier,
+    RandomForestRegressor,
+)
+from skl2onnx import to_onnx
+from onnx import TensorProto
+from onnx.helper import make_graph, make_model, make_node, make_tensor_value_info
+from onnx_extended.ortops.optim.optimize import (
+    change_onnx_operator_domain,
+    fuse_tree_ensemble_classifier,
+)
+from onnx_extended.reference import CReferenceEvaluator
+
+try:
+    from onnxruntime import InferenceSession, SessionOptions
+except ImportError:
+    SessionOptions, InferenceSession = None, None
+from onnx_extended.ext_test_case import ExtTestCase, ignore_warnings
+
+
+class TestOrtOpOptimTreeEnsembleCpu(ExtTestCase):
+    def test_get_ort_ext_libs(self):
+        from onnx_extended.ortops.optim.cpu import get_ort_ext_libs
+
+        r = get_ort_ext_libs()
+        self.assertEqual(len(r), 1)
+
+    def test_documentation(self):
+        from onnx_extended.ortops.optim.cpu import documentation
+
+        doc = documentation()
+        self.assertIsInstance(doc, list)
+        self.assertEqual(len(doc), 2)
+        for d in doc:
+            self.assertIn("~~~~", d)
+            self.assertIsInstance(d, str)
+
+    @ignore_warnings((FutureWarning, DeprecationWarning))
+    def test_change_onnx_operator_domain(self):
+        X, y = make_regression(100, n_features=4, random_state=0)
+        rf = RandomForestRegressor(n_estimators=3, max_depth=3).fit(X, y)
+        onx = to_onnx(rf, X[:1].astype(numpy.float32))
+        new_onx = change_onnx_operator_domain(
+            onx,
+            op_type="TreeEnsembleRegressor",
+            op_domain="ai.onnx.ml",
+            new_op_domain="onnx_extented.ortops.optim.cpu",
+            parallel_tree=40,
+        )
+        node = new_onx.graph.node[0]
+        self.assertEqual(node.domain, "onnx_extented.ortops.optim.cpu")
+        self.assertEqual(onx.graph.node[0].domain, "ai.onnx.ml")
+        atts = {att.name: att for att in node.attribute}
+        self.assertEqual(atts["parallel_tree"].i, 40)
+        self.assertIn(b",", atts["nodes_modes"].s)
+        self.assertIn(b"BRANCH_LEQ", atts["nodes_modes"].s)
+        domains = {op.domain: op.version for op in new_onx.opset_import}
+        self.assertEqual(domains["onnx_extented.ortops.optim.cpu"], 1)
+
+    @unittest.skipIf(InferenceSession is None, "onnxruntime not installed")
+    @ignore_warnings((FutureWarning, DeprecationWarning))
+    def test_tree_ensemble_regressor(self):
+        from onnx_extended.ortops.optim.cpu import get_ort_ext_libs
+
+        X, y = make_regression(100, n_features=6, n_targets=2, random_state=0)
+        X = X.astype(numpy.float32)
+        rf = RandomForestRegressor(n_estimators=10, max_depth=4).fit(X, y)
+        onx = to_onnx(rf, X[:1])
+        expected = InferenceSession(
+            onx.SerializeToString(), providers=["CPUExecutionProvider"]
+        ).run(None, {"X": X})[0]
+
+        opts = SessionOptions()
+        opts.register_custom_ops_library(get_ort_ext_libs()[0])
+        # use_node3 changes the way the trees are stored during the initialization
+        for use_node3 in [0, 1]:
+            with self.subTest(use_node3=use_node3):
+                new_onx = change_onnx_operator_domain(
+                    onx,
+                    op_type="TreeEnsembleRegressor",
+                    op_domain="ai.onnx.ml",
+                    new_op_domain="onnx_extented.ortops.optim.cpu",
+                    parallel_tree=1,
+                    parallel_N=1,
+                    use_node3=use_node3,
+                )
+                sess = InferenceSession(
+                    new_onx.SerializeToString(),
+                    opts,
+                    providers=["CPUExecutionProvider"],
+                )
+                got = sess.run(None, {"X": X})[0]
+                self.assertEqualArray(expected, got, atol=1e-4)
+
+    @unittest.skipIf(InferenceSession is None, "onnxruntime not installed")
+    @ignore_warnings((FutureWarning, DeprecationWarning))
+    def test_tree_ensemble_classifier(self):
+        from onnx_extended.ortops.optim.cpu import get_ort_ext_libs
+
+        X, y = make_classification(
+            200, n_features=6, n_classes=3, n_informative=4, random_state=0
+        )
+        X = X.astype(numpy.float32)
+        y += 10
+        rf = RandomForestClassifier(n_estimators=10, max_depth=4).fit(X, y)
+        onx = to_onnx(rf, X[:1], options={"zipmap": False})
+        expected = InferenceSession(
+            onx.SerializeToString(), providers=["CPUExecutionProvider"]
+        ).run(None, {"X": X})
+
+        new_onx = change_onnx_operator_domain(
+            onx,
+            op_type="TreeEnsembleClassifier",
+            op_domain="ai.onnx.ml",
+            new_op_domain="onnx_extented.ortops.optim.cpu",
+        )
+        opts = SessionOptions()
+        opts.register_custom_ops_library(get_ort_ext_libs()[0])
+        sess = InferenceSession(
+            new_onx.SerializeToString(), opts, providers=["CPUExecutionProvider"]
+        )
+        got = sess.run(None, {"X": X})
+        self.assertEqualArray(expected[0], got[0])
+        self.assertEqualArray(expected[1], got[1], atol=1e-5)
+
+    @unittest.skipIf(InferenceSession is None, "onnxruntime not installed")
+    @ignore_warnings((FutureWarning, DeprecationWarning))
+    def test_tree_ensemble_classifier_binary(self):
+        from onnx_extended.ortops.optim.cpu import get_ort_ext_libs
+
+        # the leaves only hold the score of one class, post_transform is LOGISTIC
+        X, y = make_classification(200, n_features=6, random_state=0)
+        X = X.astype(numpy.float32)
+        gb = GradientBoostingClassifier(n_estimators=10, max_depth=3).fit(X, y)
+        onx = to_onnx(gb, X[:1], options={"zipmap": False})
+        atts = {a.name: a for a in onx.graph.node[0].attribute}
+        self.assertEqual(set(atts["class_ids"].ints), {0})
+        expected = InferenceSession(
+            onx.SerializeToString(), providers=["CPUExecutionProvider"]
+        ).run(None, {"X": X})
+
+        opts = SessionOptions()
+        opts.register_custom_ops_library(get_ort_ext_libs()[0])
+        for use_node3 in [0, 1]:
+            with self.subTest(use_node3=use_node3):
+                new_onx = change_onnx_operator_domain(
+                    onx,
+                    op_type="TreeEnsembleClassifier",
+                    op_domain="ai.onnx.ml",
+                    new_op_domain="onnx_extented.ortops.optim.cpu",
+                    use_node3=use_node3,
+                )
+                sess = InferenceSession(
+                    new_onx.SerializeToString(),
+                    opts,
+                    providers=["CPUExecutionProvider"],
+                )
+                got = sess.run(None, {"X": X})
+                self.assertEqualArray(expected[0], got[0])
+                self.assertEqualArray(expected[1], got[1], atol=1e-5)
+
+    def _classifier_post_processing(self, keepdims=0):
+        X, y = make_classification(
+            200, n_features=6, n_classes=3, n_informative=4, random_state=0
+        )
+        X = X.astype(numpy.float32)
+        rf = RandomForestClassifier(n_estimators=10, max_depth=4).fit(X, y)
+        onx = to_onnx(rf, X[:1], options={"zipmap": False})
+        te = onx.graph.node[0]
+        graph = make_graph(
+            [
+                te,
+                make_node("Softmax", [te.output[1]], ["Y"], axis=1),
+                make_node("ArgMax", ["Y"], ["L"], axis=1, keepdims=keepdims),
+            ],
+            "g",
+            list(onx.graph.input),
+            [make_tensor_value_info("L", TensorProto.INT64, None)],
+        )
+        return X, make_model(graph, opset_imports=onx.opset_import)
+
+    @ignore_warnings((FutureWarning, DeprecationWarning))
+    def test_fuse_tree_ensemble_classifier(self):
+        for keepdims in [0, 1]:
+            with self.subTest(keepdims=keepdims):
+                X, onx = self._classifier_post_processing(keepdims)
+                new_onx = fuse_tree_ensemble_classifier(onx)
+                op_types = [n.op_type for n in new_onx.graph.node]
+                self.assertEqual(
+                    op_types,
+                    [
+                        "TreeEnsembleClassifier",
+                        "Unsqueeze" if keepdims else "Identity",
+                    ],
+                )
+                atts = {a.name: a for a in new_onx.graph.node[0].attribute}
+                self.assertEqual(atts["post_transform"].s, b"SOFTMAX")
+                expected = CReferenceEvaluator(onx).run(None, {"X": X})
+                got = CReferenceEvaluator(new_onx).run(None, {"X": X})
+                self.assertEqualArray(expected[0], got[0])
+
+        # the custom kernel does not compute the probabilities anymore
+        custom = change_onnx_operator_domain(
+            onx,
+            op_type="TreeEnsembleClassifier",
+            op_domain="ai.onnx.ml",
+            new_op_domain="onnx_extented.ortops.optim.cpu",
+        )
+        new_onx = fuse_tree_ensemble_classifier(custom)
+        atts = {a.name: a for a in new_onx.graph.node[0].attribute}
+        self.assertEqual(atts["compute_probabilities"].i, 0)
+        self.assertNotIn("compute_labels", atts)
+
+    @unittest.skipIf(InferenceSession is None, "onnxruntime not installed")
+    @ignore_warnings((FutureWarning, DeprecationWarning))
+    def test_tree_ensemble_classifier_fused(self):
+        from onnx_extended.ortops.optim.cpu import get_ort_ext_libs
+
+        X, onx = self._classifier_post_processing()
+        expected = InferenceSession(
+            onx.SerializeToString(), providers=["CPUExecutionProvider"]
+        ).run(None, {"X": X})
+
+        new_onx = fuse_tree_ensemble_classifier(
+            change_onnx_operator_domain(
+                onx,
+                op_type="TreeEnsembleClassifier",
+                op_domain="ai.onnx.ml",
+                new_op_domain="onnx_extented.ortops.optim.cpu",
+            )
+        )
+        opts = SessionOptions()
+        opts.register_custom_ops_library(get_ort_ext_libs()[0])
+        sess = InferenceSession(
+            new_onx.SerializeToString(), opts, providers=["CPUExecutionProvider"]
+        )
+        got = sess.run(None, {"X": X})
+        self.assertEqualArray(expected[0], got[0])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,156 @@
+import ctypes
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import unittest
+import numpy
+from sklearn.datasets import make_regression
+from sklearn.ensemble import RandomForestRegressor
+from skl2onnx import to_onnx
+from onnx_extended.ortops.optim.tree_codegen import (
+    _compiler_target,
+    compile_tree_ensemble,
+    generate_tree_ensemble_c_code,
+)
+from onnx_extended.ext_test_case import ExtTestCase, ignore_warnings
+
+try:
+    from onnxruntime import InferenceSession
+except ImportError:
+    InferenceSession = None
+
+
+class Memref1(ctypes.Structure):
+    _fields_ = [
+        ("bufferPtr", ctypes.POINTER(ctypes.c_float)),
+        ("alignedPtr", ctypes.POINTER(ctypes.c_float)),
+        ("offset", ctypes.c_int64),
+        ("lengths", ctypes.c_int64 * 1),
+        ("strides", ctypes.c_int64 * 1),
+    ]
+
+
+def run_library(lib_path, x):
+    # Same calls as TreebeardSORunner in tb_runner.h.
+    lib = ctypes.CDLL(lib_path)
+    lib.Init_model.restype = ctypes.c_int32
+    lib.GetBatchSize.restype = ctypes.c_int32
+    lib.GetRowSize.restype = ctypes.c_int32
+    lib.Prediction_Function.restype = Memref1
+    fptr = ctypes.POINTER(ctypes.c_float)
+    i64 = ctypes.c_int64
+    lib.Prediction_Function.argtypes = [fptr, fptr, *[i64] * 5]
+    lib.Prediction_Function.argtypes += [fptr, fptr, *[i64] * 3]
+    lib.Init_model()
+    batch_size = lib.GetBatchSize()
+    row_size = lib.GetRowSize()
+    assert x.shape[1] == row_size
+    x = numpy.ascontiguousarray(x, dtype=numpy.float32)
+    res = numpy.empty(x.shape[0], dtype=numpy.float32)
+    for i in range(0, x.shape[0], batch_size):
+        xb = x[i : i + batch_size]
+        rb = res[i : i + batch_size]
+        px = xb.ctypes.data_as(fptr)
+        pr = rb.ctypes.data_as(fptr)
+        n = xb.shape[0]
+        lib.Prediction_Function(px, px, 0, n, row_size, row_size, 1, pr, pr, 0, n, 1)
+    return res.reshape((-1, 1))
+
+
+class TestTreeCodegen(ExtTestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _model(self):
+        X, y = make_regression(200, n_features=5, random_state=0)
+        X = X.astype(numpy.float32)
+        rf = RandomForestRegressor(n_estimators=7, max_depth=5, random_state=0)
+        rf.fit(X, y)
+        return X, rf, to_onnx(rf, X[:1])
+
+    @ignore_warnings((FutureWarning, DeprecationWarning))
+    def test_generate_code(self):
+        _, _, onx = self._model()
+        code = generate_tree_ensemble_c_code(onx, batch_size=8)
+        self.assertIn("Prediction_Function", code)
+        self.assertIn("#define BATCH_SIZE 8", code)
+        self.assertIn("#define ROW_SIZE 5", code)
+        self.assertIn("block_6(x)", code)
+        code = generate_tree_ensemble_c_code(onx, trees_per_function=4)
+        self.assertIn("block_4(x)", code)
+        self.assertNotIn("block_1(x)", code)
+
+    @unittest.skipIf(sys.platform == "win32", "not implemented on Windows")
+    @unittest.skipIf(shutil.which("cc") is None, "no compiler")
+    @ignore_warnings((FutureWarning, DeprecationWarning))
+    def test_compile_tree_ensemble(self):
+        X, rf, onx = self._model()
+        expected = rf.predict(X).astype(numpy.float32).reshape((-1, 1))
+        for tpf in [1, 3]:
+            with self.subTest(trees_per_function=tpf):
+                lib = compile_tree_ensemble(
+                    onx, batch_size=16, trees_per_function=tpf, cache_dir=self.cache_dir
+                )
+                self.assertExists(lib)
+                got = run_library(lib, X)
+                self.assertEqualArray(expected, got, atol=1e-3)
+
+        # the second call hits the cache
+        mtime = os.stat(lib).st_mtime_ns
+        lib2 = compile_tree_ensemble(
+            onx, batch_size=16, trees_per_function=3, cache_dir=self.cache_dir
+        )
+        self.assertEqual(lib, lib2)
+        self.assertEqual(mtime, os.stat(lib2).st_mtime_ns)
+
+    @unittest.skipIf(sys.platform == "win32", "not implemented on Windows")
+    @unittest.skipIf(shutil.which("cc") is None, "no compiler")
+    @ignore_warnings((FutureWarning, DeprecationWarning))
+    def test_compile_tree_ensemble_cache_checks(self):
+        X, rf, onx = self._model()
+        expected = rf.predict(X).astype(numpy.float32).reshape((-1, 1))
+        lib = compile_tree_ensemble(onx, batch_size=16, cache_dir=self.cache_dir)
+        self.assertExists(lib + ".sha256")
+
+        # a modified library is compiled again
+        with open(lib, "ab") as f:
+            f.write(b"\0")
+        lib2 = compile_tree_ensemble(onx, batch_size=16, cache_dir=self.cache_dir)
+        self.assertEqual(lib, lib2)
+        self.assertEqualArray(expected, run_library(lib2, X), atol=1e-3)
+
+        # the targeted instruction set is part of the key
+        if platform.machine() in ("x86_64", "AMD64"):
+            target = _compiler_target("cc", ("-O3",))
+            self.assertNotIn("__AVX2__", target)
+            self.assertIn("__AVX2__", _compiler_target("cc", ("-O3", "-mavx2")))
+
+        # a folder other users can write into is rejected
+        shared = os.path.join(self.cache_dir, "shared")
+        os.mkdir(shared)
+        os.chmod(shared, 0o777)
+        self.assertRaise(
+            lambda: compile_tree_ensemble(onx, cache_dir=shared), RuntimeError
+        )
+
+    @unittest.skipIf(sys.platform == "win32", "not implemented on Windows")
+    @unittest.skipIf(shutil.which("cc") is None, "no compiler")
+    @unittest.skipIf(InferenceSession is None, "onnxruntime not installed")
+    @ignore_warnings((FutureWarning, DeprecationWarning))
+    def test_compile_tree_ensemble_ort(self):
+        X, _, onx = self._model()
+        expected = InferenceSession(
+            onx.SerializeToString(), providers=["CPUExecutionProvider"]
+        ).run(None, {"X": X})[0]
+        lib = compile_tree_ensemble(onx, cache_dir=self.cache_dir)
+        got = run_library(lib, X)
+        self.assertEqualArray(expected, got, atol=1e-4)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
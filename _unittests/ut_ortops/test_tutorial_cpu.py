@@ -1,3 +1,7 @@
+import os
+import shutil
+import sys
+import tempfile
 import unittest
 import numpy
 from onnx import TensorProto
@@ -16,7 +20,7 @@ try:
     from onnxruntime import InferenceSession, SessionOptions
 except ImportError:
     SessionOptions, InferenceSession = None, None
-from onnx_extended.ext_test_case import ExtTestCase
+from onnx_extended.ext_test_case import ExtTestCase, ignore_warnings
 
 
 class TestOrtOpTutorialCpu(ExtTestCase):
@@ -29,22 +33,41 @@ class TestOrtOpTutorialCpu(ExtTestCase):
     def test_documentation(self):
         doc = documentation()
         self.assertIsInstance(doc, list)
-        self.assertEqual(len(doc), 2)
+        self.assertEqual(len(doc), 5)
         for d in doc:
             self.assertIn("~~~~", d)
             self.assertIsInstance(d, str)
 
-    @unittest.skipIf(InferenceSession is None, "onnxruntime not installed")
-    def test_my_custom_ops(self):
+    def _tree_model(self, batch_size, cache_dir=None):
+        from sklearn.datasets import make_regression
+        from sklearn.ensemble import RandomForestRegressor
+        from skl2onnx import to_onnx
+        from onnx_extended.ortops.optim.tree_codegen import compile_tree_ensemble
+
+        X, y = make_regression(100, n_features=5, random_state=0)
+        X = X.astype(numpy.float32)
+        rf = RandomForestRegressor(n_estimators=5, max_depth=4, random_state=0)
+        rf.fit(X, y)
+        onx = to_onnx(rf, X[:1])
+        lib = compile_tree_ensemble(onx, batch_size=batch_size, cache_dir=cache_dir)
+        expected = InferenceSession(
+            onx.SerializeToString(), providers=["CPUExecutionProvider"]
+        ).run(None, {"X": X})[0]
+        return X, expected, lib
+
+    def _my_custom_op_session(self, **kwargs):
         from onnx_extended.ortops.tutorial.cpu import get_ort_ext_libs
 
         X = make_tensor_value_info("X", TensorProto.FLOAT, [None, None])
-        A = make_tensor_value_info("A", TensorProto.FLOAT, [None, None])
         Y = make_tensor_value_info("Y", TensorProto.FLOAT, [None, None])
         node1 = make_node(
-            "MyCustomOp", ["X", "A"], ["Y"], domain="onnx_extented.ortops.tutorial.cpu"
+            "MyCustomOp",
+            ["X"],
+            ["Y"],
+            domain="onnx_extented.ortops.tutorial.cpu",
+            **kwargs,
         )
-        graph = make_graph([node1], "lr", [X, A], [Y])
+        graph = make_graph([node1], "trees", [X], [Y])
         onnx_model = make_model(
             graph,
             opset_imports=[make_opsetid("onnx_extented.ortops.tutorial.cpu", 1)],
@@ -55,14 +78,73 @@ class TestOrtOpTutorialCpu(ExtTestCase):
         r = get_ort_ext_libs()
         opts = SessionOptions()
         opts.register_custom_ops_library(r[0])
-        sess = InferenceSession(
+        return InferenceSession(
             onnx_model.SerializeToString(), opts, providers=["CPUExecutionProvider"]
         )
-        a = numpy.random.randn(2, 2).astype(numpy.float32)
-        b = numpy.random.randn(2, 2).astype(numpy.float32)
-        feeds = {"X": a, "A": b}
-        got = sess.run(None, feeds)[0]
-        self.assertEqualArray(a + b, got)
+
+    @unittest.skipIf(InferenceSession is None, "onnxruntime not installed")
+    @unittest.skipIf(sys.platform == "win32", "not implemented on Windows")
+    @unittest.skipIf(shutil.which("cc") is None, "no compiler")
+    @ignore_warnings((FutureWarning, DeprecationWarning))
+    def test_my_custom_ops(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            X, expected, lib = self._tree_model(8, cache_dir=cache_dir)
+            for n_threads in [1, 3]:
+                sess = self._my_custom_op_session(model_path=lib, n_threads=n_threads)
+                # fewer rows than a batch, an exact multiple, a tail batch
+                for n in [3, 8, 64, 21, 100]:
+                    with self.subTest(n_threads=n_threads, n=n):
+                        got = sess.run(None, {"X": X[:n]})[0]
+                        self.assertEqual(got.shape, (n, 1))
+                        self.assertEqualArray(expected[:n], got, atol=1e-4)
+
+    @unittest.skipIf(InferenceSession is None, "onnxruntime not installed")
+    @unittest.skipIf(sys.platform == "win32", "not implemented on Windows")
+    @unittest.skipIf(shutil.which("cc") is None, "no compiler")
+    @ignore_warnings((FutureWarning, DeprecationWarning))
+    def test_my_custom_ops_model_blob(self):
+        import hashlib
+
+        # default cache of compile_tree_ensemble, shared by all calls
+        X, expected, lib = self._tree_model(16)
+        self.assertEqual(
+            os.path.dirname(lib),
+            os.path.join(tempfile.gettempdir(), f"onnx_extended_trees_{os.getuid()}"),
+        )
+        with open(lib, "rb") as f:
+            blob = f.read()
+        sess = self._my_custom_op_session(model_blob=blob, n_threads=2)
+        got = sess.run(None, {"X": X[:37]})[0]
+        self.assertEqualArray(expected[:37], got, atol=1e-4)
+
+        # the library is written once in a private folder named after its hash
+        folder = os.path.join(
+            os.environ.get("TMPDIR", None) or "/tmp", f"onnx_extended_{os.getuid()}"
+        )
+        self.assertEqual(os.stat(folder).st_mode & 0o077, 0)
+        written = os.path.join(
+            folder, f"treebeard_{hashlib.sha256(blob).hexdigest()}.so"
+        )
+        self.assertExists(written)
+        mtime = os.stat(written).st_mtime_ns
+
+        # a second session shares the library loaded by the first one
+        sess2 = self._my_custom_op_session(model_blob=blob)
+        sess3 = self._my_custom_op_session(model_path=written)
+        self.assertEqual(mtime, os.stat(written).st_mtime_ns)
+        del sess
+        for s in [sess2, sess3]:
+            got = s.run(None, {"X": X})[0]
+            self.assertEqualArray(expected, got, atol=1e-4)
+
+        # a modified file is replaced by the blob
+        with open(written, "ab") as f:
+            f.write(b"\0")
+        sess4 = self._my_custom_op_session(model_blob=blob)
+        with open(written, "rb") as f:
+            self.assertEqual(blob, f.read())
+        got = sess4.run(None, {"X": X})[0]
+        self.assertEqualArray(expected, got, atol=1e-4)
 
     @unittest.skipIf(InferenceSession is None, "onnxruntime not installed")
     def test_my_custom_ops_with_attributes(self):
@@ -102,6 +184,116 @@ class TestOrtOpTutorialCpu(ExtTestCase):
         got = sess.run(None, feeds)[0]
         self.assertEqualArray(a + b + cst, got)
 
+    def _elementwise_model(self, op_type, itype, **kwargs):
+        X = make_tensor_value_info("X", itype, None)
+        A = make_tensor_value_info("A", itype, None)
+        Y = make_tensor_value_info("Y", itype, None)
+        node1 = make_node(
+            op_type,
+            ["X", "A"],
+            ["Y"],
+            domain="onnx_extented.ortops.tutorial.cpu",
+            **kwargs,
+        )
+        graph = make_graph([node1], "lr", [X, A], [Y])
+        onnx_model = make_model(
+            graph,
+            opset_imports=[make_opsetid("onnx_extented.ortops.tutorial.cpu", 1)],
+            ir_version=8,
+        )
+        check_model(onnx_model)
+        return onnx_model
+
+    @unittest.skipIf(InferenceSession is None, "onnxruntime not installed")
+    def test_elementwise_ops(self):
+        from onnx_extended.ortops.tutorial.cpu import get_ort_ext_libs
+
+        r = get_ort_ext_libs()
+        opts = SessionOptions()
+        opts.register_custom_ops_library(r[0])
+
+        def sigmoid(x):
+            return 1 / (1 + numpy.exp(-x))
+
+        expected = {
+            "CustomAdd": lambda a, b: a + b + 0.5,
+            "AddRelu": lambda a, b: numpy.maximum(a + b, 0),
+            "MulSigmoid": lambda a, b: sigmoid(a * b),
+        }
+        types = [
+            ("Float", TensorProto.FLOAT, numpy.float32, 1e-5),
+            ("Double", TensorProto.DOUBLE, numpy.float64, 1e-10),
+            ("Float16", TensorProto.FLOAT16, numpy.float16, 1e-2),
+        ]
+        shapes = [
+            ((5, 7), (5, 7)),
+            ((5, 7), (7,)),
+            ((5, 1), (1, 7)),
+            ((2, 3, 4), (3, 1)),
+            ((1,), (3, 4)),
+            ((300, 500), (300, 500)),
+        ]
+        for name, fct in expected.items():
+            for suffix, itype, dtype, atol in types:
+                kwargs = dict(cst=0.5) if name == "CustomAdd" else {}
+                onnx_model = self._elementwise_model(name + suffix, itype, **kwargs)
+                sess = InferenceSession(
+                    onnx_model.SerializeToString(),
+                    opts,
+                    providers=["CPUExecutionProvider"],
+                )
+                for sx, sy in shapes:
+                    with self.subTest(op_type=name + suffix, sx=sx, sy=sy):
+                        a = numpy.random.randn(*sx).astype(dtype)
+                        b = numpy.random.randn(*sy).astype(dtype)
+                        got = sess.run(None, {"X": a, "A": b})[0]
+                        exp = fct(a.astype(numpy.float64), b.astype(numpy.float64))
+                        self.assertEqual(got.dtype, dtype)
+                        self.assertEqualArray(exp.astype(dtype), got, atol=atol)
+
+    @unittest.skipIf(InferenceSession is None, "onnxruntime not installed")
+    def test_kernel_counters(self):
+        from onnx_extended.ortops import (
+            enable_kernel_counters,
+            get_kernel_counters,
+            reset_kernel_counters,
+        )
+        from onnx_extended.ortops.tutorial.cpu import get_ort_ext_libs
+
+        r = get_ort_ext_libs()
+        opts = SessionOptions()
+        opts.register_custom_ops_library(r[0])
+        onnx_model = self._elementwise_model("AddReluFloat", TensorProto.FLOAT)
+        sess = InferenceSession(
+            onnx_model.SerializeToString(), opts, providers=["CPUExecutionProvider"]
+        )
+        a = numpy.random.randn(5, 7).astype(numpy.float32)
+        b = numpy.random.randn(7).astype(numpy.float32)
+
+        previous = enable_kernel_counters(r[0])
+        try:
+            reset_kernel_counters(r[0])
+            for _ in range(3):
+                sess.run(None, {"X": a, "A": b})
+            counters = get_kernel_counters(r[0])
+            self.assertIn("AddReluFloat", counters)
+            c = counters["AddReluFloat"]
+            self.assertEqual(c["calls"], 3)
+            self.assertEqual(c["bytes"], 3 * (35 + 7 + 35) * 4)
+            self.assertEqual(set(c["phases"]), {"plan", "allocation", "compute"})
+            for phase in c["phases"].values():
+                self.assertEqual(phase["calls"], 3)
+                self.assertGreaterEqual(phase["time"], 0)
+
+            # nothing is counted once disabled
+            enable_kernel_counters(r[0], False)
+            sess.run(None, {"X": a, "A": b})
+            self.assertEqual(get_kernel_counters(r[0])["AddReluFloat"]["calls"], 3)
+            reset_kernel_counters(r[0])
+            self.assertEqual(get_kernel_counters(r[0])["AddReluFloat"]["calls"], 0)
+        finally:
+            enable_kernel_counters(r[0], previous)
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)
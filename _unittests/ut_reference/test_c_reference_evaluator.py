@@ -80,6 +80,35 @@ class TestCReferenceEvaluator(ExtTestCase):
     def test_conv_double(self):
         self.conv_test(TensorProto.DOUBLE, np.float64)
 
+    def test_conv_denormal_as_zero(self):
+        X = make_tensor_value_info("X", TensorProto.FLOAT, [None, None, None, None])
+        Y = make_tensor_value_info("Y", TensorProto.FLOAT, [None, None, None, None])
+        W = make_tensor_value_info("W", TensorProto.FLOAT, [None, None, None, None])
+        node = make_node("Conv", ["X", "W"], ["Y"], pads=[1, 1, 1, 1])
+        graph = make_graph([node], "g", [X, W], [Y])
+        onnx_model = make_model(graph, opset_imports=[make_opsetid("", 16)])
+
+        # every weight is a denormalized number
+        x = np.ones((1, 16, 5, 5), dtype=np.float32)
+        w = np.full((4, 16, 3, 3), 1e-40, dtype=np.float32)
+        feeds = {"X": x, "W": w}
+
+        sess = CReferenceEvaluator(onnx_model)
+        got = sess.run(None, feeds)[0]
+        self.assertGreater(got.min(), 0)
+
+        sess_ftz = CReferenceEvaluator(onnx_model, denormal_as_zero=True)
+        got_ftz = sess_ftz.run(None, feeds)[0]
+        self.assertEqual(got_ftz.shape, got.shape)
+        self.assertEqual(got_ftz.max(), 0)
+
+        # the mode is restored once the computation is done
+        got = sess.run(None, feeds)[0]
+        self.assertGreater(got.min(), 0)
+        sess_ftz.set_denormal_as_zero(False)
+        got = sess_ftz.run(None, feeds)[0]
+        self.assertGreater(got.min(), 0)
+
     @unittest.skipIf(not os.path.exists(light_model), reason="onnx not recent enough")
     @unittest.skipIf(InferenceSession is None, reason="onnxruntime not installed")
     def test_light_model(self):
@@ -1,6 +1,15 @@
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 import numpy
+from onnx import TensorProto
 from onnx.defs import onnx_opset_version
+from onnx.helper import (
+    make_graph,
+    make_model,
+    make_node,
+    make_opsetid,
+    make_tensor_value_info,
+)
 from sklearn.datasets import load_iris
 from sklearn.ensemble import (
     GradientBoostingClassifier,
@@ -294,6 +303,288 @@ class TestCTreeEnsemble(ExtTestCase):
         got = y[1]
         self.assertEqualArray(exp, got, atol=1e-5)
 
+    @unittest.skipIf(onnx_opset_version() < 19, reason="ReferenceEvaluator is bugged")
+    @ignore_warnings((FutureWarning, DeprecationWarning))
+    def test_random_forest_regressor_denormal_as_zero(self):
+        iris = load_iris()
+        X, y = iris.data.astype(numpy.float32), iris.target
+        X_train, X_test, y_train, _ = train_test_split(X, y, random_state=11)
+        clr = RandomForestRegressor(n_estimators=4, max_depth=3, random_state=11)
+        clr.fit(X_train, y_train)
+
+        model_def = to_onnx(clr, X_train)
+        oinf = CReferenceEvaluator(model_def, denormal_as_zero=True)
+        self.assertTrue(oinf.rt_nodes_[0].denormal_as_zero)
+        y = oinf.run(None, {"X": X_test})
+        lexp = clr.predict(X_test).astype(numpy.float32)
+        self.assertEqualArray(lexp, y[0].ravel(), atol=1e-5)
+
+    def test_random_forest_regressor_reduced_precision(self):
+        iris = load_iris()
+        X, y = iris.data.astype(numpy.float32), iris.target
+        X_train, X_test, y_train, _ = train_test_split(X, y, random_state=11)
+        clr = RandomForestRegressor(n_estimators=10, max_depth=4, random_state=11)
+        clr.fit(X_train, y_train)
+
+        model_def = to_onnx(clr, X_train)
+        expected = CReferenceEvaluator(model_def).run(None, {"X": X_test})[0]
+        for reduced_precision in ["float16", "bfloat16"]:
+            with self.subTest(reduced_precision=reduced_precision):
+                oinf = CReferenceEvaluator(model_def)
+                oinf.rt_nodes_[0].set_reduced_precision(reduced_precision)
+                y = oinf.run(None, {"X": X_test})
+                report = oinf.rt_nodes_[0].get_reduced_precision_report()
+                self.assertEqual(report["applied"], 1)
+                self.assertEqual(report["n_features"], 4)
+                self.assertLess(report["size_after"], report["size_before"])
+                self.assertGreater(report["max_score_error"], 0)
+                self.assertEqualArray(
+                    expected, y[0], atol=report["max_score_error"] + 1e-6
+                )
+
+    def test_random_forest_classifier_reduced_precision(self):
+        iris = load_iris()
+        # every threshold is an integer + 0.5, it can be stored on 16 bits
+        X, y = numpy.round(iris.data * 10).astype(numpy.float32), iris.target
+        X_train, X_test, y_train, _ = train_test_split(X, y, random_state=11)
+        clr = RandomForestClassifier(n_estimators=10, max_depth=4, random_state=11)
+        clr.fit(X_train, y_train)
+
+        model_def = to_onnx(clr, X_train, options={"zipmap": False})
+        expected = CReferenceEvaluator(model_def).run(None, {"X": X_test})
+        oinf = CReferenceEvaluator(model_def)
+        oinf.rt_nodes_[0].set_reduced_precision("bfloat16")
+        got = oinf.run(None, {"X": X_test})
+        report = oinf.rt_nodes_[0].get_reduced_precision_report()
+        self.assertEqual(report["applied"], 1)
+        self.assertEqual(report["n_features_exact"], report["n_features"])
+        self.assertEqual(report["n_thresholds_kept"], 0)
+        self.assertEqualArray(expected[0], got[0])
+        self.assertEqualArray(
+            expected[1], got[1], atol=report["max_score_error"] + 1e-6
+        )
+
+    def _stumps(self, thresholds, features):
+        # one tree per threshold, every tree is a single split
+        n = len(thresholds)
+        ids = numpy.arange(n, dtype=numpy.int64)
+        node = make_node(
+            "TreeEnsembleRegressor",
+            ["X"],
+            ["Y"],
+            domain="ai.onnx.ml",
+            n_targets=1,
+            nodes_falsenodeids=numpy.vstack([ids * 0 + 2, ids * 0, ids * 0])
+            .T.ravel()
+            .tolist(),
+            nodes_truenodeids=numpy.vstack([ids * 0 + 1, ids * 0, ids * 0])
+            .T.ravel()
+            .tolist(),
+            nodes_featureids=numpy.vstack([features, ids * 0, ids * 0])
+            .T.ravel()
+            .tolist(),
+            nodes_modes=["BRANCH_LEQ", "LEAF", "LEAF"] * n,
+            nodes_nodeids=[0, 1, 2] * n,
+            nodes_treeids=numpy.repeat(ids, 3).tolist(),
+            nodes_values=numpy.vstack([thresholds, ids * 0, ids * 0])
+            .T.ravel()
+            .tolist(),
+            nodes_hitrates=[1.0] * (3 * n),
+            nodes_missing_value_tracks_true=[0] * (3 * n),
+            target_ids=[0] * (2 * n),
+            target_nodeids=[1, 2] * n,
+            target_treeids=numpy.repeat(ids, 2).tolist(),
+            target_weights=[1.0, 0.0] * n,
+            post_transform="NONE",
+        )
+        return make_model(
+            make_graph(
+                [node],
+                "stumps",
+                [make_tensor_value_info("X", TensorProto.FLOAT, [None, 2])],
+                [make_tensor_value_info("Y", TensorProto.FLOAT, [None, 1])],
+            ),
+            opset_imports=[make_opsetid("", 18), make_opsetid("ai.onnx.ml", 3)],
+        )
+
+    def test_reduced_precision_many_thresholds(self):
+        # 80000 distinct thresholds which cannot be stored on 16 bits,
+        # 40000 for each feature
+        n = 80000
+        thresholds = numpy.linspace(0.001, 1, n).astype(numpy.float32)
+        self.assertGreater(len(set(thresholds.tolist())), 65536)
+        features = numpy.arange(n) % 2
+        X = numpy.random.RandomState(0).rand(20, 2).astype(numpy.float32)
+        model_def = self._stumps(thresholds, features)
+        expected = CReferenceEvaluator(model_def).run(None, {"X": X})[0]
+
+        oinf = CReferenceEvaluator(model_def)
+        oinf.rt_nodes_[0].set_reduced_precision("float16")
+        got = oinf.run(None, {"X": X})[0]
+        report = oinf.rt_nodes_[0].get_reduced_precision_report()
+        self.assertEqual(report["applied"], 1)
+        self.assertEqual(report["n_distinct_thresholds_kept"], n)
+        self.assertEqualArray(expected, got)
+
+        # every threshold on the same feature, the conversion is abandoned
+        model_def = self._stumps(thresholds, features * 0)
+        expected = CReferenceEvaluator(model_def).run(None, {"X": X})[0]
+        oinf = CReferenceEvaluator(model_def)
+        oinf.rt_nodes_[0].set_reduced_precision("float16")
+        got = oinf.run(None, {"X": X})[0]
+        report = oinf.rt_nodes_[0].get_reduced_precision_report()
+        self.assertEqual(report["applied"], 0)
+        self.assertEqual(report["too_many_thresholds"], 1)
+        self.assertEqual(report["feature_id"], 0)
+        self.assertEqualArray(expected, got)
+
+    def test_random_forest_regressor_leaves(self):
+        iris = load_iris()
+        X, y = iris.data.astype(numpy.float32), iris.target
+        X_train, X_test, y_train, _ = train_test_split(X, y, random_state=11)
+        clr = RandomForestRegressor(n_estimators=10, max_depth=4, random_state=11)
+        clr.fit(X_train, y_train)
+
+        model_def = to_onnx(clr, X_train)
+        oinf = CReferenceEvaluator(model_def)
+        expected = oinf.run(None, {"X": X_test})[0]
+        rt = oinf.rt_nodes_[0].rt_
+        for parallel in [(1000, 1000, 1000, 1, 1, 0), (1, 1, 1, 1, 1, 0)]:
+            with self.subTest(parallel=parallel):
+                rt.set(*parallel)
+                leaves = rt.compute_leaves(X_test)
+                self.assertEqual(leaves.dtype, numpy.int32)
+                self.assertEqualArray(clr.apply(X_test).astype(numpy.int32), leaves)
+                scores = rt.compute_tree_scores(X_test)
+                self.assertEqual(scores.shape, (X_test.shape[0], 10))
+                self.assertEqualArray(expected.ravel(), scores.sum(axis=1), atol=1e-5)
+
+    def test_random_forest_classifier_leaves(self):
+        iris = load_iris()
+        X, y = iris.data.astype(numpy.float32), iris.target
+        X_train, X_test, y_train, _ = train_test_split(X, y, random_state=11)
+        clr = RandomForestClassifier(n_estimators=10, max_depth=4, random_state=11)
+        clr.fit(X_train, y_train)
+
+        model_def = to_onnx(clr, X_train, options={"zipmap": False})
+        oinf = CReferenceEvaluator(model_def)
+        expected = oinf.run(None, {"X": X_test})[1]
+        rt = oinf.rt_nodes_[0].rt_
+        leaves = rt.compute_leaves(X_test)
+        self.assertEqualArray(clr.apply(X_test).astype(numpy.int32), leaves)
+        scores = rt.compute_tree_scores(X_test)
+        self.assertEqual(scores.shape, (X_test.shape[0], 10, 3))
+        self.assertEqualArray(expected, scores.sum(axis=1), atol=1e-5)
+
+    def test_gradient_boosting_classifier_early_exit(self):
+        iris = load_iris()
+        X, y = iris.data.astype(numpy.float32), (iris.target == 1).astype(numpy.int64)
+        X_train, X_test, y_train, _ = train_test_split(X, y, random_state=11)
+        clr = GradientBoostingClassifier(n_estimators=100, max_depth=3)
+        clr.fit(X_train, y_train)
+
+        model_def = to_onnx(clr, X_train, options={"zipmap": False})
+        expected = CReferenceEvaluator(model_def).run(None, {"X": X_test})
+        oinf = CReferenceEvaluator(model_def)
+        oinf.rt_nodes_[0].set_early_exit(10)
+        got = oinf.run(None, {"X": X_test})
+        report = oinf.rt_nodes_[0].get_early_exit_report()
+        self.assertEqual(len(report), 10)
+        self.assertAlmostEqual(sum(report), 1)
+        self.assertGreater(sum(report[:-1]), 0)
+        # labels are exact when no margin is given
+        self.assertEqualArray(expected[0], got[0])
+        for i in range(X_test.shape[0]):
+            got = oinf.run(None, {"X": X_test[i : i + 1]})
+            self.assertEqualArray(expected[0][i : i + 1], got[0])
+
+        oinf.rt_nodes_[0].set_early_exit(10, 0.4)
+        oinf.run(None, {"X": X_test})
+        report_margin = oinf.rt_nodes_[0].get_early_exit_report()
+        self.assertGreaterEqual(report_margin[0], report[0])
+
+        # concurrent calls, the report is the one of one of the calls
+        oinf.rt_nodes_[0].set_early_exit(10)
+        oinf.run(None, {"X": X_test})
+        rt = oinf.rt_nodes_[0].rt_
+        with ThreadPoolExecutor(4) as executor:
+            results = list(
+                executor.map(lambda i: rt.compute(X_test[i % 7 :]), range(40))
+            )
+        for i, res in enumerate(results):
+            self.assertEqualArray(expected[0][i % 7 :], res[0])
+        report = oinf.rt_nodes_[0].get_early_exit_report()
+        self.assertEqual(len(report), 10)
+        self.assertAlmostEqual(sum(report), 1)
+
+    def test_random_forest_classifier_outputs(self):
+        iris = load_iris()
+        X, y = iris.data.astype(numpy.float32), iris.target
+        X_train, X_test, y_train, _ = train_test_split(X, y, random_state=11)
+        for labels in [y_train + 10, numpy.array(["a", "b", "c"])[y_train]]:
+            clr = RandomForestClassifier(n_estimators=10, max_depth=4)
+            clr.fit(X_train, labels)
+            model_def = to_onnx(clr, X_train, options={"zipmap": False})
+            oinf = CReferenceEvaluator(model_def)
+            expected = oinf.run(None, {"X": X_test})
+            self.assertEqual(clr.predict(X_test).tolist(), expected[0].tolist())
+
+            oinf.rt_nodes_[0].set_outputs(probabilities=False)
+            got = oinf.run(None, {"X": X_test})
+            self.assertEqual(expected[0].tolist(), got[0].tolist())
+            self.assertEmpty(got[1])
+
+            oinf.rt_nodes_[0].set_outputs(labels=False)
+            got = oinf.run(None, {"X": X_test})
+            self.assertEmpty(got[0])
+            self.assertEqualArray(expected[1], got[1])
+
+    def test_decision_tree_regressor_contributions(self):
+        iris = load_iris()
+        X, y = iris.data.astype(numpy.float32), iris.target
+        # the last feature is constant, it cannot contribute
+        X[:, 3] = 1
+        X_train, X_test, y_train, _ = train_test_split(X, y, random_state=11)
+        clr = DecisionTreeRegressor(max_depth=4, random_state=11)
+        clr.fit(X_train, y_train)
+
+        model_def = to_onnx(clr, X_train)
+        node = model_def.graph.node[0]
+        hitrates = [a for a in node.attribute if a.name == "nodes_hitrates"][0]
+        del hitrates.floats[:]
+        hitrates.floats.extend(clr.tree_.weighted_n_node_samples.tolist())
+
+        oinf = CReferenceEvaluator(model_def)
+        expected = oinf.run(None, {"X": X_test})[0]
+        contribs = oinf.rt_nodes_[0].rt_.compute_contributions(X_test)
+        self.assertEqual(contribs.shape, (X_test.shape[0], 5))
+        self.assertEqualArray(expected.ravel(), contribs.sum(axis=1), atol=1e-5)
+        # the expected value is the average of the training targets
+        self.assertEqualArray(
+            numpy.full(X_test.shape[0], y_train.mean(), dtype=numpy.float32),
+            contribs[:, 4],
+            atol=1e-5,
+        )
+        self.assertEqualArray(
+            numpy.zeros(X_test.shape[0], dtype=numpy.float32), contribs[:, 3]
+        )
+
+    def test_gradient_boosting_classifier_contributions(self):
+        iris = load_iris()
+        X, y = iris.data.astype(numpy.float32), iris.target
+        X_train, X_test, y_train, _ = train_test_split(X, y, random_state=11)
+        clr = GradientBoostingClassifier(n_estimators=10, max_depth=3)
+        clr.fit(X_train, y_train)
+
+        model_def = to_onnx(clr, X_train, options={"zipmap": False})
+        oinf = CReferenceEvaluator(model_def)
+        oinf.run(None, {"X": X_test})
+        contribs = oinf.rt_nodes_[0].rt_.compute_contributions(X_test)
+        self.assertEqual(contribs.shape, (X_test.shape[0], 3, 5))
+        # contributions explain the raw scores, before the softmax
+        raw = clr.decision_function(X_test).astype(numpy.float32)
+        self.assertEqualArray(raw, contribs.sum(axis=2), atol=1e-4)
+
     def common_test_onnxrt_python_tree_ensemble_runtime_version(
         self, dtype, multi=False
     ):
@@ -1,7 +1,12 @@
+import os
+import subprocess
+import sys
 import unittest
 import numpy
 from onnx_extended.ext_test_case import ExtTestCase
 from onnx_extended.validation.cpu._validation import (
+    cpu_features,
+    cpu_isa,
     vector_add,
     vector_sum,
     vector_sum_array,
@@ -67,6 +72,52 @@ class TestVectorSum(ExtTestCase):
         t1 = vector_sum_array_avx_parallel(16, values)
         self.assertEqual(t, t1)
 
+    def test_vector_sum_array_avx_tail(self):
+        # the number of columns is not a multiple of the vector size
+        for nc in [1, 7, 17, 31]:
+            values = numpy.arange(nc * 5).reshape((-1, nc)).astype(numpy.float32)
+            t = values.sum()
+            self.assertEqual(t, vector_sum_array_avx(nc, values))
+            self.assertEqual(t, vector_sum_array_avx_parallel(nc, values))
+
+    def test_cpu_isa(self):
+        isa = cpu_isa()
+        self.assertIn(isa, {"default", "avx2", "avx512"})
+        features = cpu_features()
+        self.assertIsInstance(features, dict)
+        self.assertIn("avx2", features)
+        if isa == "avx512":
+            self.assertTrue(features["avx512f"])
+        if isa != "default":
+            self.assertTrue(features["avx2"])
+
+    @unittest.skipIf(sys.platform == "win32", "not tested on Windows")
+    def test_cpu_isa_env(self):
+        # every lower instruction set can be forced
+        code = "\n".join(
+            [
+                "import numpy",
+                "from onnx_extended.validation.cpu._validation import (",
+                "    cpu_isa, vector_sum_array_avx)",
+                "values = numpy.arange(7 * 33).reshape((-1, 33))",
+                "s = vector_sum_array_avx(33, values.astype(numpy.float32))",
+                "print(cpu_isa(), s == values.sum())",
+            ]
+        )
+        order = ["default", "avx2", "avx512"]
+        best = cpu_isa()
+        for isa in order[: order.index(best) + 1]:
+            env = os.environ.copy()
+            env["ONNX_EXTENDED_CPU_ISA"] = isa
+            out = subprocess.run(
+                [sys.executable, "-c", code],
+                capture_output=True,
+                text=True,
+                env=env,
+                check=True,
+            )
+            self.assertEqual(out.stdout.strip(), f"{isa} True")
+
     def test_vector_add_exc(self):
         # This test checks function vector_add
         # raises an exception if the dimension do not match.
@@ -0,0 +1,147 @@
+#pragma once
+
+// Detects the instruction sets the processor supports with CPUID.
+// Kernels are compiled several times with __attribute__((target(...)))
+// and every process picks the best version once.
+// Environment variable ONNX_EXTENDED_CPU_ISA=default|avx2|avx512 limits
+// the instruction set, it is meant to compare or test the versions.
+
+#include <cstdlib>
+#include <cstring>
+#include <stdint.h>
+#include <string>
+
+#if defined(_MSC_VER) && (defined(_M_X64) || defined(_M_IX86))
+#define ONNX_EXTENDED_CPU_DISPATCH
+#include <immintrin.h>
+#include <intrin.h>
+// MSVC compiles intrinsics without any specific option.
+#define ONNX_EXTENDED_TARGET_AVX2
+#define ONNX_EXTENDED_TARGET_AVX512
+#elif (defined(__GNUC__) || defined(__clang__)) &&                            \
+    (defined(__x86_64__) || defined(__i386__))
+#define ONNX_EXTENDED_CPU_DISPATCH
+#include <cpuid.h>
+#include <immintrin.h>
+#define ONNX_EXTENDED_TARGET_AVX2 __attribute__((target("avx2,fma,f16c")))
+#define ONNX_EXTENDED_TARGET_AVX512                                            \
+  __attribute__((target("avx512f,avx512bw,avx512vl,avx2,fma,f16c")))
+#endif
+
+namespace cpu_features {
+
+struct CpuFeatures {
+  bool sse41 = false;
+  bool avx = false;
+  bool fma = false;
+  bool f16c = false;
+  bool avx2 = false;
+  bool avx512f = false;
+  bool avx512bw = false;
+  bool avx512vl = false;
+};
+
+// Every kernel has a version for each of them.
+enum class CpuIsa { Default = 0, Avx2 = 1, Avx512 = 2 };
+
+#if defined(ONNX_EXTENDED_CPU_DISPATCH)
+
+inline void CpuId(uint32_t leaf, uint32_t subleaf, uint32_t regs[4]) {
+#if defined(_MSC_VER)
+  int r[4];
+  __cpuidex(r, static_cast<int>(leaf), static_cast<int>(subleaf));
+  for (int i = 0; i < 4; ++i)
+    regs[i] = static_cast<uint32_t>(r[i]);
+#else
+  if (!__get_cpuid_count(leaf, subleaf, &regs[0], &regs[1], &regs[2],
+                         &regs[3]))
+    regs[0] = regs[1] = regs[2] = regs[3] = 0;
+#endif
+}
+
+// Registers the operating system saves when switching threads.
+inline uint64_t XGetBv() {
+#if defined(_MSC_VER)
+  return _xgetbv(0);
+#else
+  uint32_t eax, edx;
+  __asm__ volatile("xgetbv" : "=a"(eax), "=d"(edx) : "c"(0));
+  return (static_cast<uint64_t>(edx) << 32) | eax;
+#endif
+}
+
+#endif
+
+inline CpuFeatures DetectCpuFeatures() {
+  CpuFeatures f;
+#if defined(ONNX_EXTENDED_CPU_DISPATCH)
+  uint32_t regs[4];
+  CpuId(0, 0, regs);
+  uint32_t max_leaf = regs[0];
+  if (max_leaf < 1)
+    return f;
+  CpuId(1, 0, regs);
+  f.sse41 = (regs[2] & (1u << 19)) != 0;
+  bool osxsave = (regs[2] & (1u << 27)) != 0;
+  // xmm and ymm registers, then opmask and zmm registers
+  uint64_t xcr0 = osxsave ? XGetBv() : 0;
+  bool os_avx = (xcr0 & 0x6) == 0x6;
+  bool os_avx512 = (xcr0 & 0xe6) == 0xe6;
+  f.avx = os_avx && (regs[2] & (1u << 28)) != 0;
+  f.fma = f.avx && (regs[2] & (1u << 12)) != 0;
+  f.f16c = f.avx && (regs[2] & (1u << 29)) != 0;
+  if (max_leaf < 7)
+    return f;
+  CpuId(7, 0, regs);
+  f.avx2 = f.avx && (regs[1] & (1u << 5)) != 0;
+  f.avx512f = os_avx512 && (regs[1] & (1u << 16)) != 0;
+  f.avx512bw = f.avx512f && (regs[1] & (1u << 30)) != 0;
+  f.avx512vl = f.avx512f && (regs[1] & (1u << 31)) != 0;
+#endif
+  return f;
+}
+
+// The processor is inspected once.
+inline const CpuFeatures &GetCpuFeatures() {
+  static CpuFeatures features = DetectCpuFeatures();
+  return features;
+}
+
+inline const char *CpuIsaName(CpuIsa isa) {
+  switch (isa) {
+  case CpuIsa::Avx512:
+    return "avx512";
+  case CpuIsa::Avx2:
+    return "avx2";
+  default:
+    return "default";
+  }
+}
+
+inline CpuIsa DetectCpuIsa() {
+  const CpuFeatures &f = GetCpuFeatures();
+  CpuIsa isa = CpuIsa::Default;
+#if defined(ONNX_EXTENDED_CPU_DISPATCH)
+  if (f.avx2 && f.fma && f.f16c)
+    isa = CpuIsa::Avx2;
+  if (isa == CpuIsa::Avx2 && f.avx512f && f.avx512bw && f.avx512vl)
+    isa = CpuIsa::Avx512;
+#endif
+  const char *env = std::getenv("ONNX_EXTENDED_CPU_ISA");
+  if (env != nullptr) {
+    for (CpuIsa lower : {CpuIsa::Default, CpuIsa::Avx2}) {
+      if (std::strcmp(env, CpuIsaName(lower)) == 0 &&
+          static_cast<int>(lower) < static_cast<int>(isa))
+        isa = lower;
+    }
+  }
+  return isa;
+}
+
+// The instruction set the kernels use, chosen once per process.
+inline CpuIsa GetCpuIsa() {
+  static CpuIsa isa = DetectCpuIsa();
+  return isa;
+}
+
+} // namespace cpu_features
@@ -1 +1,23 @@
+from typing import Optional
+from .external_data import mmap_external_initializers
+from .session_pool import OrtSessionPool
 
+
+def configure_global_threads(
+    intra_op_num_threads: int = -1,
+    inter_op_num_threads: int = -1,
+    allow_spinning: Optional[bool] = None,
+):
+    """
+    Configures the thread pools shared by every
+    :class:`OrtSession <onnx_extended.ortcy.wrap.ortinf.OrtSession>`
+    created with `use_global_threads=True`. It must be called before
+    the first of them is created.
+    See :func:`ort_configure_global_threads
+    <onnx_extended.ortcy.wrap.ortinf.ort_configure_global_threads>`.
+    """
+    from .wrap.ortinf import ort_configure_global_threads
+
+    ort_configure_global_threads(
+        intra_op_num_threads, inter_op_num_threads, allow_spinning
+    )
@@ -0,0 +1,48 @@
+import os
+from typing import Dict, Optional, Union
+import numpy
+from onnx import ModelProto, TensorProto, load
+from onnx.helper import tensor_dtype_to_np_dtype
+
+
+def mmap_external_initializers(
+    model: Union[str, ModelProto], base_dir: Optional[str] = None
+) -> Dict[str, numpy.ndarray]:
+    """
+    Maps in memory the initializers a model stores as external data.
+    The arrays share the page cache, nothing is read until
+    :epkg:`onnxruntime` uses them. They can be given to
+    :class:`OrtSession <onnx_extended.ortcy.wrap.ortinf.OrtSession>`
+    with parameter *external_initializers*.
+
+    :param model: model filename or :class:`onnx.ModelProto`
+        loaded without its external data
+    :param base_dir: folder holding the external files,
+        the folder of the model by default
+    :return: dictionary `{name: array}`
+    """
+    if isinstance(model, str):
+        if base_dir is None:
+            base_dir = os.path.dirname(model)
+        model = load(model, load_external_data=False)
+    if base_dir is None:
+        base_dir = ""
+
+    files = {}
+    res = {}
+    for init in model.graph.initializer:
+        if init.data_location != TensorProto.EXTERNAL:
+            continue
+        info = {e.key: e.value for e in init.external_data}
+        location = os.path.join(base_dir, info["location"])
+        if location not in files:
+            # every file is mapped once, the arrays are views on it
+            files[location] = numpy.memmap(location, dtype=numpy.uint8, mode="r")
+        dtype = tensor_dtype_to_np_dtype(init.data_type)
+        shape = tuple(init.dims)
+        offset = int(info.get("offset", 0))
+        length = int(numpy.prod(shape)) * dtype.itemsize
+        res[init.name] = (
+            files[location][offset : offset + length].view(dtype).reshape(shape)
+        )
+    return res
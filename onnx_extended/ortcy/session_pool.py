@@ -0,0 +1,120 @@
+import threading
+from typing import Any, Dict, List, Optional, Union
+import numpy
+from onnx import ModelProto, TensorProto, load_model_from_string
+from onnx.numpy_helper import to_array
+
+
+class OrtSessionPool:
+    """
+    Holds several replicas of the same model, every one is an
+    :class:`OrtSession <onnx_extended.ortcy.wrap.ortinf.OrtSession>`.
+    Every run is dispatched to the replica with the fewest runs in progress.
+    One session may not use every core for a small model because
+    some parts of the execution are serialized, several replicas
+    used by several threads do.
+
+    :param model: filename, bytes or :class:`onnx.ModelProto`,
+        the model is loaded only once
+    :param n_replicas: number of sessions
+    :param share_weights: the initializers are converted once into
+        arrays shared by every replica, the replicas share the same
+        :class:`OrtPrepackedWeights
+        <onnx_extended.ortcy.wrap.ortinf.OrtPrepackedWeights>` as well,
+        the weights prepacked by the kernels are not duplicated
+    :param kwargs: additional parameters given to every
+        :class:`OrtSession <onnx_extended.ortcy.wrap.ortinf.OrtSession>`
+    """
+
+    def __init__(
+        self,
+        model: Union[str, bytes, ModelProto],
+        n_replicas: int = 2,
+        share_weights: bool = True,
+        **kwargs: Dict[str, Any],
+    ):
+        from .wrap.ortinf import OrtPrepackedWeights, OrtSession
+
+        if n_replicas <= 0:
+            raise ValueError(f"n_replicas must be positive not {n_replicas}.")
+        if isinstance(model, str):
+            with open(model, "rb") as f:
+                model = f.read()
+        proto = model if isinstance(model, ModelProto) else None
+        if isinstance(model, ModelProto):
+            model = model.SerializeToString()
+        if not isinstance(model, bytes):
+            raise TypeError(f"Unexpected type {type(model)} for model.")
+
+        self.initializers: Optional[Dict[str, numpy.ndarray]] = None
+        self.prepacked_weights = None
+        if share_weights:
+            if proto is None:
+                proto = load_model_from_string(model)
+            self.initializers = {
+                init.name: to_array(init)
+                for init in proto.graph.initializer
+                if init.data_type != TensorProto.STRING
+            }
+            self.prepacked_weights = OrtPrepackedWeights()
+
+        self.replicas = [
+            OrtSession(
+                model,
+                prepacked_weights=self.prepacked_weights,
+                initializers=self.initializers,
+                **kwargs,
+            )
+            for _ in range(n_replicas)
+        ]
+        self._lock = threading.Lock()
+        self._in_flight = [0 for _ in self.replicas]
+
+    def __len__(self) -> int:
+        "Returns the number of replicas."
+        return len(self.replicas)
+
+    def get_in_flight(self) -> List[int]:
+        "Returns the number of runs in progress for every replica."
+        with self._lock:
+            return list(self._in_flight)
+
+    def _acquire(self) -> int:
+        with self._lock:
+            index = min(range(len(self._in_flight)), key=self._in_flight.__getitem__)
+            self._in_flight[index] += 1
+        return index
+
+    def _release(self, index: int):
+        with self._lock:
+            self._in_flight[index] -= 1
+
+    def run(
+        self, inputs: List[numpy.ndarray], out: Optional[List[numpy.ndarray]] = None
+    ) -> List[numpy.ndarray]:
+        """
+        Runs the inference on the least loaded replica,
+        see :meth:`OrtSession.run <onnx_extended.ortcy.wrap.ortinf.OrtSession.run>`.
+        """
+        index = self._acquire()
+        try:
+            return self.replicas[index].run(inputs, out=out)
+        finally:
+            self._release(index)
+
+    def run_async(
+        self, inputs: List[numpy.ndarray], out: Optional[List[numpy.ndarray]] = None
+    ):
+        """
+        Runs the inference on the least loaded replica and returns an awaitable,
+        see :meth:`OrtSession.run_async
+        <onnx_extended.ortcy.wrap.ortinf.OrtSession.run_async>`.
+        """
+        index = self._acquire()
+        try:
+            future = self.replicas[index].run_async(inputs, out=out)
+        except Exception:
+            self._release(index)
+            raise
+        future.add_done_callback(lambda _: self._release(index))
+        return future
@@ -62,13 +62,15 @@ inline void MakeStringInternal(std::ostringstream &ss,
 template <typename T, typename... Args>
 inline void MakeStringInternal(std::ostringstream &ss, const T &t,
                                const Args &...args) noexcept {
-  MakeStringInternal(ss, t);
-  MakeStringInternal(ss, args...);
+  // Qualified calls, argument-dependent lookup could otherwise find
+  // the same functions defined in another namespace.
+  orthelpers::MakeStringInternal(ss, t);
+  orthelpers::MakeStringInternal(ss, args...);
 }
 
 template <typename... Args> inline std::string MakeString(const Args &...args) {
   std::ostringstream ss;
-  MakeStringInternal(ss, args...);
+  orthelpers::MakeStringInternal(ss, args...);
   return std::string(ss.str());
 }
 
@@ -1,6 +1,16 @@
 #include "ortapi.h"
 #include "helpers.h"
 #include "ortapi_inline.h"
+#include <algorithm>
+#include <atomic>
+#include <chrono>
+#include <cmath>
+#include <condition_variable>
+#include <exception>
+#include <functional>
+#include <mutex>
+#include <queue>
+#include <thread>
 #ifdef _WIN32
 #include <codecvt>
 #include <locale>
@@ -26,13 +36,135 @@ void OrtCpuValue::free_ort_value() {
     }
 }
 
+// Environment shared by all sessions using the global thread pools,
+// it is created once and never released.
+static std::mutex global_env_mutex;
+static OrtEnv* global_env = nullptr;
+
+static void create_global_env(int intra_op_num_threads,
+                              int inter_op_num_threads,
+                              int allow_spinning) {
+    OrtThreadingOptions* options;
+    ThrowOnError(GetOrtApi()->CreateThreadingOptions(&options));
+    OrtStatus* status = nullptr;
+    if (intra_op_num_threads != -1)
+        status = GetOrtApi()->SetGlobalIntraOpNumThreads(options, intra_op_num_threads);
+    if (status == nullptr && inter_op_num_threads != -1)
+        status = GetOrtApi()->SetGlobalInterOpNumThreads(options, inter_op_num_threads);
+    if (status == nullptr && allow_spinning != -1)
+        status = GetOrtApi()->SetGlobalSpinControl(options, allow_spinning);
+    if (status == nullptr)
+        status = GetOrtApi()->CreateEnvWithGlobalThreadPools(
+            ORT_LOGGING_LEVEL_WARNING, "ortcy", options, &global_env);
+    GetOrtApi()->ReleaseThreadingOptions(options);
+    ThrowOnError(status);
+}
+
+void configure_global_threads(int intra_op_num_threads,
+                              int inter_op_num_threads,
+                              int allow_spinning) {
+    std::lock_guard<std::mutex> lock(global_env_mutex);
+    if (global_env != nullptr)
+        EXT_THROW("The global thread pools were already created, "
+                  "they must be configured before the first session using them.");
+    create_global_env(intra_op_num_threads, inter_op_num_threads, allow_spinning);
+}
+
+static OrtEnv* get_global_env() {
+    std::lock_guard<std::mutex> lock(global_env_mutex);
+    if (global_env == nullptr)
+        create_global_env(-1, -1, -1);
+    return global_env;
+}
+
+// Counters updated after every successful run without any lock.
+// Latencies are stored in a histogram with 8 buckets per power of two
+// nanoseconds, a percentile is known within 10%.
+class RunStats {
+public:
+    static const int n_buckets = 8 * 40;
+
+    RunStats() { Reset(); }
+
+    void Reset() {
+        for(int i = 0; i < n_buckets; ++i)
+            buckets_[i].store(0, std::memory_order_relaxed);
+        run_count_.store(0, std::memory_order_relaxed);
+        bytes_in_.store(0, std::memory_order_relaxed);
+        bytes_out_.store(0, std::memory_order_relaxed);
+        total_ns_.store(0, std::memory_order_relaxed);
+        max_ns_.store(0, std::memory_order_relaxed);
+    }
+
+    void Add(int64_t latency_ns, int64_t bytes_in, int64_t bytes_out) {
+        int bucket = latency_ns <= 1 ? 0 : (int)(std::log2((double)latency_ns) * 8);
+        buckets_[std::min(bucket, n_buckets - 1)].fetch_add(1, std::memory_order_relaxed);
+        run_count_.fetch_add(1, std::memory_order_relaxed);
+        bytes_in_.fetch_add(bytes_in, std::memory_order_relaxed);
+        bytes_out_.fetch_add(bytes_out, std::memory_order_relaxed);
+        total_ns_.fetch_add(latency_ns, std::memory_order_relaxed);
+        int64_t current = max_ns_.load(std::memory_order_relaxed);
+        while (latency_ns > current &&
+               !max_ns_.compare_exchange_weak(current, latency_ns, std::memory_order_relaxed)) {
+        }
+    }
+
+    OrtRunStats Get() const {
+        std::vector<int64_t> counts(n_buckets);
+        int64_t total = 0;
+        for(int i = 0; i < n_buckets; ++i) {
+            counts[i] = buckets_[i].load(std::memory_order_relaxed);
+            total += counts[i];
+        }
+        OrtRunStats stats;
+        stats.run_count = run_count_.load(std::memory_order_relaxed);
+        stats.bytes_in = bytes_in_.load(std::memory_order_relaxed);
+        stats.bytes_out = bytes_out_.load(std::memory_order_relaxed);
+        stats.total_latency = total_ns_.load(std::memory_order_relaxed) * 1e-9;
+        stats.max_latency = max_ns_.load(std::memory_order_relaxed) * 1e-9;
+        stats.p50_latency = Percentile(counts, total, 0.5);
+        stats.p90_latency = Percentile(counts, total, 0.9);
+        stats.p99_latency = Percentile(counts, total, 0.99);
+        return stats;
+    }
+
+private:
+    // Returns the geometric middle of the bucket holding the percentile, in seconds.
+    static double Percentile(const std::vector<int64_t>& counts, int64_t total, double q) {
+        if (total == 0)
+            return 0;
+        int64_t cumulated = 0;
+        for(int i = 0; i < n_buckets; ++i) {
+            cumulated += counts[i];
+            if (cumulated >= q * total)
+                return std::exp2((i + 0.5) / 8) * 1e-9;
+        }
+        return std::exp2((n_buckets - 0.5) / 8) * 1e-9;
+    }
+
+    std::atomic<int64_t> buckets_[n_buckets];
+    std::atomic<int64_t> run_count_;
+    std::atomic<int64_t> bytes_in_;
+    std::atomic<int64_t> bytes_out_;
+    std::atomic<int64_t> total_ns_;
+    std::atomic<int64_t> max_ns_;
+};
+
 class OrtInference {
 public:
 
-    OrtInference() {
-        ThrowOnError(GetOrtApi()->CreateEnv(ORT_LOGGING_LEVEL_WARNING, "ortcy", &env_));
+    OrtInference(int use_global_threads = 0) {
+        if (use_global_threads) {
+            // The session uses the thread pools owned by the shared environment.
+            env_ = get_global_env();
+            owns_env_ = false;
+        } else {
+            ThrowOnError(GetOrtApi()->CreateEnv(ORT_LOGGING_LEVEL_WARNING, "ortcy", &env_));
+            owns_env_ = true;
+        }
         ThrowOnError(GetOrtApi()->CreateSessionOptions(&sess_options_));
-        ThrowOnError(GetOrtApi()->CreateRunOptions(&run_options_));
+        if (use_global_threads)
+            ThrowOnError(GetOrtApi()->DisablePerSessionThreads(sess_options_));
         ThrowOnError(GetOrtApi()->CreateCpuMemoryInfo(OrtArenaAllocator, OrtMemTypeDefault, &cpu_memory_info_));
         sess_ = nullptr;
         cpu_allocator_ = nullptr;
@@ -40,7 +172,8 @@ public:
         n_outputs_ = 0;
     }
 
-    void LoadFromFile(const char* filepath) {
+    void LoadFromFile(const char* filepath,
+                      OrtPrepackedWeightsContainer* prepacked_weights = nullptr) {
         EXT_ENFORCE(filepath != nullptr);
         EXT_ENFORCE(env_ != nullptr);
         EXT_ENFORCE(sess_options_ != nullptr);
@@ -48,29 +181,71 @@ public:
         std::string name(filepath);
         std::wstring_convert<std::codecvt_utf8<wchar_t>> cvt;
         std::wstring wname(cvt.from_bytes(name));
-        ThrowOnError(GetOrtApi()->CreateSession(env_, wname.c_str(), sess_options_, &sess_));
+        const wchar_t* path = wname.c_str();
         #else
-        ThrowOnError(GetOrtApi()->CreateSession(env_, filepath, sess_options_, &sess_));
+        const char* path = filepath;
         #endif
+        if (prepacked_weights == nullptr)
+            ThrowOnError(GetOrtApi()->CreateSession(env_, path, sess_options_, &sess_));
+        else
+            ThrowOnError(GetOrtApi()->CreateSessionWithPrepackedWeightsContainer(
+                env_, path, sess_options_, prepacked_weights, &sess_));
         LoadFinalize();
     }
 
-    void LoadFromBytes(const void* model_data, size_t model_data_length) {
-        ThrowOnError(GetOrtApi()->CreateSessionFromArray(env_, model_data, model_data_length, sess_options_, &sess_));
+    void LoadFromBytes(const void* model_data, size_t model_data_length,
+                       OrtPrepackedWeightsContainer* prepacked_weights = nullptr) {
+        if (prepacked_weights == nullptr)
+            ThrowOnError(GetOrtApi()->CreateSessionFromArray(
+                env_, model_data, model_data_length, sess_options_, &sess_));
+        else
+            ThrowOnError(GetOrtApi()->CreateSessionFromArrayWithPrepackedWeightsContainer(
+                env_, model_data, model_data_length, sess_options_, prepacked_weights, &sess_));
         LoadFinalize();
     }
 
     ~OrtInference() {
         if (cpu_allocator_ != nullptr) GetOrtApi()->ReleaseAllocator(cpu_allocator_);
         if (sess_ != nullptr) GetOrtApi()->ReleaseSession(sess_);
+        for(auto it : initializers_)
+            GetOrtApi()->ReleaseValue(it);
         GetOrtApi()->ReleaseSessionOptions(sess_options_);
-        GetOrtApi()->ReleaseRunOptions(run_options_);
         GetOrtApi()->ReleaseMemoryInfo(cpu_memory_info_);
-        GetOrtApi()->ReleaseEnv(env_);
+        if (owns_env_)
+            GetOrtApi()->ReleaseEnv(env_);
+    }
+
+    // Replaces an initializer of the model by a buffer owned by the caller,
+    // it must be called before the model is loaded and the buffer must
+    // outlive the session. Sessions sharing the same buffers and the same
+    // prepacked weights container share the prepacked weights as well.
+    void AddInitializer(const char* name, OrtShape* shape, OrtCpuValue* value) {
+        EXT_ENFORCE(sess_ == nullptr, "Initializers must be added before the model is loaded.");
+        OrtValue* ort_value = CreateInitializer(shape, value);
+        ThrowOnError(GetOrtApi()->AddInitializer(sess_options_, name, ort_value));
+    }
+
+    // Gives the buffers of the initializers stored as external data in the model,
+    // onnxruntime uses them instead of reading the external files.
+    // The buffers must outlive the session.
+    void AddExternalInitializers(size_t n, const char** names,
+                                 OrtShape* shapes, OrtCpuValue* values) {
+        EXT_ENFORCE(sess_ == nullptr, "Initializers must be added before the model is loaded.");
+        std::vector<OrtValue*> ort_values(n);
+        for(size_t i = 0; i < n; ++i)
+            ort_values[i] = CreateInitializer(shapes + i, values + i);
+        ThrowOnError(GetOrtApi()->AddExternalInitializers(
+            sess_options_, names, ort_values.data(), n));
     }
 
     size_t GetInputCount() const { return n_inputs_; }
     size_t GetOutputCount() const { return n_outputs_; }
+    const std::vector<std::string>& GetInputNames() const { return input_names_; }
+    const std::vector<std::string>& GetOutputNames() const { return output_names_; }
+    const std::vector<int>& GetInputTypes() const { return input_types_; }
+    const std::vector<int>& GetOutputTypes() const { return output_types_; }
+    const std::vector<std::vector<int64_t>>& GetInputShapes() const { return input_shapes_; }
+    const std::vector<std::vector<int64_t>>& GetOutputShapes() const { return output_shapes_; }
 
     void Initialize(const char* optimized_file_path = nullptr,
                     int graph_optimization_level = -1,
@@ -79,7 +254,8 @@ public:
                     int set_denormal_as_zero = 0,
                     int intra_op_num_threads = -1,
                     int inter_op_num_threads = -1,
-                    const char** custom_libs = nullptr) {
+                    const char** custom_libs = nullptr,
+                    const char* profile_prefix = nullptr) {
         if (graph_optimization_level != -1) {
             ThrowOnError(GetOrtApi()->SetSessionGraphOptimizationLevel(
                 sess_options_, (GraphOptimizationLevel)graph_optimization_level));
@@ -117,6 +293,15 @@ public:
         if (inter_op_num_threads != -1) {
             ThrowOnError(GetOrtApi()->SetInterOpNumThreads(sess_options_, inter_op_num_threads));
         }
+        if (profile_prefix != nullptr && *profile_prefix != 0) {
+            #ifdef _WIN32
+            std::wstring_convert<std::codecvt_utf8<wchar_t>> cvt;
+            std::wstring wprefix(cvt.from_bytes(std::string(profile_prefix)));
+            ThrowOnError(GetOrtApi()->EnableProfiling(sess_options_, wprefix.c_str()));
+            #else
+            ThrowOnError(GetOrtApi()->EnableProfiling(sess_options_, profile_prefix));
+            #endif
+        }
         if (custom_libs != nullptr) {
             #ifdef _WIN32
             std::wstring_convert<std::codecvt_utf8<wchar_t>> cvt;
@@ -139,31 +324,66 @@ public:
                        size_t max_outputs,
                        OrtShape* out_shapes,
                        OrtCpuValue* out_values) {
+        auto begin = std::chrono::steady_clock::now();
         if (max_outputs < n_outputs_)
             EXT_THROW("Not enough expected outputs, max_outputs=",
                       max_outputs, " > ", n_outputs_, ".");
         if (n_inputs > n_inputs_)
-            EXT_THROW("Too many inputs, n_inputs=", n_inputs, " > ", n_inputs, ".");
+            EXT_THROW("Too many inputs, n_inputs=", n_inputs, " > ", n_inputs_, ".");
         std::vector<OrtValue*> ort_values(n_inputs);
+        int64_t bytes_in = 0, bytes_out = 0;
         
         for(size_t i = 0; i < n_inputs; ++i) {
             ONNXTensorElementDataType elem_type = (ONNXTensorElementDataType)values[i].elem_type();
+            size_t n_bytes = values[i].size() * ElementSize(elem_type);
             ThrowOnError(GetOrtApi()->CreateTensorWithDataAsOrtValue(
-                cpu_memory_info_, values[i].data(),
-                values[i].size() * ElementSize(elem_type),
+                cpu_memory_info_, values[i].data(), n_bytes,
                 shapes[i].dims(), shapes[i].ndim(),
                 elem_type, &ort_values[i]));
+            bytes_in += n_bytes;
+        }
+
+        // An output with data is a buffer allocated by the caller,
+        // onnxruntime writes the results into it.
+        std::vector<OrtValue*> ort_values_out(n_outputs_, nullptr);
+        for(size_t i = 0; i < n_outputs_; ++i) {
+            if (out_values[i].data() == nullptr)
+                continue;
+            ONNXTensorElementDataType elem_type = (ONNXTensorElementDataType)out_values[i].elem_type();
+            ThrowOnError(GetOrtApi()->CreateTensorWithDataAsOrtValue(
+                cpu_memory_info_, out_values[i].data(),
+                out_values[i].size() * ElementSize(elem_type),
+                out_shapes[i].dims(), out_shapes[i].ndim(),
+                elem_type, &ort_values_out[i]));
         }
 
-        std::vector<OrtValue*> ort_values_out(n_outputs_);
-        ThrowOnError(GetOrtApi()->Run(
-            sess_, run_options_,
-            input_names_call_.data(), ort_values.data(), n_inputs,
-            output_names_call_.data(), n_outputs_, ort_values_out.data()));
+        // Every call has its own run options, the tag may change
+        // while another call is running.
+        OrtRunOptions* run_options = nullptr;
+        OrtStatus* status = GetOrtApi()->CreateRunOptions(&run_options);
+        if (status == nullptr) {
+            std::string tag = GetRunTag();
+            if (!tag.empty())
+                status = GetOrtApi()->RunOptionsSetRunTag(run_options, tag.c_str());
+        }
+        if (status == nullptr)
+            status = GetOrtApi()->Run(
+                sess_, run_options,
+                input_names_call_.data(), ort_values.data(), n_inputs,
+                output_names_call_.data(), n_outputs_, ort_values_out.data());
+        if (run_options != nullptr)
+            GetOrtApi()->ReleaseRunOptions(run_options);
 
         for(size_t i = 0; i < n_inputs; ++i) {
             GetOrtApi()->ReleaseValue(ort_values[i]);
         }
+        if (status != nullptr) {
+            for(size_t i = 0; i < n_outputs_; ++i) {
+                if (ort_values_out[i] != nullptr)
+                    GetOrtApi()->ReleaseValue(ort_values_out[i]);
+            }
+            ThrowOnError(status);
+        }
         OrtTensorTypeAndShapeInfo* info;
         ONNXTensorElementDataType elem_type;
         size_t size, n_dims;
@@ -188,11 +408,99 @@ public:
             GetOrtApi()->ReleaseTensorTypeAndShapeInfo(info);
             out_values[i].init(size, elem_type, data, ort_values_out[i]);
             // GetOrtApi()->ReleaseValue(ort_values_out[i]);
+            bytes_out += size * ElementSize(elem_type);
+        }
+        stats_.Add(std::chrono::duration_cast<std::chrono::nanoseconds>(
+                       std::chrono::steady_clock::now() - begin).count(),
+                   bytes_in, bytes_out);
+        return n_outputs_;
+    }
+
+    OrtRunStats GetRunStats() const { return stats_.Get(); }
+    void ResetRunStats() { stats_.Reset(); }
+
+    // Applies to the runs starting after this call,
+    // the runs already started keep the previous tag.
+    void SetRunTag(const char* tag) {
+        EXT_ENFORCE(tag != nullptr);
+        std::lock_guard<std::mutex> lock(run_tag_mutex_);
+        run_tag_ = tag;
+    }
+
+    std::string GetRunTag() {
+        std::lock_guard<std::mutex> lock(run_tag_mutex_);
+        return run_tag_;
+    }
+
+    // Stops the profiling and returns the name of the file it wrote.
+    std::string EndProfiling() {
+        EXT_ENFORCE(sess_ != nullptr, "No model was loaded.");
+        char* filename;
+        ThrowOnError(GetOrtApi()->SessionEndProfiling(sess_, cpu_allocator_, &filename));
+        std::string res(filename);
+        ThrowOnError(GetOrtApi()->AllocatorFree(cpu_allocator_, filename));
+        return res;
+    }
+
+    // Runs n_requests inferences, request k uses shapes[k * n_inputs + i],
+    // values[k * n_inputs + i] and receives its outputs in
+    // out_shapes[k * max_outputs + j], out_values[k * max_outputs + j].
+    // Requests are dispatched on n_threads threads if n_threads > 1.
+    size_t RunMany(size_t n_requests,
+                   size_t n_inputs,
+                   OrtShape* shapes,
+                   OrtCpuValue* values,
+                   size_t max_outputs,
+                   OrtShape* out_shapes,
+                   OrtCpuValue* out_values,
+                   int n_threads) {
+        std::atomic<size_t> next(0);
+        std::exception_ptr error;
+        std::mutex error_mutex;
+        auto worker = [&]() {
+            size_t k;
+            while ((k = next++) < n_requests) {
+                try {
+                    Run(n_inputs, shapes + k * n_inputs, values + k * n_inputs,
+                        max_outputs, out_shapes + k * max_outputs,
+                        out_values + k * max_outputs);
+                } catch (...) {
+                    std::lock_guard<std::mutex> lock(error_mutex);
+                    if (!error)
+                        error = std::current_exception();
+                    next = n_requests;
+                }
+            }
+        };
+        size_t n_workers = n_threads > 1 ? std::min((size_t)n_threads, n_requests) : 1;
+        std::vector<std::thread> threads;
+        threads.reserve(n_workers);
+        for(size_t i = 1; i < n_workers; ++i)
+            threads.emplace_back(worker);
+        worker();
+        for(auto& th : threads)
+            th.join();
+        if (error) {
+            // The outputs of the successful requests are released.
+            for(size_t i = 0; i < n_requests * max_outputs; ++i)
+                out_values[i].free_ort_value();
+            std::rethrow_exception(error);
         }
         return n_outputs_;
     }
 
 protected:
+    OrtValue* CreateInitializer(OrtShape* shape, OrtCpuValue* value) {
+        ONNXTensorElementDataType elem_type = (ONNXTensorElementDataType)value->elem_type();
+        OrtValue* ort_value;
+        ThrowOnError(GetOrtApi()->CreateTensorWithDataAsOrtValue(
+            cpu_memory_info_, value->data(),
+            value->size() * ElementSize(elem_type),
+            shape->dims(), shape->ndim(), elem_type, &ort_value));
+        initializers_.push_back(ort_value);
+        return ort_value;
+    }
+
     void LoadFinalize() {
         EXT_ENFORCE(cpu_memory_info_ != nullptr);
         ThrowOnError(GetOrtApi()->CreateAllocator(sess_, cpu_memory_info_ , &cpu_allocator_));
@@ -217,18 +525,56 @@ protected:
         for(size_t i = 0; i < n_inputs_; ++i) {
             input_names_call_[i] = input_names_[i].c_str();
         }
-        output_names_call_.resize(n_inputs_);
-        for(size_t i = 0; i < n_inputs_; ++i) {
+        output_names_call_.resize(n_outputs_);
+        for(size_t i = 0; i < n_outputs_; ++i) {
             output_names_call_[i] = output_names_[i].c_str();
         }
+
+        input_types_.resize(n_inputs_);
+        input_shapes_.resize(n_inputs_);
+        for(size_t i = 0; i < n_inputs_; ++i) {
+            GetTensorInfo(true, i, input_types_[i], input_shapes_[i]);
+        }
+        output_types_.resize(n_outputs_);
+        output_shapes_.resize(n_outputs_);
+        for(size_t i = 0; i < n_outputs_; ++i) {
+            GetTensorInfo(false, i, output_types_[i], output_shapes_[i]);
+        }
+    }
+
+    // Retrieves the element type and the shape of an input or an output,
+    // the element type is 0 if it is not a tensor, a dynamic dimension is -1.
+    void GetTensorInfo(bool is_input, size_t i, int& elem_type, std::vector<int64_t>& shape) {
+        OrtTypeInfo* type_info;
+        if (is_input)
+            ThrowOnError(GetOrtApi()->SessionGetInputTypeInfo(sess_, i, &type_info));
+        else
+            ThrowOnError(GetOrtApi()->SessionGetOutputTypeInfo(sess_, i, &type_info));
+        const OrtTensorTypeAndShapeInfo* info = nullptr;
+        ONNXTensorElementDataType tensor_type = ONNX_TENSOR_ELEMENT_DATA_TYPE_UNDEFINED;
+        size_t n_dims = 0;
+        OrtStatus* status = GetOrtApi()->CastTypeInfoToTensorInfo(type_info, &info);
+        if (status == nullptr && info != nullptr) {
+            status = GetOrtApi()->GetTensorElementType(info, &tensor_type);
+            if (status == nullptr)
+                status = GetOrtApi()->GetDimensionsCount(info, &n_dims);
+            shape.resize(n_dims);
+            if (status == nullptr && n_dims > 0)
+                status = GetOrtApi()->GetDimensions(info, shape.data(), n_dims);
+        }
+        GetOrtApi()->ReleaseTypeInfo(type_info);
+        ThrowOnError(status);
+        elem_type = (int)tensor_type;
     }
 
 private:
     // before loading the model
     OrtEnv* env_;
+    bool owns_env_;
     OrtSessionOptions* sess_options_;
-    OrtRunOptions* run_options_;
     OrtMemoryInfo* cpu_memory_info_;
+    std::mutex run_tag_mutex_;
+    std::string run_tag_;
 
 private:
     // after loading the model
@@ -240,6 +586,12 @@ private:
     std::vector<std::string> output_names_;
     std::vector<const char*> input_names_call_;
     std::vector<const char*> output_names_call_;
+    std::vector<int> input_types_;
+    std::vector<int> output_types_;
+    std::vector<std::vector<int64_t>> input_shapes_;
+    std::vector<std::vector<int64_t>> output_shapes_;
+    std::vector<OrtValue*> initializers_;
+    RunStats stats_;
 };
 
 /*
@@ -253,18 +605,62 @@ typedef enum {
 
 //////// SIMPLE API //////
 
-OrtSessionType* create_session() { return (OrtSessionType*)(new OrtInference()); }
+OrtSessionType* create_session(int use_global_threads) {
+    return (OrtSessionType*)(new OrtInference(use_global_threads));
+}
 void delete_session(OrtSessionType* ptr) {
     if (ptr == nullptr)
         throw std::runtime_error("Cannot delete a null pointer (delete_session).");
     delete (OrtInference*)ptr;
 }
-void session_load_from_file(OrtSessionType* ptr, const char* filename) { ((OrtInference*)ptr)->LoadFromFile(filename); }
-void session_load_from_bytes(OrtSessionType* ptr, const void* buffer, size_t size) {
-    ((OrtInference*)ptr)->LoadFromBytes(buffer, size);
+OrtPrepackedWeightsType* create_prepacked_weights() {
+    OrtPrepackedWeightsContainer* container;
+    ThrowOnError(GetOrtApi()->CreatePrepackedWeightsContainer(&container));
+    return (OrtPrepackedWeightsType*)container;
+}
+void delete_prepacked_weights(OrtPrepackedWeightsType* ptr) {
+    if (ptr == nullptr)
+        throw std::runtime_error("Cannot delete a null pointer (delete_prepacked_weights).");
+    GetOrtApi()->ReleasePrepackedWeightsContainer((OrtPrepackedWeightsContainer*)ptr);
+}
+void session_load_from_file(OrtSessionType* ptr, const char* filename,
+                            OrtPrepackedWeightsType* prepacked_weights) {
+    ((OrtInference*)ptr)->LoadFromFile(
+        filename, (OrtPrepackedWeightsContainer*)prepacked_weights);
+}
+void session_load_from_bytes(OrtSessionType* ptr, const void* buffer, size_t size,
+                             OrtPrepackedWeightsType* prepacked_weights) {
+    ((OrtInference*)ptr)->LoadFromBytes(
+        buffer, size, (OrtPrepackedWeightsContainer*)prepacked_weights);
+}
+void session_add_initializer(OrtSessionType* ptr, const char* name,
+                             OrtShape* shape, OrtCpuValue* value) {
+    ((OrtInference*)ptr)->AddInitializer(name, shape, value);
+}
+void session_add_external_initializers(OrtSessionType* ptr, size_t n, const char** names,
+                                       OrtShape* shapes, OrtCpuValue* values) {
+    ((OrtInference*)ptr)->AddExternalInitializers(n, names, shapes, values);
 }
 size_t session_get_input_count(OrtSessionType* ptr) { return ((OrtInference*)ptr)->GetInputCount(); }
 size_t session_get_output_count(OrtSessionType* ptr) { return ((OrtInference*)ptr)->GetOutputCount(); }
+std::vector<std::string> session_get_input_names(OrtSessionType* ptr) {
+    return ((OrtInference*)ptr)->GetInputNames();
+}
+std::vector<std::string> session_get_output_names(OrtSessionType* ptr) {
+    return ((OrtInference*)ptr)->GetOutputNames();
+}
+std::vector<int> session_get_input_types(OrtSessionType* ptr) {
+    return ((OrtInference*)ptr)->GetInputTypes();
+}
+std::vector<int> session_get_output_types(OrtSessionType* ptr) {
+    return ((OrtInference*)ptr)->GetOutputTypes();
+}
+std::vector<std::vector<int64_t>> session_get_input_shapes(OrtSessionType* ptr) {
+    return ((OrtInference*)ptr)->GetInputShapes();
+}
+std::vector<std::vector<int64_t>> session_get_output_shapes(OrtSessionType* ptr) {
+    return ((OrtInference*)ptr)->GetOutputShapes();
+}
 
 void session_initialize(OrtSessionType* ptr,
                         const char* optimized_file_path,
@@ -274,7 +670,8 @@ void session_initialize(OrtSessionType* ptr,
                         int set_denormal_as_zero,
                         int intra_op_num_threads,
                         int inter_op_num_threads,
-                        char** custom_libs) {
+                        char** custom_libs,
+                        const char* profile_prefix) {
     ((OrtInference*)ptr)->Initialize(optimized_file_path,
                                      graph_optimization_level,
                                      enable_cuda,
@@ -282,7 +679,104 @@ void session_initialize(OrtSessionType* ptr,
                                      set_denormal_as_zero,
                                      intra_op_num_threads,
                                      inter_op_num_threads,
-                                     (const char**)custom_libs);
+                                     (const char**)custom_libs,
+                                     profile_prefix);
+}
+
+OrtRunStats session_get_run_stats(OrtSessionType* ptr) {
+    return ((OrtInference*)ptr)->GetRunStats();
+}
+void session_reset_run_stats(OrtSessionType* ptr) { ((OrtInference*)ptr)->ResetRunStats(); }
+void session_set_run_tag(OrtSessionType* ptr, const char* tag) {
+    ((OrtInference*)ptr)->SetRunTag(tag);
+}
+std::string session_end_profiling(OrtSessionType* ptr) {
+    return ((OrtInference*)ptr)->EndProfiling();
+}
+
+size_t session_run_many(OrtSessionType* ptr,
+                        size_t n_requests,
+                        size_t n_inputs,
+                        OrtShape* shapes,
+                        OrtCpuValue* values,
+                        size_t max_outputs,
+                        OrtShape* out_shapes,
+                        OrtCpuValue* out_values,
+                        int n_threads) {
+    return ((OrtInference*)ptr)->RunMany(n_requests, n_inputs, shapes, values,
+                                         max_outputs, out_shapes, out_values,
+                                         n_threads);
+}
+
+// Native threads running the inferences requested by session_run_async,
+// the pool is created on first use and never released.
+class AsyncRunPool {
+public:
+    AsyncRunPool(size_t n_threads) {
+        for(size_t i = 0; i < n_threads; ++i)
+            threads_.emplace_back([this]() { Loop(); });
+    }
+
+    void Submit(std::function<void()> task) {
+        {
+            std::lock_guard<std::mutex> lock(mutex_);
+            tasks_.push(std::move(task));
+        }
+        cv_.notify_one();
+    }
+
+private:
+    void Loop() {
+        while (true) {
+            std::function<void()> task;
+            {
+                std::unique_lock<std::mutex> lock(mutex_);
+                cv_.wait(lock, [this]() { return !tasks_.empty(); });
+                task = std::move(tasks_.front());
+                tasks_.pop();
+            }
+            task();
+        }
+    }
+
+    std::mutex mutex_;
+    std::condition_variable cv_;
+    std::queue<std::function<void()>> tasks_;
+    std::vector<std::thread> threads_;
+};
+
+static std::mutex async_pool_mutex;
+static AsyncRunPool* async_pool = nullptr;
+
+static AsyncRunPool* get_async_pool() {
+    std::lock_guard<std::mutex> lock(async_pool_mutex);
+    if (async_pool == nullptr)
+        async_pool = new AsyncRunPool(std::max(1u, std::thread::hardware_concurrency()));
+    return async_pool;
+}
+
+void session_run_async(OrtSessionType* ptr,
+                       size_t n_inputs,
+                       OrtShape* shapes,
+                       OrtCpuValue* values,
+                       size_t max_outputs,
+                       OrtShape* out_shapes,
+                       OrtCpuValue* out_values,
+                       RunAsyncCallback callback,
+                       void* user_data) {
+    get_async_pool()->Submit([=]() {
+        try {
+            ((OrtInference*)ptr)->Run(n_inputs, shapes, values,
+                                      max_outputs, out_shapes, out_values);
+        } catch (const std::exception& e) {
+            callback(user_data, e.what());
+            return;
+        } catch (...) {
+            callback(user_data, "Unexpected error.");
+            return;
+        }
+        callback(user_data, nullptr);
+    });
 }
 
 size_t session_run(OrtSessionType* ptr,
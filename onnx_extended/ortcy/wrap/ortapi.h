@@ -6,6 +6,7 @@
 #include <vector>
 
 #define OrtSessionType void
+#define OrtPrepackedWeightsType void
 
 namespace ortapi {
 
@@ -26,7 +27,8 @@ inline size_t ElementSize(ONNXTensorElementDataType elem_type) {
             return 2;
         case ONNXTensorElementDataType::ONNX_TENSOR_ELEMENT_DATA_TYPE_UINT8:
         case ONNXTensorElementDataType::ONNX_TENSOR_ELEMENT_DATA_TYPE_INT8:
-            return 2;
+        case ONNXTensorElementDataType::ONNX_TENSOR_ELEMENT_DATA_TYPE_BOOL:
+            return 1;
         default:
             throw std::runtime_error(
                 "One element type is not implemented in function `ortapi::ElementSize()`.");
@@ -75,17 +77,51 @@ class OrtCpuValue {
         void free_ort_value();
 };
 
+// Counters of a session updated after every successful run,
+// latencies are in seconds, percentiles are known within 10%.
+struct OrtRunStats {
+    int64_t run_count;
+    int64_t bytes_in;
+    int64_t bytes_out;
+    double total_latency;
+    double max_latency;
+    double p50_latency;
+    double p90_latency;
+    double p99_latency;
+};
+
 // Simplified API for this project.
 // see https://onnxruntime.ai/docs/api/c/
+// session_run: out_values[i] (and out_shapes[i]) may be initialized with
+// a buffer allocated by the caller, onnxruntime then writes the i-th output
+// into it, the OrtValue stored in out_values[i] only wraps that buffer.
 
 typedef void release(size_t output, int elem_type, size_t size, OrtShape* shape, void* data, void* args);
 
 std::vector<std::string> get_available_providers();
 
-OrtSessionType *create_session();
+// Creates the environment shared by every session created with
+// use_global_threads=1, -1 keeps the default value, it must be called
+// before the first of these sessions is created.
+void configure_global_threads(int intra_op_num_threads = -1,
+                              int inter_op_num_threads = -1,
+                              int allow_spinning = -1);
+OrtSessionType *create_session(int use_global_threads = 0);
 void delete_session(OrtSessionType *);
-void session_load_from_file(OrtSessionType*, const char* filename);
-void session_load_from_bytes(OrtSessionType*, const void* buffer, size_t size);
+// Container sharing the weights prepacked by the kernels among
+// every session loaded with it, it must outlive these sessions.
+OrtPrepackedWeightsType *create_prepacked_weights();
+void delete_prepacked_weights(OrtPrepackedWeightsType *);
+// Replaces an initializer by a buffer owned by the caller before the model is loaded.
+void session_add_initializer(OrtSessionType*, const char* name,
+                             OrtShape* shape, OrtCpuValue* value);
+// Gives the buffers of the initializers stored as external data before the model is loaded.
+void session_add_external_initializers(OrtSessionType*, size_t n, const char** names,
+                                       OrtShape* shapes, OrtCpuValue* values);
+void session_load_from_file(OrtSessionType*, const char* filename,
+                            OrtPrepackedWeightsType* prepacked_weights = nullptr);
+void session_load_from_bytes(OrtSessionType*, const void* buffer, size_t size,
+                             OrtPrepackedWeightsType* prepacked_weights = nullptr);
 void session_initialize(OrtSessionType* ptr,
                         const char* optimized_file_path,
                         int graph_optimization_level = -1,
@@ -94,9 +130,24 @@ void session_initialize(OrtSessionType* ptr,
                         int set_denormal_as_zero = 0,
                         int intra_op_num_threads = -1,
                         int inter_op_num_threads = -1,
-                        char** custom_libs = nullptr);
+                        char** custom_libs = nullptr,
+                        const char* profile_prefix = nullptr);
 size_t session_get_input_count(OrtSessionType *);
 size_t session_get_output_count(OrtSessionType *);
+// Metadata retrieved when the model is loaded, the element type is 0
+// if the input or the output is not a tensor, a dynamic dimension is -1.
+std::vector<std::string> session_get_input_names(OrtSessionType *);
+std::vector<std::string> session_get_output_names(OrtSessionType *);
+std::vector<int> session_get_input_types(OrtSessionType *);
+std::vector<int> session_get_output_types(OrtSessionType *);
+std::vector<std::vector<int64_t>> session_get_input_shapes(OrtSessionType *);
+std::vector<std::vector<int64_t>> session_get_output_shapes(OrtSessionType *);
+OrtRunStats session_get_run_stats(OrtSessionType *);
+void session_reset_run_stats(OrtSessionType *);
+// The tag appears in the logs and the profiling of the following runs.
+void session_set_run_tag(OrtSessionType *, const char* tag);
+// Stops the profiling enabled with profile_prefix and returns the file it wrote.
+std::string session_end_profiling(OrtSessionType *);
 size_t session_run(OrtSessionType* ptr,
                    size_t n_inputs,
                    OrtShape* shapes,
@@ -105,5 +156,32 @@ size_t session_run(OrtSessionType* ptr,
                    OrtShape* out_shapes,
                    OrtCpuValue* out_values);
 
+// Runs n_requests inferences, every request has n_inputs inputs and
+// max_outputs outputs, arrays are concatenated request after request.
+size_t session_run_many(OrtSessionType* ptr,
+                        size_t n_requests,
+                        size_t n_inputs,
+                        OrtShape* shapes,
+                        OrtCpuValue* values,
+                        size_t max_outputs,
+                        OrtShape* out_shapes,
+                        OrtCpuValue* out_values,
+                        int n_threads = 1);
+// Called once the inference started by session_run_async is done,
+// error is null if it succeeded, the message of the exception otherwise.
+typedef void (*RunAsyncCallback)(void* user_data, const char* error);
+
+// Queues an inference on a pool of native threads and returns immediately,
+// callback is called from one of these threads once the outputs are filled.
+// All pointers must remain valid until then.
+void session_run_async(OrtSessionType* ptr,
+                       size_t n_inputs,
+                       OrtShape* shapes,
+                       OrtCpuValue* values,
+                       size_t max_outputs,
+                       OrtShape* out_shapes,
+                       OrtCpuValue* out_values,
+                       RunAsyncCallback callback,
+                       void* user_data);
 
 } // namespace ortapi
@@ -1,10 +1,12 @@
+import asyncio
+import mmap
 import numpy
 cimport numpy
 cimport cython
 from libc.stdint cimport int64_t
 from libc.stdlib cimport free, malloc
-from libc.string cimport memcpy
 from cpython cimport Py_buffer
+from cpython.ref cimport Py_INCREF, Py_DECREF
 from cpython.buffer cimport (
     PyObject_GetBuffer,
     PyBuffer_Release,
@@ -27,7 +29,7 @@ cdef extern from "<string>" namespace "std":
         const char* c_str()
 
 
-cdef extern from "<vector>" namespace "std":
+cdef extern from "<vector>" namespace "std" nogil:
     cdef cppclass vector[T]:
         cppclass iterator:
             T operator*()
@@ -36,15 +38,19 @@ cdef extern from "<vector>" namespace "std":
             bint operator!=(iterator)
         vector()
         void push_back(T&)
+        void resize(size_t)
         T& operator[](int)
         T& at(int)
+        T* data()
         iterator begin()
         iterator end()
         int size() const
         const char* c_str() const
 
 
-cdef extern from "ortapi.h" namespace "ortapi":
+# Every function is declared nogil, the C++ exceptions are converted
+# into python exceptions once the GIL is acquired again.
+cdef extern from "ortapi.h" namespace "ortapi" nogil:
 
     cdef cppclass OrtShape:
         OrtShape()
@@ -56,20 +62,45 @@ cdef extern from "ortapi.h" namespace "ortapi":
     cdef cppclass OrtCpuValue:
         OrtCpuValue()
         void init(size_t size, int elem_type, void* data, void* ort_value)
-        void free_ort_value()
+        void free_ort_value() except +
         int elem_type()
         size_t size()
         void* data()
 
-    vector[string] get_available_providers()
+    vector[string] get_available_providers() except +
 
-    size_t ElementSizeI(int elem_type)
-    void* create_session()
-    void delete_session(void*)
-    size_t session_get_input_count(void*)
-    size_t session_get_output_count(void*)
-    void session_load_from_file(void*, const char* filename)
-    void session_load_from_bytes(void*, const void* buffer, size_t size)
+    size_t ElementSizeI(int elem_type) except +
+    void configure_global_threads(int intra_op_num_threads,
+                                  int inter_op_num_threads,
+                                  int allow_spinning) except +
+    void* create_session(int use_global_threads) except +
+    void delete_session(void*) except +
+    size_t session_get_input_count(void*) except +
+    size_t session_get_output_count(void*) except +
+    vector[string] session_get_input_names(void*) except +
+    vector[string] session_get_output_names(void*) except +
+    vector[int] session_get_input_types(void*) except +
+    vector[int] session_get_output_types(void*) except +
+    vector[vector[int64_t]] session_get_input_shapes(void*) except +
+    vector[vector[int64_t]] session_get_output_shapes(void*) except +
+    void* create_prepacked_weights() except +
+    void delete_prepacked_weights(void*) except +
+    void session_add_initializer(void*,
+                                 const char* name,
+                                 OrtShape* shape,
+                                 OrtCpuValue* value) except +
+    void session_add_external_initializers(void*,
+                                           size_t n,
+                                           const char** names,
+                                           OrtShape* shapes,
+                                           OrtCpuValue* values) except +
+    void session_load_from_file(void*,
+                                const char* filename,
+                                void* prepacked_weights) except +
+    void session_load_from_bytes(void*,
+                                 const void* buffer,
+                                 size_t size,
+                                 void* prepacked_weights) except +
     void session_initialize(void*,
                             const char* optimized_file_path,
                             int graph_optimization_level,
@@ -78,14 +109,49 @@ cdef extern from "ortapi.h" namespace "ortapi":
                             int set_denormal_as_zero,
                             int intra_op_num_threads,
                             int inter_op_num_threads,
-                            char** custom_libs)
+                            char** custom_libs,
+                            const char* profile_prefix) except +
+
+    cdef struct OrtRunStats:
+        int64_t run_count
+        int64_t bytes_in
+        int64_t bytes_out
+        double total_latency
+        double max_latency
+        double p50_latency
+        double p90_latency
+        double p99_latency
+
+    OrtRunStats session_get_run_stats(void*) except +
+    void session_reset_run_stats(void*) except +
+    void session_set_run_tag(void*, const char* tag) except +
+    string session_end_profiling(void*) except +
     size_t session_run(void*,
                        size_t n_inputs,
                        const OrtShape* shapes,
                        const OrtCpuValue* values,
                        size_t max_outputs,
                        OrtShape* out_shapes,
-                       OrtCpuValue* out_values)
+                       OrtCpuValue* out_values) except +
+    size_t session_run_many(void*,
+                            size_t n_requests,
+                            size_t n_inputs,
+                            const OrtShape* shapes,
+                            const OrtCpuValue* values,
+                            size_t max_outputs,
+                            OrtShape* out_shapes,
+                            OrtCpuValue* out_values,
+                            int n_threads) except +
+    ctypedef void (*RunAsyncCallback)(void* user_data, const char* error)
+    void session_run_async(void*,
+                           size_t n_inputs,
+                           const OrtShape* shapes,
+                           const OrtCpuValue* values,
+                           size_t max_outputs,
+                           OrtShape* out_shapes,
+                           OrtCpuValue* out_values,
+                           RunAsyncCallback callback,
+                           void* user_data) except +
 
 cdef list _ort_get_available_providers():
     """
@@ -108,6 +174,212 @@ def ort_get_available_providers():
     return r
 
 
+def ort_configure_global_threads(
+    intra_op_num_threads=-1,
+    inter_op_num_threads=-1,
+    allow_spinning=None,
+):
+    """
+    Configures the thread pools shared by every :class:`OrtSession`
+    created with `use_global_threads=True`. It must be called before
+    the first of them is created, default values are used otherwise.
+
+    :param intra_op_num_threads: number of threads used to parallelize
+        the execution within nodes, -1 for the default value
+    :param inter_op_num_threads: number of threads used to parallelize
+        the execution of the graph, -1 for the default value
+    :param allow_spinning: threads keep spinning waiting for a new task
+        if True, None for the default value
+    """
+    configure_global_threads(
+        intra_op_num_threads,
+        inter_op_num_threads,
+        -1 if allow_spinning is None else (1 if allow_spinning else 0),
+    )
+
+
+cdef class OrtCpuValueOwner:
+    """
+    Owns an OrtValue returned by :epkg:`onnxruntime`. It is the base
+    of every numpy array returned by :class:`OrtSession`, the array
+    uses the memory allocated by onnxruntime without any copy and
+    the OrtValue is released when the array is garbage collected.
+    """
+
+    cdef OrtCpuValue value
+
+    def __dealloc__(self):
+        self.value.free_ort_value()
+
+
+cdef dict _numpy_typenums = {
+    1: numpy.NPY_FLOAT32,
+    2: numpy.NPY_UINT8,
+    3: numpy.NPY_INT8,
+    4: numpy.NPY_UINT16,
+    5: numpy.NPY_INT16,
+    6: numpy.NPY_INT32,
+    7: numpy.NPY_INT64,
+    9: numpy.NPY_BOOL,
+    10: numpy.NPY_FLOAT16,
+    11: numpy.NPY_FLOAT64,
+    12: numpy.NPY_UINT32,
+    13: numpy.NPY_UINT64,
+}
+
+
+cdef list _wrap_ort_values(size_t n_outputs,
+                           OrtShape* out_shapes,
+                           OrtCpuValue* out_values):
+    """
+    Wraps the outputs of session_run into numpy arrays without any copy.
+    Every array keeps a reference on the owner of its OrtValue.
+    """
+    cdef OrtCpuValueOwner owner
+    cdef numpy.ndarray tout
+    cdef int typenum
+    # Every OrtValue is owned before any array is created, they are all
+    # released even if one of them cannot be converted.
+    owners = []
+    for i in range(n_outputs):
+        owner = OrtCpuValueOwner.__new__(OrtCpuValueOwner)
+        owner.value = out_values[i]
+        owners.append(owner)
+    res = []
+    for i in range(n_outputs):
+        owner = owners[i]
+        typenum = _numpy_typenums[owner.value.elem_type()]
+        tout = numpy.PyArray_SimpleNewFromData(
+            out_shapes[i].ndim(),
+            <numpy.npy_intp*>out_shapes[i].dims(),
+            typenum,
+            owner.value.data())
+        numpy.set_array_base(tout, owner)
+        res.append(tout)
+    return res
+
+
+cdef int _init_output_buffers(list out,
+                              size_t max_outputs,
+                              OrtShape* out_shapes,
+                              OrtCpuValue* out_values) except -1:
+    """
+    Gives session_run the buffers allocated by the caller to receive
+    the outputs.
+    """
+    cdef numpy.ndarray value
+    if len(out) > max_outputs:
+        raise RuntimeError(
+            f"This function does not work with more than "
+            f"{max_outputs} outputs ({len(out)})."
+        )
+    for n in range(len(out)):
+        value = out[n]
+        out_shapes[n].init(value.ndim)
+        for i in range(value.ndim):
+            out_shapes[n].set(i, value.shape[i])
+        out_values[n].init(
+            value.size,
+            OrtSession._onnx_types[value.dtype],
+            value.data,
+            <void*>0
+        )
+    return 0
+
+
+cdef list _release_output_buffers(size_t n_outputs,
+                                  OrtCpuValue* out_values,
+                                  list out):
+    """
+    Releases the OrtValue wrapping the buffers allocated by the caller,
+    the buffers hold the outputs.
+    """
+    for i in range(n_outputs):
+        out_values[i].free_ort_value()
+    return list(out)
+
+
+cdef class OrtPrepackedWeights:
+    """
+    Container for the weights prepacked by :epkg:`onnxruntime` kernels.
+    Sessions created with the same container and the same shared
+    initializers (see parameter *initializers* of :class:`OrtSession`)
+    prepack these weights only once and share them.
+    Every session keeps a reference on the container.
+    """
+
+    cdef void* container
+
+    def __cinit__(self):
+        self.container = create_prepacked_weights()
+
+    def __dealloc__(self):
+        if self.container != NULL:
+            delete_prepacked_weights(self.container)
+
+
+cdef class _AsyncRun:
+    """
+    Holds everything an inference started by :meth:`OrtSession.run_async`
+    needs until it is done: the session, the inputs, the outputs and
+    the future to complete.
+    """
+
+    cdef object session
+    cdef object loop
+    cdef object future
+    cdef list values
+    cdef list buffers
+    cdef size_t n_outputs
+    cdef vector[OrtShape] shapes
+    cdef vector[OrtCpuValue] in_values
+    cdef vector[OrtShape] out_shapes
+    cdef vector[OrtCpuValue] out_values
+
+
+def _set_future(future, result, exc):
+    if future.cancelled():
+        return
+    if exc is None:
+        future.set_result(result)
+    else:
+        future.set_exception(exc)
+
+
+cdef void _run_async_done(void* user_data, const char* error) noexcept with gil:
+    """
+    Called by a native thread once the inference is done, the outputs
+    are converted on this thread and the event loop is notified.
+    """
+    cdef _AsyncRun run = <_AsyncRun>user_data
+    # releases the reference taken by OrtSession.run_async
+    Py_DECREF(run)
+    result = None
+    exc = None
+    if error != NULL:
+        exc = RuntimeError(error.decode("utf-8", "replace"))
+    else:
+        # The future must complete even if the outputs cannot be converted,
+        # an exception raised here would be swallowed by the callback.
+        try:
+            if run.buffers is not None:
+                result = _release_output_buffers(
+                    run.n_outputs, run.out_values.data(), run.buffers
+                )
+            else:
+                result = _wrap_ort_values(
+                    run.n_outputs, run.out_shapes.data(), run.out_values.data()
+                )
+        except BaseException as e:
+            result = None
+            exc = e
+    try:
+        run.loop.call_soon_threadsafe(_set_future, run.future, result, exc)
+    except RuntimeError:
+        # the event loop is closed, nobody waits for the result anymore
+        pass
+
+
 cdef class OrtSession:
     """
     Wrapper around :epkg:`onnxruntime C API` based on :epkg:`cython`.
@@ -125,6 +397,41 @@ cdef class OrtSession:
         the execution of the graph
     :param intra_op_num_threads: number of threads used to parallelize
         the execution within nodes
+    :param custom_libs: list of libraries implementing custom kernels
+    :param use_global_threads: the session uses the thread pools shared
+        by every session created with this option instead of its own,
+        *inter_op_num_threads* and *intra_op_num_threads* are then ignored,
+        see :func:`ort_configure_global_threads`
+    :param prepacked_weights: :class:`OrtPrepackedWeights`, sessions created
+        with the same container share the prepacked version of
+        the initializers given by *initializers*
+    :param initializers: dictionary `{name: array}` replacing the initializers
+        of the model by arrays the session does not copy, sessions sharing
+        these arrays do not duplicate the weights
+    :param profiling: enables :epkg:`onnxruntime` profiling,
+        see :meth:`end_profiling`
+    :param profile_prefix: prefix of the profiling file,
+        `ortcy_profile` if None
+    :param external_initializers: dictionary `{name: array}` holding
+        the initializers the model stores as external data, onnxruntime
+        uses these arrays instead of reading the external files, they can be
+        memory mapped, see :func:`mmap_external_initializers
+        <onnx_extended.ortcy.mmap_external_initializers>`
+    :param use_mmap: if *filename* is a path, the file is memory mapped
+        and the model is parsed from the mapped pages, the external data
+        must then be given with *external_initializers*
+
+    *filename* may be any object implementing the buffer protocol
+    such as :class:`mmap.mmap`, the model is parsed from it without any copy.
+
+    The inference runs without holding the GIL, the same session can be
+    used by many python threads at the same time. The inputs must not be
+    modified while the inference is running.
+
+    Outputs are numpy arrays sharing the memory onnxruntime allocated,
+    there is no copy. The memory is released when the arrays are garbage
+    collected. They can be given to any other framework through
+    the DLPack protocol (`__dlpack__`) implemented by numpy.
     """
 
     # see https://github.com/onnx/onnx/blob/main/onnx/onnx.proto3#L485
@@ -174,17 +481,72 @@ cdef class OrtSession:
     }
 
     cdef void* session
+    cdef list bound_outputs
+    cdef OrtPrepackedWeights prepacked_weights
+    cdef list initializers
+    cdef size_t n_inputs
+    cdef size_t n_outputs
+    cdef vector[int] input_types
+    cdef list input_names
+    cdef list output_names
+    cdef list output_types
+    cdef list input_shapes
+    cdef list output_shapes
 
-    cdef void _session_load_from_bytes(self, object data):
+    cdef int _session_load_from_bytes(self, object data, void* prepacked) except -1:
         cdef Py_buffer buffer
         cdef char * ptr
 
         PyObject_GetBuffer(data, &buffer, PyBUF_SIMPLE | PyBUF_ANY_CONTIGUOUS)
         try:
             ptr = <char *>buffer.buf
-            session_load_from_bytes(self.session, <void*>ptr, len(data))
+            session_load_from_bytes(self.session, <void*>ptr, buffer.len, prepacked)
         finally:
             PyBuffer_Release(&buffer)
+        return 0
+
+    cdef int _add_initializers(self, dict initializers, bint external) except -1:
+        """
+        Replaces the initializers of the model by the given arrays
+        or gives the arrays holding the initializers stored as external data
+        if *external* is True. The session keeps a reference on every array,
+        they are not copied.
+        """
+        cdef size_t n = len(initializers)
+        cdef vector[OrtShape] shapes
+        cdef vector[OrtCpuValue] values
+        cdef vector[const char*] c_names
+        cdef numpy.ndarray array
+        shapes.resize(n)
+        values.resize(n)
+        c_names.resize(n)
+        names = [name.encode("utf-8") for name in initializers]
+        if self.initializers is None:
+            self.initializers = []
+        for i, init in enumerate(initializers.values()):
+            array = numpy.ascontiguousarray(init)
+            if array.dtype not in OrtSession._onnx_types:
+                raise TypeError(
+                    f"Unexpected type {array.dtype} for initializer {names[i]!r}."
+                )
+            shapes[i].init(array.ndim)
+            for d in range(array.ndim):
+                shapes[i].set(d, array.shape[d])
+            values[i].init(
+                array.size, OrtSession._onnx_types[array.dtype], array.data, <void*>0
+            )
+            c_names[i] = names[i]
+            self.initializers.append(array)
+        if external:
+            session_add_external_initializers(
+                self.session, n, c_names.data(), shapes.data(), values.data()
+            )
+        else:
+            for i in range(n):
+                session_add_initializer(
+                    self.session, c_names[i], &shapes[i], &values[i]
+                )
+        return 0
 
     def __init__(
         self,
@@ -197,8 +559,16 @@ cdef class OrtSession:
         inter_op_num_threads=-1,
         intra_op_num_threads=-1,
         custom_libs=None,
+        use_global_threads=False,
+        prepacked_weights=None,
+        initializers=None,
+        profiling=False,
+        profile_prefix=None,
+        external_initializers=None,
+        use_mmap=False,
     ):
         cdef char** c_custom_libs = <char**> 0
+        cdef void* prepacked = <void*> 0
 
         custom_libs_encoded = (
             None if custom_libs is None else
@@ -210,8 +580,11 @@ cdef class OrtSession:
                 c_custom_libs[i] = <char*>custom_libs_encoded[i]
             c_custom_libs[len(custom_libs)] = <char*> 0
         opt_file_path = (optimized_file_path or "").encode('utf-8')
+        c_profile_prefix = (
+            (profile_prefix or "ortcy_profile") if profiling else ""
+        ).encode("utf-8")
 
-        self.session = <void*>create_session()
+        self.session = <void*>create_session(1 if use_global_threads else 0)
         session_initialize(
             self.session,
             opt_file_path,
@@ -221,28 +594,169 @@ cdef class OrtSession:
             1 if set_denormal_as_zero else 0,
             intra_op_num_threads,
             inter_op_num_threads,
-            c_custom_libs)
+            c_custom_libs,
+            c_profile_prefix)
 
         if c_custom_libs != (<char**> 0):
             free(c_custom_libs)
 
-        if isinstance(filename, str):
-            session_load_from_file(self.session, filename.encode('utf-8'))
-        elif isinstance(filename, bytes):
-            self._session_load_from_bytes(filename)
+        if initializers:
+            self._add_initializers(initializers, False)
+        if external_initializers:
+            self._add_initializers(external_initializers, True)
+        if prepacked_weights is not None:
+            self.prepacked_weights = prepacked_weights
+            prepacked = self.prepacked_weights.container
+
+        if isinstance(filename, str) and use_mmap:
+            with open(filename, "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    self._session_load_from_bytes(data, prepacked)
+        elif isinstance(filename, str):
+            session_load_from_file(self.session, filename.encode('utf-8'), prepacked)
+        elif isinstance(filename, (bytes, bytearray, memoryview, mmap.mmap)):
+            self._session_load_from_bytes(filename, prepacked)
         else:
             raise TypeError(f"Unexpected type for filename {type(filename)}.")
 
+        # metadata does not change after the model is loaded
+        self.n_inputs = session_get_input_count(self.session)
+        self.n_outputs = session_get_output_count(self.session)
+        self.input_types = session_get_input_types(self.session)
+        self.output_types = list(session_get_output_types(self.session))
+        self.input_names = [
+            n.c_str().decode("utf-8") for n in session_get_input_names(self.session)
+        ]
+        self.output_names = [
+            n.c_str().decode("utf-8") for n in session_get_output_names(self.session)
+        ]
+        self.input_shapes = [
+            tuple(shape) for shape in session_get_input_shapes(self.session)
+        ]
+        self.output_shapes = [
+            tuple(shape) for shape in session_get_output_shapes(self.session)
+        ]
+
     def __dealloc__(self):
         delete_session(self.session)
 
+    def end_profiling(self):
+        """
+        Stops the profiling enabled with `profiling=True`
+        and returns the name of the json file onnxruntime wrote.
+        """
+        return session_end_profiling(self.session).c_str().decode("utf-8")
+
+    def set_run_tag(self, tag):
+        """
+        Sets the tag onnxruntime adds to the logs of the following runs,
+        the runs already in progress keep the previous tag.
+        """
+        session_set_run_tag(self.session, tag.encode("utf-8"))
+
+    def get_run_stats(self):
+        """
+        Returns the counters updated after every successful run:
+        *run_count*, *bytes_in*, *bytes_out*, *total_latency*, *max_latency*,
+        *p50_latency*, *p90_latency*, *p99_latency*. Latencies are
+        in seconds, the percentiles come from a histogram maintained
+        in C++ and are known within 10%.
+        """
+        return session_get_run_stats(self.session)
+
+    def reset_run_stats(self):
+        "Resets the counters returned by :meth:`get_run_stats`."
+        session_reset_run_stats(self.session)
+
     def get_input_count(self):
         "Returns the number of inputs."
-        return session_get_input_count(self.session)
+        return self.n_inputs
 
     def get_output_count(self):
         "Returns the number of outputs."
-        return session_get_output_count(self.session)
+        return self.n_outputs
+
+    def get_input_names(self):
+        "Returns the input names."
+        return list(self.input_names)
+
+    def get_output_names(self):
+        "Returns the output names."
+        return list(self.output_names)
+
+    def get_input_types(self):
+        "Returns the input element types (onnx), 0 if not a tensor."
+        return [self.input_types[i] for i in range(self.n_inputs)]
+
+    def get_output_types(self):
+        "Returns the output element types (onnx), 0 if not a tensor."
+        return list(self.output_types)
+
+    def get_input_shapes(self):
+        "Returns the input shapes, a dynamic dimension is -1."
+        return list(self.input_shapes)
+
+    def get_output_shapes(self):
+        "Returns the output shapes, a dynamic dimension is -1."
+        return list(self.output_shapes)
+
+    cdef numpy.ndarray _init_input(
+        self, size_t n, object input, OrtShape* shape, OrtCpuValue* value
+    ):
+        """
+        Fills the shape and the value of input *n*, returns the contiguous
+        array holding the data, it must be kept alive until the inference
+        is done. The element type is checked against the model.
+        """
+        cdef numpy.ndarray array = (
+            input if isinstance(input, numpy.ndarray) else numpy.asarray(input)
+        )
+        if not numpy.PyArray_IS_C_CONTIGUOUS(array):
+            array = numpy.ascontiguousarray(array)
+        cdef int typenum = numpy.PyArray_TYPE(array)
+        cdef int elem_type = (
+            _onnx_types_from_typenum[typenum] if 0 <= typenum < 32 else -1
+        )
+        if elem_type == -1:
+            raise TypeError(f"Unsupported type {array.dtype} for input {n}.")
+        if self.input_types[n] > 0 and elem_type != self.input_types[n]:
+            raise TypeError(
+                f"Input {n} ({self.input_names[n]!r}) expects element type "
+                f"{self.input_types[n]} not {elem_type} ({array.dtype})."
+            )
+        shape[0].init(array.ndim)
+        for i in range(array.ndim):
+            shape[0].set(i, array.shape[i])
+        value[0].init(array.size, elem_type, array.data, <void*>0)
+        return array
+
+    cdef list _check_output_buffers(self, out):
+        if len(out) != self.n_outputs:
+            raise ValueError(
+                f"Expecting {self.n_outputs} output buffers not {len(out)}."
+            )
+        for o in out:
+            if not isinstance(o, numpy.ndarray):
+                raise TypeError(f"An output buffer must be an array not {type(o)}.")
+            if not o.flags.c_contiguous or not o.flags.writeable:
+                raise ValueError("An output buffer must be contiguous and writeable.")
+            if o.dtype not in OrtSession._onnx_types:
+                raise TypeError(f"Unexpected type {o.dtype} for an output buffer.")
+        return list(out)
+
+    def bind_outputs(self, outputs):
+        """
+        Binds preallocated arrays to the outputs. Every following call to
+        a *run* method writes the outputs into them instead of allocating
+        new arrays and returns them. Shapes and types must be the expected
+        ones. onnxruntime does not allocate any output anymore.
+
+        :param outputs: list of contiguous arrays, one per output,
+            None to remove the binding
+        """
+        self.bound_outputs = (
+            None if outputs is None else self._check_output_buffers(outputs)
+        )
 
     @cython.boundscheck(False)
     @cython.nonecheck(False)
@@ -250,62 +764,53 @@ cdef class OrtSession:
     def run(
         self,
         list inputs,
+        out=None,
     ):
         """
         Runs the inference.
-        The number of inputs and outputs must not exceed 10.
+
+        :param inputs: list of arrays
+        :param out: list of preallocated arrays receiving the outputs,
+            the arrays bound with :meth:`bind_outputs` if None
+        :return: list of arrays
         """
-        if len(inputs) > 10:
+        cdef size_t n_inputs = len(inputs)
+        if n_inputs > self.n_inputs:
             raise RuntimeError(
-                f"This function does not work with more than "
-                f"10 inputs ({len(inputs)})."
+                f"The model has {self.n_inputs} inputs but {n_inputs} were given."
             )
-        cdef OrtShape shapes[10]
-        cdef OrtCpuValue in_values[10]
-        cdef numpy.ndarray value
+        cdef vector[OrtShape] shapes
+        cdef vector[OrtCpuValue] in_values
+        shapes.resize(n_inputs)
+        in_values.resize(n_inputs)
 
-        values = []
-        for n in range(len(inputs)):
-            shapes[n].init(inputs[n].ndim)
-            for i in range(inputs[n].ndim):
-                shapes[n].set(i, inputs[n].shape[i])
-            value = numpy.ascontiguousarray(inputs[n])
-            in_values[n].init(
-                value.size,
-                OrtSession._onnx_types[value.dtype],
-                value.data,
-                <void*>0
-            )
-            # otherwise the pointer might be destroyed by the garbage collector
-            values.append(value)
+        # otherwise the pointer might be destroyed by the garbage collector
+        values = [None] * n_inputs
+        for n in range(n_inputs):
+            values[n] = self._init_input(n, inputs[n], &shapes[n], &in_values[n])
 
-        cdef OrtShape out_shapes[10]
-        cdef OrtCpuValue out_values[10]
-
-        cdef size_t n_outputs = session_run(
-            self.session, len(inputs), shapes, in_values, 10, out_shapes, out_values)
+        cdef vector[OrtShape] out_shapes
+        cdef vector[OrtCpuValue] out_values
+        out_shapes.resize(self.n_outputs)
+        out_values.resize(self.n_outputs)
+        cdef size_t n_outputs
+        cdef list buffers = (
+            self.bound_outputs if out is None else self._check_output_buffers(out)
+        )
+        if buffers is not None:
+            _init_output_buffers(
+                buffers, self.n_outputs, out_shapes.data(), out_values.data()
+            )
 
-        # onnxruntime does not implement the DLPack protocol through the C API.
-        # DLPack protocol should be used.
+        # values holds a reference on every input until the inference is done
+        with nogil:
+            n_outputs = session_run(
+                self.session, n_inputs, shapes.data(), in_values.data(),
+                self.n_outputs, out_shapes.data(), out_values.data())
 
-        cdef numpy.ndarray[numpy.int64_t, ndim=1] shape
-        cdef numpy.ndarray tout
-        res = list()
-        for i in range(n_outputs):
-            shape = numpy.empty(out_shapes[i].ndim(), dtype=numpy.int64)
-            memcpy(shape.data,
-                   out_shapes[i].dims(),
-                   out_shapes[i].ndim() * 8)  # 8 = sizeof(int64)
-            tout = numpy.empty(
-                shape=shape,
-                dtype=OrtSession._dtypes[out_values[i].elem_type()]
-            )
-            memcpy(tout.data,
-                   out_values[i].data(),
-                   out_values[i].size() * ElementSizeI(out_values[i].elem_type()))
-            out_values[i].free_ort_value()
-            res.append(tout)
-        return res
+        if buffers is not None:
+            return _release_output_buffers(n_outputs, out_values.data(), buffers)
+        return _wrap_ort_values(n_outputs, out_shapes.data(), out_values.data())
 
     @cython.boundscheck(False)
     @cython.nonecheck(False)
@@ -313,51 +818,39 @@ cdef class OrtSession:
     def run_1_1(
         self,
         numpy.ndarray input1,
+        numpy.ndarray out=None,
     ):
         """
         Runs the inference assuming the model has one input and one output.
+
+        :param input1: input
+        :param out: preallocated array receiving the output,
+            the array bound with :meth:`bind_outputs` if None
+        :return: output
         """
+        if self.n_inputs != 1:
+            raise RuntimeError(f"Expecting 1 input not {self.n_inputs}.")
+        if self.n_outputs != 1:
+            raise RuntimeError(f"Expecting 1 output not {self.n_outputs}.")
         cdef OrtShape shapes[1]
-
-        shapes[0].init(input1.ndim)
-        for i in range(input1.ndim):
-            shapes[0].set(i, input1.shape[i])
-
-        cdef numpy.ndarray value1 = numpy.ascontiguousarray(input1)
         cdef OrtCpuValue in_values[1]
-
-        in_values[0].init(
-            value1.size,
-            OrtSession._onnx_types[value1.dtype],
-            value1.data,
-            <void*>0
-        )
+        cdef numpy.ndarray value1 = self._init_input(0, input1, shapes, in_values)
 
         cdef OrtShape out_shapes[1]
         cdef OrtCpuValue out_values[1]
-
-        cdef size_t n_outputs = session_run(
-            self.session, 1, shapes, in_values, 1, out_shapes, out_values)
-        if n_outputs != 1:
-            raise RuntimeError(f"Expecting 1 output not {n_outputs}.")
-
-        # onnxruntime does not implement the DLPack protocol through the C API.
-        # DLPack protocol should be used.
-
-        cdef numpy.ndarray[numpy.int64_t, ndim=1] shape = numpy.empty(
-            out_shapes[0].ndim(), dtype=numpy.int64)
-        memcpy(shape.data,
-               out_shapes[0].dims(),
-               out_shapes[0].ndim() * 8)  # 8 = sizeof(int64)
-        cdef numpy.ndarray tout = numpy.empty(
-            shape=shape,
-            dtype=OrtSession._dtypes[out_values[0].elem_type()]
+        cdef size_t n_outputs
+        cdef list buffers = (
+            self.bound_outputs if out is None else self._check_output_buffers([out])
         )
-        memcpy(tout.data,
-               out_values[0].data(),
-               out_values[0].size() * ElementSizeI(out_values[0].elem_type()))
-        out_values[0].free_ort_value()
-        return tout
+        if buffers is not None:
+            _init_output_buffers(buffers, 1, out_shapes, out_values)
+
+        with nogil:
+            n_outputs = session_run(
+                self.session, 1, shapes, in_values, 1, out_shapes, out_values)
+        if buffers is not None:
+            return _release_output_buffers(n_outputs, out_values, buffers)[0]
+        return _wrap_ort_values(n_outputs, out_shapes, out_values)[0]
 
     @cython.boundscheck(False)
     @cython.nonecheck(False)
@@ -365,62 +858,285 @@ cdef class OrtSession:
     def run_2(
         self,
         numpy.ndarray input1,
-        numpy.ndarray input2
+        numpy.ndarray input2,
+        out=None,
     ):
         """
         Runs the inference assuming the model has two inputs.
+
+        :param input1: first input
+        :param input2: second input
+        :param out: list of preallocated arrays receiving the outputs,
+            the arrays bound with :meth:`bind_outputs` if None
+        :return: list of arrays
         """
+        if self.n_inputs != 2:
+            raise RuntimeError(f"Expecting 2 inputs not {self.n_inputs}.")
         cdef OrtShape shapes[2]
+        cdef OrtCpuValue in_values[2]
+        cdef numpy.ndarray value1 = self._init_input(0, input1, shapes, in_values)
+        cdef numpy.ndarray value2 = self._init_input(
+            1, input2, &shapes[1], &in_values[1]
+        )
 
-        shapes[0].init(input1.ndim)
-        for i in range(input1.ndim):
-            shapes[0].set(i, input1.shape[i])
+        cdef vector[OrtShape] out_shapes
+        cdef vector[OrtCpuValue] out_values
+        out_shapes.resize(self.n_outputs)
+        out_values.resize(self.n_outputs)
+        cdef size_t n_outputs
+        cdef list buffers = (
+            self.bound_outputs if out is None else self._check_output_buffers(out)
+        )
+        if buffers is not None:
+            _init_output_buffers(
+                buffers, self.n_outputs, out_shapes.data(), out_values.data()
+            )
 
-        shapes[1].init(input2.ndim)
-        for i in range(input2.ndim):
-            shapes[1].set(i, input2.shape[i])
+        with nogil:
+            n_outputs = session_run(
+                self.session, 2, shapes, in_values,
+                self.n_outputs, out_shapes.data(), out_values.data())
 
-        cdef numpy.ndarray value1 = numpy.ascontiguousarray(input1)
-        cdef numpy.ndarray value2 = numpy.ascontiguousarray(input2)
+        if buffers is not None:
+            return _release_output_buffers(n_outputs, out_values.data(), buffers)
+        return _wrap_ort_values(n_outputs, out_shapes.data(), out_values.data())
 
-        cdef OrtCpuValue in_values[2]
-        in_values[0].init(
-            value1.size,
-            OrtSession._onnx_types[value1.dtype],
-            value1.data,
-            <void*>0
-        )
-        in_values[1].init(
-            value2.size,
-            OrtSession._onnx_types[value2.dtype],
-            value2.data,
-            <void*>0
+    cdef int _split_output_buffers(
+        self,
+        list buffers,
+        list requests,
+        OrtShape* out_shapes,
+        OrtCpuValue* out_values,
+    ) except -1:
+        """
+        Gives every request a slice of the buffers allocated by the caller.
+        The first dimension of every output of a request is assumed to be
+        the first dimension of its first input, the buffers concatenate
+        the outputs of all requests along the first axis.
+        """
+        cdef numpy.ndarray buffer
+        cdef size_t n_requests = len(requests)
+        cdef size_t n_outputs = self.n_outputs
+        cdef int64_t offset, rows, row_size
+        cdef int elem_type
+        for i in range(n_outputs):
+            buffer = buffers[i]
+            if buffer.ndim == 0:
+                raise ValueError(f"Output buffer {i} must have one dimension at least.")
+            elem_type = OrtSession._onnx_types[buffer.dtype]
+            row_size = 1
+            for d in range(1, buffer.ndim):
+                row_size *= buffer.shape[d]
+            offset = 0
+            for k in range(n_requests):
+                rows = numpy.asarray(requests[k][0]).shape[0]
+                if offset + rows > buffer.shape[0]:
+                    raise ValueError(
+                        f"Output buffer {i} has {buffer.shape[0]} rows, "
+                        f"it is too small for request {k}."
+                    )
+                out_shapes[k * n_outputs + i].init(buffer.ndim)
+                out_shapes[k * n_outputs + i].set(0, rows)
+                for d in range(1, buffer.ndim):
+                    out_shapes[k * n_outputs + i].set(d, buffer.shape[d])
+                out_values[k * n_outputs + i].init(
+                    rows * row_size,
+                    elem_type,
+                    buffer.data + offset * row_size * numpy.PyArray_ITEMSIZE(buffer),
+                    <void*>0
+                )
+                offset += rows
+            if offset != buffer.shape[0]:
+                raise ValueError(
+                    f"Output buffer {i} has {buffer.shape[0]} rows "
+                    f"but the requests produce {offset} rows."
+                )
+        return 0
+
+    @cython.boundscheck(False)
+    @cython.nonecheck(False)
+    @cython.wraparound(False)
+    def run_many(
+        self,
+        list requests,
+        out=None,
+        int n_threads=1,
+    ):
+        """
+        Runs the inference for many requests in a single call.
+        The loop over the requests happens in C++ without the GIL,
+        the conversion of the inputs and outputs is the only part
+        done in python.
+
+        :param requests: list of requests, every request is a list of arrays,
+            all requests must have the same number of inputs
+        :param out: list of preallocated arrays, one per output,
+            every array concatenates the outputs of all requests
+            along the first axis, the first dimension of the outputs
+            of a request is assumed to be the first dimension of its first input
+        :param n_threads: number of threads running the requests,
+            requests are run one after another if it is 1
+        :return: list of list of arrays, one list per request, or *out*
+            if it is specified
+        """
+        cdef size_t n_requests = len(requests)
+        if n_requests == 0:
+            return [] if out is None else list(out)
+        cdef size_t n_inputs = len(requests[0])
+        if n_inputs > self.n_inputs:
+            raise RuntimeError(
+                f"The model has {self.n_inputs} inputs but {n_inputs} were given."
+            )
+        cdef vector[OrtShape] shapes
+        cdef vector[OrtCpuValue] in_values
+        shapes.resize(n_requests * n_inputs)
+        in_values.resize(n_requests * n_inputs)
+
+        # values holds a reference on every input until the inference is done
+        values = []
+        cdef size_t k, n, pos
+        for k in range(n_requests):
+            inputs = requests[k]
+            if len(inputs) != n_inputs:
+                raise ValueError(
+                    f"Request {k} has {len(inputs)} inputs, "
+                    f"the first one has {n_inputs}."
+                )
+            for n in range(n_inputs):
+                pos = k * n_inputs + n
+                values.append(
+                    self._init_input(n, inputs[n], &shapes[pos], &in_values[pos])
+                )
+
+        cdef size_t n_outputs = self.n_outputs
+        cdef vector[OrtShape] out_shapes
+        cdef vector[OrtCpuValue] out_values
+        out_shapes.resize(n_requests * n_outputs)
+        out_values.resize(n_requests * n_outputs)
+        cdef list buffers = None
+        if out is not None:
+            buffers = self._check_output_buffers(out)
+            self._split_output_buffers(
+                buffers, requests, out_shapes.data(), out_values.data()
+            )
+
+        with nogil:
+            session_run_many(
+                self.session, n_requests, n_inputs, shapes.data(), in_values.data(),
+                n_outputs, out_shapes.data(), out_values.data(), n_threads)
+
+        if buffers is not None:
+            return _release_output_buffers(
+                n_requests * n_outputs, out_values.data(), buffers
+            )
+        res = _wrap_ort_values(
+            n_requests * n_outputs, out_shapes.data(), out_values.data()
         )
+        return [res[k * n_outputs: (k + 1) * n_outputs] for k in range(n_requests)]
+
+    def run_stream(
+        self,
+        iterable,
+        int batch_size=16,
+        int n_threads=1,
+    ):
+        """
+        Runs the inference for every request produced by an iterable
+        and yields the outputs in the same order. Requests are gathered
+        by *batch_size* and given to :meth:`run_many`.
+
+        :param iterable: iterable over requests, every request is a list of arrays
+        :param batch_size: number of requests sent to :meth:`run_many` at once
+        :param n_threads: number of threads running the requests
+        :return: generator over list of arrays, one list per request
+        """
+        if batch_size <= 0:
+            raise ValueError(f"batch_size must be positive not {batch_size}.")
+        requests = []
+        for inputs in iterable:
+            requests.append(list(inputs))
+            if len(requests) >= batch_size:
+                yield from self.run_many(requests, n_threads=n_threads)
+                requests = []
+        if requests:
+            yield from self.run_many(requests, n_threads=n_threads)
 
-        cdef OrtShape out_shapes[10]
-        cdef OrtCpuValue out_values[10]
+    def run_async(
+        self,
+        list inputs,
+        out=None,
+    ):
+        """
+        Runs the inference on a pool of native threads and returns
+        an awaitable. The call returns immediately, no python thread
+        is involved while the inference runs, the running event loop
+        is notified when the outputs are ready.
 
-        cdef size_t n_outputs = session_run(
-            self.session, 2, shapes, in_values, 10, out_shapes, out_values)
+        :param inputs: list of arrays
+        :param out: list of preallocated arrays receiving the outputs,
+            the arrays bound with :meth:`bind_outputs` if None
+        :return: :class:`asyncio.Future` whose result is the list of outputs
 
-        # onnxruntime does not implement the DLPack protocol through the C API.
-        # DLPack protocol should be used.
+        It must be called from a coroutine:
 
-        cdef numpy.ndarray[numpy.int64_t, ndim=1] shape
-        cdef numpy.ndarray tout
-        res = list()
-        for i in range(n_outputs):
-            shape = numpy.empty(out_shapes[i].ndim(), dtype=numpy.int64)
-            memcpy(shape.data,
-                   out_shapes[i].dims(),
-                   out_shapes[i].ndim() * 8)  # 8 = sizeof(int64)
-            tout = numpy.empty(
-                shape=shape,
-                dtype=OrtSession._dtypes[out_values[i].elem_type()]
+        ::
+
+            outputs = await session.run_async([x])
+        """
+        loop = asyncio.get_running_loop()
+        cdef size_t n_inputs = len(inputs)
+        if n_inputs > self.n_inputs:
+            raise RuntimeError(
+                f"The model has {self.n_inputs} inputs but {n_inputs} were given."
             )
-            memcpy(tout.data,
-                   out_values[i].data(),
-                   out_values[i].size() * ElementSizeI(out_values[i].elem_type()))
-            out_values[i].free_ort_value()
-            res.append(tout)
-        return res
+        cdef _AsyncRun run = _AsyncRun.__new__(_AsyncRun)
+        run.session = self
+        run.loop = loop
+        run.future = loop.create_future()
+        run.n_outputs = self.n_outputs
+        run.shapes.resize(n_inputs)
+        run.in_values.resize(n_inputs)
+        run.values = [None] * n_inputs
+        for n in range(n_inputs):
+            run.values[n] = self._init_input(
+                n, inputs[n], &run.shapes[n], &run.in_values[n]
+            )
+        run.out_shapes.resize(run.n_outputs)
+        run.out_values.resize(run.n_outputs)
+        run.buffers = (
+            self.bound_outputs if out is None else self._check_output_buffers(out)
+        )
+        if run.buffers is not None:
+            _init_output_buffers(
+                run.buffers, run.n_outputs,
+                run.out_shapes.data(), run.out_values.data()
+            )
+
+        # the native thread owns a reference on run until it is done
+        Py_INCREF(run)
+        try:
+            session_run_async(
+                self.session, n_inputs, run.shapes.data(), run.in_values.data(),
+                run.n_outputs, run.out_shapes.data(), run.out_values.data(),
+                _run_async_done, <void*>run)
+        except Exception:
+            Py_DECREF(run)
+            raise
+        return run.future
+
+
+# Converts a numpy type number into an onnx element type, -1 if not supported.
+cdef int _onnx_types_from_typenum[32]
+
+
+def _init_onnx_types_from_typenum():
+    for typenum in range(32):
+        _onnx_types_from_typenum[typenum] = -1
+        try:
+            dtype = numpy.PyArray_DescrFromType(typenum)
+        except (TypeError, ValueError):
+            continue
+        _onnx_types_from_typenum[typenum] = OrtSession._onnx_types.get(dtype, -1)
+
+
+_init_onnx_types_from_typenum()
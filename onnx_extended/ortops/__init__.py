@@ -1,6 +1,8 @@
+import ctypes
+import json
 import os
 import platform
-from typing import List
+from typing import Any, Dict, List
 
 _ort_ext_libs_pathes = {}
 
@@ -34,3 +36,74 @@ def _get_ort_ext_libs(path: str) -> List[str]:
             )
         _ort_ext_libs_pathes[path] = res
     return _ort_ext_libs_pathes[path]
+
+
+_ort_ext_libs_handles = {}
+
+
+def _load_ort_ext_lib(lib: str) -> ctypes.CDLL:
+    if lib not in _ort_ext_libs_handles:
+        handle = ctypes.CDLL(lib)
+        handle.OrtOpsGetKernelCounters.argtypes = [ctypes.c_char_p, ctypes.c_int64]
+        handle.OrtOpsGetKernelCounters.restype = ctypes.c_int64
+        handle.OrtOpsResetKernelCounters.argtypes = []
+        handle.OrtOpsResetKernelCounters.restype = None
+        handle.OrtOpsEnableKernelCounters.argtypes = [ctypes.c_int64]
+        handle.OrtOpsEnableKernelCounters.restype = None
+        handle.OrtOpsKernelCountersEnabled.argtypes = []
+        handle.OrtOpsKernelCountersEnabled.restype = ctypes.c_int64
+        _ort_ext_libs_handles[lib] = handle
+    return _ort_ext_libs_handles[lib]
+
+
+def enable_kernel_counters(lib: str, enable: bool = True) -> bool:
+    """
+    Enables or disables the counters the kernels of a library update
+    (number of calls, processed bytes, time spent in every phase).
+    They are disabled by default unless environment variable
+    ``ONNX_EXTENDED_KERNEL_COUNTERS=1`` is set before the library is loaded.
+
+    :param lib: library path, one returned by `get_ort_ext_libs`
+    :param enable: enables or disables
+    :return: previous state
+    """
+    handle = _load_ort_ext_lib(lib)
+    previous = bool(handle.OrtOpsKernelCountersEnabled())
+    handle.OrtOpsEnableKernelCounters(1 if enable else 0)
+    return previous
+
+
+def reset_kernel_counters(lib: str):
+    """
+    Sets all the counters of a library to zero.
+
+    :param lib: library path, one returned by `get_ort_ext_libs`
+    """
+    _load_ort_ext_lib(lib).OrtOpsResetKernelCounters()
+
+
+def get_kernel_counters(lib: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Returns the counters of every kernel a library created.
+    The library must be the one registered in the
+    :epkg:`onnxruntime` session, the counters are stored in it.
+
+    :param lib: library path, one returned by `get_ort_ext_libs`
+    :return: dictionary ``{op_type: {"calls": int, "bytes": int,
+        "phases": {phase: {"calls": int, "time": float}}}}``,
+        time is in seconds
+    """
+    handle = _load_ort_ext_lib(lib)
+    size = handle.OrtOpsGetKernelCounters(None, 0)
+    while True:
+        buffer = ctypes.create_string_buffer(size)
+        needed = handle.OrtOpsGetKernelCounters(buffer, size)
+        if needed <= size:
+            break
+        # A kernel was created in the meantime.
+        size = needed
+    counters = json.loads(buffer.value.decode("utf-8"))
+    for values in counters.values():
+        for phase in values["phases"].values():
+            phase["time"] = phase.pop("ns") * 1e-9
+    return counters
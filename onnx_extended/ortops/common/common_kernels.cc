@@ -0,0 +1,74 @@
+#include "common_kernels.h"
+#include <cstdlib>
+#include <cstring>
+
+namespace ortops {
+
+// Every library compiles this file, the counters are not shared
+// between libraries. The mutex only protects the registration,
+// the kernels update their counters without any lock.
+struct KernelCountersRegistry {
+  KernelCountersRegistry() {
+    const char *env = std::getenv("ONNX_EXTENDED_KERNEL_COUNTERS");
+    enabled = env != nullptr && std::strcmp(env, "1") == 0;
+  }
+
+  std::atomic<bool> enabled;
+  std::mutex mutex;
+  // Ordered by registration, the pointers remain valid.
+  std::vector<std::unique_ptr<KernelCounters>> counters;
+};
+
+static KernelCountersRegistry registry;
+
+bool KernelCountersEnabled() {
+  return registry.enabled.load(std::memory_order_relaxed);
+}
+
+KernelCounters *GetKernelCounters(const std::string &name,
+                                  const std::vector<std::string> &phases) {
+  std::lock_guard<std::mutex> lock(registry.mutex);
+  for (auto &c : registry.counters) {
+    if (c->name() == name)
+      return c.get();
+  }
+  registry.counters.push_back(std::make_unique<KernelCounters>(name, phases));
+  return registry.counters.back().get();
+}
+
+} // namespace ortops
+
+int64_t OrtOpsGetKernelCounters(char *buffer, int64_t size) {
+  std::string json;
+  {
+    std::lock_guard<std::mutex> lock(ortops::registry.mutex);
+    std::ostringstream ss;
+    ss << "{";
+    for (size_t i = 0; i < ortops::registry.counters.size(); ++i) {
+      if (i > 0)
+        ss << ", ";
+      ss << "\"" << ortops::registry.counters[i]->name()
+         << "\": " << ortops::registry.counters[i]->ToJson();
+    }
+    ss << "}";
+    json = ss.str();
+  }
+  int64_t needed = static_cast<int64_t>(json.size()) + 1;
+  if (buffer != nullptr && size >= needed)
+    std::memcpy(buffer, json.c_str(), needed);
+  return needed;
+}
+
+void OrtOpsResetKernelCounters() {
+  std::lock_guard<std::mutex> lock(ortops::registry.mutex);
+  for (auto &c : ortops::registry.counters)
+    c->Reset();
+}
+
+void OrtOpsEnableKernelCounters(int64_t enable) {
+  ortops::registry.enabled = enable != 0;
+}
+
+int64_t OrtOpsKernelCountersEnabled() {
+  return ortops::KernelCountersEnabled() ? 1 : 0;
+}
@@ -5,6 +5,12 @@
 #include <onnxruntime_c_api.h>
 #include <onnxruntime_cxx_api.h>
 #undef ORT_API_MANUAL_INIT
+#include <atomic>
+#include <chrono>
+#include <list>
+#include <memory>
+#include <mutex>
+#include <unordered_map>
 
 namespace ortops {
 
@@ -94,6 +100,55 @@ inline T KernelInfoGetOptionalAttribute(const OrtApi &api,
   return default_value;
 }
 
+template <typename T>
+inline OrtStatus *KernelInfoGetAttributeArrayApi(const OrtApi &api,
+                                                 const OrtKernelInfo *info,
+                                                 const char *name, T *out,
+                                                 size_t *size);
+
+template <>
+inline OrtStatus *KernelInfoGetAttributeArrayApi<int64_t>(
+    const OrtApi &api, const OrtKernelInfo *info, const char *name,
+    int64_t *out, size_t *size) {
+  return api.KernelInfoGetAttributeArray_int64(info, name, out, size);
+}
+
+template <>
+inline OrtStatus *
+KernelInfoGetAttributeArrayApi<float>(const OrtApi &api,
+                                      const OrtKernelInfo *info,
+                                      const char *name, float *out,
+                                      size_t *size) {
+  return api.KernelInfoGetAttributeArray_float(info, name, out, size);
+}
+
+// Returns an empty vector if the attribute is missing.
+template <typename T>
+inline std::vector<T>
+KernelInfoGetOptionalAttributeArray(const OrtApi &api,
+                                    const OrtKernelInfo *info,
+                                    const char *name) {
+  size_t size = 0;
+  std::vector<T> out;
+  OrtStatus *status =
+      KernelInfoGetAttributeArrayApi<T>(api, info, name, nullptr, &size);
+
+  if (status != nullptr) {
+    OrtErrorCode code = api.GetErrorCode(status);
+    if (code == ORT_FAIL) {
+      api.ReleaseStatus(status);
+      return out;
+    }
+    ThrowOnError(api, status);
+  }
+  if (size == 0)
+    return out;
+  out.resize(size);
+  ThrowOnError(api, KernelInfoGetAttributeArrayApi<T>(api, info, name,
+                                                      out.data(), &size));
+  return out;
+}
+
 inline bool KernelInfoGetOptionalAttributeInt64AsBool(const OrtApi &api,
                                                       const OrtKernelInfo *info,
                                                       const char *name,
@@ -103,4 +158,244 @@ inline bool KernelInfoGetOptionalAttributeInt64AsBool(const OrtApi &api,
   return value == 1;
 }
 
+// Identifies the inputs of a call to a kernel: the number of inputs,
+// the element type, the rank and the dimensions of every input.
+struct ShapeKey {
+  std::vector<int64_t> values;
+
+  bool operator==(const ShapeKey &other) const {
+    return values == other.values;
+  }
+
+  struct hash_fn {
+    std::size_t operator()(const ShapeKey &key) const {
+      std::size_t h = key.values.size();
+      for (auto v : key.values)
+        h ^= std::hash<int64_t>()(v) + 0x9e3779b9 + (h << 6) + (h >> 2);
+      return h;
+    }
+  };
+};
+
+inline ShapeKey MakeShapeKey(const Ort::KernelContext &ctx) {
+  ShapeKey key;
+  size_t n_inputs = ctx.GetInputCount();
+  key.values.push_back(static_cast<int64_t>(n_inputs));
+  for (size_t i = 0; i < n_inputs; ++i) {
+    Ort::ConstValue value = ctx.GetInput(i);
+    if (static_cast<const OrtValue *>(value) == nullptr) {
+      // missing optional input
+      key.values.push_back(-1);
+      continue;
+    }
+    Ort::TensorTypeAndShapeInfo info = value.GetTensorTypeAndShapeInfo();
+    std::vector<int64_t> shape = info.GetShape();
+    key.values.push_back(static_cast<int64_t>(info.GetElementType()));
+    key.values.push_back(static_cast<int64_t>(shape.size()));
+    key.values.insert(key.values.end(), shape.begin(), shape.end());
+  }
+  return key;
+}
+
+// Stores the plans a kernel computes for the shapes it receives
+// (dimensions, strides, descriptors, scratch buffers...) so that
+// the setup is done once per shape. The least recently used plan is
+// evicted when the cache is full. A plan is shared by every call with the
+// same shapes, calls may happen at the same time, a plan is not modified
+// after it is created unless it holds its own mutex.
+template <typename Plan> class PlanCache {
+public:
+  explicit PlanCache(size_t capacity = 8)
+      : capacity_(capacity > 0 ? capacity : 1), hits_(0), misses_(0) {}
+
+  // Returns the plan for key, make_plan() creates it if it is not cached.
+  template <typename MakePlan>
+  std::shared_ptr<Plan> Get(const ShapeKey &key, MakePlan make_plan) {
+    {
+      std::lock_guard<std::mutex> lock(mutex_);
+      auto it = index_.find(key);
+      if (it != index_.end()) {
+        ++hits_;
+        items_.splice(items_.begin(), items_, it->second);
+        return it->second->second;
+      }
+      ++misses_;
+    }
+    // The plan is created outside the lock, another thread may create
+    // the same plan at the same time, the first one is kept.
+    std::shared_ptr<Plan> plan = make_plan();
+    std::lock_guard<std::mutex> lock(mutex_);
+    auto it = index_.find(key);
+    if (it != index_.end()) {
+      items_.splice(items_.begin(), items_, it->second);
+      return it->second->second;
+    }
+    items_.emplace_front(key, plan);
+    index_[key] = items_.begin();
+    while (items_.size() > capacity_) {
+      // The plan is destroyed when the last call using it ends.
+      index_.erase(items_.back().first);
+      items_.pop_back();
+    }
+    return plan;
+  }
+
+  size_t size() const {
+    std::lock_guard<std::mutex> lock(mutex_);
+    return items_.size();
+  }
+  int64_t hits() const {
+    std::lock_guard<std::mutex> lock(mutex_);
+    return hits_;
+  }
+  int64_t misses() const {
+    std::lock_guard<std::mutex> lock(mutex_);
+    return misses_;
+  }
+
+private:
+  typedef std::list<std::pair<ShapeKey, std::shared_ptr<Plan>>> list_type;
+  size_t capacity_;
+  int64_t hits_;
+  int64_t misses_;
+  mutable std::mutex mutex_;
+  // The most recently used plan is the first one.
+  list_type items_;
+  std::unordered_map<ShapeKey, typename list_type::iterator, ShapeKey::hash_fn>
+      index_;
+};
+
+////////////////////////////////////////
+// kernel counters
+////////////////////////////////////////
+
+// Call counts, bytes and time spent in every phase of a kernel.
+// They are only updated when the counters are enabled, with function
+// OrtOpsEnableKernelCounters exported by the library or with environment
+// variable ONNX_EXTENDED_KERNEL_COUNTERS=1. All kernels with the same
+// name share the same counters, the updates are atomic.
+class KernelCounters {
+public:
+  KernelCounters(const std::string &name,
+                 const std::vector<std::string> &phases)
+      : name_(name), phases_(phases), calls_(0), bytes_(0),
+        phase_calls_(new std::atomic<int64_t>[phases.size()]),
+        phase_ns_(new std::atomic<int64_t>[phases.size()]) {
+    Reset();
+  }
+
+  inline void AddCall(int64_t bytes) {
+    calls_.fetch_add(1, std::memory_order_relaxed);
+    bytes_.fetch_add(bytes, std::memory_order_relaxed);
+  }
+
+  inline void AddPhase(size_t phase, int64_t ns) {
+    phase_calls_[phase].fetch_add(1, std::memory_order_relaxed);
+    phase_ns_[phase].fetch_add(ns, std::memory_order_relaxed);
+  }
+
+  void Reset() {
+    calls_ = 0;
+    bytes_ = 0;
+    for (size_t i = 0; i < phases_.size(); ++i) {
+      phase_calls_[i] = 0;
+      phase_ns_[i] = 0;
+    }
+  }
+
+  // {"calls": ..., "bytes": ..., "phases": {name: {"calls": ..., "ns": ...}}}
+  std::string ToJson() const {
+    std::ostringstream ss;
+    ss << "{\"calls\": " << calls_.load() << ", \"bytes\": " << bytes_.load()
+       << ", \"phases\": {";
+    for (size_t i = 0; i < phases_.size(); ++i) {
+      if (i > 0)
+        ss << ", ";
+      ss << "\"" << phases_[i] << "\": {\"calls\": " << phase_calls_[i].load()
+         << ", \"ns\": " << phase_ns_[i].load() << "}";
+    }
+    ss << "}}";
+    return ss.str();
+  }
+
+  const std::string &name() const { return name_; }
+
+private:
+  std::string name_;
+  std::vector<std::string> phases_;
+  std::atomic<int64_t> calls_;
+  std::atomic<int64_t> bytes_;
+  std::unique_ptr<std::atomic<int64_t>[]> phase_calls_;
+  std::unique_ptr<std::atomic<int64_t>[]> phase_ns_;
+};
+
+// Implemented in common_kernels.cc, every library has its own counters.
+bool KernelCountersEnabled();
+
+// Returns the counters of kernel name, they are created by the first
+// call and remain valid until the library is unloaded.
+KernelCounters *GetKernelCounters(const std::string &name,
+                                  const std::vector<std::string> &phases);
+
+// Counts one call processing bytes if the counters are enabled.
+inline void CountKernelCall(KernelCounters *counters, int64_t bytes) {
+  if (counters != nullptr && KernelCountersEnabled())
+    counters->AddCall(bytes);
+}
+
+// Measures the time spent in consecutive phases of a kernel,
+// Next(phase) ends the current phase and starts a new one.
+// Nothing is measured if the counters are disabled.
+class KernelPhaseTimer {
+public:
+  KernelPhaseTimer(KernelCounters *counters, size_t phase)
+      : counters_(counters != nullptr && KernelCountersEnabled() ? counters
+                                                                 : nullptr),
+        phase_(phase) {
+    if (counters_ != nullptr)
+      begin_ = std::chrono::steady_clock::now();
+  }
+
+  ~KernelPhaseTimer() { Stop(); }
+
+  void Next(size_t phase) {
+    if (counters_ == nullptr)
+      return;
+    auto now = std::chrono::steady_clock::now();
+    counters_->AddPhase(
+        phase_,
+        std::chrono::duration_cast<std::chrono::nanoseconds>(now - begin_)
+            .count());
+    phase_ = phase;
+    begin_ = now;
+  }
+
+  void Stop() {
+    if (counters_ == nullptr)
+      return;
+    Next(phase_);
+    counters_ = nullptr;
+  }
+
+private:
+  KernelCounters *counters_;
+  size_t phase_;
+  std::chrono::steady_clock::time_point begin_;
+};
+
 } // namespace ortops
+
+// Functions exported by every library to read the counters,
+// see onnx_extended.ortops.get_kernel_counters.
+extern "C" {
+
+// Writes the counters of all kernels as a json string into buffer
+// if size is big enough, returns the size needed including the final '\0'.
+ORT_EXPORT int64_t OrtOpsGetKernelCounters(char *buffer, int64_t size);
+
+ORT_EXPORT void OrtOpsResetKernelCounters();
+
+ORT_EXPORT void OrtOpsEnableKernelCounters(int64_t enable);
+
+ORT_EXPORT int64_t OrtOpsKernelCountersEnabled();
+}
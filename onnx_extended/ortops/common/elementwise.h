@@ -0,0 +1,547 @@
+#pragma once
+
+// Elementwise binary kernels with numpy broadcasting. The loops are
+// compiled for several instruction sets (the default flags, AVX2, AVX-512)
+// and the best one supported by the CPU is chosen at runtime
+// (see cpu_features.h). Big tensors are split into chunks processed
+// by the threads of the library (see thread_pool.h).
+
+#include "cpu_features.h"
+#include "helpers.h"
+#include "thread_pool.h"
+#include <algorithm>
+#include <cmath>
+#include <cstring>
+#include <stdint.h>
+#include <vector>
+
+namespace ortops {
+
+////////////////////////////////////////
+// functions
+////////////////////////////////////////
+
+template <typename T> inline T Sigmoid(T x) {
+  return static_cast<T>(1) / (static_cast<T>(1) + std::exp(-x));
+}
+
+// X + Y + cst
+template <typename T> struct AddCstFunction {
+  T cst;
+  explicit AddCstFunction(T c = 0) : cst(c) {}
+  inline T operator()(T a, T b) const { return a + b + cst; }
+};
+
+// Relu(X + Y)
+template <typename T> struct AddReluFunction {
+  inline T operator()(T a, T b) const {
+    T v = a + b;
+    return v > 0 ? v : 0;
+  }
+};
+
+// Sigmoid(X * Y)
+template <typename T> struct MulSigmoidFunction {
+  inline T operator()(T a, T b) const { return Sigmoid(a * b); }
+};
+
+////////////////////////////////////////
+// float 16
+////////////////////////////////////////
+
+inline float HalfToFloat(uint16_t h) {
+  uint32_t sign = static_cast<uint32_t>(h & 0x8000) << 16;
+  uint32_t exponent = (h >> 10) & 0x1f;
+  uint32_t mantissa = h & 0x3ff;
+  uint32_t bits;
+  if (exponent == 0x1f) {
+    // inf or nan
+    bits = sign | 0x7f800000 | (mantissa << 13);
+  } else if (exponent == 0) {
+    if (mantissa == 0) {
+      bits = sign;
+    } else {
+      // denormal number
+      float value = std::ldexp(static_cast<float>(mantissa), -24);
+      return sign ? -value : value;
+    }
+  } else {
+    bits = sign | ((exponent + 112) << 23) | (mantissa << 13);
+  }
+  float value;
+  std::memcpy(&value, &bits, sizeof(float));
+  return value;
+}
+
+// Rounds to the nearest value, ties to even.
+inline uint16_t FloatToHalf(float f) {
+  uint32_t bits;
+  std::memcpy(&bits, &f, sizeof(float));
+  uint16_t sign = static_cast<uint16_t>((bits >> 16) & 0x8000);
+  uint32_t abs_bits = bits & 0x7fffffff;
+  if (abs_bits >= 0x7f800000) {
+    // inf or nan
+    return sign | 0x7c00 | (abs_bits > 0x7f800000 ? 0x200 : 0);
+  }
+  if (abs_bits >= 0x477ff000) {
+    // overflow
+    return sign | 0x7c00;
+  }
+  if (abs_bits < 0x38800000) {
+    // denormal number or zero, the rounding is done by the addition
+    float value;
+    std::memcpy(&value, &abs_bits, sizeof(float));
+    value += 0.5f;
+    uint32_t rounded;
+    std::memcpy(&rounded, &value, sizeof(float));
+    return sign | static_cast<uint16_t>(rounded - 0x3f000000);
+  }
+  uint32_t odd = (abs_bits >> 13) & 1;
+  abs_bits += 0xc8000fff + odd; // rebias the exponent and round
+  return sign | static_cast<uint16_t>(abs_bits >> 13);
+}
+
+////////////////////////////////////////
+// runtime dispatch
+////////////////////////////////////////
+
+using cpu_features::CpuIsa;
+
+// How the pointers move in a contiguous segment.
+enum class SegmentMode {
+  VectorVector = 0, // z[i] = f(x[i], y[i])
+  ScalarVector = 1, // z[i] = f(x[0], y[i])
+  VectorScalar = 2, // z[i] = f(x[i], y[0])
+};
+
+#define ORTOPS_ELEMENTWISE_LOOP_BODY                                           \
+  switch (mode) {                                                              \
+  case SegmentMode::VectorVector:                                              \
+    for (int64_t i = 0; i < n; ++i)                                            \
+      z[i] = fn(x[i], y[i]);                                                   \
+    break;                                                                     \
+  case SegmentMode::ScalarVector: {                                            \
+    T a = x[0];                                                                \
+    for (int64_t i = 0; i < n; ++i)                                            \
+      z[i] = fn(a, y[i]);                                                      \
+  } break;                                                                     \
+  case SegmentMode::VectorScalar: {                                            \
+    T b = y[0];                                                                \
+    for (int64_t i = 0; i < n; ++i)                                            \
+      z[i] = fn(x[i], b);                                                      \
+  } break;                                                                     \
+  }
+
+template <typename T, typename Fn>
+void ElementwiseLoopDefault(const Fn &fn, SegmentMode mode,
+                            const T *__restrict x, const T *__restrict y,
+                            T *__restrict z, int64_t n) {
+  ORTOPS_ELEMENTWISE_LOOP_BODY
+}
+
+#if defined(ONNX_EXTENDED_CPU_DISPATCH)
+
+template <typename T, typename Fn>
+ONNX_EXTENDED_TARGET_AVX2 void
+ElementwiseLoopAvx2(const Fn &fn, SegmentMode mode, const T *__restrict x,
+                    const T *__restrict y, T *__restrict z, int64_t n) {
+  ORTOPS_ELEMENTWISE_LOOP_BODY
+}
+
+template <typename T, typename Fn>
+ONNX_EXTENDED_TARGET_AVX512 void
+ElementwiseLoopAvx512(const Fn &fn, SegmentMode mode, const T *__restrict x,
+                      const T *__restrict y, T *__restrict z, int64_t n) {
+  ORTOPS_ELEMENTWISE_LOOP_BODY
+}
+
+#endif
+
+#undef ORTOPS_ELEMENTWISE_LOOP_BODY
+
+#if defined(ONNX_EXTENDED_CPU_DISPATCH)
+
+// The compiler does not vectorize std::exp, the following loops
+// compute Sigmoid(X * Y) with intrinsics. exp follows the implementation
+// of cephes, x is clamped, -x * log2(e) = n + r, exp(x) = 2^n exp(r ln 2).
+
+ONNX_EXTENDED_TARGET_AVX2 inline __m256 ExpAvx2(__m256 x) {
+  // the second operand is returned if one of them is nan
+  x = _mm256_min_ps(_mm256_set1_ps(88.3762626647949f),
+                    _mm256_max_ps(_mm256_set1_ps(-88.3762626647949f), x));
+  __m256 fx = _mm256_floor_ps(_mm256_fmadd_ps(
+      x, _mm256_set1_ps(1.44269504088896341f), _mm256_set1_ps(0.5f)));
+  x = _mm256_fnmadd_ps(fx, _mm256_set1_ps(0.693359375f), x);
+  x = _mm256_fnmadd_ps(fx, _mm256_set1_ps(-2.12194440e-4f), x);
+  __m256 y = _mm256_set1_ps(1.9875691500E-4f);
+  y = _mm256_fmadd_ps(y, x, _mm256_set1_ps(1.3981999507E-3f));
+  y = _mm256_fmadd_ps(y, x, _mm256_set1_ps(8.3334519073E-3f));
+  y = _mm256_fmadd_ps(y, x, _mm256_set1_ps(4.1665795894E-2f));
+  y = _mm256_fmadd_ps(y, x, _mm256_set1_ps(1.6666665459E-1f));
+  y = _mm256_fmadd_ps(y, x, _mm256_set1_ps(5.0000001201E-1f));
+  y = _mm256_add_ps(_mm256_fmadd_ps(y, _mm256_mul_ps(x, x), x),
+                    _mm256_set1_ps(1.0f));
+  __m256i n = _mm256_slli_epi32(
+      _mm256_add_epi32(_mm256_cvttps_epi32(fx), _mm256_set1_epi32(127)), 23);
+  return _mm256_mul_ps(y, _mm256_castsi256_ps(n));
+}
+
+ONNX_EXTENDED_TARGET_AVX2 inline void
+ElementwiseLoopAvx2(const MulSigmoidFunction<float> &fn, SegmentMode mode,
+                    const float *x, const float *y, float *z, int64_t n) {
+  int64_t sx = mode == SegmentMode::ScalarVector ? 0 : 1;
+  int64_t sy = mode == SegmentMode::VectorScalar ? 0 : 1;
+  const __m256 one = _mm256_set1_ps(1.0f);
+  int64_t i = 0;
+  for (; i + 8 <= n; i += 8) {
+    __m256 a = sx ? _mm256_loadu_ps(x + i) : _mm256_set1_ps(x[0]);
+    __m256 b = sy ? _mm256_loadu_ps(y + i) : _mm256_set1_ps(y[0]);
+    __m256 e = ExpAvx2(_mm256_sub_ps(_mm256_setzero_ps(), _mm256_mul_ps(a, b)));
+    _mm256_storeu_ps(z + i, _mm256_div_ps(one, _mm256_add_ps(one, e)));
+  }
+  for (; i < n; ++i)
+    z[i] = fn(x[i * sx], y[i * sy]);
+}
+
+ONNX_EXTENDED_TARGET_AVX512 inline __m512 ExpAvx512(__m512 x) {
+  // the second operand is returned if one of them is nan
+  x = _mm512_min_ps(_mm512_set1_ps(88.3762626647949f),
+                    _mm512_max_ps(_mm512_set1_ps(-88.3762626647949f), x));
+  __m512 fx = _mm512_roundscale_ps(
+      _mm512_fmadd_ps(x, _mm512_set1_ps(1.44269504088896341f),
+                      _mm512_set1_ps(0.5f)),
+      _MM_FROUND_TO_NEG_INF | _MM_FROUND_NO_EXC);
+  x = _mm512_fnmadd_ps(fx, _mm512_set1_ps(0.693359375f), x);
+  x = _mm512_fnmadd_ps(fx, _mm512_set1_ps(-2.12194440e-4f), x);
+  __m512 y = _mm512_set1_ps(1.9875691500E-4f);
+  y = _mm512_fmadd_ps(y, x, _mm512_set1_ps(1.3981999507E-3f));
+  y = _mm512_fmadd_ps(y, x, _mm512_set1_ps(8.3334519073E-3f));
+  y = _mm512_fmadd_ps(y, x, _mm512_set1_ps(4.1665795894E-2f));
+  y = _mm512_fmadd_ps(y, x, _mm512_set1_ps(1.6666665459E-1f));
+  y = _mm512_fmadd_ps(y, x, _mm512_set1_ps(5.0000001201E-1f));
+  y = _mm512_add_ps(_mm512_fmadd_ps(y, _mm512_mul_ps(x, x), x),
+                    _mm512_set1_ps(1.0f));
+  __m512i n = _mm512_slli_epi32(
+      _mm512_add_epi32(_mm512_cvttps_epi32(fx), _mm512_set1_epi32(127)), 23);
+  return _mm512_mul_ps(y, _mm512_castsi512_ps(n));
+}
+
+ONNX_EXTENDED_TARGET_AVX512 inline void
+ElementwiseLoopAvx512(const MulSigmoidFunction<float> &fn, SegmentMode mode,
+                      const float *x, const float *y, float *z, int64_t n) {
+  int64_t sx = mode == SegmentMode::ScalarVector ? 0 : 1;
+  int64_t sy = mode == SegmentMode::VectorScalar ? 0 : 1;
+  const __m512 one = _mm512_set1_ps(1.0f);
+  int64_t i = 0;
+  for (; i + 16 <= n; i += 16) {
+    __m512 a = sx ? _mm512_loadu_ps(x + i) : _mm512_set1_ps(x[0]);
+    __m512 b = sy ? _mm512_loadu_ps(y + i) : _mm512_set1_ps(y[0]);
+    __m512 e = ExpAvx512(_mm512_sub_ps(_mm512_setzero_ps(), _mm512_mul_ps(a, b)));
+    _mm512_storeu_ps(z + i, _mm512_div_ps(one, _mm512_add_ps(one, e)));
+  }
+  for (; i < n; ++i)
+    z[i] = fn(x[i * sx], y[i * sy]);
+}
+
+#endif
+
+template <typename T, typename Fn>
+inline void ElementwiseLoop(CpuIsa isa, const Fn &fn, SegmentMode mode,
+                            const T *x, const T *y, T *z, int64_t n) {
+#if defined(ONNX_EXTENDED_CPU_DISPATCH)
+  switch (isa) {
+  case CpuIsa::Avx512:
+    ElementwiseLoopAvx512(fn, mode, x, y, z, n);
+    return;
+  case CpuIsa::Avx2:
+    ElementwiseLoopAvx2(fn, mode, x, y, z, n);
+    return;
+  default:
+    break;
+  }
+#endif
+  ElementwiseLoopDefault(fn, mode, x, y, z, n);
+}
+
+////////////////////////////////////////
+// broadcasting
+////////////////////////////////////////
+
+// Describes how the output of a binary operator is computed from its inputs.
+// Consecutive dimensions broadcasted the same way are merged,
+// the last merged dimension is processed by a contiguous loop.
+struct BroadcastPlan {
+  std::vector<int64_t> shape; // output shape
+  int64_t size;               // number of elements of the output
+  // merged dimensions, the last one is the contiguous one
+  std::vector<int64_t> dims;
+  std::vector<int64_t> x_strides; // 0 for a broadcasted dimension
+  std::vector<int64_t> y_strides;
+};
+
+inline BroadcastPlan MakeBroadcastPlan(const std::vector<int64_t> &x_shape,
+                                       const std::vector<int64_t> &y_shape) {
+  size_t rank = std::max(x_shape.size(), y_shape.size());
+  std::vector<int64_t> xs(rank, 1), ys(rank, 1);
+  std::copy(x_shape.begin(), x_shape.end(),
+            xs.begin() + (rank - x_shape.size()));
+  std::copy(y_shape.begin(), y_shape.end(),
+            ys.begin() + (rank - y_shape.size()));
+
+  BroadcastPlan plan;
+  plan.shape.resize(rank);
+  plan.size = 1;
+  for (size_t i = 0; i < rank; ++i) {
+    EXT_ENFORCE(xs[i] == ys[i] || xs[i] == 1 || ys[i] == 1,
+                "Shapes ", x_shape, " and ", y_shape,
+                " cannot be broadcasted.");
+    plan.shape[i] = xs[i] == 1 ? ys[i] : xs[i];
+    plan.size *= plan.shape[i];
+  }
+
+  // kind of every dimension: 0 both inputs, 1 only y, 2 only x
+  int last_kind = -1;
+  for (size_t i = 0; i < rank; ++i) {
+    if (plan.shape[i] == 1)
+      continue;
+    int kind = xs[i] == 1 ? 1 : (ys[i] == 1 ? 2 : 0);
+    if (kind == last_kind) {
+      plan.dims.back() *= plan.shape[i];
+    } else {
+      plan.dims.push_back(plan.shape[i]);
+      plan.x_strides.push_back(kind == 1 ? 0 : 1);
+      plan.y_strides.push_back(kind == 2 ? 0 : 1);
+      last_kind = kind;
+    }
+  }
+  if (plan.dims.empty()) {
+    plan.dims.push_back(1);
+    plan.x_strides.push_back(1);
+    plan.y_strides.push_back(1);
+  }
+  // strides in number of elements
+  int64_t x_stride = 1, y_stride = 1;
+  for (size_t i = plan.dims.size(); i > 0; --i) {
+    int64_t dim = plan.dims[i - 1];
+    if (plan.x_strides[i - 1] != 0) {
+      plan.x_strides[i - 1] = x_stride;
+      x_stride *= dim;
+    }
+    if (plan.y_strides[i - 1] != 0) {
+      plan.y_strides[i - 1] = y_stride;
+      y_stride *= dim;
+    }
+  }
+  return plan;
+}
+
+// Computes the output elements in [begin, end),
+// z points to the output element begin.
+template <typename T, typename Fn>
+void BroadcastBinaryRange(CpuIsa isa, const Fn &fn,
+                          const BroadcastPlan &plan, const T *x, const T *y,
+                          T *z, int64_t begin, int64_t end) {
+  size_t rank = plan.dims.size();
+  int64_t inner = plan.dims[rank - 1];
+  SegmentMode mode = plan.x_strides[rank - 1] == 0
+                         ? SegmentMode::ScalarVector
+                         : (plan.y_strides[rank - 1] == 0
+                                ? SegmentMode::VectorScalar
+                                : SegmentMode::VectorVector);
+  if (rank == 1) {
+    // no broadcast or one input is a scalar
+    ElementwiseLoop(isa, fn, mode,
+                    mode == SegmentMode::ScalarVector ? x : x + begin,
+                    mode == SegmentMode::VectorScalar ? y : y + begin, z,
+                    end - begin);
+    return;
+  }
+
+  // offsets of the first element
+  std::vector<int64_t> index(rank);
+  int64_t x_offset = 0, y_offset = 0, remaining = begin;
+  for (size_t i = rank; i > 0; --i) {
+    index[i - 1] = remaining % plan.dims[i - 1];
+    remaining /= plan.dims[i - 1];
+    x_offset += index[i - 1] * plan.x_strides[i - 1];
+    y_offset += index[i - 1] * plan.y_strides[i - 1];
+  }
+
+  int64_t pos = begin;
+  while (pos < end) {
+    int64_t n = std::min(inner - index[rank - 1], end - pos);
+    ElementwiseLoop(isa, fn, mode, x + x_offset, y + y_offset, z + (pos - begin),
+                    n);
+    pos += n;
+    // next segment
+    x_offset += n * plan.x_strides[rank - 1];
+    y_offset += n * plan.y_strides[rank - 1];
+    index[rank - 1] += n;
+    for (size_t i = rank; i > 1 && index[i - 1] == plan.dims[i - 1]; --i) {
+      x_offset -= plan.dims[i - 1] * plan.x_strides[i - 1];
+      y_offset -= plan.dims[i - 1] * plan.y_strides[i - 1];
+      index[i - 1] = 0;
+      ++index[i - 2];
+      x_offset += plan.x_strides[i - 2];
+      y_offset += plan.y_strides[i - 2];
+    }
+  }
+}
+
+template <typename T> struct FirstFunction {
+  inline T operator()(T a, T) const { return a; }
+};
+
+template <typename T> struct SecondFunction {
+  inline T operator()(T, T b) const { return b; }
+};
+
+////////////////////////////////////////
+// float 16 conversions
+////////////////////////////////////////
+
+inline void ConvertHalfToFloatDefault(const uint16_t *src, float *dst,
+                                      int64_t n) {
+  for (int64_t i = 0; i < n; ++i)
+    dst[i] = HalfToFloat(src[i]);
+}
+
+inline void ConvertFloatToHalfDefault(const float *src, uint16_t *dst,
+                                      int64_t n) {
+  for (int64_t i = 0; i < n; ++i)
+    dst[i] = FloatToHalf(src[i]);
+}
+
+#if defined(ONNX_EXTENDED_CPU_DISPATCH)
+
+// Every processor supporting AVX2 supports F16C.
+ONNX_EXTENDED_TARGET_AVX2 inline void
+ConvertHalfToFloatF16C(const uint16_t *src, float *dst, int64_t n) {
+  int64_t i = 0;
+  for (; i + 8 <= n; i += 8)
+    _mm256_storeu_ps(dst + i,
+                     _mm256_cvtph_ps(_mm_loadu_si128(
+                         reinterpret_cast<const __m128i *>(src + i))));
+  for (; i < n; ++i)
+    dst[i] = HalfToFloat(src[i]);
+}
+
+ONNX_EXTENDED_TARGET_AVX2 inline void
+ConvertFloatToHalfF16C(const float *src, uint16_t *dst, int64_t n) {
+  int64_t i = 0;
+  for (; i + 8 <= n; i += 8)
+    _mm_storeu_si128(reinterpret_cast<__m128i *>(dst + i),
+                     _mm256_cvtps_ph(_mm256_loadu_ps(src + i),
+                                     _MM_FROUND_TO_NEAREST_INT));
+  for (; i < n; ++i)
+    dst[i] = FloatToHalf(src[i]);
+}
+
+#endif
+
+inline void ConvertHalfToFloat(CpuIsa isa, const uint16_t *src,
+                               float *dst, int64_t n) {
+#if defined(ONNX_EXTENDED_CPU_DISPATCH)
+  if (isa != CpuIsa::Default) {
+    ConvertHalfToFloatF16C(src, dst, n);
+    return;
+  }
+#endif
+  ConvertHalfToFloatDefault(src, dst, n);
+}
+
+inline void ConvertFloatToHalf(CpuIsa isa, const float *src,
+                               uint16_t *dst, int64_t n) {
+#if defined(ONNX_EXTENDED_CPU_DISPATCH)
+  if (isa != CpuIsa::Default) {
+    ConvertFloatToHalfF16C(src, dst, n);
+    return;
+  }
+#endif
+  ConvertFloatToHalfDefault(src, dst, n);
+}
+
+// Computes fn on float, the inputs are broadcasted and converted
+// by blocks small enough to stay in the cache.
+template <typename Fn>
+void BroadcastBinaryRangeFloat16(CpuIsa isa, const Fn &fn,
+                                 const BroadcastPlan &plan, const uint16_t *x,
+                                 const uint16_t *y, uint16_t *z, int64_t begin,
+                                 int64_t end) {
+  const int64_t block = 1024;
+  bool contiguous = plan.dims.size() == 1 && plan.x_strides[0] != 0 &&
+                    plan.y_strides[0] != 0;
+  uint16_t hx[block], hy[block];
+  float fx[block], fy[block], fz[block];
+  for (int64_t b = begin; b < end; b += block) {
+    int64_t n = std::min(block, end - b);
+    const uint16_t *px = x + b;
+    const uint16_t *py = y + b;
+    if (!contiguous) {
+      BroadcastBinaryRange(isa, FirstFunction<uint16_t>(), plan, x, y, hx, b,
+                           b + n);
+      BroadcastBinaryRange(isa, SecondFunction<uint16_t>(), plan, x, y, hy, b,
+                           b + n);
+      px = hx;
+      py = hy;
+    }
+    ConvertHalfToFloat(isa, px, fx, n);
+    ConvertHalfToFloat(isa, py, fy, n);
+    ElementwiseLoop(isa, fn, SegmentMode::VectorVector, fx,
+                    static_cast<const float *>(fy), fz, n);
+    ConvertFloatToHalf(isa, fz, z + (b - begin), n);
+  }
+}
+
+////////////////////////////////////////
+// parallelization
+////////////////////////////////////////
+
+// Calls fn(begin, end) on chunks of [0, size) with at most n_threads threads
+// taken from the pool of the library (see thread_pool.h).
+// Small tensors are processed by the calling thread.
+template <typename F>
+void ParallelizeChunks(int64_t size, int64_t n_threads, int64_t chunk_size,
+                       F fn) {
+  int64_t n_chunks = (size + chunk_size - 1) / chunk_size;
+  ParallelFor(n_chunks, n_threads, [&](int64_t chunk) {
+    int64_t begin = chunk * chunk_size;
+    fn(begin, std::min(begin + chunk_size, size));
+  });
+}
+
+////////////////////////////////////////
+// entry points
+////////////////////////////////////////
+
+// Default number of elements processed by a thread.
+const int64_t ElementwiseChunkSize = 1 << 16;
+
+// z = fn(x, y), z must have plan.size elements.
+template <typename T, typename Fn>
+void BroadcastBinary(const Fn &fn, const BroadcastPlan &plan, const T *x,
+                     const T *y, T *z, int64_t n_threads = 1,
+                     int64_t chunk_size = ElementwiseChunkSize) {
+  CpuIsa isa = cpu_features::GetCpuIsa();
+  ParallelizeChunks(plan.size, n_threads, chunk_size,
+                    [&](int64_t begin, int64_t end) {
+                      BroadcastBinaryRange(isa, fn, plan, x, y, z + begin,
+                                           begin, end);
+                    });
+}
+
+// Same function for float 16 stored as uint16_t, fn is a function on float.
+template <typename Fn>
+void BroadcastBinaryFloat16(const Fn &fn, const BroadcastPlan &plan,
+                            const uint16_t *x, const uint16_t *y, uint16_t *z,
+                            int64_t n_threads = 1,
+                            int64_t chunk_size = ElementwiseChunkSize) {
+  CpuIsa isa = cpu_features::GetCpuIsa();
+  ParallelizeChunks(plan.size, n_threads, chunk_size,
+                    [&](int64_t begin, int64_t end) {
+                      BroadcastBinaryRangeFloat16(isa, fn, plan, x, y,
+                                                  z + begin, begin, end);
+                    });
+}
+
+} // namespace ortops
@@ -0,0 +1,135 @@
+#pragma once
+
+// SHA-256 (FIPS 180-4), used to identify the content of a compiled library
+// before it is loaded.
+
+#include <algorithm>
+#include <cstdint>
+#include <cstring>
+#include <string>
+
+namespace ortops {
+
+class Sha256 {
+public:
+  Sha256() { Reset(); }
+
+  void Reset() {
+    static const uint32_t init[8] = {0x6a09e667, 0xbb67ae85, 0x3c6ef372,
+                                     0xa54ff53a, 0x510e527f, 0x9b05688c,
+                                     0x1f83d9ab, 0x5be0cd19};
+    std::memcpy(state_, init, sizeof(state_));
+    size_ = 0;
+    buffer_size_ = 0;
+  }
+
+  void Update(const void *data, size_t size) {
+    const unsigned char *p = static_cast<const unsigned char *>(data);
+    size_ += size;
+    while (size > 0) {
+      size_t n = std::min<size_t>(size, 64 - buffer_size_);
+      std::memcpy(buffer_ + buffer_size_, p, n);
+      buffer_size_ += n;
+      p += n;
+      size -= n;
+      if (buffer_size_ == 64) {
+        Transform(buffer_);
+        buffer_size_ = 0;
+      }
+    }
+  }
+
+  // Returns the digest as 64 hexadecimal characters.
+  std::string HexDigest() {
+    uint64_t bits = static_cast<uint64_t>(size_) * 8;
+    unsigned char pad = 0x80;
+    Update(&pad, 1);
+    pad = 0;
+    while (buffer_size_ != 56)
+      Update(&pad, 1);
+    unsigned char length[8];
+    for (int i = 0; i < 8; ++i)
+      length[i] = static_cast<unsigned char>(bits >> (56 - 8 * i));
+    Update(length, 8);
+    static const char hex[] = "0123456789abcdef";
+    std::string res(64, '0');
+    for (int i = 0; i < 8; ++i) {
+      for (int j = 0; j < 8; ++j)
+        res[i * 8 + j] = hex[(state_[i] >> (28 - 4 * j)) & 0xf];
+    }
+    Reset();
+    return res;
+  }
+
+  static std::string Hash(const std::string &content) {
+    Sha256 sha;
+    sha.Update(content.data(), content.size());
+    return sha.HexDigest();
+  }
+
+private:
+  static inline uint32_t Rotr(uint32_t x, int n) {
+    return (x >> n) | (x << (32 - n));
+  }
+
+  void Transform(const unsigned char *block) {
+    static const uint32_t k[64] = {
+        0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b,
+        0x59f111f1, 0x923f82a4, 0xab1c5ed5, 0xd807aa98, 0x12835b01,
+        0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7,
+        0xc19bf174, 0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc,
+        0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da, 0x983e5152,
+        0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147,
+        0x06ca6351, 0x14292967, 0x27b70a85, 0x2e1b2138, 0x4d2c6dfc,
+        0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+        0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819,
+        0xd6990624, 0xf40e3585, 0x106aa070, 0x19a4c116, 0x1e376c08,
+        0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f,
+        0x682e6ff3, 0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208,
+        0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2};
+    uint32_t w[64];
+    for (int i = 0; i < 16; ++i)
+      w[i] = (static_cast<uint32_t>(block[4 * i]) << 24) |
+             (static_cast<uint32_t>(block[4 * i + 1]) << 16) |
+             (static_cast<uint32_t>(block[4 * i + 2]) << 8) |
+             static_cast<uint32_t>(block[4 * i + 3]);
+    for (int i = 16; i < 64; ++i) {
+      uint32_t s0 = Rotr(w[i - 15], 7) ^ Rotr(w[i - 15], 18) ^ (w[i - 15] >> 3);
+      uint32_t s1 = Rotr(w[i - 2], 17) ^ Rotr(w[i - 2], 19) ^ (w[i - 2] >> 10);
+      w[i] = w[i - 16] + s0 + w[i - 7] + s1;
+    }
+    uint32_t a = state_[0], b = state_[1], c = state_[2], d = state_[3],
+             e = state_[4], f = state_[5], g = state_[6], h = state_[7];
+    for (int i = 0; i < 64; ++i) {
+      uint32_t s1 = Rotr(e, 6) ^ Rotr(e, 11) ^ Rotr(e, 25);
+      uint32_t ch = (e & f) ^ (~e & g);
+      uint32_t t1 = h + s1 + ch + k[i] + w[i];
+      uint32_t s0 = Rotr(a, 2) ^ Rotr(a, 13) ^ Rotr(a, 22);
+      uint32_t maj = (a & b) ^ (a & c) ^ (b & c);
+      uint32_t t2 = s0 + maj;
+      h = g;
+      g = f;
+      f = e;
+      e = d + t1;
+      d = c;
+      c = b;
+      b = a;
+      a = t1 + t2;
+    }
+    state_[0] += a;
+    state_[1] += b;
+    state_[2] += c;
+    state_[3] += d;
+    state_[4] += e;
+    state_[5] += f;
+    state_[6] += g;
+    state_[7] += h;
+  }
+
+  uint32_t state_[8];
+  uint64_t size_;
+  unsigned char buffer_[64];
+  size_t buffer_size_;
+};
+
+} // namespace ortops
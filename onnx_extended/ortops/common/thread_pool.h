@@ -0,0 +1,140 @@
+#pragma once
+
+// Threads shared by the kernels of a library. They are created the first
+// time a kernel needs them and wait for tasks until the library is unloaded,
+// a call to a kernel does not create any thread.
+
+#include <algorithm>
+#include <atomic>
+#include <condition_variable>
+#include <deque>
+#include <exception>
+#include <functional>
+#include <memory>
+#include <mutex>
+#include <stdint.h>
+#include <thread>
+#include <vector>
+
+namespace ortops {
+
+class ThreadPool {
+public:
+  explicit ThreadPool(int64_t n_threads) : stop_(false) {
+    threads_.reserve(static_cast<size_t>(std::max<int64_t>(n_threads, 0)));
+    for (int64_t i = 0; i < n_threads; ++i)
+      threads_.emplace_back([this]() { Run(); });
+  }
+
+  ~ThreadPool() {
+    {
+      std::lock_guard<std::mutex> lock(mutex_);
+      stop_ = true;
+    }
+    cv_.notify_all();
+    for (auto &th : threads_)
+      th.join();
+  }
+
+  int64_t size() const { return static_cast<int64_t>(threads_.size()); }
+
+  void Schedule(std::function<void()> task) {
+    {
+      std::lock_guard<std::mutex> lock(mutex_);
+      tasks_.push_back(std::move(task));
+    }
+    cv_.notify_one();
+  }
+
+private:
+  void Run() {
+    while (true) {
+      std::function<void()> task;
+      {
+        std::unique_lock<std::mutex> lock(mutex_);
+        cv_.wait(lock, [this]() { return stop_ || !tasks_.empty(); });
+        if (tasks_.empty())
+          return;
+        task = std::move(tasks_.front());
+        tasks_.pop_front();
+      }
+      task();
+    }
+  }
+
+  std::mutex mutex_;
+  std::condition_variable cv_;
+  std::deque<std::function<void()>> tasks_;
+  std::vector<std::thread> threads_;
+  bool stop_;
+};
+
+// One pool per library, the calling thread always takes part in the work,
+// the pool holds one thread less than the number of cores.
+inline ThreadPool &GetThreadPool() {
+  static ThreadPool pool(
+      std::max<int64_t>(1, std::thread::hardware_concurrency()) - 1);
+  return pool;
+}
+
+// Calls fn(i) for every i in [0, n) with at most n_threads threads
+// including the calling thread. Every thread takes the next index
+// until there is none left. The first exception stops the loop and
+// is raised again once every thread is done.
+template <typename F> void ParallelFor(int64_t n, int64_t n_threads, F fn) {
+  ThreadPool &pool = GetThreadPool();
+  int64_t n_workers = std::min(std::min(n_threads, n), pool.size() + 1);
+  if (n_workers <= 1) {
+    for (int64_t i = 0; i < n; ++i)
+      fn(i);
+    return;
+  }
+
+  struct State {
+    std::atomic<int64_t> next{0};
+    std::mutex mutex;
+    std::condition_variable cv;
+    int64_t active = 0;
+    bool closed = false;
+    std::exception_ptr error;
+  };
+  auto state = std::make_shared<State>();
+  auto work = [&state, &fn, n]() {
+    int64_t i;
+    while ((i = state->next++) < n) {
+      try {
+        fn(i);
+      } catch (...) {
+        std::lock_guard<std::mutex> lock(state->mutex);
+        if (!state->error)
+          state->error = std::current_exception();
+        state->next = n;
+      }
+    }
+  };
+  for (int64_t k = 1; k < n_workers; ++k) {
+    // A task starting after the calling thread is done returns immediately,
+    // the pool may be busy with other kernels.
+    pool.Schedule([state, &work]() {
+      {
+        std::lock_guard<std::mutex> lock(state->mutex);
+        if (state->closed)
+          return;
+        ++state->active;
+      }
+      work();
+      std::lock_guard<std::mutex> lock(state->mutex);
+      if (--state->active == 0)
+        state->cv.notify_all();
+    });
+  }
+  work();
+
+  std::unique_lock<std::mutex> lock(state->mutex);
+  state->closed = true;
+  state->cv.wait(lock, [&state]() { return state->active == 0; });
+  if (state->error)
+    std::rethrow_exception(state->error);
+}
+
+} // namespace ortops
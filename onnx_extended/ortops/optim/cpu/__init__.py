@@ -0,0 +1,123 @@
+import os
+import textwrap
+from typing import List
+from ... import _get_ort_ext_libs
+
+
+def get_ort_ext_libs() -> List[str]:
+    """
+    Returns the list of libraries implementing new optimized
+    :epkg:`onnxruntime` kernels implemented for the
+    :epkg:`CPUExecutionProvider`.
+    """
+    return _get_ort_ext_libs(os.path.dirname(__file__))
+
+
+def documentation() -> List[str]:
+    """
+    Returns a list of rst string documenting every implemented kernels
+    in this subfolder.
+    """
+    return list(
+        map(
+            textwrap.dedent,
+            [
+                """
+    onnx_extented.ortops.optim.cpu.TreeEnsembleClassifier
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    It does the same computation as
+    `ai.onnx.ml.TreeEnsembleClassifier
+    <https://onnx.ai/onnx/operators/onnx_aionnxml_TreeEnsembleClassifier.html>`_
+    with the tree engine implemented in this package
+    (see :func:`change_onnx_operator_domain
+    <onnx_extended.ortops.optim.optimize.change_onnx_operator_domain>`
+    to convert a model).
+
+    **Provider**
+
+    CPUExecutionProvider
+
+    **Attributes**
+
+    The same attributes as the standard operator except
+    *classlabels_strings* which is not supported and
+    *nodes_modes* which is a string, the modes are separated by a comma.
+    The following attributes tune the parallelization,
+    -1 keeps the default value.
+
+    * parallel_tree: parallelization by trees if the number of trees is higher
+    * parallel_tree_N: batch size (rows) if parallelization by trees
+    * parallel_N: parallelization by rows if the number of rows is higher
+    * batch_size_tree: number of trees to compute at the same time
+    * batch_size_rows: number of rows to compute at the same time
+    * use_node3: use bigger nodes
+    * denormal_as_zero: 1 to flush denormal numbers to zero
+    * compute_labels: 0 to skip the labels
+    * compute_probabilities: 0 to skip the probabilities and the post transform
+
+    The labels and the probabilities are computed in the same pass
+    over the rows. An output which is skipped is an empty tensor.
+
+    **Inputs**
+
+    * X (T1): tensor of type T1
+
+    **Outputs**
+
+    * label (T3): labels of type T3
+    * Y (T2): probabilities of type T2
+
+    **Constraints**
+
+    * T1: float
+    * T2: float
+    * T3: int64
+    """,
+                """
+    onnx_extented.ortops.optim.cpu.TreeEnsembleRegressor
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    It does the same computation as
+    `ai.onnx.ml.TreeEnsembleRegressor
+    <https://onnx.ai/onnx/operators/onnx_aionnxml_TreeEnsembleRegressor.html>`_
+    with the tree engine implemented in this package
+    (see :func:`change_onnx_operator_domain
+    <onnx_extended.ortops.optim.optimize.change_onnx_operator_domain>`
+    to convert a model).
+
+    **Provider**
+
+    CPUExecutionProvider
+
+    **Attributes**
+
+    The same attributes as the standard operator except
+    *nodes_modes* which is a string, the modes are separated by a comma.
+    The following attributes tune the parallelization,
+    -1 keeps the default value.
+
+    * parallel_tree: parallelization by trees if the number of trees is higher
+    * parallel_tree_N: batch size (rows) if parallelization by trees
+    * parallel_N: parallelization by rows if the number of rows is higher
+    * batch_size_tree: number of trees to compute at the same time
+    * batch_size_rows: number of rows to compute at the same time
+    * use_node3: use bigger nodes
+    * denormal_as_zero: 1 to flush denormal numbers to zero
+
+    **Inputs**
+
+    * X (T1): tensor of type T1
+
+    **Outputs**
+
+    * Y (T2): prediction of type T2
+
+    **Constraints**
+
+    * T1: float
+    * T2: float
+    """,
+            ],
+        )
+    )
@@ -0,0 +1,200 @@
+#include "tree_ensemble.h"
+#include <sstream>
+
+namespace ortops {
+
+// Attribute nodes_modes is a list of strings in ai.onnx.ml,
+// onnxruntime does not give access to such attributes to a custom kernel,
+// the converter joins them with a comma.
+static std::vector<std::string> SplitString(const std::string &input, char sep) {
+  std::vector<std::string> parts;
+  std::string part;
+  std::istringstream stream(input);
+  while (std::getline(stream, part, sep)) {
+    if (!part.empty())
+      parts.push_back(part);
+  }
+  return parts;
+}
+
+TreeEnsembleKernel::TreeEnsembleKernel(const OrtApi &api, const OrtKernelInfo *info,
+                                       bool is_classifier) {
+  std::string aggregate_function =
+      KernelInfoGetOptionalAttributeString(api, info, "aggregate_function", "SUM");
+  std::vector<float> base_values = KernelInfoGetOptionalAttributeArray<float>(api, info, "base_values");
+  std::vector<int64_t> nodes_falsenodeids =
+      KernelInfoGetOptionalAttributeArray<int64_t>(api, info, "nodes_falsenodeids");
+  std::vector<int64_t> nodes_featureids =
+      KernelInfoGetOptionalAttributeArray<int64_t>(api, info, "nodes_featureids");
+  std::vector<float> nodes_hitrates = KernelInfoGetOptionalAttributeArray<float>(api, info, "nodes_hitrates");
+  std::vector<int64_t> nodes_missing_value_tracks_true =
+      KernelInfoGetOptionalAttributeArray<int64_t>(api, info, "nodes_missing_value_tracks_true");
+  std::vector<std::string> nodes_modes =
+      SplitString(KernelInfoGetOptionalAttributeString(api, info, "nodes_modes", ""), ',');
+  std::vector<int64_t> nodes_nodeids = KernelInfoGetOptionalAttributeArray<int64_t>(api, info, "nodes_nodeids");
+  std::vector<int64_t> nodes_treeids = KernelInfoGetOptionalAttributeArray<int64_t>(api, info, "nodes_treeids");
+  std::vector<int64_t> nodes_truenodeids =
+      KernelInfoGetOptionalAttributeArray<int64_t>(api, info, "nodes_truenodeids");
+  std::vector<float> nodes_values = KernelInfoGetOptionalAttributeArray<float>(api, info, "nodes_values");
+  std::string post_transform = KernelInfoGetOptionalAttributeString(api, info, "post_transform", "NONE");
+
+  // The regressor and the classifier use a different prefix for the same attributes.
+  const char *prefix = is_classifier ? "class" : "target";
+  std::vector<int64_t> target_class_ids =
+      KernelInfoGetOptionalAttributeArray<int64_t>(api, info, orthelpers::MakeString(prefix, "_ids").c_str());
+  std::vector<int64_t> target_class_nodeids =
+      KernelInfoGetOptionalAttributeArray<int64_t>(api, info, orthelpers::MakeString(prefix, "_nodeids").c_str());
+  std::vector<int64_t> target_class_treeids =
+      KernelInfoGetOptionalAttributeArray<int64_t>(api, info, orthelpers::MakeString(prefix, "_treeids").c_str());
+  std::vector<float> target_class_weights =
+      KernelInfoGetOptionalAttributeArray<float>(api, info, orthelpers::MakeString(prefix, "_weights").c_str());
+
+  if (is_classifier) {
+    classlabels_int64s = KernelInfoGetOptionalAttributeArray<int64_t>(api, info, "classlabels_int64s");
+    EXT_ENFORCE(!classlabels_int64s.empty(),
+                "Attribute 'classlabels_int64s' of operator 'TreeEnsembleClassifier' "
+                "cannot be empty, string labels are not supported.");
+    n_targets_or_classes = static_cast<int64_t>(classlabels_int64s.size());
+  } else {
+    n_targets_or_classes = KernelInfoGetOptionalAttribute<int64_t>(api, info, "n_targets", 1);
+  }
+
+  // Parameters driving the parallelization, -1 keeps the default value.
+  int64_t parallel_tree = KernelInfoGetOptionalAttribute<int64_t>(api, info, "parallel_tree", -1);
+  int64_t parallel_tree_N = KernelInfoGetOptionalAttribute<int64_t>(api, info, "parallel_tree_N", -1);
+  int64_t parallel_N = KernelInfoGetOptionalAttribute<int64_t>(api, info, "parallel_N", -1);
+  int64_t batch_size_tree = KernelInfoGetOptionalAttribute<int64_t>(api, info, "batch_size_tree", -1);
+  int64_t batch_size_rows = KernelInfoGetOptionalAttribute<int64_t>(api, info, "batch_size_rows", -1);
+  int64_t use_node3 = KernelInfoGetOptionalAttribute<int64_t>(api, info, "use_node3", -1);
+  bool denormal_as_zero = KernelInfoGetOptionalAttributeInt64AsBool(api, info, "denormal_as_zero", false);
+
+  onnx_c_ops::TreeEnsembleCommon<float, float, float> *engine;
+  if (is_classifier) {
+    cls_type_float = std::make_unique<onnx_c_ops::TreeEnsembleCommonClassifier<float, float, float>>();
+    engine = cls_type_float.get();
+  } else {
+    reg_type_float = std::make_unique<onnx_c_ops::TreeEnsembleCommon<float, float, float>>();
+    engine = reg_type_float.get();
+  }
+  // Init reads these parameters (use_node3 for example), they must be set first.
+  engine->set(static_cast<int>(parallel_tree), static_cast<int>(parallel_tree_N),
+              static_cast<int>(parallel_N), static_cast<int>(batch_size_tree),
+              static_cast<int>(batch_size_rows), static_cast<int>(use_node3));
+  engine->set_denormal_as_zero(denormal_as_zero);
+  // Init is not virtual, the classifier computes more than the regressor
+  // (binary case, positive weights), each one must call its own method.
+  if (is_classifier) {
+    cls_type_float->Init(aggregate_function, base_values, n_targets_or_classes, nodes_falsenodeids,
+                         nodes_featureids, nodes_hitrates, nodes_missing_value_tracks_true,
+                         nodes_modes, nodes_nodeids, nodes_treeids, nodes_truenodeids,
+                         nodes_values, post_transform, target_class_ids, target_class_nodeids,
+                         target_class_treeids, target_class_weights);
+  } else {
+    reg_type_float->Init(aggregate_function, base_values, n_targets_or_classes, nodes_falsenodeids,
+                         nodes_featureids, nodes_hitrates, nodes_missing_value_tracks_true,
+                         nodes_modes, nodes_nodeids, nodes_treeids, nodes_truenodeids,
+                         nodes_values, post_transform, target_class_ids, target_class_nodeids,
+                         target_class_treeids, target_class_weights);
+  }
+  if (is_classifier) {
+    // The labels are written while the probabilities are computed.
+    cls_type_float->set_class_labels(classlabels_int64s);
+    compute_labels = KernelInfoGetOptionalAttributeInt64AsBool(api, info, "compute_labels", true);
+    compute_probabilities =
+        KernelInfoGetOptionalAttributeInt64AsBool(api, info, "compute_probabilities", true);
+  } else {
+    compute_labels = false;
+    compute_probabilities = true;
+  }
+  counters = GetKernelCounters(is_classifier ? "TreeEnsembleClassifier" : "TreeEnsembleRegressor",
+                               {"allocation", "inference"});
+}
+
+void TreeEnsembleKernel::Compute(OrtKernelContext *context) {
+  Ort::KernelContext ctx(context);
+  Ort::ConstValue input_X = ctx.GetInput(0);
+  const float *X = input_X.GetTensorData<float>();
+  std::vector<int64_t> dimensions_in = input_X.GetTensorTypeAndShapeInfo().GetShape();
+  EXT_ENFORCE(dimensions_in.size() == 2, "TreeEnsemble only allows 2D inputs.");
+  int64_t n_rows = dimensions_in[0];
+  int64_t n_features = dimensions_in[1];
+  std::vector<int64_t> dimensions_out{n_rows, n_targets_or_classes};
+  CountKernelCall(counters, n_rows * (n_features + n_targets_or_classes) *
+                                    static_cast<int64_t>(sizeof(float)));
+  KernelPhaseTimer timer(counters, 0);
+
+  if (reg_type_float) {
+    Ort::UnownedValue output = ctx.GetOutput(0, dimensions_out);
+    float *out = output.GetTensorMutableData<float>();
+    timer.Next(1);
+    reg_type_float->Compute(n_rows, n_features, X, out, nullptr);
+  } else {
+    // An output which is not computed is an empty tensor.
+    std::vector<int64_t> dimensions_label{compute_labels ? n_rows : 0};
+    if (!compute_probabilities)
+      dimensions_out[0] = 0;
+    Ort::UnownedValue output_label = ctx.GetOutput(0, dimensions_label);
+    Ort::UnownedValue output = ctx.GetOutput(1, dimensions_out);
+    int64_t *labels = compute_labels ? output_label.GetTensorMutableData<int64_t>() : nullptr;
+    float *out = compute_probabilities ? output.GetTensorMutableData<float>() : nullptr;
+    timer.Next(1);
+    cls_type_float->Compute(n_rows, n_features, X, out, labels);
+  }
+}
+
+//////////////////////////
+// TreeEnsembleRegressor
+//////////////////////////
+
+void *TreeEnsembleRegressor::CreateKernel(const OrtApi &api, const OrtKernelInfo *info) const {
+  return std::make_unique<TreeEnsembleKernel>(api, info, false).release();
+};
+
+const char *TreeEnsembleRegressor::GetName() const { return "TreeEnsembleRegressor"; };
+
+const char *TreeEnsembleRegressor::GetExecutionProviderType() const { return "CPUExecutionProvider"; };
+
+size_t TreeEnsembleRegressor::GetInputTypeCount() const { return 1; };
+
+ONNXTensorElementDataType TreeEnsembleRegressor::GetInputType(size_t index) const {
+  return ONNX_TENSOR_ELEMENT_DATA_TYPE_FLOAT;
+};
+
+size_t TreeEnsembleRegressor::GetOutputTypeCount() const { return 1; };
+
+ONNXTensorElementDataType TreeEnsembleRegressor::GetOutputType(size_t index) const {
+  return ONNX_TENSOR_ELEMENT_DATA_TYPE_FLOAT;
+};
+
+///////////////////////////
+// TreeEnsembleClassifier
+///////////////////////////
+
+void *TreeEnsembleClassifier::CreateKernel(const OrtApi &api, const OrtKernelInfo *info) const {
+  return std::make_unique<TreeEnsembleKernel>(api, info, true).release();
+};
+
+const char *TreeEnsembleClassifier::GetName() const { return "TreeEnsembleClassifier"; };
+
+const char *TreeEnsembleClassifier::GetExecutionProviderType() const { return "CPUExecutionProvider"; };
+
+size_t TreeEnsembleClassifier::GetInputTypeCount() const { return 1; };
+
+ONNXTensorElementDataType TreeEnsembleClassifier::GetInputType(size_t index) const {
+  return ONNX_TENSOR_ELEMENT_DATA_TYPE_FLOAT;
+};
+
+size_t TreeEnsembleClassifier::GetOutputTypeCount() const { return 2; };
+
+ONNXTensorElementDataType TreeEnsembleClassifier::GetOutputType(size_t index) const {
+  switch (index) {
+  case 0:
+    return ONNX_TENSOR_ELEMENT_DATA_TYPE_INT64;
+  case 1:
+    return ONNX_TENSOR_ELEMENT_DATA_TYPE_FLOAT;
+  default:
+    EXT_THROW("Unexpected output index ", index, " for operator 'TreeEnsembleClassifier'.");
+  }
+};
+
+} // namespace ortops
@@ -0,0 +1,50 @@
+#pragma once
+
+#include "common/common_kernels.h"
+#include "onnx_extended/reference/c_ops/cpu/c_op_tree_ensemble_common_classifier_.hpp"
+#include <memory>
+#include <vector>
+
+namespace ortops {
+
+struct TreeEnsembleKernel {
+  TreeEnsembleKernel(const OrtApi &api, const OrtKernelInfo *info, bool is_classifier);
+  void Compute(OrtKernelContext *context);
+
+private:
+  // Only one of them is not null.
+  std::unique_ptr<onnx_c_ops::TreeEnsembleCommon<float, float, float>> reg_type_float;
+  std::unique_ptr<onnx_c_ops::TreeEnsembleCommonClassifier<float, float, float>> cls_type_float;
+  int64_t n_targets_or_classes;
+  // The engine replaces the index of the predicted class
+  // by the corresponding label.
+  std::vector<int64_t> classlabels_int64s;
+  // Attributes compute_labels, compute_probabilities (classifier only),
+  // the engine skips an output which is not needed.
+  bool compute_labels;
+  bool compute_probabilities;
+  // Phases allocation, inference.
+  KernelCounters *counters;
+};
+
+struct TreeEnsembleRegressor : Ort::CustomOpBase<TreeEnsembleRegressor, TreeEnsembleKernel> {
+  void *CreateKernel(const OrtApi &api, const OrtKernelInfo *info) const;
+  const char *GetName() const;
+  const char *GetExecutionProviderType() const;
+  size_t GetInputTypeCount() const;
+  ONNXTensorElementDataType GetInputType(size_t index) const;
+  size_t GetOutputTypeCount() const;
+  ONNXTensorElementDataType GetOutputType(size_t index) const;
+};
+
+struct TreeEnsembleClassifier : Ort::CustomOpBase<TreeEnsembleClassifier, TreeEnsembleKernel> {
+  void *CreateKernel(const OrtApi &api, const OrtKernelInfo *info) const;
+  const char *GetName() const;
+  const char *GetExecutionProviderType() const;
+  size_t GetInputTypeCount() const;
+  ONNXTensorElementDataType GetInputType(size_t index) const;
+  size_t GetOutputTypeCount() const;
+  ONNXTensorElementDataType GetOutputType(size_t index) const;
+};
+
+} // namespace ortops
@@ -0,0 +1,273 @@
+from typing import Any, Dict, List, Optional, Set, Tuple
+import numpy
+from onnx import AttributeProto, GraphProto, ModelProto, NodeProto
+from onnx.helper import get_attribute_value, make_attribute, make_node, make_opsetid
+from onnx.numpy_helper import from_array, to_array
+
+
+def _convert_attribute(att: AttributeProto) -> AttributeProto:
+    """
+    Converts the attributes :epkg:`onnxruntime` does not give access to
+    from a custom kernel. A list of strings becomes a string, the values
+    are separated by a comma. A tensor attribute `<name>_as_tensor`
+    becomes a list of floats `<name>`.
+    """
+    if att.type == AttributeProto.STRINGS:
+        return make_attribute(att.name, ",".join(s.decode() for s in att.strings))
+    if att.type == AttributeProto.TENSOR and att.name.endswith("_as_tensor"):
+        values = to_array(att.t).astype(float).ravel().tolist()
+        return make_attribute(att.name[: -len("_as_tensor")], values)
+    return att
+
+
+def change_onnx_operator_domain(
+    onx: ModelProto,
+    op_type: str,
+    op_domain: str = "",
+    new_op_type: Optional[str] = None,
+    new_op_domain: Optional[str] = None,
+    new_opset: Optional[int] = None,
+    **kwargs: Dict[str, Any],
+) -> ModelProto:
+    """
+    Replaces every node of a given type and domain by another one,
+    usually implemented by a custom kernel.
+
+    :param onx: model
+    :param op_type: type of the nodes to replace
+    :param op_domain: domain of the nodes to replace
+    :param new_op_type: new type, *op_type* if None
+    :param new_op_domain: new domain, *op_domain* if None
+    :param new_opset: opset version for the new domain, 1 if None
+        and the domain is not already imported
+    :param kwargs: attributes added to every new node
+    :return: new model
+
+    The attributes are converted into types a custom kernel can read,
+    a list of strings becomes a string joining the values with a comma,
+    a tensor attribute `<name>_as_tensor` becomes a list of floats `<name>`.
+    The following example replaces every
+    `ai.onnx.ml.TreeEnsembleRegressor` by the implementation in
+    :mod:`onnx_extended.ortops.optim.cpu` and tunes the parallelization.
+
+    ::
+
+        from onnx_extended.ortops.optim.optimize import (
+            change_onnx_operator_domain,
+        )
+
+        new_onx = change_onnx_operator_domain(
+            onx,
+            op_type="TreeEnsembleRegressor",
+            op_domain="ai.onnx.ml",
+            new_op_domain="onnx_extented.ortops.optim.cpu",
+            parallel_tree=40,
+            batch_size_rows=2,
+        )
+    """
+    if not isinstance(onx, ModelProto):
+        raise TypeError(f"Unexpected type {type(onx)} for onx.")
+    if new_op_type is None:
+        new_op_type = op_type
+    if new_op_domain is None:
+        new_op_domain = op_domain
+
+    nodes = []
+    modified = False
+    for node in onx.graph.node:
+        if node.op_type != op_type or node.domain != op_domain:
+            nodes.append(node)
+            continue
+        new_node = make_node(
+            new_op_type,
+            node.input,
+            node.output,
+            name=node.name,
+            domain=new_op_domain,
+            **kwargs,
+        )
+        new_node.attribute.extend(_convert_attribute(att) for att in node.attribute)
+        nodes.append(new_node)
+        modified = True
+
+    new_onx = ModelProto()
+    new_onx.CopyFrom(onx)
+    if not modified:
+        return new_onx
+
+    del new_onx.graph.node[:]
+    new_onx.graph.node.extend(nodes)
+    domains = {op.domain for op in new_onx.opset_import}
+    if new_op_domain not in domains:
+        new_onx.opset_import.append(make_opsetid(new_op_domain, new_opset or 1))
+    return new_onx
+
+
+def _attributes(node: NodeProto) -> Dict[str, Any]:
+    return {att.name: get_attribute_value(att) for att in node.attribute}
+
+
+def _set_attribute(node: NodeProto, name: str, value: Any):
+    for i, att in enumerate(node.attribute):
+        if att.name == name:
+            del node.attribute[i]
+            break
+    node.attribute.append(make_attribute(name, value))
+
+
+def _argmax_is_label(atts: Dict[str, Any]) -> bool:
+    """
+    Tells if ArgMax applied on the probabilities returns the label
+    the tree ensemble predicts: the labels are the class indices,
+    the post transform keeps the order of the scores and every leaf
+    has a weight for every class.
+    """
+    labels = atts.get("classlabels_int64s", None)
+    if labels is None or list(labels) != list(range(len(labels))):
+        return False
+    post_transform = atts.get("post_transform", b"NONE")
+    if isinstance(post_transform, bytes):
+        post_transform = post_transform.decode()
+    if post_transform not in ("NONE", "SOFTMAX", "LOGISTIC"):
+        return False
+    leaves = {}
+    for tree, node, cl in zip(
+        atts["class_treeids"], atts["class_nodeids"], atts["class_ids"]
+    ):
+        leaves.setdefault((tree, node), set()).add(cl)
+    return all(len(v) == len(labels) for v in leaves.values())
+
+
+def _consumers(graph: GraphProto, name: str) -> List[Tuple[int, NodeProto]]:
+    return [(i, n) for i, n in enumerate(graph.node) if name in n.input]
+
+
+def _fuse_softmax(
+    graph: GraphProto, node: NodeProto, atts: Dict[str, Any], graph_outputs: Set[str]
+) -> Optional[int]:
+    """
+    Replaces a Softmax on the probabilities by ``post_transform="SOFTMAX"``.
+    Returns the index of the Softmax node to remove or None if nothing changed.
+    """
+    if atts.get("post_transform", b"NONE") not in (b"NONE", "NONE"):
+        return None
+    if node.output[1] in graph_outputs:
+        return None
+    nexts = _consumers(graph, node.output[1])
+    if len(nexts) != 1:
+        return None
+    index, softmax = nexts[0]
+    if (
+        softmax.op_type != "Softmax"
+        or softmax.domain != ""
+        or _attributes(softmax).get("axis", -1) not in (1, -1)
+    ):
+        return None
+    _set_attribute(node, "post_transform", "SOFTMAX")
+    atts["post_transform"] = "SOFTMAX"
+    node.output[1] = softmax.output[0]
+    return index
+
+
+def _fuse_argmax(graph: GraphProto, node: NodeProto, atts: Dict[str, Any], opset: int):
+    """
+    Replaces every ArgMax on the probabilities by the labels,
+    Unsqueeze if *keepdims* is 1, Identity otherwise.
+    """
+    if not node.output[0] or not _argmax_is_label(atts):
+        return
+    for _, argmax in _consumers(graph, node.output[1]):
+        if argmax.op_type != "ArgMax" or argmax.domain != "":
+            continue
+        argmax_atts = _attributes(argmax)
+        if argmax_atts.get("axis", 0) not in (1, -1) or argmax_atts.get(
+            "select_last_index", 0
+        ):
+            continue
+        if argmax_atts.get("keepdims", 1):
+            if opset >= 13:
+                axes = f"{argmax.output[0]}_axes"
+                graph.initializer.append(
+                    from_array(numpy.array([1], dtype=numpy.int64), axes)
+                )
+                new_node = make_node("Unsqueeze", [node.output[0], axes], argmax.output)
+            else:
+                new_node = make_node(
+                    "Unsqueeze", [node.output[0]], argmax.output, axes=[1]
+                )
+        else:
+            new_node = make_node("Identity", [node.output[0]], argmax.output)
+        new_node.name = argmax.name
+        argmax.CopyFrom(new_node)
+
+
+def _skip_unused_outputs(graph: GraphProto, graph_outputs: Set[str]):
+    """
+    Tells the custom kernels not to compute the outputs nobody uses.
+    """
+    for node in graph.node:
+        if (
+            node.op_type != "TreeEnsembleClassifier"
+            or node.domain != "onnx_extented.ortops.optim.cpu"
+        ):
+            continue
+        for name, att_name in zip(
+            node.output, ["compute_labels", "compute_probabilities"]
+        ):
+            if name and name not in graph_outputs and not _consumers(graph, name):
+                _set_attribute(node, att_name, 0)
+
+
+def fuse_tree_ensemble_classifier(onx: ModelProto) -> ModelProto:
+    """
+    Merges the nodes following a TreeEnsembleClassifier into it
+    when the tree ensemble computes the same result while it computes
+    the probabilities of a row. The model must have more than two classes.
+
+    * *Softmax* on the probabilities becomes ``post_transform="SOFTMAX"``
+      if the post transform is NONE,
+    * *ArgMax* on the probabilities is replaced by the labels
+      (or the labels with one more dimension if *keepdims* is 1)
+      if the labels are the class indices.
+
+    Once fused, if a node from domain `onnx_extented.ortops.optim.cpu`
+    has an output nobody uses, the kernel does not compute it anymore
+    (attributes *compute_labels*, *compute_probabilities*).
+    *ZipMap* cannot be fused, it returns a sequence of maps.
+
+    :param onx: model
+    :return: new model
+    """
+    if not isinstance(onx, ModelProto):
+        raise TypeError(f"Unexpected type {type(onx)} for onx.")
+    new_onx = ModelProto()
+    new_onx.CopyFrom(onx)
+    graph = new_onx.graph
+    opset = {op.domain: op.version for op in new_onx.opset_import}.get("", 1)
+    graph_outputs = {o.name for o in graph.output}
+
+    removed = set()
+    for node in graph.node:
+        if (
+            node.op_type != "TreeEnsembleClassifier"
+            or node.domain not in ("ai.onnx.ml", "onnx_extented.ortops.optim.cpu")
+            or len(node.output) < 2
+        ):
+            continue
+        atts = _attributes(node)
+        n_classes = max(
+            len(atts.get("classlabels_int64s", [])),
+            len(atts.get("classlabels_strings", [])),
+        )
+        if n_classes <= 2:
+            continue
+        index = _fuse_softmax(graph, node, atts, graph_outputs)
+        if index is not None:
+            removed.add(index)
+        _fuse_argmax(graph, node, atts, opset)
+
+    nodes = [n for i, n in enumerate(graph.node) if i not in removed]
+    del graph.node[:]
+    graph.node.extend(nodes)
+    _skip_unused_outputs(graph, graph_outputs)
+    return new_onx
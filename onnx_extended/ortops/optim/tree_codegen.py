@@ -0,0 +1,329 @@
+import functools
+import hashlib
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional, Tuple, Union
+import numpy
+from onnx import ModelProto, NodeProto
+from onnx.helper import get_attribute_value
+from onnx.numpy_helper import to_array
+
+_conditions = {
+    "BRANCH_LEQ": "<=",
+    "BRANCH_LT": "<",
+    "BRANCH_GTE": ">=",
+    "BRANCH_GT": ">",
+    "BRANCH_EQ": "==",
+    "BRANCH_NEQ": "!=",
+}
+
+_template = """/* Generated by onnx_extended.ortops.optim.tree_codegen. */
+#include <math.h>
+#include <stdint.h>
+
+#define BATCH_SIZE {batch_size}
+#define ROW_SIZE {n_features}
+
+typedef struct {{
+  float *bufferPtr;
+  float *alignedPtr;
+  int64_t offset;
+  int64_t lengths[1];
+  int64_t strides[1];
+}} Memref1;
+
+{blocks}
+
+int32_t Init_model() {{ return 0; }}
+
+int32_t GetBatchSize() {{ return BATCH_SIZE; }}
+
+int32_t GetRowSize() {{ return ROW_SIZE; }}
+
+Memref1 Prediction_Function(float *ptr, float *alignedPtr, int64_t offset,
+                            int64_t len0, int64_t len1, int64_t stride0,
+                            int64_t stride1, float *resultPtr,
+                            float *resultAlignedPtr, int64_t resultOffset,
+                            int64_t resultLen, int64_t resultStride) {{
+  for (int64_t i = 0; i < len0; ++i) {{
+    const float *x = alignedPtr + offset + i * stride0;
+    float score = 0;
+{calls}
+    resultAlignedPtr[resultOffset + i * resultStride] = {final};
+  }}
+  Memref1 result = {{resultPtr, resultAlignedPtr, resultOffset,
+                    {{resultLen}}, {{resultStride}}}};
+  return result;
+}}
+"""
+
+
+def _float(value: float) -> str:
+    # 9 significant digits are enough to retrieve the same float32.
+    return f"{float(numpy.float32(value)):.9e}f"
+
+
+def _get_attributes(node: NodeProto) -> Dict[str, numpy.ndarray]:
+    atts = {}
+    for att in node.attribute:
+        value = get_attribute_value(att)
+        name = att.name
+        if name.endswith("_as_tensor"):
+            name = name[: -len("_as_tensor")]
+            value = to_array(value)
+        if isinstance(value, bytes):
+            value = value.decode()
+        elif isinstance(value, list) and value and isinstance(value[0], bytes):
+            value = [v.decode() for v in value]
+        atts[name] = value
+    return atts
+
+
+def _tree_code(
+    tree: Dict[int, Tuple],
+    leaves: Dict[int, float],
+    root: int,
+    indent: str,
+    rows: List[str],
+):
+    mode, feature, threshold, true_id, false_id, missing = tree[root]
+    if mode == "LEAF":
+        rows.append(f"{indent}score += {_float(leaves.get(root, 0))};")
+        return
+    if mode not in _conditions:
+        raise ValueError(f"Unexpected mode {mode!r}.")
+    cond = f"x[{feature}] {_conditions[mode]} {_float(threshold)}"
+    if missing:
+        cond = f"{cond} || isnan(x[{feature}])"
+    rows.append(f"{indent}if ({cond}) {{")
+    _tree_code(tree, leaves, true_id, indent + "  ", rows)
+    rows.append(f"{indent}}} else {{")
+    _tree_code(tree, leaves, false_id, indent + "  ", rows)
+    rows.append(f"{indent}}}")
+
+
+def generate_tree_ensemble_c_code(
+    model: Union[ModelProto, NodeProto],
+    batch_size: int = 64,
+    n_features: Optional[int] = None,
+    trees_per_function: int = 1,
+) -> str:
+    """
+    Generates the C code evaluating a single target *TreeEnsembleRegressor*.
+    The trees become nested if/else blocks, the model is not interpreted
+    anymore. The code exposes the functions a library
+    compiled by :epkg:`Treebeard` exposes, *Init_model*, *GetBatchSize*,
+    *GetRowSize* and *Prediction_Function*.
+
+    :param model: a model with one node *TreeEnsembleRegressor*
+        or the node itself
+    :param batch_size: value returned by *GetBatchSize*
+    :param n_features: value returned by *GetRowSize*,
+        the highest feature index + 1 if not specified
+    :param trees_per_function: every function evaluates
+        that number of trees, the prediction calls every function
+    :return: C code
+    """
+    if isinstance(model, ModelProto):
+        nodes = [n for n in model.graph.node if n.op_type == "TreeEnsembleRegressor"]
+        if len(nodes) != 1:
+            raise ValueError(
+                f"The model must contain one TreeEnsembleRegressor not {len(nodes)}."
+            )
+        model = nodes[0]
+    if model.op_type != "TreeEnsembleRegressor":
+        raise NotImplementedError(f"Unsupported operator type {model.op_type!r}.")
+    atts = _get_attributes(model)
+    if atts.get("n_targets", 1) != 1:
+        raise NotImplementedError("Only one target is supported.")
+    post_transform = atts.get("post_transform", "NONE")
+    if post_transform != "NONE":
+        raise NotImplementedError(f"Unsupported post_transform {post_transform!r}.")
+    aggregate_function = atts.get("aggregate_function", "SUM")
+    if aggregate_function not in ("SUM", "AVERAGE"):
+        raise NotImplementedError(
+            f"Unsupported aggregate_function {aggregate_function!r}."
+        )
+    if trees_per_function <= 0:
+        raise ValueError(f"trees_per_function={trees_per_function} must be > 0.")
+
+    missing = atts.get("nodes_missing_value_tracks_true", [])
+    trees: Dict[int, Dict[int, Tuple]] = {}
+    not_roots: Dict[int, set] = {}
+    for i, (tid, nid) in enumerate(zip(atts["nodes_treeids"], atts["nodes_nodeids"])):
+        trees.setdefault(tid, {})[nid] = (
+            atts["nodes_modes"][i],
+            atts["nodes_featureids"][i],
+            atts["nodes_values"][i],
+            atts["nodes_truenodeids"][i],
+            atts["nodes_falsenodeids"][i],
+            i < len(missing) and missing[i] == 1,
+        )
+        if atts["nodes_modes"][i] != "LEAF":
+            not_roots.setdefault(tid, set()).update(
+                [atts["nodes_truenodeids"][i], atts["nodes_falsenodeids"][i]]
+            )
+    leaves: Dict[int, Dict[int, float]] = {}
+    for tid, nid, w in zip(
+        atts["target_treeids"], atts["target_nodeids"], atts["target_weights"]
+    ):
+        leaves.setdefault(tid, {})
+        leaves[tid][nid] = leaves[tid].get(nid, 0) + float(w)
+
+    if n_features is None:
+        n_features = max(atts["nodes_featureids"]) + 1
+
+    tree_ids = sorted(trees)
+    blocks = []
+    calls = []
+    for b in range(0, len(tree_ids), trees_per_function):
+        rows = [f"static float block_{b}(const float *x) {{", "  float score = 0;"]
+        for tid in tree_ids[b : b + trees_per_function]:
+            tree = trees[tid]
+            roots = [n for n in tree if n not in not_roots.get(tid, set())]
+            if len(roots) != 1:
+                raise ValueError(f"Tree {tid} has {len(roots)} roots.")
+            rows.append(f"  /* tree {tid} */")
+            _tree_code(tree, leaves.get(tid, {}), roots[0], "  ", rows)
+        rows.extend(["  return score;", "}"])
+        blocks.append("\n".join(rows))
+        calls.append(f"    score += block_{b}(x);")
+
+    base_values = atts.get("base_values", [])
+    base = float(base_values[0]) if len(base_values) > 0 else 0.0
+    if aggregate_function == "AVERAGE":
+        final = f"score / {_float(len(tree_ids))} + {_float(base)}"
+    else:
+        final = f"score + {_float(base)}"
+    return _template.format(
+        batch_size=batch_size,
+        n_features=n_features,
+        blocks="\n\n".join(blocks),
+        calls="\n".join(calls),
+        final=final,
+    )
+
+
+def _private_cache_dir(cache_dir: str) -> str:
+    """
+    Creates the cache folder if it does not exist and checks
+    nobody else than the current user can modify it.
+    """
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    st = os.lstat(cache_dir)
+    if not stat.S_ISDIR(st.st_mode):
+        raise RuntimeError(f"Cache folder {cache_dir!r} is not a directory.")
+    if st.st_uid != os.getuid():
+        raise RuntimeError(
+            f"Cache folder {cache_dir!r} is not owned by the current user."
+        )
+    if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise RuntimeError(
+            f"Cache folder {cache_dir!r} is writable by other users, "
+            f"permissions are {oct(stat.S_IMODE(st.st_mode))}."
+        )
+    return cache_dir
+
+
+@functools.lru_cache(maxsize=None)
+def _compiler_target(compiler: str, flags: Tuple[str, ...]) -> str:
+    """
+    Returns the macros the compiler predefines with these flags.
+    They depend on the instruction set the code is compiled for
+    (`__AVX2__`, ...), `-march=native` on two different machines
+    does not lead to the same library.
+    """
+    cmd = [compiler, *flags, "-E", "-dM", "-x", "c", os.devnull]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Unable to run {' '.join(cmd)!r}\n{proc.stderr}")
+    return "\n".join(sorted(proc.stdout.splitlines()))
+
+
+def _file_digest(filename: str) -> str:
+    with open(filename, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def compile_tree_ensemble(
+    model: Union[ModelProto, NodeProto],
+    batch_size: int = 64,
+    n_features: Optional[int] = None,
+    trees_per_function: int = 1,
+    cache_dir: Optional[str] = None,
+    compiler: Optional[str] = None,
+    flags: Optional[List[str]] = None,
+) -> str:
+    """
+    Compiles a *TreeEnsembleRegressor* into a shared library
+    with the code produced by :func:`generate_tree_ensemble_c_code`.
+    The library can replace a library compiled by :epkg:`Treebeard`
+    in kernel `onnx_extented.ortops.tutorial.cpu.MyCustomOp`
+    (attribute *model_path*). The library is cached, it is compiled
+    again only if the generated code, the compiler, the flags or
+    the instruction set targeted by the compiler change.
+    The cache folder must only be writable by the current user.
+    The sha256 of every library is stored next to it and checked
+    before the library is returned, a modified library is compiled again.
+
+    :param model: see :func:`generate_tree_ensemble_c_code`
+    :param batch_size: see :func:`generate_tree_ensemble_c_code`
+    :param n_features: see :func:`generate_tree_ensemble_c_code`
+    :param trees_per_function: see :func:`generate_tree_ensemble_c_code`
+    :param cache_dir: folder storing the compiled libraries,
+        `onnx_extended_trees_<uid>` in the temporary folder by default
+    :param compiler: compiler, environment variable `CC` or `cc` by default
+    :param flags: compilation flags, `-O3 -march=native` by default
+    :return: path to the shared library
+    """
+    if sys.platform == "win32":
+        raise NotImplementedError("Compilation is not implemented on Windows.")
+    code = generate_tree_ensemble_c_code(
+        model,
+        batch_size=batch_size,
+        n_features=n_features,
+        trees_per_function=trees_per_function,
+    )
+    if compiler is None:
+        compiler = os.environ.get("CC", "cc")
+    if flags is None:
+        flags = ["-O3", "-march=native"]
+    if cache_dir is None:
+        cache_dir = os.path.join(
+            tempfile.gettempdir(), f"onnx_extended_trees_{os.getuid()}"
+        )
+    _private_cache_dir(cache_dir)
+
+    key = "\n".join(
+        [compiler, " ".join(flags), _compiler_target(compiler, tuple(flags)), code]
+    )
+    digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+    lib = os.path.join(cache_dir, f"trees_{digest}.so")
+    lib_sha = f"{lib}.sha256"
+    if os.path.exists(lib) and os.path.exists(lib_sha):
+        with open(lib_sha, "r") as f:
+            expected = f.read().strip()
+        if expected == _file_digest(lib):
+            return lib
+
+    # Files are created under another name and renamed,
+    # another process may compile the same model.
+    pid = os.getpid()
+    source = os.path.join(cache_dir, f"trees_{digest}.{pid}.c")
+    with open(source, "w") as f:
+        f.write(code)
+    tmp_lib = f"{lib}.{pid}"
+    cmd = [compiler, *flags, "-shared", "-fPIC", source, "-o", tmp_lib, "-lm"]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    os.remove(source)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Compilation failed with {' '.join(cmd)!r}\n{proc.stderr}")
+    tmp_sha = f"{lib_sha}.{pid}"
+    with open(tmp_sha, "w") as f:
+        f.write(_file_digest(tmp_lib))
+    os.replace(tmp_lib, lib)
+    os.replace(tmp_sha, lib_sha)
+    return lib
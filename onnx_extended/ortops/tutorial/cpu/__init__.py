@@ -26,20 +26,38 @@ def documentation() -> List[str]:
     onnx_extented.ortops.tutorial.cpu.MyCustomOp
     ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    It does the sum of two tensors.
+    It runs a tree ensemble compiled by :epkg:`Treebeard`
+    or by :func:`compile_tree_ensemble
+    <onnx_extended.ortops.optim.tree_codegen.compile_tree_ensemble>`.
+    The input is split into the batches the compiled model expects,
+    the last incomplete batch is padded.
 
     **Provider**
     
     CPUExecutionProvider
+
+    **Attributes**
+
+    * model_path: path to the library compiled by :epkg:`Treebeard`
+    * model_blob: content of the library if *model_path* is not specified,
+      it is written once in folder `onnx_extended_<uid>` of the temporary
+      folder, only accessible to the current user, and its content
+      is verified (SHA-256) before it is loaded
+    * n_threads: number of threads running the batches in parallel,
+      1 by default, 0 or a negative value for one thread per core,
+      the threads belong to a pool shared by the kernels of the library
+
+    Kernels loading the same library share it, it is loaded and
+    initialized once and unloaded when the last session using it
+    is released.
     
     **Inputs**
     
-    * X (T): tensor of type T
-    * Y (T): tensor of type T
+    * X (T): tensor of type T and shape *(N, F)*
 
     **Outputs**
 
-    * Z (T): addition of X, Y
+    * Y (T): predictions, shape *(N, 1)*
 
     **Constraints**
 
@@ -70,11 +88,106 @@ def documentation() -> List[str]:
 
     **Outputs**
 
-    * Z (T): addition of X, Y + cst
+    * Z (T): addition of X, Y + cst, the inputs are broadcasted
 
     **Constraints**
 
     * T: float
+    """,
+                """
+    onnx_extented.ortops.tutorial.cpu.CustomAddFloat
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    It computes `X + Y + cst` with numpy broadcasting.
+    Kernels *CustomAddDouble* and *CustomAddFloat16* do the same
+    for double and float 16, float 16 is computed with float.
+    The loop is compiled for AVX2 and AVX-512 and the best version
+    the processor supports is chosen once (see :func:`cpu_isa
+    <onnx_extended.validation.cpu._validation.cpu_isa>`).
+    Big tensors are split into chunks processed by several threads.
+
+    **Provider**
+    
+    CPUExecutionProvider
+    
+    **Attributes**
+
+    * cst: a float constant, 0 by default
+    * n_threads: number of threads, 0 or a negative value
+      for one thread per core (default)
+    
+    **Inputs**
+    
+    * X (T): tensor of type T
+    * Y (T): tensor of type T
+
+    **Outputs**
+
+    * Z (T): X + Y + cst
+
+    **Constraints**
+
+    * T: float, double, float 16
+    """,
+                """
+    onnx_extented.ortops.tutorial.cpu.AddReluFloat
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    It computes `Relu(X + Y)` with numpy broadcasting in one loop.
+    Kernels *AddReluDouble* and *AddReluFloat16* do the same
+    for double and float 16.
+
+    **Provider**
+    
+    CPUExecutionProvider
+    
+    **Attributes**
+
+    * n_threads: number of threads, 0 or a negative value
+      for one thread per core (default)
+    
+    **Inputs**
+    
+    * X (T): tensor of type T
+    * Y (T): tensor of type T
+
+    **Outputs**
+
+    * Z (T): Relu(X + Y)
+
+    **Constraints**
+
+    * T: float, double, float 16
+    """,
+                """
+    onnx_extented.ortops.tutorial.cpu.MulSigmoidFloat
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    It computes `Sigmoid(X * Y)` with numpy broadcasting in one loop.
+    Kernels *MulSigmoidDouble* and *MulSigmoidFloat16* do the same
+    for double and float 16.
+
+    **Provider**
+    
+    CPUExecutionProvider
+    
+    **Attributes**
+
+    * n_threads: number of threads, 0 or a negative value
+      for one thread per core (default)
+    
+    **Inputs**
+    
+    * X (T): tensor of type T
+    * Y (T): tensor of type T
+
+    **Outputs**
+
+    * Z (T): Sigmoid(X * Y)
+
+    **Constraints**
+
+    * T: float, double, float 16
     """,
             ],
         )
@@ -1,31 +1,74 @@
 #include "my_kernel.h"
+#include "common/thread_pool.h"
+#include <algorithm>
 #include <sstream>
+#include <thread>
 
 namespace ortops {
 
-MyCustomKernel::MyCustomKernel(const OrtApi &api, const OrtKernelInfo *info) : soRunner("/home/srajendra/temp/rf_nf10_T500_d10.onnx.so") {
+MyCustomKernel::MyCustomKernel(const OrtApi &api, const OrtKernelInfo *info) {
+  // The compiled model is given as a path or as the content of the library.
+  std::string model_path = KernelInfoGetOptionalAttributeString(api, info, "model_path", "");
+  std::string model_blob = KernelInfoGetOptionalAttributeString(api, info, "model_blob", "");
+  if (model_path.empty() == model_blob.empty())
+    throw std::runtime_error(
+        "Operator 'MyCustomOp' expects one attribute among 'model_path' and 'model_blob'.");
+  soRunner = model_path.empty() ? TreebeardSOCache::LoadFromBlob(model_blob)
+                                : TreebeardSOCache::Load(model_path);
+  scratch_input.resize(static_cast<size_t>(soRunner->GetBatchSize()) * soRunner->GetRowSize(), 0);
+  scratch_output.resize(soRunner->GetBatchSize(), 0);
+  n_threads = KernelInfoGetOptionalAttribute<int64_t>(api, info, "n_threads", 1);
+  if (n_threads <= 0)
+    n_threads = std::max<int64_t>(1, std::thread::hardware_concurrency());
+  counters = GetKernelCounters("MyCustomOp", {"validation", "allocation", "inference"});
 }
 
 void MyCustomKernel::Compute(OrtKernelContext *context) {
   Ort::KernelContext ctx(context);
+  KernelPhaseTimer timer(counters, 0);
 
   Ort::ConstValue input_X = ctx.GetInput(0);
   const float *X = input_X.GetTensorData<float>();
 
-  // Setup output, which is assumed to have the same dimensions as the inputs.
   std::vector<int64_t> dimensions = input_X.GetTensorTypeAndShapeInfo().GetShape();
 
-  if (dimensions[0] != soRunner.GetBatchSize() || dimensions[1] != soRunner.GetRowSize()) {
+  if (dimensions.size() != 2 || dimensions[1] != soRunner->GetRowSize()) {
     std::stringstream ss;
-    ss << "Dimensions not " << soRunner.GetBatchSize() << " x " << soRunner.GetRowSize();
+    ss << "Dimensions not N x " << soRunner->GetRowSize();
     throw std::runtime_error(ss.str());
   }
 
+  timer.Next(1);
   Ort::UnownedValue output = ctx.GetOutput(0, {dimensions[0], 1});
   float *out = output.GetTensorMutableData<float>();
-
-  const size_t size = output.GetTensorTypeAndShapeInfo().GetElementCount();
-  soRunner.RunInference(X, out);
+  timer.Next(2);
+
+  const int64_t n_rows = dimensions[0];
+  const int64_t batch_size = soRunner->GetBatchSize();
+  const int64_t row_size = soRunner->GetRowSize();
+  const int64_t n_full = n_rows / batch_size;
+  const int64_t n_tail = n_rows - n_full * batch_size;
+  const int64_t n_batches = n_full + (n_tail > 0 ? 1 : 0);
+  CountKernelCall(counters, n_rows * (row_size + 1) * static_cast<int64_t>(sizeof(float)));
+
+  auto run_batch = [&](int64_t batch) {
+    int64_t begin = batch * batch_size;
+    if (batch < n_full) {
+      // Full batches are computed in place, the compiled model reads the input
+      // and writes the output directly.
+      soRunner->RunInference(X + begin * row_size, out + begin);
+    } else {
+      // The remaining rows are copied into a padded batch.
+      std::lock_guard<std::mutex> lock(scratch_mutex);
+      std::copy(X + begin * row_size, X + n_rows * row_size, scratch_input.begin());
+      soRunner->RunInference(scratch_input.data(), scratch_output.data());
+      std::copy(scratch_output.begin(), scratch_output.begin() + n_tail, out + begin);
+    }
+  };
+
+  // Each batch writes its own slice of the output, the batches are
+  // dispatched on the threads of the library (see thread_pool.h).
+  ParallelFor(n_batches, n_threads, run_batch);
 }
 
 void* MyCustomOp::CreateKernel(const OrtApi& api, const OrtKernelInfo* info) const {
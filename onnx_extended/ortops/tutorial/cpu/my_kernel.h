@@ -2,6 +2,8 @@
 
 #include "common/common_kernels.h"
 #include "tb_runner.h"
+#include <mutex>
+#include <vector>
 
 namespace ortops {
 
@@ -9,7 +11,16 @@ struct MyCustomKernel {
   MyCustomKernel(const OrtApi &api, const OrtKernelInfo *info);
   void Compute(OrtKernelContext* context);
 private:
-  TreebeardSORunner soRunner;
+  std::shared_ptr<TreebeardSORunner> soRunner;
+  // Number of threads running the compiled batches, attribute n_threads.
+  int64_t n_threads;
+  // The compiled model only processes batches of soRunner.GetBatchSize() rows,
+  // the last incomplete batch is padded into these buffers allocated once.
+  std::mutex scratch_mutex;
+  std::vector<float> scratch_input;
+  std::vector<float> scratch_output;
+  // Phases validation, allocation, inference.
+  KernelCounters *counters;
 };
 
 struct MyCustomOp : Ort::CustomOpBase<MyCustomOp, MyCustomKernel> {
@@ -76,20 +76,17 @@ void MyCustomKernelWithAttributes::Compute(OrtKernelContext *context) {
   const double *X = input_X.GetTensorData<double>();
   const double *Y = input_Y.GetTensorData<double>();
 
-  // Setup output, which is assumed to have the same dimensions as the inputs.
-  std::vector<int64_t> dimensions = input_X.GetTensorTypeAndShapeInfo().GetShape();
+  // The output shape follows the broadcasting rules.
+  BroadcastPlan plan = MakeBroadcastPlan(input_X.GetTensorTypeAndShapeInfo().GetShape(),
+                                         input_Y.GetTensorTypeAndShapeInfo().GetShape());
 
-  Ort::UnownedValue output = ctx.GetOutput(0, dimensions);
+  Ort::UnownedValue output = ctx.GetOutput(0, plan.shape);
   double *out = output.GetTensorMutableData<double>();
 
-  const size_t size = output.GetTensorTypeAndShapeInfo().GetElementCount();
-
   // Do computation
   double cst = att_tensor_double[0] + static_cast<double>(att_float) + static_cast<double>(att_int64) + static_cast<double>(att_string[0]);
 
-  for (size_t i = 0; i < size; i++) {
-    out[i] = X[i] + Y[i] + cst;
-  }
+  BroadcastBinary(AddCstFunction<double>(cst), plan, X, Y, out);
 }
 
 void* MyCustomOpWithAttributes::CreateKernel(const OrtApi& api, const OrtKernelInfo* info) const {
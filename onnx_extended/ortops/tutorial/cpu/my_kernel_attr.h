@@ -1,6 +1,7 @@
 #pragma once
 
 #include "common/common_kernels.h"
+#include "common/elementwise.h"
 
 namespace ortops {
 
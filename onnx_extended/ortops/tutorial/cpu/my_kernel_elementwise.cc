@@ -0,0 +1,145 @@
+#include "my_kernel_elementwise.h"
+#include <thread>
+
+namespace ortops {
+
+// float 16 is computed on float
+template <typename T> struct ElementwiseComputeType { typedef T type; };
+template <> struct ElementwiseComputeType<Ort::Float16_t> {
+  typedef float type;
+};
+
+template <typename T> ONNXTensorElementDataType ElementwiseElementType();
+template <> ONNXTensorElementDataType ElementwiseElementType<float>() {
+  return ONNX_TENSOR_ELEMENT_DATA_TYPE_FLOAT;
+}
+template <> ONNXTensorElementDataType ElementwiseElementType<double>() {
+  return ONNX_TENSOR_ELEMENT_DATA_TYPE_DOUBLE;
+}
+template <> ONNXTensorElementDataType ElementwiseElementType<Ort::Float16_t>() {
+  return ONNX_TENSOR_ELEMENT_DATA_TYPE_FLOAT16;
+}
+
+template <typename Fn, typename T>
+static void RunElementwise(const Fn &fn, const BroadcastPlan &plan, const T *x,
+                           const T *y, T *z, int64_t n_threads) {
+  BroadcastBinary(fn, plan, x, y, z, n_threads);
+}
+
+template <typename Fn>
+static void RunElementwise(const Fn &fn, const BroadcastPlan &plan,
+                           const Ort::Float16_t *x, const Ort::Float16_t *y,
+                           Ort::Float16_t *z, int64_t n_threads) {
+  BroadcastBinaryFloat16(fn, plan, reinterpret_cast<const uint16_t *>(x),
+                         reinterpret_cast<const uint16_t *>(y),
+                         reinterpret_cast<uint16_t *>(z), n_threads);
+}
+
+////////////////////
+// ElementwiseKernel
+////////////////////
+
+template <typename T>
+ElementwiseKernel<T>::ElementwiseKernel(const OrtApi &api,
+                                        const OrtKernelInfo *info,
+                                        const char *name,
+                                        ElementwiseKind kind)
+    : kind_(kind) {
+  cst_ = KernelInfoGetOptionalAttribute<float>(api, info, "cst", 0);
+  n_threads_ = KernelInfoGetOptionalAttribute<int64_t>(api, info, "n_threads", 0);
+  if (n_threads_ <= 0)
+    n_threads_ = std::max<int64_t>(1, std::thread::hardware_concurrency());
+  plans_ = std::make_unique<PlanCache<BroadcastPlan>>();
+  counters_ = GetKernelCounters(name, {"plan", "allocation", "compute"});
+}
+
+template <typename T>
+void ElementwiseKernel<T>::Compute(OrtKernelContext *context) {
+  typedef typename ElementwiseComputeType<T>::type C;
+  Ort::KernelContext ctx(context);
+  KernelPhaseTimer timer(counters_, 0);
+  Ort::ConstValue input_X = ctx.GetInput(0);
+  Ort::ConstValue input_Y = ctx.GetInput(1);
+
+  // The broadcasting is computed once per pair of shapes.
+  std::shared_ptr<BroadcastPlan> plan =
+      plans_->Get(MakeShapeKey(ctx), [&input_X, &input_Y]() {
+        return std::make_shared<BroadcastPlan>(
+            MakeBroadcastPlan(input_X.GetTensorTypeAndShapeInfo().GetShape(),
+                              input_Y.GetTensorTypeAndShapeInfo().GetShape()));
+      });
+
+  timer.Next(1);
+  Ort::UnownedValue output = ctx.GetOutput(0, plan->shape);
+  const T *X = input_X.GetTensorData<T>();
+  const T *Y = input_Y.GetTensorData<T>();
+  T *Z = output.GetTensorMutableData<T>();
+  timer.Next(2);
+  CountKernelCall(
+      counters_,
+      static_cast<int64_t>(
+          input_X.GetTensorTypeAndShapeInfo().GetElementCount() +
+          input_Y.GetTensorTypeAndShapeInfo().GetElementCount() + plan->size) *
+          static_cast<int64_t>(sizeof(T)));
+
+  switch (kind_) {
+  case ElementwiseKind::AddCst:
+    RunElementwise(AddCstFunction<C>(static_cast<C>(cst_)), *plan, X, Y, Z,
+                   n_threads_);
+    break;
+  case ElementwiseKind::AddRelu:
+    RunElementwise(AddReluFunction<C>(), *plan, X, Y, Z, n_threads_);
+    break;
+  case ElementwiseKind::MulSigmoid:
+    RunElementwise(MulSigmoidFunction<C>(), *plan, X, Y, Z, n_threads_);
+    break;
+  default:
+    EXT_THROW("Unexpected kind ", static_cast<int>(kind_), ".");
+  }
+}
+
+////////////////
+// ElementwiseOp
+////////////////
+
+template <typename T>
+void *ElementwiseOp<T>::CreateKernel(const OrtApi &api,
+                                     const OrtKernelInfo *info) const {
+  return std::make_unique<ElementwiseKernel<T>>(api, info, name_, kind_).release();
+}
+
+template <typename T> const char *ElementwiseOp<T>::GetName() const {
+  return name_;
+}
+
+template <typename T>
+const char *ElementwiseOp<T>::GetExecutionProviderType() const {
+  return "CPUExecutionProvider";
+}
+
+template <typename T> size_t ElementwiseOp<T>::GetInputTypeCount() const {
+  return 2;
+}
+
+template <typename T>
+ONNXTensorElementDataType ElementwiseOp<T>::GetInputType(size_t index) const {
+  return ElementwiseElementType<T>();
+}
+
+template <typename T> size_t ElementwiseOp<T>::GetOutputTypeCount() const {
+  return 1;
+}
+
+template <typename T>
+ONNXTensorElementDataType ElementwiseOp<T>::GetOutputType(size_t index) const {
+  return ElementwiseElementType<T>();
+}
+
+template struct ElementwiseKernel<float>;
+template struct ElementwiseKernel<double>;
+template struct ElementwiseKernel<Ort::Float16_t>;
+template struct ElementwiseOp<float>;
+template struct ElementwiseOp<double>;
+template struct ElementwiseOp<Ort::Float16_t>;
+
+} // namespace ortops
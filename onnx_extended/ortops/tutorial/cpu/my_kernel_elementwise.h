@@ -0,0 +1,47 @@
+#pragma once
+
+#include "common/common_kernels.h"
+#include "common/elementwise.h"
+
+namespace ortops {
+
+enum class ElementwiseKind {
+  AddCst = 0,     // X + Y + cst
+  AddRelu = 1,    // Relu(X + Y)
+  MulSigmoid = 2, // Sigmoid(X * Y)
+};
+
+// T is float, double or Ort::Float16_t.
+template <typename T> struct ElementwiseKernel {
+  ElementwiseKernel(const OrtApi &api, const OrtKernelInfo *info,
+                    const char *name, ElementwiseKind kind);
+  void Compute(OrtKernelContext *context);
+
+private:
+  ElementwiseKind kind_;
+  float cst_;
+  int64_t n_threads_;
+  std::unique_ptr<PlanCache<BroadcastPlan>> plans_;
+  // Phases plan, allocation, compute.
+  KernelCounters *counters_;
+};
+
+template <typename T>
+struct ElementwiseOp
+    : Ort::CustomOpBase<ElementwiseOp<T>, ElementwiseKernel<T>> {
+  ElementwiseOp(const char *name, ElementwiseKind kind)
+      : name_(name), kind_(kind) {}
+  void *CreateKernel(const OrtApi &api, const OrtKernelInfo *info) const;
+  const char *GetName() const;
+  const char *GetExecutionProviderType() const;
+  size_t GetInputTypeCount() const;
+  ONNXTensorElementDataType GetInputType(size_t index) const;
+  size_t GetOutputTypeCount() const;
+  ONNXTensorElementDataType GetOutputType(size_t index) const;
+
+private:
+  const char *name_;
+  ElementwiseKind kind_;
+};
+
+} // namespace ortops
@@ -7,6 +7,7 @@
 #include "ort_tutorial_cpu_lib.h"
 #include "my_kernel.h"
 #include "my_kernel_attr.h"
+#include "my_kernel_elementwise.h"
 
 static const char* c_OpDomain = "onnx_extented.ortops.tutorial.cpu";
 
@@ -24,6 +25,15 @@ OrtStatus* ORT_API_CALL RegisterCustomOps(OrtSessionOptions* options, const OrtA
   // An instance remaining available until onnxruntime unload the library.
   static ortops::MyCustomOp c_CustomOp;
   static ortops::MyCustomOpWithAttributes c_CustomOpAttr;
+  static ortops::ElementwiseOp<float> c_CustomAddFloat("CustomAddFloat", ortops::ElementwiseKind::AddCst);
+  static ortops::ElementwiseOp<double> c_CustomAddDouble("CustomAddDouble", ortops::ElementwiseKind::AddCst);
+  static ortops::ElementwiseOp<Ort::Float16_t> c_CustomAddFloat16("CustomAddFloat16", ortops::ElementwiseKind::AddCst);
+  static ortops::ElementwiseOp<float> c_AddReluFloat("AddReluFloat", ortops::ElementwiseKind::AddRelu);
+  static ortops::ElementwiseOp<double> c_AddReluDouble("AddReluDouble", ortops::ElementwiseKind::AddRelu);
+  static ortops::ElementwiseOp<Ort::Float16_t> c_AddReluFloat16("AddReluFloat16", ortops::ElementwiseKind::AddRelu);
+  static ortops::ElementwiseOp<float> c_MulSigmoidFloat("MulSigmoidFloat", ortops::ElementwiseKind::MulSigmoid);
+  static ortops::ElementwiseOp<double> c_MulSigmoidDouble("MulSigmoidDouble", ortops::ElementwiseKind::MulSigmoid);
+  static ortops::ElementwiseOp<Ort::Float16_t> c_MulSigmoidFloat16("MulSigmoidFloat16", ortops::ElementwiseKind::MulSigmoid);
 
   OrtStatus* result = nullptr;
 
@@ -32,6 +42,15 @@ OrtStatus* ORT_API_CALL RegisterCustomOps(OrtSessionOptions* options, const OrtA
 
     domain.Add(&c_CustomOp);
     domain.Add(&c_CustomOpAttr);
+    domain.Add(&c_CustomAddFloat);
+    domain.Add(&c_CustomAddDouble);
+    domain.Add(&c_CustomAddFloat16);
+    domain.Add(&c_AddReluFloat);
+    domain.Add(&c_AddReluDouble);
+    domain.Add(&c_AddReluFloat16);
+    domain.Add(&c_MulSigmoidFloat);
+    domain.Add(&c_MulSigmoidDouble);
+    domain.Add(&c_MulSigmoidFloat16);
 
     session_options.Add(domain);
     AddOrtCustomOpDomainToContainer(std::move(domain));
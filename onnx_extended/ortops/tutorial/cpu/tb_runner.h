@@ -1,8 +1,25 @@
+#pragma once
+
+#include "common/sha256.h"
+#include <cerrno>
 #include <cstdint>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
 #include <dlfcn.h>
+#include <fstream>
 #include <iostream>
+#include <iterator>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <sstream>
 #include <stdexcept>
 #include <string>
+#include <sys/stat.h>
+#include <unistd.h>
+#include <utility>
+#include <vector>
 
 template<typename T, int32_t Rank>
 struct Memref {
@@ -51,6 +68,9 @@ public:
     dlclose(so);
   }
 
+  TreebeardSORunner(const TreebeardSORunner&) = delete;
+  TreebeardSORunner& operator=(const TreebeardSORunner&) = delete;
+
   int32_t GetBatchSize() const { return batchSize; }
   int32_t GetRowSize() const { return rowSize; }
 
@@ -74,4 +94,105 @@ public:
                      resultPtr, resultAlignedPtr, offset, resultLen, stride);
     return 0;
   }
-};
\ No newline at end of file
+};
+
+// Libraries loaded by every kernel of the process. A library is loaded and
+// initialized once, kernels share the same TreebeardSORunner and the library
+// is unloaded when the last kernel using it is destroyed. A library is
+// identified by the SHA-256 of its content.
+class TreebeardSOCache {
+public:
+  // Loads the library stored in a file.
+  static std::shared_ptr<TreebeardSORunner> Load(const std::string& path) {
+    std::string content;
+    if (!ReadFile(path, content))
+      throw std::runtime_error("Unable to read '" + path + "'.");
+    return Get(path, ortops::Sha256::Hash(content));
+  }
+
+  // Loads a library given as bytes. It is written once in a private
+  // folder (see PrivateFolder) in a file named after its hash. An existing
+  // file is only loaded if its content matches the blob.
+  static std::shared_ptr<TreebeardSORunner> LoadFromBlob(const std::string& blob) {
+    std::string hash = ortops::Sha256::Hash(blob);
+    std::string path = PrivateFolder() + "/treebeard_" + hash + ".so";
+    std::string content;
+    if (!ReadFile(path, content) || ortops::Sha256::Hash(content) != hash) {
+      // Written under a unique name and renamed, another kernel or another
+      // process may do the same. mkstemp creates the file with mode 0600.
+      std::string tmp_template = path + ".XXXXXX";
+      std::vector<char> buffer(tmp_template.begin(), tmp_template.end());
+      buffer.push_back(0);
+      int fd = mkstemp(buffer.data());
+      if (fd < 0)
+        throw std::runtime_error("Unable to create '" + tmp_template + "': " +
+                                 std::strerror(errno) + ".");
+      std::string tmp_path(buffer.data());
+      size_t written = 0;
+      while (written < blob.size()) {
+        ssize_t n = write(fd, blob.data() + written, blob.size() - written);
+        if (n <= 0) {
+          close(fd);
+          unlink(tmp_path.c_str());
+          throw std::runtime_error("Unable to write '" + tmp_path + "'.");
+        }
+        written += static_cast<size_t>(n);
+      }
+      close(fd);
+      if (std::rename(tmp_path.c_str(), path.c_str()) != 0) {
+        unlink(tmp_path.c_str());
+        throw std::runtime_error("Unable to rename '" + tmp_path + "'.");
+      }
+    }
+    return Get(path, hash);
+  }
+
+private:
+  static bool ReadFile(const std::string& path, std::string& content) {
+    std::ifstream f(path, std::ios::binary);
+    if (!f)
+      return false;
+    content.assign((std::istreambuf_iterator<char>(f)), std::istreambuf_iterator<char>());
+    return true;
+  }
+
+  // $TMPDIR/onnx_extended_<uid>, created with mode 0700. Nobody else
+  // can replace a library once it is verified. The folder is rejected if it
+  // is a symbolic link, belongs to another user or is accessible to others.
+  static std::string PrivateFolder() {
+    const char* tmp = std::getenv("TMPDIR");
+    std::string folder = std::string(tmp == nullptr || *tmp == 0 ? "/tmp" : tmp) +
+                         "/onnx_extended_" + std::to_string(getuid());
+    if (mkdir(folder.c_str(), 0700) != 0 && errno != EEXIST)
+      throw std::runtime_error("Unable to create '" + folder + "': " +
+                               std::strerror(errno) + ".");
+    struct stat st;
+    if (lstat(folder.c_str(), &st) != 0 || !S_ISDIR(st.st_mode) ||
+        st.st_uid != getuid() || (st.st_mode & 077) != 0)
+      throw std::runtime_error("Folder '" + folder + "' must be a directory owned "
+                               "by the current user and only accessible to them.");
+    return folder;
+  }
+
+  static std::shared_ptr<TreebeardSORunner> Get(const std::string& path,
+                                                const std::string& hash) {
+    static std::mutex mutex;
+    static std::map<std::string, std::pair<std::string, std::weak_ptr<TreebeardSORunner>>>
+        cache;
+    std::lock_guard<std::mutex> lock(mutex);
+    auto it = cache.find(path);
+    if (it != cache.end()) {
+      std::shared_ptr<TreebeardSORunner> runner = it->second.second.lock();
+      if (runner) {
+        // dlopen would return the library already loaded.
+        if (it->second.first != hash)
+          throw std::runtime_error("'" + path + "' was modified while a previous "
+                                   "version is still loaded.");
+        return runner;
+      }
+    }
+    std::shared_ptr<TreebeardSORunner> runner = std::make_shared<TreebeardSORunner>(path.c_str());
+    cache[path] = std::make_pair(hash, std::weak_ptr<TreebeardSORunner>(runner));
+    return runner;
+  }
+};
@@ -32,6 +32,12 @@ def documentation() -> List[str]:
     **Provider**
     
     CUDAExecutionProvider
+
+    **Attributes**
+
+    * planCacheSize: the matrix descriptors and the algorithm chosen
+      by cuBLAS are computed once for every input shape and kept
+      for the last *planCacheSize* shapes, 8 by default
     
     **Inputs**
     
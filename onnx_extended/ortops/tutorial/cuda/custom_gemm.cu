@@ -141,6 +141,31 @@ CustomGemmOpFloat8E4M3FN::GetOutputType(size_t index) const {
 // CustomGemmKernel
 ///////////////////
 
+CustomGemmPlan::~CustomGemmPlan() { Release(); }
+
+void CustomGemmPlan::Release() {
+  // No exception, it is called by the destructor.
+  if (workspace != nullptr) {
+    // cudaFree waits for the calls still using the workspace.
+    cudaFree(workspace);
+    workspace = nullptr;
+  }
+  workspaceSize = 0;
+  if (Ddesc != nullptr)
+    cublasLtMatrixLayoutDestroy(Ddesc);
+  if (Cdesc != nullptr)
+    cublasLtMatrixLayoutDestroy(Cdesc);
+  if (Bdesc != nullptr)
+    cublasLtMatrixLayoutDestroy(Bdesc);
+  if (Adesc != nullptr)
+    cublasLtMatrixLayoutDestroy(Adesc);
+  if (operationDesc != nullptr)
+    cublasLtMatmulDescDestroy(operationDesc);
+  Adesc = Bdesc = Cdesc = Ddesc = nullptr;
+  operationDesc = nullptr;
+  initialized = false;
+}
+
 CustomGemmKernel::CustomGemmKernel(const OrtApi &api,
                                    const OrtKernelInfo *info) {
   row_major_ =
@@ -153,6 +178,10 @@ CustomGemmKernel::CustomGemmKernel(const OrtApi &api,
       api, info, "fastAccumulationMode", true);
   smCount_ = KernelInfoGetOptionalAttribute<int64_t>(api, info, "smCount", 0);
   alpha_ = KernelInfoGetOptionalAttribute<float>(api, info, "alpha", 1);
+  int64_t plan_cache_size =
+      KernelInfoGetOptionalAttribute<int64_t>(api, info, "planCacheSize", 8);
+  plans_ = std::make_unique<PlanCache<CustomGemmPlan>>(
+      static_cast<size_t>(std::max<int64_t>(plan_cache_size, 1)));
 
   // A string attribute.
   std::string compute_type = KernelInfoGetOptionalAttributeString(
@@ -170,6 +199,16 @@ CustomGemmKernel::CustomGemmKernel(const OrtApi &api,
   } else {
     EXT_THROW("Unexpected value for compute_type '", compute_type, "'.");
   }
+  // One handle for every call, it is created last so that
+  // no exception can be raised after it is created.
+  CUBLAS_THROW_IF_ERROR(cublasLtCreate(&cublasLt_));
+}
+
+CustomGemmKernel::~CustomGemmKernel() {
+  // The plans are released before the handle.
+  plans_.reset();
+  if (cublasLt_ != nullptr)
+    cublasLtDestroy(cublasLt_);
 }
 
 void CustomGemmKernel::set(const std::vector<int64_t> &a_shape,
@@ -255,8 +294,15 @@ void CustomGemmKernel::Compute(OrtKernelContext *context) {
   auto dtype_A = input_A.GetTensorTypeAndShapeInfo().GetElementType();
   auto dtype_B = input_B.GetTensorTypeAndShapeInfo().GetElementType();
 
-  int M, N, K, lda, ldb, ldd;
-  set(a_shape, b_shape, M, N, K, lda, ldb, ldd);
+  // The dimensions, the descriptors and the algorithm only depend
+  // on the input shapes and types, they are computed once per shape.
+  std::shared_ptr<CustomGemmPlan> plan = plans_->Get(MakeShapeKey(ctx), [&]() {
+    auto p = std::make_shared<CustomGemmPlan>();
+    set(a_shape, b_shape, p->M, p->N, p->K, p->lda, p->ldb, p->ldd);
+    return p;
+  });
+  int M = plan->M, N = plan->N, K = plan->K;
+  int lda = plan->lda, ldb = plan->ldb, ldd = plan->ldd;
   std::vector<int64_t> dimensions{M, N};
   Ort::UnownedValue Y = ctx.GetOutput(0, dimensions);
   ONNXTensorElementDataType out_dtype =
@@ -267,208 +313,199 @@ void CustomGemmKernel::Compute(OrtKernelContext *context) {
               "Output 1 is not on CUDA");
 
   cudaStream_t stream = (cudaStream_t)ctx.GetGPUComputeStream();
-  cublasLtHandle_t cublasLt;
-  CUBLAS_THROW_IF_ERROR(cublasLtCreate(&cublasLt));
 
-  cublasLtMatmulDesc_t operationDesc = nullptr;
-  cublasLtMatrixLayout_t Adesc = nullptr, Bdesc = nullptr, Cdesc = nullptr,
-                         Ddesc = nullptr;
-
-  // Create matrix descriptors. Not setting any extra attributes.
   cudaDataType_t a_cuda_type = ToCudaDataType(dtype_A);
   cudaDataType_t b_cuda_type = ToCudaDataType(dtype_B);
   cudaDataType_t d_cuda_type = ToCudaDataType(out_dtype);
   cudaDataType_t bias_cuda_type =
       ToCudaDataType(ONNX_TENSOR_ELEMENT_DATA_TYPE_FLOAT);
   cudaDataType_t scale_cuda_type = bias_cuda_type;
+  bool c_as_bias = false;
+#if ORT_VERSION >= 1160 && CUDA_VERSION >= 11080
+  // For FP8 output, cuBLAS requires C_type to be same as bias_type
+  c_as_bias = n_inputs == 5 &&
+              (out_dtype == ONNX_TENSOR_ELEMENT_DATA_TYPE_FLOAT8E4M3FN ||
+               out_dtype == ONNX_TENSOR_ELEMENT_DATA_TYPE_FLOAT8E5M2);
+#endif
+  cublasLtEpilogue_t epilogue = CUBLASLT_EPILOGUE_DEFAULT;
 
-  CUBLAS_THROW_IF_ERROR(cublasLtMatrixLayoutCreate(
-      &Adesc, a_cuda_type, transA_ ? K : M, transA_ ? M : K, lda));
-  CUBLAS_THROW_IF_ERROR(cublasLtMatrixLayoutCreate(
-      &Bdesc, b_cuda_type, transB_ ? N : K, transB_ ? K : N, ldb));
-  CUBLAS_THROW_IF_ERROR(
-      cublasLtMatrixLayoutCreate(&Ddesc, d_cuda_type, M, N, ldd));
-
-  if (row_major_) {
-    cublasLtOrder_t matrixOrder = CUBLASLT_ORDER_ROW;
-    CUBLAS_THROW_IF_ERROR(
-        cublasLtMatrixLayoutSetAttribute(Adesc, CUBLASLT_MATRIX_LAYOUT_ORDER,
-                                         &matrixOrder, sizeof(matrixOrder)));
-    CUBLAS_THROW_IF_ERROR(
-        cublasLtMatrixLayoutSetAttribute(Bdesc, CUBLASLT_MATRIX_LAYOUT_ORDER,
-                                         &matrixOrder, sizeof(matrixOrder)));
-  }
-
-  CUBLAS_THROW_IF_ERROR(
-      cublasLtMatmulDescCreate(&operationDesc, computeType_, scale_cuda_type));
-  cublasOperation_t transa = transA_ ? CUBLAS_OP_T : CUBLAS_OP_N;
-  cublasOperation_t transb = transB_ ? CUBLAS_OP_T : CUBLAS_OP_N;
-  CUBLAS_THROW_IF_ERROR(cublasLtMatmulDescSetAttribute(
-      operationDesc, CUBLASLT_MATMUL_DESC_TRANSA, &transa, sizeof(transa)));
-  CUBLAS_THROW_IF_ERROR(cublasLtMatmulDescSetAttribute(
-      operationDesc, CUBLASLT_MATMUL_DESC_TRANSB, &transb, sizeof(transb)));
-
-  if (smCount_ != 0) {
-    int math_sm_count = static_cast<int>(smCount_);
-    CUBLAS_THROW_IF_ERROR(cublasLtMatmulDescSetAttribute(
-        operationDesc, CUBLASLT_MATMUL_DESC_SM_COUNT_TARGET, &math_sm_count,
-        sizeof(math_sm_count)));
-  }
+  {
+    // The descriptors and the workspace are shared by every call using
+    // the plan, the calls are enqueued one after another.
+    std::lock_guard<std::mutex> lock(plan->mutex);
+    if (!plan->initialized) {
+      try {
+        CUBLAS_THROW_IF_ERROR(cublasLtMatmulDescCreate(
+            &plan->operationDesc, computeType_, scale_cuda_type));
+        cublasOperation_t transa = transA_ ? CUBLAS_OP_T : CUBLAS_OP_N;
+        cublasOperation_t transb = transB_ ? CUBLAS_OP_T : CUBLAS_OP_N;
+        CUBLAS_THROW_IF_ERROR(cublasLtMatmulDescSetAttribute(
+            plan->operationDesc, CUBLASLT_MATMUL_DESC_TRANSA, &transa,
+            sizeof(transa)));
+        CUBLAS_THROW_IF_ERROR(cublasLtMatmulDescSetAttribute(
+            plan->operationDesc, CUBLASLT_MATMUL_DESC_TRANSB, &transb,
+            sizeof(transb)));
+
+        if (smCount_ != 0) {
+          int math_sm_count = static_cast<int>(smCount_);
+          CUBLAS_THROW_IF_ERROR(cublasLtMatmulDescSetAttribute(
+              plan->operationDesc, CUBLASLT_MATMUL_DESC_SM_COUNT_TARGET,
+              &math_sm_count, sizeof(math_sm_count)));
+        }
+
+        if (n_inputs == 5) {
+          // gemm float 8
+          const int8_t ifast_accumulation_mode = fastAccumulationMode_ ? 1 : 0;
+          CUBLAS_THROW_IF_ERROR(cublasLtMatmulDescSetAttribute(
+              plan->operationDesc,
+              cublasLtMatmulDescAttributes_t::CUBLASLT_MATMUL_DESC_FAST_ACCUM,
+              &ifast_accumulation_mode, sizeof(ifast_accumulation_mode)));
+          if (c_as_bias) {
+            CUBLAS_THROW_IF_ERROR(cublasLtMatmulDescSetAttribute(
+                plan->operationDesc, CUBLASLT_MATMUL_DESC_BIAS_DATA_TYPE,
+                &bias_cuda_type, sizeof(bias_cuda_type)));
+          }
+        }
+
+        CUBLAS_THROW_IF_ERROR(cublasLtMatmulDescSetAttribute(
+            plan->operationDesc, CUBLASLT_MATMUL_DESC_EPILOGUE, &epilogue,
+            sizeof(epilogue)));
+
+        // Create matrix descriptors. Not setting any extra attributes.
+        CUBLAS_THROW_IF_ERROR(cublasLtMatrixLayoutCreate(
+            &plan->Adesc, a_cuda_type, transA_ ? K : M, transA_ ? M : K, lda));
+        CUBLAS_THROW_IF_ERROR(cublasLtMatrixLayoutCreate(
+            &plan->Bdesc, b_cuda_type, transB_ ? N : K, transB_ ? K : N, ldb));
+        CUBLAS_THROW_IF_ERROR(
+            cublasLtMatrixLayoutCreate(&plan->Ddesc, d_cuda_type, M, N, ldd));
+        // An output is still needed but it is not initialized.
+        CUBLAS_THROW_IF_ERROR(cublasLtMatrixLayoutCreate(
+            &plan->Cdesc, c_as_bias ? bias_cuda_type : d_cuda_type, M, N, ldd));
+
+        if (row_major_) {
+          cublasLtOrder_t matrixOrder = CUBLASLT_ORDER_ROW;
+          CUBLAS_THROW_IF_ERROR(cublasLtMatrixLayoutSetAttribute(
+              plan->Adesc, CUBLASLT_MATRIX_LAYOUT_ORDER, &matrixOrder,
+              sizeof(matrixOrder)));
+          CUBLAS_THROW_IF_ERROR(cublasLtMatrixLayoutSetAttribute(
+              plan->Bdesc, CUBLASLT_MATRIX_LAYOUT_ORDER, &matrixOrder,
+              sizeof(matrixOrder)));
+          CUBLAS_THROW_IF_ERROR(cublasLtMatrixLayoutSetAttribute(
+              plan->Cdesc, CUBLASLT_MATRIX_LAYOUT_ORDER, &matrixOrder,
+              sizeof(matrixOrder)));
+          CUBLAS_THROW_IF_ERROR(cublasLtMatrixLayoutSetAttribute(
+              plan->Ddesc, CUBLASLT_MATRIX_LAYOUT_ORDER, &matrixOrder,
+              sizeof(matrixOrder)));
+        }
+
+        // See
+        // https://docs.nvidia.com/cuda/cublas/index.html?highlight=cublasLtMatmulPreferenceAttributes_t#cublasltmatmulpreferenceattributes-t
+        // The workspace is allocated once per plan.
+        size_t workspaceSize = std::max(
+            (size_t)1 << 20,
+            (std::min((size_t)(1 << 24), (size_t)std::max(K * M, K * N) * 4) +
+             16)); // suggested fixed value 24Mb
+        workspaceSize -= workspaceSize % 16;
+        cublasLtMatmulPreference_t preference = nullptr;
+        cublasLtMatmulPreferenceCreate(&preference);
+        cublasLtMatmulPreferenceSetAttribute(
+            preference, CUBLASLT_MATMUL_PREF_MAX_WORKSPACE_BYTES,
+            &workspaceSize, sizeof(workspaceSize));
+
+        // https://docs.nvidia.com/cuda/cublas/index.html?highlight=cublasLtMatmulAlgoGetHeuristic#cublasltmatmulalgogetheuristic
+        cublasLtMatmulHeuristicResult_t heuristicResult = {};
+        int returnedResults = 0;
+        cublasStatus_t cuda_status = cublasLtMatmulAlgoGetHeuristic(
+            cublasLt_, plan->operationDesc, plan->Adesc, plan->Bdesc,
+            plan->Cdesc, plan->Ddesc, preference, 1, &heuristicResult,
+            &returnedResults);
+        CUBLAS_THROW_IF_ERROR(cublasLtMatmulPreferenceDestroy(preference));
+        EXT_ENFORCE(
+            returnedResults > 0 && cuda_status == CUBLAS_STATUS_SUCCESS,
+            " Unable to find any suitable algorithm due to ",
+            cublasGetErrorEnum(cuda_status), ", returnedResults=", returnedResults,
+            ", alpha=", alpha_,
+            ", n_inputs=", n_inputs, ", A_type=", CudaDataTypeToString(a_cuda_type),
+            ", B_type=", CudaDataTypeToString(b_cuda_type),
+            ", result_type=", CudaDataTypeToString(d_cuda_type),
+            ", bias_type=", CudaDataTypeToString(bias_cuda_type),
+            ", scale_type=", CudaDataTypeToString(scale_cuda_type),
+            ", computeType=", CublasComputeTypeToString(computeType_),
+            ", epilogue=", epilogue, ", smCount=", smCount_, ", transA=", transA_,
+            ", transB=", transB_,
+            ", fastAccumulationMode=", (fastAccumulationMode_ ? 1 : 0),
+            ", a_shape=", a_shape[0], "x", a_shape[1], ", b_shape=", b_shape[0], "x",
+            b_shape[1], ", M=", M, ", N=", N, ", K=", K, ", lda=", lda, ", ldb=", ldb,
+            ", ldd=", ldd, ", workspaceSize=", workspaceSize,
+            ", rowMajor=", (row_major_ ? 1 : 0),
+            ". Check NVIDIA documentation to see what combination is valid: ",
+            "https://docs.nvidia.com/cuda/cublas/"
+            "index.html?highlight=cublasLtMatmulAlgoGetHeuristic#"
+            "cublasltmatmulalgogetheuristic.");
+        plan->algo = heuristicResult.algo;
+        if (workspaceSize > 0) {
+          CUDA_THROW_IF_ERROR(cudaMalloc(&plan->workspace, workspaceSize));
+        }
+        plan->workspaceSize = workspaceSize;
+        plan->initialized = true;
+      } catch (...) {
+        // A partially created plan is released, the next call creates it again.
+        plan->Release();
+        throw;
+      }
+    }
+    size_t workspaceSize = plan->workspaceSize;
 
-  const void *p_scale_a = nullptr;
-  const void *p_scale_b = nullptr;
-  const void *p_scale_y = nullptr;
-  if (n_inputs == 5) {
-    // gemm float 8
-    const int8_t ifast_accumulation_mode = fastAccumulationMode_ ? 1 : 0;
-    CUBLAS_THROW_IF_ERROR(cublasLtMatmulDescSetAttribute(
-        operationDesc,
-        cublasLtMatmulDescAttributes_t::CUBLASLT_MATMUL_DESC_FAST_ACCUM,
-        &ifast_accumulation_mode, sizeof(ifast_accumulation_mode)));
-    p_scale_a = scale_A.GetTensorRawData();
-    CUBLAS_THROW_IF_ERROR(cublasLtMatmulDescSetAttribute(
-        operationDesc, CUBLASLT_MATMUL_DESC_A_SCALE_POINTER, &p_scale_a,
-        sizeof(p_scale_a)));
-    p_scale_b = scale_B.GetTensorRawData();
-    CUBLAS_THROW_IF_ERROR(cublasLtMatmulDescSetAttribute(
-        operationDesc, CUBLASLT_MATMUL_DESC_B_SCALE_POINTER, &p_scale_b,
-        sizeof(p_scale_b)));
-    p_scale_y = scale_Y.GetTensorRawData();
-    CUBLAS_THROW_IF_ERROR(cublasLtMatmulDescSetAttribute(
-        operationDesc, CUBLASLT_MATMUL_DESC_D_SCALE_POINTER, &p_scale_y,
-        sizeof(p_scale_b)));
-
-    // float 8
-#if ORT_VERSION >= 1160 && CUDA_VERSION >= 11080
-    if (out_dtype == ONNX_TENSOR_ELEMENT_DATA_TYPE_FLOAT8E4M3FN ||
-        out_dtype == ONNX_TENSOR_ELEMENT_DATA_TYPE_FLOAT8E5M2) {
-      // For FP8 output, cuBLAS requires C_type to be same as bias_type
-      CUBLAS_THROW_IF_ERROR(
-          cublasLtMatrixLayoutCreate(&Cdesc, bias_cuda_type, M, N, ldd));
+    if (n_inputs == 5) {
+      // The scales change with every call.
+      const void *p_scale_a = scale_A.GetTensorRawData();
+      CUBLAS_THROW_IF_ERROR(cublasLtMatmulDescSetAttribute(
+          plan->operationDesc, CUBLASLT_MATMUL_DESC_A_SCALE_POINTER, &p_scale_a,
+          sizeof(p_scale_a)));
+      const void *p_scale_b = scale_B.GetTensorRawData();
       CUBLAS_THROW_IF_ERROR(cublasLtMatmulDescSetAttribute(
-          operationDesc, CUBLASLT_MATMUL_DESC_BIAS_DATA_TYPE, &bias_cuda_type,
-          sizeof(bias_cuda_type)));
-    } else {
-      CUBLAS_THROW_IF_ERROR(
-          cublasLtMatrixLayoutCreate(&Cdesc, d_cuda_type, M, N, ldd));
+          plan->operationDesc, CUBLASLT_MATMUL_DESC_B_SCALE_POINTER, &p_scale_b,
+          sizeof(p_scale_b)));
+      const void *p_scale_y = scale_Y.GetTensorRawData();
+      CUBLAS_THROW_IF_ERROR(cublasLtMatmulDescSetAttribute(
+          plan->operationDesc, CUBLASLT_MATMUL_DESC_D_SCALE_POINTER, &p_scale_y,
+          sizeof(p_scale_y)));
     }
-  } else {
-    CUBLAS_THROW_IF_ERROR(
-        cublasLtMatrixLayoutCreate(&Cdesc, d_cuda_type, M, N, ldd));
-  }
-#else
-    // An output is still needed but it is not initialized.
-    CUBLAS_THROW_IF_ERROR(
-        cublasLtMatrixLayoutCreate(&Cdesc, d_cuda_type, M, N, ldd));
-#endif
-
-  if (row_major_) {
-    cublasLtOrder_t matrixOrder = CUBLASLT_ORDER_ROW;
-    CUBLAS_THROW_IF_ERROR(
-        cublasLtMatrixLayoutSetAttribute(Cdesc, CUBLASLT_MATRIX_LAYOUT_ORDER,
-                                         &matrixOrder, sizeof(matrixOrder)));
-    CUBLAS_THROW_IF_ERROR(
-        cublasLtMatrixLayoutSetAttribute(Ddesc, CUBLASLT_MATRIX_LAYOUT_ORDER,
-                                         &matrixOrder, sizeof(matrixOrder)));
-  }
 
-  cublasLtEpilogue_t epilogue = CUBLASLT_EPILOGUE_DEFAULT;
-  cublasLtMatmulDescSetAttribute(operationDesc, CUBLASLT_MATMUL_DESC_EPILOGUE,
-                                 &epilogue, sizeof(epilogue));
-
-  // See
-  // https://docs.nvidia.com/cuda/cublas/index.html?highlight=cublasLtMatmulPreferenceAttributes_t#cublasltmatmulpreferenceattributes-t
-  // The workspace should be allocated once from OpKernelContext assuming
-  // only one cuda function is running at a time (which is not necessarily true
-  // with H100).
-  size_t workspaceSize = std::max(
-      (size_t)1 << 20,
-      (std::min((size_t)(1 << 24), (size_t)std::max(K * M, K * N) * 4) +
-       16)); // suggested fixed value 24Mb
-  workspaceSize -= workspaceSize % 16;
-  cublasLtMatmulPreference_t preference = nullptr;
-  cublasLtMatmulPreferenceCreate(&preference);
-  cublasLtMatmulPreferenceSetAttribute(preference,
-                                       CUBLASLT_MATMUL_PREF_MAX_WORKSPACE_BYTES,
-                                       &workspaceSize, sizeof(workspaceSize));
-
-  // https://docs.nvidia.com/cuda/cublas/index.html?highlight=cublasLtMatmulAlgoGetHeuristic#cublasltmatmulalgogetheuristic
-  cublasLtMatmulHeuristicResult_t heuristicResult = {};
-  int returnedResults = 0;
-  cublasStatus_t cuda_status = cublasLtMatmulAlgoGetHeuristic(
-      cublasLt, operationDesc, Adesc, Bdesc, Cdesc, Ddesc, preference, 1,
-      &heuristicResult, &returnedResults);
-  EXT_ENFORCE(
-      returnedResults > 0 && cuda_status == CUBLAS_STATUS_SUCCESS,
-      " Unable to find any suitable algorithm due to ",
-      cublasGetErrorEnum(cuda_status), ", returnedResults=", returnedResults,
-      ", alpha=", alpha_,
-      ", n_inputs=", n_inputs, ", A_type=", CudaDataTypeToString(a_cuda_type),
-      ", B_type=", CudaDataTypeToString(b_cuda_type),
-      ", result_type=", CudaDataTypeToString(d_cuda_type),
-      ", bias_type=", CudaDataTypeToString(bias_cuda_type),
-      ", scale_type=", CudaDataTypeToString(scale_cuda_type),
-      ", computeType=", CublasComputeTypeToString(computeType_),
-      ", epilogue=", epilogue, ", smCount=", smCount_, ", transA=", transA_,
-      ", transB=", transB_,
-      ", fastAccumulationMode=", (fastAccumulationMode_ ? 1 : 0),
-      ", a_shape=", a_shape[0], "x", a_shape[1], ", b_shape=", b_shape[0], "x",
-      b_shape[1], ", M=", M, ", N=", N, ", K=", K, ", lda=", lda, ", ldb=", ldb,
-      ", ldd=", ldd, ", workspaceSize=", workspaceSize,
-      ", rowMajor=", (row_major_ ? 1 : 0),
-      ". Check NVIDIA documentation to see what combination is valid: ",
-      "https://docs.nvidia.com/cuda/cublas/"
-      "index.html?highlight=cublasLtMatmulAlgoGetHeuristic#"
-      "cublasltmatmulalgogetheuristic.");
-
-  void *workspace = nullptr;
-  if (workspaceSize > 0) {
-    CUDA_THROW_IF_ERROR(cudaMalloc((void **)&workspace, workspaceSize));
+    // https://docs.nvidia.com/cuda/cublas/index.html?highlight=cublasLtMatmul#cublasltmatmul
+    float beta = 0;
+    void *C = Y.GetTensorMutableRawData();
+    cublasStatus_t cuda_status = cublasLtMatmul(
+        cublasLt_, plan->operationDesc,
+        static_cast<const void *>(&alpha_),              /* alpha */
+        input_A.GetTensorRawData(),                      /* A */
+        plan->Adesc, input_B.GetTensorRawData(),         /* B */
+        plan->Bdesc, static_cast<const void *>(&beta),   /* beta */
+        C,                                               /* C */
+        plan->Cdesc, Y.GetTensorMutableRawData(),        /* Y */
+        plan->Ddesc, &plan->algo,                        /* algo */
+        plan->workspace,                                 /* workspace */
+        workspaceSize, stream);                          /* stream */
+    EXT_ENFORCE(
+        cuda_status == CUBLAS_STATUS_SUCCESS,
+        " Unable to run cublasLtMatmul due to ",
+        cublasGetErrorEnum(cuda_status),
+        ", alpha=", alpha_,
+        ", n_inputs=", n_inputs, ", A_type=", CudaDataTypeToString(a_cuda_type),
+        ", B_type=", CudaDataTypeToString(b_cuda_type),
+        ", result_type=", CudaDataTypeToString(d_cuda_type),
+        ", bias_type=", CudaDataTypeToString(bias_cuda_type),
+        ", scale_type=", CudaDataTypeToString(scale_cuda_type),
+        ", computeType=", CublasComputeTypeToString(computeType_),
+        ", epilogue=", epilogue, ", smCount=", smCount_, ", transA=", transA_,
+        ", transB=", transB_,
+        ", fastAccumulationMode=", (fastAccumulationMode_ ? 1 : 0),
+        ", a_shape=", a_shape[0], "x", a_shape[1], ", b_shape=", b_shape[0], "x",
+        b_shape[1], ", M=", M, ", N=", N, ", K=", K, ", lda=", lda, ", ldb=", ldb,
+        ", ldd=", ldd, ", workspaceSize=", workspaceSize,
+        ", rowMajor=", (row_major_ ? 1 : 0),
+        ".");
   }
-  // https://docs.nvidia.com/cuda/cublas/index.html?highlight=cublasLtMatmul#cublasltmatmul
-  float beta = 0;
-  void *C = Y.GetTensorMutableRawData();
-  cuda_status = cublasLtMatmul(
-      cublasLt, operationDesc, static_cast<const void *>(&alpha_), /* alpha */
-      input_A.GetTensorRawData(),                                  /* A */
-      Adesc, input_B.GetTensorRawData(),                           /* B */
-      Bdesc, static_cast<const void *>(&beta),                     /* beta */
-      C,                                                           /* C */
-      Cdesc, Y.GetTensorMutableRawData(),                          /* Y */
-      Ddesc, &heuristicResult.algo,                                /* algo */
-      workspace,                                                   /* workspace */
-      workspaceSize, stream);                                      /* stream */
-  EXT_ENFORCE(
-      cuda_status == CUBLAS_STATUS_SUCCESS,
-      " Unable to run cublasLtMatmul due to ",
-      cublasGetErrorEnum(cuda_status), ", returnedResults=", returnedResults,
-      ", alpha=", alpha_,
-      ", n_inputs=", n_inputs, ", A_type=", CudaDataTypeToString(a_cuda_type),
-      ", B_type=", CudaDataTypeToString(b_cuda_type),
-      ", result_type=", CudaDataTypeToString(d_cuda_type),
-      ", bias_type=", CudaDataTypeToString(bias_cuda_type),
-      ", scale_type=", CudaDataTypeToString(scale_cuda_type),
-      ", computeType=", CublasComputeTypeToString(computeType_),
-      ", epilogue=", epilogue, ", smCount=", smCount_, ", transA=", transA_,
-      ", transB=", transB_,
-      ", fastAccumulationMode=", (fastAccumulationMode_ ? 1 : 0),
-      ", a_shape=", a_shape[0], "x", a_shape[1], ", b_shape=", b_shape[0], "x",
-      b_shape[1], ", M=", M, ", N=", N, ", K=", K, ", lda=", lda, ", ldb=", ldb,
-      ", ldd=", ldd, ", workspaceSize=", workspaceSize,
-      ", rowMajor=", (row_major_ ? 1 : 0),
-      ".");
-
-  if (workspaceSize > 0) {
-    cudaFree(workspace);
-  }
-
-  CUBLAS_THROW_IF_ERROR(cublasLtMatmulPreferenceDestroy(preference));
-  CUBLAS_THROW_IF_ERROR(cublasLtMatrixLayoutDestroy(Ddesc));
-  CUBLAS_THROW_IF_ERROR(cublasLtMatrixLayoutDestroy(Cdesc));
-  CUBLAS_THROW_IF_ERROR(cublasLtMatrixLayoutDestroy(Bdesc));
-  CUBLAS_THROW_IF_ERROR(cublasLtMatrixLayoutDestroy(Adesc));
-  CUBLAS_THROW_IF_ERROR(cublasLtMatmulDescDestroy(operationDesc));
-  CUBLAS_THROW_IF_ERROR(cublasLtDestroy(cublasLt));
 
   std::vector<int64_t> tdims{1};
   Ort::UnownedValue ttime = ctx.GetOutput(1, tdims);
@@ -4,10 +4,35 @@
 #include "cublas_v2.h"
 #include <cuda_runtime.h>
 
+#include <cublasLt.h>
+#include <mutex>
+
 namespace ortops {
 
+// Everything CustomGemmKernel computes from the input shapes.
+// The dimensions are set when the plan is created, the descriptors,
+// the algorithm and the workspace are set by the first call using the plan.
+// The mutex protects them, calls using the same plan run one after another.
+struct CustomGemmPlan {
+  int M, N, K, lda, ldb, ldd;
+  std::mutex mutex;
+  bool initialized = false;
+  cublasLtMatmulDesc_t operationDesc = nullptr;
+  cublasLtMatrixLayout_t Adesc = nullptr;
+  cublasLtMatrixLayout_t Bdesc = nullptr;
+  cublasLtMatrixLayout_t Cdesc = nullptr;
+  cublasLtMatrixLayout_t Ddesc = nullptr;
+  cublasLtMatmulAlgo_t algo;
+  void *workspace = nullptr;
+  size_t workspaceSize = 0;
+  ~CustomGemmPlan();
+  // Destroys everything the plan created, the plan is no longer initialized.
+  void Release();
+};
+
 struct CustomGemmKernel {
   CustomGemmKernel(const OrtApi &api, const OrtKernelInfo *info);
+  ~CustomGemmKernel();
   void Compute(OrtKernelContext *context);
 
 private:
@@ -23,6 +48,8 @@ private:
   bool row_major_;
   int64_t smCount_;
   cublasComputeType_t computeType_;
+  cublasLtHandle_t cublasLt_ = nullptr;
+  std::unique_ptr<PlanCache<CustomGemmPlan>> plans_;
 };
 
 struct CustomGemmOpFloat
@@ -14,7 +14,15 @@ class _ClassifierCommon:
         Replaces int64 predicted labels by the corresponding
         strings.
         """
-        if classlabels_int64s_string is not None and len(classlabels_int64s_string) > 0:
+        if (
+            label is not None
+            and classlabels_int64s_string is not None
+            and len(classlabels_int64s_string) > 0
+        ):
+            if label.size == 0 or (
+                label.min() >= 0 and label.max() < len(classlabels_int64s_string)
+            ):
+                return numpy.array(classlabels_int64s_string)[label], scores
             new_label = []
             no_array = False
             for i in label:
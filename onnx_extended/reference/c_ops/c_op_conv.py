@@ -13,6 +13,19 @@ class Conv(OpRun):
     ):
         OpRun.__init__(self, onnx_node, run_params, schema)
         self.cache_ = {}
+        self.denormal_as_zero = False
+
+    def set_denormal_as_zero(self, denormal_as_zero: bool = True):
+        """
+        Flushes denormal numbers to zero (FTZ/DAZ) on every thread
+        used by the C implementation while it computes the output.
+        The previous state of every thread is restored afterwards.
+
+        :param denormal_as_zero: enables or disables the mode
+        """
+        self.denormal_as_zero = denormal_as_zero
+        for rt in self.cache_.values():
+            rt.set_denormal_as_zero(denormal_as_zero)
 
     def _run(
         self,
@@ -36,6 +49,7 @@ class Conv(OpRun):
                     f"No C implementation C for operator 'Conv' and dtype={X.dtype}."
                 )
             self.cache_[X.dtype] = rt
+            rt.set_denormal_as_zero(self.denormal_as_zero)
 
             rt.init(
                 auto_pad,
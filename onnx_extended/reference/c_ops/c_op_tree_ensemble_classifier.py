@@ -1,4 +1,4 @@
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 import numpy
 from onnx import NodeProto
 from onnx.reference.op_run import OpRun
@@ -17,6 +17,10 @@ class TreeEnsembleClassifierCommon(OpRun, _ClassifierCommon):
     ):
         OpRun.__init__(self, onnx_node, run_params, schema=schema)
         self.parallel = None
+        self.denormal_as_zero = False
+        self.reduced_precision = None
+        self.early_exit = None
+        self.outputs = (True, True)
         self.rt_ = None
         # default is no parallelization
         self.set_parallel(int(100e6), int(100e6), int(100e6), 1, 1, 0)
@@ -52,6 +56,100 @@ class TreeEnsembleClassifierCommon(OpRun, _ClassifierCommon):
         if self.rt_ is not None:
             self.rt_.set(*self.parallel)
 
+    def set_denormal_as_zero(self, denormal_as_zero: bool = True):
+        """
+        Flushes denormal numbers to zero (FTZ/DAZ) on every thread
+        used by the C implementation while it computes the predictions.
+        The previous state of every thread is restored afterwards.
+
+        :param denormal_as_zero: enables or disables the mode
+        """
+        self.denormal_as_zero = denormal_as_zero
+        if self.rt_ is not None:
+            self.rt_.set_denormal_as_zero(denormal_as_zero)
+
+    def set_outputs(self, labels: bool = True, probabilities: bool = True):
+        """
+        Selects the outputs to compute. The labels and the probabilities
+        are computed in the same pass over the rows, an output which
+        is not needed is not allocated and is returned as None.
+        The post transform is skipped if the probabilities are not needed.
+
+        :param labels: computes the labels
+        :param probabilities: computes the probabilities
+        """
+        self.outputs = (labels, probabilities)
+
+    def set_early_exit(self, block_size: int = 100, margin: float = 0):
+        """
+        Evaluates the trees by blocks for a binary classifier.
+        After every block, a row stops if the remaining trees cannot
+        change its label, the maximum contribution of every tree is
+        computed when the runtime is initialized. If *margin* is positive,
+        a row also stops if its probability (or its score if there is no
+        post transform) is further than *margin* from the decision
+        threshold, the label may then differ from the one
+        obtained with all trees. Probabilities of the rows which
+        stopped only include the evaluated trees.
+
+        :param block_size: number of trees evaluated before checking
+            a row can stop, 0 to disable the early exit
+        :param margin: margin to the decision threshold, 0 to only stop
+            rows whose label cannot change anymore
+        """
+        self.early_exit = (block_size, margin)
+        if self.rt_ is not None:
+            self.rt_.set_early_exit(*self.early_exit)
+
+    def get_early_exit_report(self) -> Optional[List[float]]:
+        """
+        Returns the fraction of rows which stopped after every block
+        of trees during the last prediction, the last value includes the rows
+        which went through all trees. None if the runtime is not initialized.
+        If several predictions run at the same time, the report is the one
+        of the prediction which finished last.
+        """
+        if self.rt_ is None:
+            return None
+        return self.rt_.get_early_exit_report()
+
+    def set_reduced_precision(self, reduced_precision: Optional[str] = "float16"):
+        """
+        Stores the thresholds and the leaf weights on 16 bits.
+        A threshold is converted only if every threshold used
+        to split the same feature can be converted without any loss,
+        the decision paths remain the same. The leaf weights are rounded
+        but the scores are still accumulated in float.
+        The conversion happens when the runtime is initialized,
+        :meth:`get_reduced_precision_report` returns the
+        loss of accuracy it introduces.
+
+        :param reduced_precision: `'float16'`, `'bfloat16'` or None
+            to disable it
+        """
+        if reduced_precision not in (None, "float16", "bfloat16"):
+            raise ValueError(f"Unexpected value {reduced_precision!r}.")
+        self.reduced_precision = reduced_precision
+        # the runtime is created again on the next call
+        self.rt_ = None
+
+    def get_reduced_precision_report(self) -> Optional[Dict[str, float]]:
+        """
+        Returns the statistics computed when the runtime was initialized
+        with a reduced precision, None if the runtime is not initialized.
+        Key `applied` is 0 if the model could not be converted,
+        `too_many_thresholds` is then 1 if feature `feature_id` is split
+        with more than 65536 distinct thresholds which cannot be stored
+        on 16 bits, `weight_out_of_range` is 1 if a leaf weight cannot
+        be stored on 16 bits, `max_weight_error` is the largest error on a leaf weight,
+        `max_score_error` bounds the error on the raw scores,
+        `size_before` and `size_after` are the sizes before and
+        after the conversion.
+        """
+        if self.rt_ is None:
+            return None
+        return self.rt_.get_reduced_precision_report()
+
     def _init(self, dtype, **kwargs):
         if dtype == numpy.float32:
             cls = RuntimeTreeEnsembleClassifierFloat
@@ -89,6 +187,8 @@ class TreeEnsembleClassifierCommon(OpRun, _ClassifierCommon):
             len(kwargs.get("classlabels_strings", None) or []),
         )
         self.rt_ = cls()
+        if self.reduced_precision is not None:
+            self.rt_.set_reduced_precision(self.reduced_precision.upper())
         self.rt_.init(
             "SUM",  # 3
             base_values,  # 4
@@ -108,8 +208,14 @@ class TreeEnsembleClassifierCommon(OpRun, _ClassifierCommon):
             kwargs["class_treeids"],  # 18
             cw,  # 19
         )
+        # integer labels replace the class index while computing
+        if kwargs.get("classlabels_int64s", None):
+            self.rt_.set_class_labels(list(kwargs["classlabels_int64s"]))
         if self.parallel is not None:
             self.rt_.set(*self.parallel)
+        self.rt_.set_denormal_as_zero(self.denormal_as_zero)
+        if self.early_exit is not None:
+            self.rt_.set_early_exit(*self.early_exit)
 
     def _run(self, x, **kwargs):
         """
@@ -121,13 +227,15 @@ class TreeEnsembleClassifierCommon(OpRun, _ClassifierCommon):
             x = x.todense()
         if self.rt_ is None:
             self._init(x.dtype, **kwargs)
-        label, scores = self.rt_.compute(x)
-        if scores.shape[0] != label.shape[0]:
-            scores = scores.reshape((label.shape[0], -1))
-        cl = kwargs["classlabels_int64s"] or []
-        if len(cl) == 0:
-            cl = kwargs["classlabels_strings"]
-        return self._post_process_predicted_label(label, scores, cl)
+        label, scores = self.rt_.compute(x, *self.outputs)
+        if scores is not None and scores.shape[0] != x.shape[0]:
+            scores = scores.reshape((x.shape[0], -1))
+        if kwargs["classlabels_int64s"]:
+            # already replaced by the runtime
+            return label, scores
+        return self._post_process_predicted_label(
+            label, scores, kwargs["classlabels_strings"]
+        )
 
 
 class TreeEnsembleClassifier_1(TreeEnsembleClassifierCommon):
@@ -1,4 +1,4 @@
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 import numpy
 from onnx import NodeProto
 from onnx.reference.op_run import OpRun
@@ -16,6 +16,8 @@ class TreeEnsembleRegressorCommon(OpRun):
     ):
         OpRun.__init__(self, onnx_node, run_params, schema=schema)
         self.parallel = None
+        self.denormal_as_zero = False
+        self.reduced_precision = None
         self.rt_ = None
         # default is no parallelization
         self.set_parallel(int(100e6), int(100e6), int(100e6), 1, 1, 0)
@@ -51,6 +53,55 @@ class TreeEnsembleRegressorCommon(OpRun):
         if self.rt_ is not None:
             self.rt_.set(*self.parallel)
 
+    def set_denormal_as_zero(self, denormal_as_zero: bool = True):
+        """
+        Flushes denormal numbers to zero (FTZ/DAZ) on every thread
+        used by the C implementation while it computes the predictions.
+        The previous state of every thread is restored afterwards.
+
+        :param denormal_as_zero: enables or disables the mode
+        """
+        self.denormal_as_zero = denormal_as_zero
+        if self.rt_ is not None:
+            self.rt_.set_denormal_as_zero(denormal_as_zero)
+
+    def set_reduced_precision(self, reduced_precision: Optional[str] = "float16"):
+        """
+        Stores the thresholds and the leaf weights on 16 bits.
+        A threshold is converted only if every threshold used
+        to split the same feature can be converted without any loss,
+        the decision paths remain the same. The leaf weights are rounded
+        but the scores are still accumulated in float.
+        The conversion happens when the runtime is initialized,
+        :meth:`get_reduced_precision_report` returns the
+        loss of accuracy it introduces.
+
+        :param reduced_precision: `'float16'`, `'bfloat16'` or None
+            to disable it
+        """
+        if reduced_precision not in (None, "float16", "bfloat16"):
+            raise ValueError(f"Unexpected value {reduced_precision!r}.")
+        self.reduced_precision = reduced_precision
+        # the runtime is created again on the next call
+        self.rt_ = None
+
+    def get_reduced_precision_report(self) -> Optional[Dict[str, float]]:
+        """
+        Returns the statistics computed when the runtime was initialized
+        with a reduced precision, None if the runtime is not initialized.
+        Key `applied` is 0 if the model could not be converted,
+        `too_many_thresholds` is then 1 if feature `feature_id` is split
+        with more than 65536 distinct thresholds which cannot be stored
+        on 16 bits, `weight_out_of_range` is 1 if a leaf weight cannot
+        be stored on 16 bits, `max_weight_error` is the largest error on a leaf weight,
+        `max_score_error` bounds the error on the raw scores,
+        `size_before` and `size_after` are the sizes before and
+        after the conversion.
+        """
+        if self.rt_ is None:
+            return None
+        return self.rt_.get_reduced_precision_report()
+
     def _init(self, dtype, **kwargs):
         if dtype == numpy.float32:
             cls = RuntimeTreeEnsembleRegressorFloat
@@ -58,6 +109,8 @@ class TreeEnsembleRegressorCommon(OpRun):
             cls = RuntimeTreeEnsembleRegressorDouble
 
         self.rt_ = cls()
+        if self.reduced_precision is not None:
+            self.rt_.set_reduced_precision(self.reduced_precision.upper())
 
         empty_f = numpy.array([], dtype=dtype)
         base_values = numpy.array(
@@ -102,6 +155,7 @@ class TreeEnsembleRegressorCommon(OpRun):
         )
         if self.parallel is not None:
             self.rt_.set(*self.parallel)
+        self.rt_.set_denormal_as_zero(self.denormal_as_zero)
 
     def _run(self, x, **kwargs):
         if hasattr(x, "todense"):
@@ -121,6 +121,17 @@ AGGREGATE_FUNCTION to_AGGREGATE_FUNCTION(const std::string &input) {
                               std::string("' is not defined."));
 }
 
+REDUCED_PRECISION to_REDUCED_PRECISION(const std::string &input) {
+  if (input == "NONE" || input.empty())
+    return REDUCED_PRECISION::NONE;
+  if (input == "FLOAT16")
+    return REDUCED_PRECISION::FLOAT16;
+  if (input == "BFLOAT16")
+    return REDUCED_PRECISION::BFLOAT16;
+  throw std::invalid_argument(std::string("REDUCED_PRECISION '") + input +
+                              std::string("' is not defined."));
+}
+
 StorageOrder to_StorageOrder(const std::string &input) {
   if (input == "UNKNOWN")
     return StorageOrder::UNKNOWN;
@@ -1,6 +1,8 @@
 #pragma once
 
 #include <algorithm>
+#include <cstdint>
+#include <cstring>
 #include <float.h>
 #include <iostream> // cout
 #include <iterator>
@@ -134,6 +136,69 @@ enum class AutoPadType {
 
 AutoPadType to_AutoPadType(const std::string &value);
 
+enum class REDUCED_PRECISION { NONE = 0, FLOAT16 = 1, BFLOAT16 = 2 };
+
+REDUCED_PRECISION to_REDUCED_PRECISION(const std::string &value);
+
+// Conversion from float to float16 (round to nearest even).
+inline uint16_t FloatToFloat16(float f) {
+  uint32_t x;
+  std::memcpy(&x, &f, sizeof(x));
+  uint16_t sign = static_cast<uint16_t>((x >> 16) & 0x8000);
+  uint32_t absx = x & 0x7fffffff;
+  if (absx >= 0x7f800000) // inf or nan
+    return sign | (absx > 0x7f800000 ? 0x7e00 : 0x7c00);
+  if (absx >= 0x477ff000) // rounded to infinity
+    return sign | 0x7c00;
+  if (absx < 0x38800000) { // denormalized float16
+    float a;
+    std::memcpy(&a, &absx, sizeof(a));
+    return sign | static_cast<uint16_t>(std::nearbyint(a * 16777216.0f));
+  }
+  absx += 0xc8000fff + ((absx >> 13) & 1); // exponent bias and rounding
+  return sign | static_cast<uint16_t>(absx >> 13);
+}
+
+inline float Float16ToFloat(uint16_t h) {
+  uint32_t sign = static_cast<uint32_t>(h & 0x8000) << 16;
+  uint32_t exp = (h >> 10) & 0x1f;
+  uint32_t mant = h & 0x3ff;
+  float f;
+  if (exp == 0) {
+    f = std::ldexp(static_cast<float>(mant), -24);
+    return sign ? -f : f;
+  }
+  uint32_t x = exp == 0x1f ? (sign | 0x7f800000 | (mant << 13))
+                           : (sign | ((exp + 112) << 23) | (mant << 13));
+  std::memcpy(&f, &x, sizeof(f));
+  return f;
+}
+
+// Conversion from float to bfloat16 (round to nearest even).
+inline uint16_t FloatToBFloat16(float f) {
+  uint32_t x;
+  std::memcpy(&x, &f, sizeof(x));
+  if ((x & 0x7fffffff) > 0x7f800000) // nan
+    return static_cast<uint16_t>((x >> 16) | 0x40);
+  x += 0x7fff + ((x >> 16) & 1);
+  return static_cast<uint16_t>(x >> 16);
+}
+
+inline float BFloat16ToFloat(uint16_t h) {
+  uint32_t x = static_cast<uint32_t>(h) << 16;
+  float f;
+  std::memcpy(&f, &x, sizeof(f));
+  return f;
+}
+
+inline uint16_t FloatTo16(float f, bool bfloat16) {
+  return bfloat16 ? FloatToBFloat16(f) : FloatToFloat16(f);
+}
+
+inline float Float16To(uint16_t h, bool bfloat16) {
+  return bfloat16 ? BFloat16ToFloat(h) : Float16ToFloat(h);
+}
+
 static inline float ErfInv(float x) {
   float sgn = x < 0 ? -1.0f : 1.0f;
   x = (1 - x) * (1 + x);
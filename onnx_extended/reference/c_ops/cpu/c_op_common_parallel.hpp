@@ -3,6 +3,13 @@
 #include <cstdint>
 #include <omp.h>
 #include <stdexcept>
+#include <vector>
+
+#if defined(__x86_64__) || defined(_M_X64) || defined(__i386__) ||            \
+    defined(_M_IX86)
+#include <xmmintrin.h>
+#define _ONNX_C_OPS_HAS_MXCSR
+#endif
 
 namespace onnx_c_ops {
 
@@ -94,4 +101,60 @@ inline void TryBatchParallelFor(int64_t n_threads, int64_t batch_size,
   }
 }
 
-} // namespace onnx_c_ops
\ No newline at end of file
+// Bits FTZ (flush-to-zero, bit 15) and DAZ (denormals-are-zero, bit 6)
+// of register MXCSR.
+const unsigned int kMxcsrFtzDaz = 0x8040;
+
+inline unsigned int GetDenormalFlags() {
+#if defined(_ONNX_C_OPS_HAS_MXCSR)
+  return _mm_getcsr() & kMxcsrFtzDaz;
+#else
+  return 0;
+#endif
+}
+
+inline void SetDenormalFlags(unsigned int flags) {
+#if defined(_ONNX_C_OPS_HAS_MXCSR)
+  _mm_setcsr((_mm_getcsr() & ~kMxcsrFtzDaz) | (flags & kMxcsrFtzDaz));
+#endif
+}
+
+// MXCSR is a per-thread register. This class sets FTZ and DAZ
+// on the calling thread and on every thread of the openmp pool
+// when it is created and restores the previous values when it is destroyed.
+// It does nothing if *enable* is false or on non x86 processors.
+class DenormalAsZeroScope {
+public:
+  DenormalAsZeroScope(bool enable) : enable_(enable) {
+    if (!enable_)
+      return;
+    n_threads_ = ::omp_get_max_threads();
+    saved_.resize(n_threads_ + 1);
+    saved_[n_threads_] = GetDenormalFlags();
+    SetDenormalFlags(kMxcsrFtzDaz);
+#pragma omp parallel num_threads(n_threads_)
+    {
+      int t = ::omp_get_thread_num();
+      saved_[t] = GetDenormalFlags();
+      SetDenormalFlags(kMxcsrFtzDaz);
+    }
+  }
+
+  ~DenormalAsZeroScope() {
+    if (!enable_)
+      return;
+#pragma omp parallel num_threads(n_threads_)
+    {
+      int t = ::omp_get_thread_num();
+      SetDenormalFlags(saved_[t]);
+    }
+    SetDenormalFlags(saved_[n_threads_]);
+  }
+
+private:
+  bool enable_;
+  int n_threads_;
+  std::vector<unsigned int> saved_;
+};
+
+} // namespace onnx_c_ops
@@ -22,6 +22,9 @@ in :epkg:`onnxruntime`. Supports float only.)pbdoc");
           "Initializes the runtime with the ONNX attributes.");
   clf.def("compute", &ConvFloat::compute,
           "Computes the output for operator Conv.");
+  clf.def("set_denormal_as_zero", &ConvFloat::set_denormal_as_zero,
+          "Flushes denormal numbers to zero (FTZ/DAZ) on every thread "
+          "while computing.");
 
   py::class_<ConvDouble> cld(
       m, "ConvDouble",
@@ -34,4 +37,7 @@ in :epkg:`onnxruntime`. Supports double only.)pbdoc");
           "Initializes the runtime with the ONNX attributes.");
   cld.def("compute", &ConvDouble::compute,
           "Computes the output for operator Conv.");
+  cld.def("set_denormal_as_zero", &ConvDouble::set_denormal_as_zero,
+          "Flushes denormal numbers to zero (FTZ/DAZ) on every thread "
+          "while computing.");
 }
@@ -1,5 +1,6 @@
 #pragma once
 
+#include "c_op_common_parallel.hpp"
 #include "c_op_conv.h"
 #include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
@@ -119,6 +120,10 @@ template <typename T> class Conv : public ConvPoolCommon {
 public:
   Conv();
 
+  void set_denormal_as_zero(bool denormal_as_zero) {
+    denormal_as_zero_ = denormal_as_zero;
+  }
+
   py::array_t<T>
   compute(py::array_t<T, py::array::c_style | py::array::forcecast> X,
           py::array_t<T, py::array::c_style | py::array::forcecast> W,
@@ -137,9 +142,12 @@ protected:
       const std::vector<int64_t> &strides, const std::vector<int64_t> &x_dims,
       const std::vector<int64_t> &y_dims,
       const std::vector<int64_t> &w_dims) const;
+
+  bool denormal_as_zero_;
 };
 
-template <typename T> Conv<T>::Conv() : ConvPoolCommon() {}
+template <typename T>
+Conv<T>::Conv() : ConvPoolCommon(), denormal_as_zero_(false) {}
 
 template <typename T>
 py::array_t<T> Conv<T>::compute(
@@ -197,6 +205,7 @@ void Conv<T>::compute_gil_free(
     const std::vector<int64_t> &dilations, const std::vector<int64_t> &strides,
     const std::vector<int64_t> &x_dims, const std::vector<int64_t> &y_dims,
     const std::vector<int64_t> &w_dims) const {
+  DenormalAsZeroScope denormal_scope(denormal_as_zero_);
   std::vector<int64_t> b_dims;
   arrayshape2vector(b_dims, B);
 
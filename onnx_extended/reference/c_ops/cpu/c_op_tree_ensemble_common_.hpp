@@ -6,6 +6,9 @@
 
 #include "c_op_common_parallel.hpp"
 #include "c_op_tree_ensemble_common_agg_.hpp"
+#include <map>
+#include <mutex>
+#include <tuple>
 
 // #define DEBUG_PRINT(...) printf("%s", MakeString("*", __FILE__, ":", __LINE__, ":", MakeString(__VA_ARGS__), "\n").c_str());
 #define DEBUG_PRINT(...)
@@ -30,6 +33,16 @@ template <class Tp> struct TreeAlloc {
   void deallocate(Tp *p, std::size_t) { AllocatorDefaultFree(p); }
 };
 
+template <class T, class U>
+bool operator==(const TreeAlloc<T> &, const TreeAlloc<U> &) {
+  return true;
+}
+
+template <class T, class U>
+bool operator!=(const TreeAlloc<T> &, const TreeAlloc<U> &) {
+  return false;
+}
+
 class TreeEnsembleCommonAttributes {
 public:
   TreeEnsembleCommonAttributes() {
@@ -39,12 +52,18 @@ public:
     batch_size_tree_ = 2;
     batch_size_rows_ = 2;
     use_node3_ = 0;
+    denormal_as_zero_ = false;
+    reduced_precision_ = REDUCED_PRECISION::NONE;
+    early_exit_block_ = 0;
+    early_exit_margin_ = 0;
   }
 
   int64_t get_target_or_class_count() const {
     return this->n_targets_or_classes_;
   }
 
+  int64_t get_tree_count() const { return this->n_trees_; }
+
   void set(int parallel_tree, int parallel_tree_N, int parallel_N,
            int batch_size_tree, int batch_size_rows, int use_node3) {
     if (parallel_tree >= 0)
@@ -61,6 +80,21 @@ public:
       use_node3_ = use_node3;
   }
 
+  void set_denormal_as_zero(bool denormal_as_zero) {
+    denormal_as_zero_ = denormal_as_zero;
+  }
+
+  // Enables the early exit for binary classifiers if block_size > 0.
+  void set_early_exit(int64_t block_size, double margin) {
+    early_exit_block_ = block_size;
+    early_exit_margin_ = margin;
+  }
+
+  // Must be called before Init.
+  void set_reduced_precision(const std::string &reduced_precision) {
+    reduced_precision_ = to_REDUCED_PRECISION(reduced_precision);
+  }
+
 protected:
   int64_t n_targets_or_classes_;
   POST_EVAL_TRANSFORM post_transform_;
@@ -79,8 +113,114 @@ protected:
   int batch_size_tree_;
   int batch_size_rows_;
   int use_node3_;
+  bool denormal_as_zero_; // sets FTZ/DAZ on every thread while computing
+  REDUCED_PRECISION reduced_precision_; // storage of thresholds and weights
+  int64_t early_exit_block_;            // trees evaluated before a row may exit
+  double early_exit_margin_;            // margin to the decision threshold
+};
+
+// Tells if a row follows the true branch of a node, used by TreeSHAP which
+// needs to evaluate every node independently.
+template <typename InputType, typename ThresholdType>
+inline bool IsTrueBranch(const TreeNodeElement<ThresholdType> *node,
+                         InputType val) {
+  bool cond;
+  switch (node->mode()) {
+  case NODE_MODE::BRANCH_LEQ:
+    cond = val <= node->value_or_unique_weight;
+    break;
+  case NODE_MODE::BRANCH_LT:
+    cond = val < node->value_or_unique_weight;
+    break;
+  case NODE_MODE::BRANCH_GTE:
+    cond = val >= node->value_or_unique_weight;
+    break;
+  case NODE_MODE::BRANCH_GT:
+    cond = val > node->value_or_unique_weight;
+    break;
+  case NODE_MODE::BRANCH_EQ:
+    cond = val == node->value_or_unique_weight;
+    break;
+  case NODE_MODE::BRANCH_NEQ:
+    cond = val != node->value_or_unique_weight;
+    break;
+  default:
+    cond = false;
+    break;
+  }
+  return cond || (node->is_missing_track_true() && _isnan_(val));
+}
+
+// Element of the path of unique features followed by TreeSHAP,
+// see Algorithm 2 in "Consistent Individualized Feature Attribution for
+// Tree Ensembles", Lundberg, Erion, Lee, https://arxiv.org/abs/1802.03888.
+struct ShapPathElement {
+  int64_t feature_index;
+  double zero_fraction;
+  double one_fraction;
+  double pweight;
 };
 
+inline void ShapExtendPath(ShapPathElement *path, int64_t depth,
+                           double zero_fraction, double one_fraction,
+                           int64_t feature_index) {
+  path[depth].feature_index = feature_index;
+  path[depth].zero_fraction = zero_fraction;
+  path[depth].one_fraction = one_fraction;
+  path[depth].pweight = depth == 0 ? 1 : 0;
+  for (int64_t i = depth - 1; i >= 0; --i) {
+    path[i + 1].pweight += one_fraction * path[i].pweight * (i + 1) /
+                           static_cast<double>(depth + 1);
+    path[i].pweight = zero_fraction * path[i].pweight * (depth - i) /
+                      static_cast<double>(depth + 1);
+  }
+}
+
+inline void ShapUnwindPath(ShapPathElement *path, int64_t depth,
+                           int64_t path_index) {
+  const double one_fraction = path[path_index].one_fraction;
+  const double zero_fraction = path[path_index].zero_fraction;
+  double next_one_portion = path[depth].pweight;
+  for (int64_t i = depth - 1; i >= 0; --i) {
+    if (one_fraction != 0) {
+      const double tmp = path[i].pweight;
+      path[i].pweight =
+          next_one_portion * (depth + 1) / ((i + 1) * one_fraction);
+      next_one_portion = tmp - path[i].pweight * zero_fraction * (depth - i) /
+                                   static_cast<double>(depth + 1);
+    } else {
+      path[i].pweight =
+          path[i].pweight * (depth + 1) / (zero_fraction * (depth - i));
+    }
+  }
+  for (int64_t i = path_index; i < depth; ++i) {
+    path[i].feature_index = path[i + 1].feature_index;
+    path[i].zero_fraction = path[i + 1].zero_fraction;
+    path[i].one_fraction = path[i + 1].one_fraction;
+  }
+}
+
+// Sum of the weights of the path if the feature at path_index is removed.
+inline double ShapUnwoundPathSum(const ShapPathElement *path, int64_t depth,
+                                 int64_t path_index) {
+  const double one_fraction = path[path_index].one_fraction;
+  const double zero_fraction = path[path_index].zero_fraction;
+  double next_one_portion = path[depth].pweight;
+  double total = 0;
+  for (int64_t i = depth - 1; i >= 0; --i) {
+    if (one_fraction != 0) {
+      const double tmp =
+          next_one_portion * (depth + 1) / ((i + 1) * one_fraction);
+      total += tmp;
+      next_one_portion = path[i].pweight - tmp * zero_fraction * (depth - i) /
+                                               static_cast<double>(depth + 1);
+    } else if (zero_fraction != 0) {
+      total += path[i].pweight * (depth + 1) / (zero_fraction * (depth - i));
+    }
+  }
+  return total;
+}
+
 template <typename InputType, typename ThresholdType, typename OutputType>
 class TreeEnsembleCommon : public TreeEnsembleCommonAttributes {
 protected:
@@ -101,6 +241,28 @@ protected:
       nodes3_;
   std::vector<TreeNodeElement3<ThresholdType> *> roots3_;
 
+  // reduced precision, nodes_, weights_, roots_ are empty if used
+  std::vector<TreeNodeElement16, TreeAlloc<TreeNodeElement16>> nodes16_;
+  std::vector<SparseValue16> weights16_;
+  std::vector<TreeNodeElement16 *> roots16_;
+  // thresholds which cannot be stored on 16 bits grouped by feature,
+  // the thresholds of feature f start at thresholds16_offsets_[f]
+  std::vector<ThresholdType> thresholds16_;
+  std::vector<int64_t> thresholds16_offsets_;
+  std::map<std::string, double> reduced_precision_report_;
+
+  // early exit, remaining_max_[j] is the sum of the largest absolute leaf
+  // weight over trees j, j+1, ..., n_trees - 1
+  std::vector<double> remaining_max_;
+  // written by the last call to Compute, several calls may run
+  // at the same time, the mutex protects it
+  mutable std::vector<double> early_exit_report_;
+  mutable std::mutex early_exit_mutex_;
+
+  // cover of every node in nodes_ (nodes_hitrates), only used by TreeSHAP,
+  // empty if it was not specified, both branches are then equally likely
+  std::vector<ThresholdType> covers_;
+
 public:
   TreeEnsembleCommon() {}
 
@@ -126,11 +288,40 @@ public:
   Status Compute(int64_t n_rows, int64_t n_features, const InputType *X,
                  OutputType *Y, int64_t *label) const;
 
+  // Stores the leaf reached by every row in every tree, leaves is
+  // a matrix [n_rows, n_trees]. The leaf index is the position of the leaf
+  // among the nodes of its tree, in the order they were given to Init.
+  Status ComputeLeaves(int64_t n_rows, int64_t n_features, const InputType *X,
+                       int32_t *leaves) const;
+
+  // Stores the raw score of every tree for every row, Y is a tensor
+  // [n_rows, n_trees, n_targets_or_classes], no base values,
+  // no aggregation, no post transform.
+  Status ComputeTreeScores(int64_t n_rows, int64_t n_features,
+                           const InputType *X, OutputType *Y) const;
+
+  // Computes the contribution of every feature to the raw score of every
+  // target with TreeSHAP, Y is a tensor [n_rows, n_targets_or_classes,
+  // n_features + 1], the last column is the expected value of the raw score
+  // including the base values. The post transform is not applied.
+  Status ComputeContributions(int64_t n_rows, int64_t n_features,
+                              const InputType *X, OutputType *Y) const;
+
   int omp_get_max_threads() const;
   int64_t get_sizeof() const;
+  std::map<std::string, double> get_reduced_precision_report() const {
+    return reduced_precision_report_;
+  }
+  // Fraction of rows which exited after every stage during the last call
+  // to Compute, the last stage includes the rows which went through all trees.
+  std::vector<double> get_early_exit_report() const {
+    std::lock_guard<std::mutex> lock(early_exit_mutex_);
+    return early_exit_report_;
+  }
 
 protected:
   void ConvertTreeIntoTree3();
+  void ConvertTreeIntoTree16();
   int ConvertTreeNodeElementIntoTreeNodeElement3(
       size_t root_id, InlinedVector<size_t> &to_remove);
 
@@ -138,10 +329,71 @@ protected:
   ProcessTreeNodeLeave(size_t root_id, const InputType *x_data) const;
   const TreeNodeElement<ThresholdType> *
   ProcessTreeNodeLeave3(size_t root_id, const InputType *x_data) const;
+  const TreeNodeElement16 *
+  ProcessTreeNodeLeave16(size_t root_id, const InputType *x_data) const;
+
+  // Gives access to the leaves and the weights whatever the precision
+  // the nodes are stored with.
+  struct NodeStorage {
+    const TreeEnsembleCommon *tree;
+    inline const TreeNodeElement<ThresholdType> *
+    Leave(size_t root_id, const InputType *x_data) const {
+      return tree->ProcessTreeNodeLeave(root_id, x_data);
+    }
+    inline const std::vector<SparseValue<ThresholdType>> &weights() const {
+      return tree->weights_;
+    }
+    inline const TreeNodeElement<ThresholdType> *Root(size_t root_id) const {
+      return tree->roots_[root_id];
+    }
+  };
+
+  struct NodeStorage16 {
+    const TreeEnsembleCommon *tree;
+    inline const TreeNodeElement16 *Leave(size_t root_id,
+                                          const InputType *x_data) const {
+      return tree->ProcessTreeNodeLeave16(root_id, x_data);
+    }
+    inline const std::vector<SparseValue16> &weights() const {
+      return tree->weights16_;
+    }
+    inline const TreeNodeElement16 *Root(size_t root_id) const {
+      return tree->roots16_[root_id];
+    }
+  };
 
   template <typename AGG>
   void ComputeAgg(int64_t n_rows, int64_t n_features, const InputType *X,
                   OutputType *Y, int64_t *labels, const AGG &agg) const;
+
+  template <typename AGG, typename STORAGE>
+  void ComputeAggStorage(int64_t n_rows, int64_t n_features, const InputType *X,
+                         OutputType *Y, int64_t *labels, const AGG &agg,
+                         const STORAGE &storage) const;
+
+  template <typename AGG, typename STORAGE>
+  void ComputeAggEarlyExit(int64_t n_rows, int64_t n_features,
+                           const InputType *X, OutputType *Y, int64_t *labels,
+                           const AGG &agg, const STORAGE &storage) const;
+
+  template <typename STORAGE> void ComputeRemainingMax(const STORAGE &storage);
+  double GetEarlyExitRawMargin() const;
+
+  // Fraction of the cover of a node going to one of its children.
+  double GetCoverFraction(const TreeNodeElement<ThresholdType> *node,
+                          const TreeNodeElement<ThresholdType> *child) const;
+  void TreeShapRecursive(const TreeNodeElement<ThresholdType> *node,
+                         const InputType *x_data, double *phi,
+                         int64_t n_features, ShapPathElement *parent_path,
+                         int64_t depth, double parent_zero_fraction,
+                         double parent_one_fraction,
+                         int64_t parent_feature_index) const;
+
+  // Calls fct(i, j, leaf, storage) for every row i and every tree j.
+  template <typename STORAGE, typename FCT>
+  void ComputeForEachLeaf(int64_t n_rows, int64_t n_features,
+                          const InputType *X, const STORAGE &storage,
+                          const FCT &fct) const;
 };
 
 template <typename InputType, typename ThresholdType, typename OutputType>
@@ -154,6 +406,12 @@ TreeEnsembleCommon<InputType, ThresholdType, OutputType>::get_sizeof() const {
   res += roots_.size() * sizeof(TreeNodeElement<ThresholdType> *);
   res += nodes3_.size() * sizeof(TreeNodeElement3<ThresholdType>);
   res += roots3_.size() * sizeof(TreeNodeElement3<ThresholdType> *);
+  res += nodes16_.size() * sizeof(TreeNodeElement16);
+  res += weights16_.size() * sizeof(SparseValue16);
+  res += roots16_.size() * sizeof(TreeNodeElement16 *);
+  res += thresholds16_.size() * sizeof(ThresholdType);
+  res += thresholds16_offsets_.size() * sizeof(int64_t);
+  res += covers_.size() * sizeof(ThresholdType);
   return res;
 }
 
@@ -247,10 +505,7 @@ Status TreeEnsembleCommon<InputType, ThresholdType, OutputType>::Init(
     }
     node.value_or_unique_weight = nodes_values[i];
 
-    /* hitrates is not used for inference, they are ignored.
-    node.hitrates = nodes_hitrates[i];
-    */
-
+    // hitrates is not used for inference, see covers_.
     node.flags = static_cast<uint8_t>(cmodes[i]);
     node.truenode_inc_or_first_weight = 0; // nodes_truenodeids[i] if not a leaf
     node.falsenode_inc_or_n_weights = 0; // nodes_falsenodeids[i] if not a leaf
@@ -389,10 +644,27 @@ Status TreeEnsembleCommon<InputType, ThresholdType, OutputType>::Init(
     }
   }
 
-  if (use_node3_) {
+  if (reduced_precision_ != REDUCED_PRECISION::NONE) {
+    // Thresholds and weights are stored on 16 bits.
+    ConvertTreeIntoTree16();
+  }
+  if (use_node3_ && nodes16_.empty()) {
     // Use optimized implementation with bigger nodes.
     ConvertTreeIntoTree3();
   }
+  covers_.clear();
+  if (nodes16_.empty() &&
+      nodes_hitrates.size() == static_cast<size_t>(n_nodes_) &&
+      std::all_of(nodes_hitrates.begin(), nodes_hitrates.end(),
+                  [](ThresholdType h) { return h >= 0; }) &&
+      std::any_of(nodes_hitrates.begin(), nodes_hitrates.end(),
+                  [](ThresholdType h) { return h > 0; })) {
+    covers_ = nodes_hitrates;
+  }
+  if (roots16_.empty())
+    ComputeRemainingMax(NodeStorage{this});
+  else
+    ComputeRemainingMax(NodeStorage16{this});
   return Status::OK();
 }
 
@@ -538,6 +810,176 @@ int TreeEnsembleCommon<InputType, ThresholdType, OutputType>::
   return nodes3_.size() > last_node3 ? static_cast<int>(last_node3) : -1;
 }
 
+template <typename InputType, typename ThresholdType, typename OutputType>
+void TreeEnsembleCommon<InputType, ThresholdType,
+                        OutputType>::ConvertTreeIntoTree16() {
+  DEBUG_PRINT("ConvertTreeIntoTree16")
+  nodes16_.clear();
+  weights16_.clear();
+  roots16_.clear();
+  thresholds16_.clear();
+  thresholds16_offsets_.clear();
+  reduced_precision_report_.clear();
+  bool bfloat16 = reduced_precision_ == REDUCED_PRECISION::BFLOAT16;
+  reduced_precision_report_["bfloat16"] = bfloat16 ? 1 : 0;
+  reduced_precision_report_["size_before"] = static_cast<double>(get_sizeof());
+  reduced_precision_report_["applied"] = 0;
+
+  // A threshold is stored on 16 bits only if every threshold used to split
+  // the same feature can be converted without any loss, every split decision
+  // remains the same. The other thresholds are stored in thresholds16_,
+  // every node keeps the index of its threshold among the thresholds
+  // of the same feature, up to 65536 distinct thresholds per feature.
+  std::vector<uint8_t> feature_used(max_feature_id_ + 1, 0);
+  std::vector<uint8_t> feature_exact(max_feature_id_ + 1, 1);
+  for (auto it = nodes_.cbegin(); it != nodes_.cend(); ++it) {
+    if (!it->is_not_leaf())
+      continue;
+    feature_used[it->feature_id] = 1;
+    if (static_cast<ThresholdType>(Float16To(
+            FloatTo16(static_cast<float>(it->value_or_unique_weight), bfloat16),
+            bfloat16)) != it->value_or_unique_weight)
+      feature_exact[it->feature_id] = 0;
+  }
+
+  // The error introduced by every leaf is bounded by the largest error
+  // in every tree.
+  std::vector<double> tree_errors(static_cast<size_t>(n_trees_), 0);
+  std::vector<size_t> tree_ids(nodes_.size());
+  for (size_t t = 0, j = 0; j < nodes_.size(); ++j) {
+    if (t + 1 < roots_.size() && &(nodes_[j]) == roots_[t + 1])
+      ++t;
+    tree_ids[j] = t;
+  }
+
+  std::vector<std::unordered_map<ThresholdType, uint16_t>> threshold_index(
+      feature_used.size());
+  std::vector<std::vector<ThresholdType>> feature_thresholds(
+      feature_used.size());
+  nodes16_.reserve(nodes_.size());
+  double max_weight_error = 0;
+  size_t n_kept = 0;
+  for (size_t j = 0; j < nodes_.size(); ++j) {
+    const TreeNodeElement<ThresholdType> &node = nodes_[j];
+    TreeNodeElement16 node16;
+    node16.feature_id = node.feature_id;
+    node16.truenode_inc_or_first_weight = node.truenode_inc_or_first_weight;
+    node16.falsenode_inc_or_n_weights = node.falsenode_inc_or_n_weights;
+    node16.flags = node.flags;
+    if (bfloat16)
+      node16.flags |= ReducedPrecisionFlag::kBFloat16;
+    if (!node.is_not_leaf() || feature_exact[node.feature_id]) {
+      node16.value_or_unique_weight =
+          FloatTo16(static_cast<float>(node.value_or_unique_weight), bfloat16);
+    } else {
+      auto &index = threshold_index[node.feature_id];
+      auto &kept = feature_thresholds[node.feature_id];
+      auto it = index.find(node.value_or_unique_weight);
+      if (it == index.end()) {
+        if (kept.size() > std::numeric_limits<uint16_t>::max()) {
+          // Too many thresholds to keep for one feature,
+          // the conversion is abandoned.
+          decltype(nodes16_)().swap(nodes16_);
+          reduced_precision_report_["too_many_thresholds"] = 1;
+          reduced_precision_report_["feature_id"] =
+              static_cast<double>(node.feature_id);
+          return;
+        }
+        it = index
+                 .insert(std::pair<ThresholdType, uint16_t>(
+                     node.value_or_unique_weight,
+                     static_cast<uint16_t>(kept.size())))
+                 .first;
+        kept.push_back(node.value_or_unique_weight);
+      }
+      node16.value_or_unique_weight = it->second;
+      node16.flags |= ReducedPrecisionFlag::kThresholdIndex;
+      ++n_kept;
+    }
+    nodes16_.emplace_back(node16);
+  }
+
+  // weights16_ follows the same order as weights_, the unique weight
+  // stored in a leaf is the first one.
+  weights16_.resize(weights_.size());
+  for (size_t j = 0; j < nodes_.size(); ++j) {
+    const TreeNodeElement<ThresholdType> &node = nodes_[j];
+    if (node.is_not_leaf())
+      continue;
+    for (int32_t k = 0; k < node.falsenode_inc_or_n_weights; ++k) {
+      const SparseValue<ThresholdType> &w =
+          weights_[node.truenode_inc_or_first_weight + k];
+      SparseValue16 &w16 = weights16_[node.truenode_inc_or_first_weight + k];
+      w16.i = static_cast<int32_t>(w.i);
+      w16.value = FloatTo16(static_cast<float>(w.value), bfloat16);
+      double err =
+          std::abs(static_cast<double>(Float16To(w16.value, bfloat16)) -
+                   static_cast<double>(w.value));
+      if (!(err <= std::numeric_limits<float>::max())) {
+        // A weight is out of range, the conversion is abandoned.
+        decltype(nodes16_)().swap(nodes16_);
+        decltype(weights16_)().swap(weights16_);
+        reduced_precision_report_["weight_out_of_range"] = 1;
+        return;
+      }
+      max_weight_error = std::max(max_weight_error, err);
+      tree_errors[tree_ids[j]] = std::max(tree_errors[tree_ids[j]], err);
+    }
+  }
+
+  thresholds16_offsets_.resize(feature_thresholds.size());
+  for (size_t f = 0; f < feature_thresholds.size(); ++f) {
+    thresholds16_offsets_[f] = static_cast<int64_t>(thresholds16_.size());
+    thresholds16_.insert(thresholds16_.end(), feature_thresholds[f].begin(),
+                         feature_thresholds[f].end());
+  }
+
+  roots16_.reserve(roots_.size());
+  for (auto it = roots_.cbegin(); it != roots_.cend(); ++it)
+    roots16_.push_back(&(nodes16_[*it - &(nodes_[0])]));
+
+  double max_score_error = 0;
+  for (auto it = tree_errors.cbegin(); it != tree_errors.cend(); ++it) {
+    switch (aggregate_function_) {
+    case AGGREGATE_FUNCTION::MIN:
+    case AGGREGATE_FUNCTION::MAX:
+      max_score_error = std::max(max_score_error, *it);
+      break;
+    default:
+      max_score_error += *it;
+    }
+  }
+  if (aggregate_function_ == AGGREGATE_FUNCTION::AVERAGE && n_trees_ > 0)
+    max_score_error /= static_cast<double>(n_trees_);
+
+  size_t n_features = 0, n_features_exact = 0;
+  for (size_t f = 0; f < feature_used.size(); ++f) {
+    if (!feature_used[f])
+      continue;
+    ++n_features;
+    if (feature_exact[f])
+      ++n_features_exact;
+  }
+
+  // The nodes in full precision are not needed anymore.
+  decltype(nodes_)().swap(nodes_);
+  decltype(weights_)().swap(weights_);
+  decltype(roots_)().swap(roots_);
+  decltype(nodes3_)().swap(nodes3_);
+  decltype(roots3_)().swap(roots3_);
+
+  reduced_precision_report_["applied"] = 1;
+  reduced_precision_report_["n_features"] = static_cast<double>(n_features);
+  reduced_precision_report_["n_features_exact"] =
+      static_cast<double>(n_features_exact);
+  reduced_precision_report_["n_thresholds_kept"] = static_cast<double>(n_kept);
+  reduced_precision_report_["n_distinct_thresholds_kept"] =
+      static_cast<double>(thresholds16_.size());
+  reduced_precision_report_["max_weight_error"] = max_weight_error;
+  reduced_precision_report_["max_score_error"] = max_score_error;
+  reduced_precision_report_["size_after"] = static_cast<double>(get_sizeof());
+}
+
 template <typename InputType, typename ThresholdType, typename OutputType>
 Status TreeEnsembleCommon<InputType, ThresholdType, OutputType>::Compute(
     int64_t n_rows, int64_t n_features, const InputType *X, OutputType *Y,
@@ -545,42 +987,438 @@ Status TreeEnsembleCommon<InputType, ThresholdType, OutputType>::Compute(
   switch (aggregate_function_) {
   case AGGREGATE_FUNCTION::AVERAGE:
     DEBUG_PRINT("Compute AVERAGE")
-    ComputeAgg(n_rows, n_features, X, Y, label,
-               TreeAggregatorAverage<InputType, ThresholdType, OutputType>(
-                   roots_.size(), n_targets_or_classes_, post_transform_,
-                   base_values_));
+    ComputeAgg(
+        n_rows, n_features, X, Y, label,
+        TreeAggregatorAverage<InputType, ThresholdType, OutputType>(
+            n_trees_, n_targets_or_classes_, post_transform_, base_values_));
     return Status::OK();
   case AGGREGATE_FUNCTION::SUM:
     DEBUG_PRINT("Compute SUM")
-    ComputeAgg(n_rows, n_features, X, Y, label,
-               TreeAggregatorSum<InputType, ThresholdType, OutputType>(
-                   roots_.size(), n_targets_or_classes_, post_transform_,
-                   base_values_));
+    ComputeAgg(
+        n_rows, n_features, X, Y, label,
+        TreeAggregatorSum<InputType, ThresholdType, OutputType>(
+            n_trees_, n_targets_or_classes_, post_transform_, base_values_));
     return Status::OK();
   case AGGREGATE_FUNCTION::MIN:
     DEBUG_PRINT("Compute MIN")
-    ComputeAgg(n_rows, n_features, X, Y, label,
-               TreeAggregatorMin<InputType, ThresholdType, OutputType>(
-                   roots_.size(), n_targets_or_classes_, post_transform_,
-                   base_values_));
+    ComputeAgg(
+        n_rows, n_features, X, Y, label,
+        TreeAggregatorMin<InputType, ThresholdType, OutputType>(
+            n_trees_, n_targets_or_classes_, post_transform_, base_values_));
     return Status::OK();
   case AGGREGATE_FUNCTION::MAX:
     DEBUG_PRINT("Compute MAX")
-    ComputeAgg(n_rows, n_features, X, Y, label,
-               TreeAggregatorMax<InputType, ThresholdType, OutputType>(
-                   roots_.size(), n_targets_or_classes_, post_transform_,
-                   base_values_));
+    ComputeAgg(
+        n_rows, n_features, X, Y, label,
+        TreeAggregatorMax<InputType, ThresholdType, OutputType>(
+            n_trees_, n_targets_or_classes_, post_transform_, base_values_));
     return Status::OK();
   default:
     EXT_THROW("Unknown aggregation function in TreeEnsemble.");
   }
 }
 
+template <typename InputType, typename ThresholdType, typename OutputType>
+Status TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeLeaves(
+    int64_t n_rows, int64_t n_features, const InputType *X,
+    int32_t *leaves) const {
+  int64_t n_trees = n_trees_;
+  auto fct = [leaves, n_trees](int64_t i, int64_t j, const auto *leaf,
+                               const auto &storage) {
+    leaves[i * n_trees + j] = static_cast<int32_t>(leaf - storage.Root(j));
+  };
+  if (roots16_.empty())
+    ComputeForEachLeaf(n_rows, n_features, X, NodeStorage{this}, fct);
+  else
+    ComputeForEachLeaf(n_rows, n_features, X, NodeStorage16{this}, fct);
+  return Status::OK();
+}
+
+template <typename InputType, typename ThresholdType, typename OutputType>
+Status
+TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeTreeScores(
+    int64_t n_rows, int64_t n_features, const InputType *X,
+    OutputType *Y) const {
+  int64_t n_trees = n_trees_;
+  int64_t n_targets = n_targets_or_classes_;
+  auto fct = [Y, n_trees, n_targets](int64_t i, int64_t j, const auto *leaf,
+                                     const auto &storage) {
+    OutputType *y = Y + (i * n_trees + j) * n_targets;
+    if (n_targets == 1) {
+      *y = static_cast<OutputType>(GetLeafWeight(*leaf));
+      return;
+    }
+    std::fill(y, y + n_targets, static_cast<OutputType>(0));
+    auto it = storage.weights().cbegin() + leaf->truenode_inc_or_first_weight;
+    for (int32_t k = 0; k < leaf->falsenode_inc_or_n_weights; ++k, ++it)
+      y[it->i] += static_cast<OutputType>(GetLeafWeight(*leaf, *it));
+  };
+  if (roots16_.empty())
+    ComputeForEachLeaf(n_rows, n_features, X, NodeStorage{this}, fct);
+  else
+    ComputeForEachLeaf(n_rows, n_features, X, NodeStorage16{this}, fct);
+  return Status::OK();
+}
+
+template <typename InputType, typename ThresholdType, typename OutputType>
+double
+TreeEnsembleCommon<InputType, ThresholdType, OutputType>::GetCoverFraction(
+    const TreeNodeElement<ThresholdType> *node,
+    const TreeNodeElement<ThresholdType> *child) const {
+  if (covers_.empty())
+    return 0.5;
+  // The cover of a node is the sum of its children's, some converters
+  // set the same hitrate for every node.
+  double cover =
+      static_cast<double>(
+          covers_[node + node->truenode_inc_or_first_weight - nodes_.data()]) +
+      static_cast<double>(
+          covers_[node + node->falsenode_inc_or_n_weights - nodes_.data()]);
+  if (cover <= 0)
+    return 0.5;
+  return static_cast<double>(covers_[child - nodes_.data()]) / cover;
+}
+
+template <typename InputType, typename ThresholdType, typename OutputType>
+void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::
+    TreeShapRecursive(const TreeNodeElement<ThresholdType> *node,
+                      const InputType *x_data, double *phi, int64_t n_features,
+                      ShapPathElement *parent_path, int64_t depth,
+                      double parent_zero_fraction, double parent_one_fraction,
+                      int64_t parent_feature_index) const {
+  // Every call works on its own copy of the path.
+  ShapPathElement *path = parent_path + depth + 1;
+  std::copy(parent_path, parent_path + depth + 1, path);
+  ShapExtendPath(path, depth, parent_zero_fraction, parent_one_fraction,
+                 parent_feature_index);
+
+  if (!node->is_not_leaf()) {
+    auto it = weights_.cbegin() + node->truenode_inc_or_first_weight;
+    for (int32_t k = 0; k < node->falsenode_inc_or_n_weights; ++k, ++it) {
+      double *phi_target = phi + it->i * (n_features + 1);
+      double value = static_cast<double>(it->value);
+      for (int64_t i = 1; i <= depth; ++i) {
+        double w = ShapUnwoundPathSum(path, depth, i);
+        phi_target[path[i].feature_index] +=
+            w * (path[i].one_fraction - path[i].zero_fraction) * value;
+      }
+    }
+    return;
+  }
+
+  const TreeNodeElement<ThresholdType> *hot, *cold;
+  if (IsTrueBranch(node, x_data[node->feature_id])) {
+    hot = node + node->truenode_inc_or_first_weight;
+    cold = node + node->falsenode_inc_or_n_weights;
+  } else {
+    hot = node + node->falsenode_inc_or_n_weights;
+    cold = node + node->truenode_inc_or_first_weight;
+  }
+  double incoming_zero_fraction = 1;
+  double incoming_one_fraction = 1;
+
+  // If the feature was already used on the path, the previous split is undone
+  // to be redone for this node.
+  int64_t path_index = 0;
+  for (; path_index <= depth; ++path_index) {
+    if (path[path_index].feature_index == node->feature_id)
+      break;
+  }
+  if (path_index != depth + 1) {
+    incoming_zero_fraction = path[path_index].zero_fraction;
+    incoming_one_fraction = path[path_index].one_fraction;
+    ShapUnwindPath(path, depth, path_index);
+    --depth;
+  }
+
+  TreeShapRecursive(hot, x_data, phi, n_features, path, depth + 1,
+                    GetCoverFraction(node, hot) * incoming_zero_fraction,
+                    incoming_one_fraction, node->feature_id);
+  TreeShapRecursive(cold, x_data, phi, n_features, path, depth + 1,
+                    GetCoverFraction(node, cold) * incoming_zero_fraction, 0,
+                    node->feature_id);
+}
+
+template <typename InputType, typename ThresholdType, typename OutputType>
+Status
+TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeContributions(
+    int64_t n_rows, int64_t n_features, const InputType *X,
+    OutputType *Y) const {
+  if (roots_.empty()) {
+    EXT_THROW("Contributions cannot be computed if thresholds and weights are "
+              "stored with a reduced precision.");
+  }
+  if (max_feature_id_ >= n_features) {
+    throw std::runtime_error(
+        MakeString("One path in the graph requests feature ", max_feature_id_,
+                   " but input tensor has ", n_features, " features."));
+  }
+  double scale;
+  switch (aggregate_function_) {
+  case AGGREGATE_FUNCTION::SUM:
+    scale = 1;
+    break;
+  case AGGREGATE_FUNCTION::AVERAGE:
+    scale = 1. / static_cast<double>(n_trees_);
+    break;
+  default:
+    EXT_THROW("Contributions are only available when trees are aggregated "
+              "with SUM or AVERAGE.");
+  }
+
+  // The expected value of every tree is the average of its leaves weighted
+  // by the probability to reach them, it also gives the maximum depth.
+  int64_t n_targets = n_targets_or_classes_;
+  std::vector<double> expected(n_targets, 0);
+  int64_t max_depth = 0;
+  std::vector<
+      std::tuple<const TreeNodeElement<ThresholdType> *, double, int64_t>>
+      stack;
+  for (int64_t j = 0; j < n_trees_; ++j) {
+    stack.clear();
+    stack.emplace_back(roots_[j], 1., 0);
+    while (!stack.empty()) {
+      const TreeNodeElement<ThresholdType> *node = std::get<0>(stack.back());
+      double proba = std::get<1>(stack.back());
+      int64_t depth = std::get<2>(stack.back());
+      stack.pop_back();
+      if (node->is_not_leaf()) {
+        auto true_node = node + node->truenode_inc_or_first_weight;
+        auto false_node = node + node->falsenode_inc_or_n_weights;
+        stack.emplace_back(true_node, proba * GetCoverFraction(node, true_node),
+                           depth + 1);
+        stack.emplace_back(
+            false_node, proba * GetCoverFraction(node, false_node), depth + 1);
+        continue;
+      }
+      max_depth = std::max(max_depth, depth);
+      auto it = weights_.cbegin() + node->truenode_inc_or_first_weight;
+      for (int32_t k = 0; k < node->falsenode_inc_or_n_weights; ++k, ++it)
+        expected[it->i] += proba * static_cast<double>(it->value);
+    }
+  }
+  for (int64_t k = 0; k < n_targets; ++k) {
+    expected[k] *= scale;
+    if (base_values_.size() == static_cast<size_t>(n_targets))
+      expected[k] += static_cast<double>(base_values_[k]);
+    else if (base_values_.size() == 1)
+      expected[k] += static_cast<double>(base_values_[0]);
+  }
+
+  // Every call to TreeShapRecursive uses depth + 1 elements of the path.
+  int64_t path_size = (max_depth + 2) * (max_depth + 3) / 2;
+  int64_t n_cols = n_features + 1;
+  int64_t n_trees = n_trees_;
+  auto fct = [this, X, Y, n_features, n_cols, n_targets, n_trees, path_size,
+              scale, &expected](int64_t i) {
+    std::vector<ShapPathElement> path(path_size);
+    std::vector<double> phi(n_targets * n_cols, 0);
+    const InputType *x_data = X + i * n_features;
+    for (int64_t j = 0; j < n_trees; ++j)
+      TreeShapRecursive(roots_[j], x_data, phi.data(), n_features, path.data(),
+                        0, 1, 1, -1);
+    OutputType *y = Y + i * n_targets * n_cols;
+    for (int64_t k = 0; k < n_targets; ++k) {
+      for (int64_t f = 0; f < n_features; ++f)
+        y[k * n_cols + f] =
+            static_cast<OutputType>(phi[k * n_cols + f] * scale);
+      y[k * n_cols + n_features] = static_cast<OutputType>(expected[k]);
+    }
+  };
+
+  int64_t max_num_threads = omp_get_max_threads();
+  if (n_rows <= 1 || max_num_threads == 1) {
+    for (int64_t i = 0; i < n_rows; ++i)
+      fct(i);
+  } else {
+    // parallelization by rows, every row is much more expensive than
+    // a prediction
+    TryBatchParallelFor(max_num_threads, 1, n_rows, fct);
+  }
+  return Status::OK();
+}
+
+template <typename InputType, typename ThresholdType, typename OutputType>
+template <typename STORAGE>
+void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::
+    ComputeRemainingMax(const STORAGE &storage) {
+  remaining_max_.resize(static_cast<size_t>(n_trees_) + 1);
+  remaining_max_[n_trees_] = 0;
+  std::vector<decltype(storage.Root(0))> stack;
+  for (int64_t j = n_trees_ - 1; j >= 0; --j) {
+    double tree_max = 0;
+    stack.clear();
+    stack.push_back(storage.Root(j));
+    while (!stack.empty()) {
+      auto node = stack.back();
+      stack.pop_back();
+      if (node->is_not_leaf()) {
+        stack.push_back(node + node->truenode_inc_or_first_weight);
+        stack.push_back(node + node->falsenode_inc_or_n_weights);
+        continue;
+      }
+      auto it = storage.weights().cbegin() + node->truenode_inc_or_first_weight;
+      for (int32_t k = 0; k < node->falsenode_inc_or_n_weights; ++k, ++it)
+        tree_max = std::max(
+            tree_max, std::abs(static_cast<double>(GetLeafWeight(*node, *it))));
+    }
+    remaining_max_[j] = remaining_max_[j + 1] + tree_max;
+  }
+}
+
+template <typename InputType, typename ThresholdType, typename OutputType>
+double TreeEnsembleCommon<InputType, ThresholdType,
+                          OutputType>::GetEarlyExitRawMargin() const {
+  // The margin is expressed after the post transform, it is converted
+  // into a margin on the raw score.
+  if (early_exit_margin_ <= 0)
+    return std::numeric_limits<double>::infinity();
+  switch (post_transform_) {
+  case POST_EVAL_TRANSFORM::LOGISTIC:
+  case POST_EVAL_TRANSFORM::SOFTMAX:
+  case POST_EVAL_TRANSFORM::SOFTMAX_ZERO: {
+    if (early_exit_margin_ >= 0.5)
+      return std::numeric_limits<double>::infinity();
+    double logit =
+        std::log((0.5 + early_exit_margin_) / (0.5 - early_exit_margin_));
+    // softmax is applied on (-score, score)
+    return post_transform_ == POST_EVAL_TRANSFORM::LOGISTIC ? logit : logit / 2;
+  }
+  default:
+    return early_exit_margin_;
+  }
+}
+
+template <typename InputType, typename ThresholdType, typename OutputType>
+template <typename AGG, typename STORAGE>
+void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::
+    ComputeAggEarlyExit(int64_t n_rows, int64_t n_features, const InputType *X,
+                        OutputType *Y, int64_t *labels, const AGG &agg,
+                        const STORAGE &storage) const {
+  // The trees are evaluated by blocks of early_exit_block_ trees.
+  // After every block, the row exits if the label remains the same
+  // when the score is moved by the largest contribution the remaining
+  // trees may add, or by the margin if it is smaller.
+  int64_t N = n_rows;
+  int64_t stride = n_features;
+  int64_t block = early_exit_block_;
+  int64_t n_stages = (n_trees_ + block - 1) / block;
+  double raw_margin = GetEarlyExitRawMargin();
+  int64_t max_num_threads = omp_get_max_threads();
+  std::vector<int64_t> row_stages(N);
+  TryBatchParallelFor(
+      max_num_threads, batch_size_rows_, N,
+      [this, &agg, &storage, &row_stages, X, Y, labels, stride, block, n_stages,
+       raw_margin](int64_t i) {
+        size_t n_targets = static_cast<size_t>(n_targets_or_classes_);
+        const InputType *x_data = X + i * stride;
+        InlinedVector<ScoreValue<ThresholdType>> scores(n_targets, {0, 0});
+        InlinedVector<ScoreValue<ThresholdType>> low, high;
+        int64_t label_low, label_high, stage, begin, end;
+        for (stage = 0; stage < n_stages; ++stage) {
+          begin = stage * block;
+          end = std::min(n_trees_, begin + block);
+          for (int64_t j = begin; j < end; ++j) {
+            agg.ProcessTreeNodePrediction(scores, *storage.Leave(j, x_data),
+                                          storage.weights());
+          }
+          if (end == n_trees_)
+            break;
+          ThresholdType shift = static_cast<ThresholdType>(
+              std::min(remaining_max_[end], raw_margin));
+          low = scores;
+          high = scores;
+          bool has_score = false;
+          for (size_t k = 0; k < n_targets; ++k) {
+            if (scores[k].has_score) {
+              low[k].score -= shift;
+              high[k].score += shift;
+              has_score = true;
+            }
+          }
+          if (!has_score)
+            continue;
+          // Only the labels are compared, the probabilities are not needed.
+          agg.FinalizeScores(low, nullptr, -1, &label_low);
+          agg.FinalizeScores(high, nullptr, -1, &label_high);
+          if (label_low == label_high)
+            break;
+        }
+        row_stages[i] = stage < n_stages ? stage : n_stages - 1;
+        agg.FinalizeScores(
+            scores, Y == nullptr ? nullptr : (Y + i * n_targets_or_classes_),
+            -1, labels == nullptr ? nullptr : (labels + i));
+      });
+
+  // The report is computed locally and then stored.
+  std::vector<double> report(static_cast<size_t>(n_stages), 0);
+  for (auto it = row_stages.cbegin(); it != row_stages.cend(); ++it)
+    report[*it] += 1;
+  for (auto it = report.begin(); it != report.end(); ++it)
+    *it /= static_cast<double>(N > 0 ? N : 1);
+  std::lock_guard<std::mutex> lock(early_exit_mutex_);
+  early_exit_report_.swap(report);
+}
+
+template <typename InputType, typename ThresholdType, typename OutputType>
+template <typename STORAGE, typename FCT>
+void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::
+    ComputeForEachLeaf(int64_t n_rows, int64_t n_features, const InputType *X,
+                       const STORAGE &storage, const FCT &fct) const {
+  if (max_feature_id_ >= n_features) {
+    throw std::runtime_error(
+        MakeString("One path in the graph requests feature ", max_feature_id_,
+                   " but input tensor has ", n_features, " features."));
+  }
+  // Every output is independent, no reduction is needed.
+  int64_t stride = n_features;
+  int64_t N = n_rows;
+  int64_t max_num_threads = omp_get_max_threads();
+  if (N <= parallel_N_ || max_num_threads == 1) {
+    if (n_trees_ > parallel_tree_ && max_num_threads > 1) {
+      // parallelization by trees
+      TryBatchParallelFor(max_num_threads, batch_size_tree_, n_trees_,
+                          [&storage, &fct, X, N, stride](int64_t j) {
+                            for (int64_t i = 0; i < N; ++i)
+                              fct(i, j, storage.Leave(j, X + i * stride),
+                                  storage);
+                          });
+    } else {
+      for (int64_t j = 0; j < n_trees_; ++j) {
+        for (int64_t i = 0; i < N; ++i)
+          fct(i, j, storage.Leave(j, X + i * stride), storage);
+      }
+    }
+  } else {
+    // parallelization by rows
+    int64_t n_trees = n_trees_;
+    TryBatchParallelFor(max_num_threads, batch_size_rows_, N,
+                        [&storage, &fct, X, n_trees, stride](int64_t i) {
+                          for (int64_t j = 0; j < n_trees; ++j)
+                            fct(i, j, storage.Leave(j, X + i * stride),
+                                storage);
+                        });
+  }
+}
+
 template <typename InputType, typename ThresholdType, typename OutputType>
 template <typename AGG>
 void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeAgg(
     int64_t n_rows, int64_t n_features, const InputType *X, OutputType *Y,
     int64_t *labels, const AGG &agg) const {
+  if (roots16_.empty())
+    ComputeAggStorage(n_rows, n_features, X, Y, labels, agg, NodeStorage{this});
+  else
+    ComputeAggStorage(n_rows, n_features, X, Y, labels, agg,
+                      NodeStorage16{this});
+}
+
+template <typename InputType, typename ThresholdType, typename OutputType>
+template <typename AGG, typename STORAGE>
+void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::
+    ComputeAggStorage(int64_t n_rows, int64_t n_features, const InputType *X,
+                      OutputType *Y, int64_t *labels, const AGG &agg,
+                      const STORAGE &storage) const {
   int64_t stride = n_features;
   int64_t N = n_rows;
   int64_t C = n_features;
@@ -616,7 +1454,7 @@ void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeAgg(
         DEBUG_PRINT()
         for (int64_t j = 0; j < n_trees_; ++j) {
           agg.ProcessTreeNodePrediction1(
-              score, *ProcessTreeNodeLeave(static_cast<size_t>(j), x_data));
+              score, *storage.Leave(static_cast<size_t>(j), x_data));
         }
         DEBUG_PRINT()
       } else { /* section B: 1 output, 1 row and enough trees to parallelize
@@ -624,12 +1462,12 @@ void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeAgg(
         DEBUG_PRINT()
         std::vector<ScoreValue<ThresholdType>> scores(
             static_cast<size_t>(n_trees_), {0, 0});
-        TryBatchParallelFor(
-            max_num_threads, this->batch_size_tree_, n_trees_,
-            [this, &scores, &agg, max_num_threads, x_data](int64_t j) {
-              agg.ProcessTreeNodePrediction1(scores[j],
-                                             *ProcessTreeNodeLeave(j, x_data));
-            });
+        TryBatchParallelFor(max_num_threads, this->batch_size_tree_, n_trees_,
+                            [this, &storage, &scores, &agg, max_num_threads,
+                             x_data](int64_t j) {
+                              agg.ProcessTreeNodePrediction1(
+                                  scores[j], *storage.Leave(j, x_data));
+                            });
 
         for (auto it = scores.cbegin(); it != scores.cend(); ++it) {
           agg.MergePrediction1(score, *it);
@@ -667,12 +1505,13 @@ void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeAgg(
           for (i = batch; i < batch_end; ++i) {
             agg.ProcessTreeNodePrediction1(
                 scores[static_cast<int64_t>(i - batch)],
-                *ProcessTreeNodeLeave(j, x_data + i * stride));
+                *storage.Leave(j, x_data + i * stride));
           }
         }
         for (i = batch; i < batch_end; ++i) {
           agg.FinalizeScores1(
-              z_data + i, scores[static_cast<int64_t>(i - batch)],
+              z_data == nullptr ? nullptr : (z_data + i),
+              scores[static_cast<int64_t>(i - batch)],
               label_data == nullptr ? nullptr : (label_data + i));
         }
       }
@@ -690,8 +1529,8 @@ void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeAgg(
         end_n = std::min(N, begin_n + parallel_tree_n);
         TrySimpleParallelFor(
             max_num_threads, this->batch_size_tree_, num_threads,
-            [this, &agg, &scores, num_threads, x_data, N, begin_n, end_n,
-             stride](int64_t batch_num) {
+            [this, &storage, &agg, &scores, num_threads, x_data, N, begin_n,
+             end_n, stride](int64_t batch_num) {
               auto work = PartitionWork(batch_num, num_threads, this->n_trees_);
               for (int64_t i = begin_n; i < end_n; ++i) {
                 scores[batch_num * N + i] = {0, 0};
@@ -700,7 +1539,7 @@ void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeAgg(
                 for (int64_t i = begin_n; i < end_n; ++i) {
                   agg.ProcessTreeNodePrediction1(
                       scores[batch_num * N + i],
-                      *ProcessTreeNodeLeave(j, x_data + i * stride));
+                      *storage.Leave(j, x_data + i * stride));
                 }
               }
             });
@@ -716,7 +1555,8 @@ void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeAgg(
                 agg.MergePrediction1(scores[i],
                                      scores[j * static_cast<int64_t>(N) + i]);
               }
-              agg.FinalizeScores1(z_data + i, scores[i],
+              agg.FinalizeScores1(z_data == nullptr ? nullptr : (z_data + i),
+                                  scores[i],
                                   label_data == nullptr ? nullptr
                                                         : (label_data + i));
             }
@@ -726,15 +1566,16 @@ void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeAgg(
       DEBUG_PRINT()
       TryBatchParallelFor(
           max_num_threads, batch_size_rows_, N,
-          [this, &agg, x_data, z_data, stride, label_data,
+          [this, &storage, &agg, x_data, z_data, stride, label_data,
            max_num_threads](int64_t i) {
             ScoreValue<ThresholdType> score = {0, 0};
             for (size_t j = 0; j < static_cast<size_t>(n_trees_); ++j) {
               agg.ProcessTreeNodePrediction1(
-                  score, *ProcessTreeNodeLeave(j, x_data + i * stride));
+                  score, *storage.Leave(j, x_data + i * stride));
             }
 
-            agg.FinalizeScores1(z_data + i, score,
+            agg.FinalizeScores1(z_data == nullptr ? nullptr : (z_data + i),
+                                score,
                                 label_data == nullptr ? nullptr
                                                       : (label_data + i));
           });
@@ -742,7 +1583,11 @@ void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeAgg(
     }
   } else {
     DEBUG_PRINT("C>1")
-    if (N == 1) { /* section A2: 2+ outputs, 1 row, not enough trees to
+    if (early_exit_block_ > 0 && early_exit_block_ < n_trees_ &&
+        agg.is_binary()) { /* section F2: binary classification,
+                              trees evaluated by blocks, early exit */
+      ComputeAggEarlyExit(n_rows, n_features, X, Y, labels, agg, storage);
+    } else if (N == 1) { /* section A2: 2+ outputs, 1 row, not enough trees to
                      parallelize */
       DEBUG_PRINT()
       if (n_trees_ <= parallel_tree_ || max_num_threads == 1) { /* section A2 */
@@ -751,8 +1596,8 @@ void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeAgg(
             static_cast<size_t>(n_targets_or_classes_), {0, 0});
         for (int64_t j = 0; j < n_trees_; ++j) {
           agg.ProcessTreeNodePrediction(
-              scores, *ProcessTreeNodeLeave(static_cast<size_t>(j), x_data),
-              weights_);
+              scores, *storage.Leave(static_cast<size_t>(j), x_data),
+              storage.weights());
         }
         agg.FinalizeScores(scores, z_data, -1, label_data);
         DEBUG_PRINT()
@@ -765,14 +1610,15 @@ void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeAgg(
             num_threads);
         TrySimpleParallelFor(
             max_num_threads, batch_size_tree_, num_threads,
-            [this, &agg, &scores, num_threads, x_data](int64_t batch_num) {
+            [this, &storage, &agg, &scores, num_threads,
+             x_data](int64_t batch_num) {
               scores[batch_num].resize(
                   static_cast<size_t>(n_targets_or_classes_), {0, 0});
               auto work = PartitionWork(batch_num, num_threads, n_trees_);
               for (auto j = work.start; j < work.end; ++j) {
                 agg.ProcessTreeNodePrediction(scores[batch_num],
-                                              *ProcessTreeNodeLeave(j, x_data),
-                                              weights_);
+                                              *storage.Leave(j, x_data),
+                                              storage.weights());
               }
             });
         for (size_t i = 1, limit = scores.size(); i < limit; ++i) {
@@ -798,16 +1644,19 @@ void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeAgg(
           std::fill(scores[i - batch].begin(), scores[i - batch].end(),
                     ScoreValue<ThresholdType>({0, 0}));
         }
-        for (j = 0, limit = roots_.size(); j < limit; ++j) {
+        for (j = 0, limit = static_cast<size_t>(n_trees_); j < limit; ++j) {
           for (i = batch; i < batch_end; ++i) {
             agg.ProcessTreeNodePrediction(
-                scores[i - batch],
-                *ProcessTreeNodeLeave(j, x_data + i * stride), weights_);
+                scores[i - batch], *storage.Leave(j, x_data + i * stride),
+                storage.weights());
           }
         }
         for (i = batch; i < batch_end; ++i) {
           agg.FinalizeScores(scores[i - batch],
-                             z_data + i * n_targets_or_classes_, -1,
+                             z_data == nullptr
+                                 ? nullptr
+                                 : (z_data + i * n_targets_or_classes_),
+                             -1,
                              label_data == nullptr ? nullptr
                                                    : (label_data + i));
         }
@@ -827,8 +1676,8 @@ void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeAgg(
         end_n = std::min(N, begin_n + parallel_tree_n);
         TrySimpleParallelFor(
             max_num_threads, batch_size_tree_, num_threads,
-            [this, &agg, &scores, num_threads, x_data, N, stride, begin_n,
-             end_n](int64_t batch_num) {
+            [this, &storage, &agg, &scores, num_threads, x_data, N, stride,
+             begin_n, end_n](int64_t batch_num) {
               auto work = PartitionWork(batch_num, num_threads, this->n_trees_);
               for (int64_t i = begin_n; i < end_n; ++i) {
                 scores[batch_num * N + i].resize(
@@ -838,7 +1687,8 @@ void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeAgg(
                 for (int64_t i = begin_n; i < end_n; ++i) {
                   agg.ProcessTreeNodePrediction(
                       scores[batch_num * static_cast<int64_t>(N) + i],
-                      *ProcessTreeNodeLeave(j, x_data + i * stride), weights_);
+                      *storage.Leave(j, x_data + i * stride),
+                      storage.weights());
                 }
               }
             });
@@ -855,7 +1705,11 @@ void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeAgg(
                                     scores[j * static_cast<int64_t>(N) + i]);
               }
               agg.FinalizeScores(
-                  scores[i], z_data + i * this->n_targets_or_classes_, -1,
+                  scores[i],
+                  z_data == nullptr
+                      ? nullptr
+                      : (z_data + i * this->n_targets_or_classes_),
+                  -1,
                   label_data == nullptr ? nullptr : (label_data + i));
             }
           });
@@ -866,7 +1720,7 @@ void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeAgg(
           std::min<int32_t>(max_num_threads, static_cast<int32_t>(N));
       TrySimpleParallelFor(
           max_num_threads, batch_size_tree_, num_threads,
-          [this, &agg, num_threads, x_data, z_data, label_data, N,
+          [this, &storage, &agg, num_threads, x_data, z_data, label_data, N,
            stride](int64_t batch_num) {
             auto work = PartitionWork(batch_num, num_threads, this->n_trees_);
             for (int64_t i = work.start; work.end; ++i) {
@@ -876,13 +1730,18 @@ void TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ComputeAgg(
 
               std::fill(scores.begin(), scores.end(),
                         ScoreValue<ThresholdType>({0, 0}));
-              for (j = 0, limit = roots_.size(); j < limit; ++j) {
+              for (j = 0, limit = static_cast<size_t>(n_trees_); j < limit;
+                   ++j) {
                 agg.ProcessTreeNodePrediction(
-                    scores, *ProcessTreeNodeLeave(j, x_data + i * stride),
-                    weights_);
+                    scores, *storage.Leave(j, x_data + i * stride),
+                    storage.weights());
               }
 
-              agg.FinalizeScores(scores, z_data + i * n_targets_or_classes_, -1,
+              agg.FinalizeScores(scores,
+                                 z_data == nullptr
+                                     ? nullptr
+                                     : (z_data + i * n_targets_or_classes_),
+                                 -1,
                                  label_data == nullptr ? nullptr
                                                        : (label_data + i));
             }
@@ -1122,4 +1981,61 @@ TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ProcessTreeNodeLeave(
   return root;
 }
 
+template <typename InputType, typename ThresholdType, typename OutputType>
+const TreeNodeElement16 *
+TreeEnsembleCommon<InputType, ThresholdType, OutputType>::ProcessTreeNodeLeave16(
+    size_t root_id, const InputType *x_data) const {
+  const TreeNodeElement16 *root = roots16_[root_id];
+  InputType val;
+  ThresholdType threshold;
+  if (same_mode_ && !has_missing_tracks_ &&
+      root->mode() == NODE_MODE::BRANCH_LEQ) {
+    while (root->is_not_leaf()) {
+      val = x_data[root->feature_id];
+      threshold = root->is_threshold_index()
+                      ? thresholds16_[thresholds16_offsets_[root->feature_id] +
+                                      root->value_or_unique_weight]
+                      : static_cast<ThresholdType>(root->value());
+      root += val <= threshold ? root->truenode_inc_or_first_weight
+                               : root->falsenode_inc_or_n_weights;
+    }
+    return root;
+  }
+  bool cond;
+  while (root->is_not_leaf()) {
+    val = x_data[root->feature_id];
+    threshold = root->is_threshold_index()
+                    ? thresholds16_[thresholds16_offsets_[root->feature_id] +
+                                    root->value_or_unique_weight]
+                    : static_cast<ThresholdType>(root->value());
+    switch (root->mode()) {
+    case NODE_MODE::BRANCH_LEQ:
+      cond = val <= threshold;
+      break;
+    case NODE_MODE::BRANCH_LT:
+      cond = val < threshold;
+      break;
+    case NODE_MODE::BRANCH_GTE:
+      cond = val >= threshold;
+      break;
+    case NODE_MODE::BRANCH_GT:
+      cond = val > threshold;
+      break;
+    case NODE_MODE::BRANCH_EQ:
+      cond = val == threshold;
+      break;
+    case NODE_MODE::BRANCH_NEQ:
+      cond = val != threshold;
+      break;
+    default:
+      cond = false;
+      break;
+    }
+    root += cond || (root->is_missing_track_true() && _isnan_(val))
+                ? root->truenode_inc_or_first_weight
+                : root->falsenode_inc_or_n_weights;
+  }
+  return root;
+}
+
 } // namespace onnx_c_ops
@@ -4,17 +4,15 @@
 // https://github.com/microsoft/onnxruntime/blob/master/onnxruntime/core/providers/cpu/ml/tree_ensemble_regressor.cc.
 
 #include <algorithm>
+#include <deque>
 #include <iterator>
 #include <limits>
+#include <string>
 #include <thread>
+#include <unordered_map>
+#include <unordered_set>
 #include <vector>
 
-#include <pybind11/numpy.h>
-#include <pybind11/pybind11.h>
-#include <pybind11/stl.h>
-
-namespace py = pybind11;
-
 #include "c_op_common.h"
 
 namespace onnx_c_ops {
@@ -212,6 +210,63 @@ template <typename T> struct TreeNodeElement3 {
   }
 };
 
+enum ReducedPrecisionFlag : uint8_t { kThresholdIndex = 32, kBFloat16 = 64 };
+
+struct TreeNodeElement16 {
+  // Same as TreeNodeElement but the threshold or the weight is stored
+  // on 16 bits (float16 or bfloat16). If the threshold cannot be converted
+  // without changing the split decision, `value_or_unique_weight` is the
+  // index of the threshold among the thresholds of the same feature
+  // stored in `TreeEnsembleCommon::thresholds16_`.
+  int feature_id;
+  int32_t truenode_inc_or_first_weight;
+  int32_t falsenode_inc_or_n_weights;
+  uint16_t value_or_unique_weight;
+  uint8_t flags;
+
+  inline NODE_MODE mode() const { return NODE_MODE(flags & 0xF); }
+  inline bool is_not_leaf() const { return !(flags & NODE_MODE::LEAF); }
+  inline bool is_missing_track_true() const {
+    return flags & MissingTrack::kTrue;
+  }
+  inline bool is_threshold_index() const {
+    return flags & ReducedPrecisionFlag::kThresholdIndex;
+  }
+  inline bool is_bfloat16() const {
+    return flags & ReducedPrecisionFlag::kBFloat16;
+  }
+  inline float value() const {
+    return Float16To(value_or_unique_weight, is_bfloat16());
+  }
+};
+
+struct SparseValue16 {
+  int32_t i;
+  uint16_t value;
+};
+
+// The aggregators retrieve the weights through the following functions
+// whatever the precision the nodes are stored with.
+
+template <typename T> inline T GetLeafWeight(const TreeNodeElement<T> &leaf) {
+  return leaf.value_or_unique_weight;
+}
+
+inline float GetLeafWeight(const TreeNodeElement16 &leaf) {
+  return leaf.value();
+}
+
+template <typename T>
+inline T GetLeafWeight(const TreeNodeElement<T> & /*leaf*/,
+                       const SparseValue<T> &w) {
+  return w.value;
+}
+
+inline float GetLeafWeight(const TreeNodeElement16 &leaf,
+                           const SparseValue16 &w) {
+  return Float16To(w.value, leaf.is_bfloat16());
+}
+
 template <typename InputType, typename ThresholdType, typename OutputType>
 class TreeAggregator {
 protected:
@@ -235,9 +290,9 @@ public:
 
   // 1 output
 
-  void ProcessTreeNodePrediction1(
-      ScoreValue<ThresholdType> & /*prediction*/,
-      const TreeNodeElement<ThresholdType> & /*root*/) const {}
+  template <typename NodeType>
+  void ProcessTreeNodePrediction1(ScoreValue<ThresholdType> & /*prediction*/,
+                                  const NodeType & /*root*/) const {}
 
   void MergePrediction1(ScoreValue<ThresholdType> & /*prediction*/,
                         ScoreValue<ThresholdType> & /*prediction2*/) const {}
@@ -254,10 +309,11 @@ public:
 
   // N outputs
 
+  template <typename NodeType, typename WeightType>
   void ProcessTreeNodePrediction(
       InlinedVector<ScoreValue<ThresholdType>> & /*predictions*/,
-      const TreeNodeElement<ThresholdType> & /*root*/,
-      const InlinedVector<SparseValue<ThresholdType>> & /*weights*/) const {}
+      const NodeType & /*root*/,
+      const InlinedVector<WeightType> & /*weights*/) const {}
 
   void MergePrediction(
       InlinedVector<ScoreValue<ThresholdType>> & /*predictions*/,
@@ -279,6 +335,9 @@ public:
   }
 
   const char* kind() const { return "NONE"; }
+
+  // True if the predicted label only depends on one score.
+  bool is_binary() const { return false; }
 };
 
 /////////////
@@ -297,10 +356,10 @@ public:
 
   // 1 output
 
-  void
-  ProcessTreeNodePrediction1(ScoreValue<ThresholdType> &prediction,
-                             const TreeNodeElement<ThresholdType> &root) const {
-    prediction.score += root.value_or_unique_weight;
+  template <typename NodeType>
+  void ProcessTreeNodePrediction1(ScoreValue<ThresholdType> &prediction,
+                                  const NodeType &root) const {
+    prediction.score += GetLeafWeight(root);
   }
 
   void MergePrediction1(ScoreValue<ThresholdType> &prediction,
@@ -319,14 +378,14 @@ public:
 
   // N outputs
 
+  template <typename NodeType, typename WeightType>
   void ProcessTreeNodePrediction(
       InlinedVector<ScoreValue<ThresholdType>> &predictions,
-      const TreeNodeElement<ThresholdType> &root,
-      const InlinedVector<SparseValue<ThresholdType>> &weights) const {
+      const NodeType &root, const InlinedVector<WeightType> &weights) const {
     auto it = weights.begin() + root.truenode_inc_or_first_weight;
     for (int32_t i = 0; i < root.falsenode_inc_or_n_weights; ++i, ++it) {
       // EXT_ENFORCE(it->i < (int64_t)predictions.size());
-      predictions[static_cast<size_t>(it->i)].score += it->value;
+      predictions[static_cast<size_t>(it->i)].score += GetLeafWeight(root, *it);
       predictions[static_cast<size_t>(it->i)].has_score = 1;
     }
   }
@@ -408,12 +467,12 @@ public:
 
   // 1 output
 
-  void
-  ProcessTreeNodePrediction1(ScoreValue<ThresholdType> &prediction,
-                             const TreeNodeElement<ThresholdType> &root) const {
-    prediction.score = (!(prediction.has_score) ||
-                        root.value_or_unique_weight < prediction.score)
-                           ? root.value_or_unique_weight
+  template <typename NodeType>
+  void ProcessTreeNodePrediction1(ScoreValue<ThresholdType> &prediction,
+                                  const NodeType &root) const {
+    ThresholdType weight = GetLeafWeight(root);
+    prediction.score = (!(prediction.has_score) || weight < prediction.score)
+                           ? weight
                            : prediction.score;
     prediction.has_score = 1;
   }
@@ -431,16 +490,17 @@ public:
 
   // N outputs
 
+  template <typename NodeType, typename WeightType>
   void ProcessTreeNodePrediction(
       InlinedVector<ScoreValue<ThresholdType>> &predictions,
-      const TreeNodeElement<ThresholdType> &root,
-      const InlinedVector<SparseValue<ThresholdType>> &weights) const {
+      const NodeType &root, const InlinedVector<WeightType> &weights) const {
     auto it = weights.begin() + root.truenode_inc_or_first_weight;
     for (int32_t i = 0; i < root.falsenode_inc_or_n_weights; ++i, ++it) {
+      ThresholdType weight = GetLeafWeight(root, *it);
       predictions[static_cast<size_t>(it->i)].score =
           (!predictions[static_cast<size_t>(it->i)].has_score ||
-           it->value < predictions[static_cast<size_t>(it->i)].score)
-              ? it->value
+           weight < predictions[static_cast<size_t>(it->i)].score)
+              ? weight
               : predictions[static_cast<size_t>(it->i)].score;
       predictions[static_cast<size_t>(it->i)].has_score = 1;
     }
@@ -478,12 +538,12 @@ public:
 
   // 1 output
 
-  void
-  ProcessTreeNodePrediction1(ScoreValue<ThresholdType> &prediction,
-                             const TreeNodeElement<ThresholdType> &root) const {
-    prediction.score = (!(prediction.has_score) ||
-                        root.value_or_unique_weight > prediction.score)
-                           ? root.value_or_unique_weight
+  template <typename NodeType>
+  void ProcessTreeNodePrediction1(ScoreValue<ThresholdType> &prediction,
+                                  const NodeType &root) const {
+    ThresholdType weight = GetLeafWeight(root);
+    prediction.score = (!(prediction.has_score) || weight > prediction.score)
+                           ? weight
                            : prediction.score;
     prediction.has_score = 1;
   }
@@ -501,16 +561,17 @@ public:
 
   // N outputs
 
+  template <typename NodeType, typename WeightType>
   void ProcessTreeNodePrediction(
       InlinedVector<ScoreValue<ThresholdType>> &predictions,
-      const TreeNodeElement<ThresholdType> &root,
-      const InlinedVector<SparseValue<ThresholdType>> &weights) const {
+      const NodeType &root, const InlinedVector<WeightType> &weights) const {
     auto it = weights.begin() + root.truenode_inc_or_first_weight;
     for (int32_t i = 0; i < root.falsenode_inc_or_n_weights; ++i, ++it) {
+      ThresholdType weight = GetLeafWeight(root, *it);
       predictions[static_cast<size_t>(it->i)].score =
           (!predictions[static_cast<size_t>(it->i)].has_score ||
-           it->value > predictions[static_cast<size_t>(it->i)].score)
-              ? it->value
+           weight > predictions[static_cast<size_t>(it->i)].score)
+              ? weight
               : predictions[static_cast<size_t>(it->i)].score;
       predictions[static_cast<size_t>(it->i)].has_score = 1;
     }
@@ -547,6 +608,8 @@ private:
   bool weights_are_all_positive_;
   int64_t positive_label_;
   int64_t negative_label_;
+  // Labels replacing the predicted class index, null to keep the index.
+  const int64_t *class_labels_;
 
 public:
   TreeAggregatorClassifier(size_t n_trees, const int64_t &n_targets_or_classes,
@@ -554,12 +617,19 @@ public:
                            const std::vector<ThresholdType> &base_values,
                            bool binary_case, bool weights_are_all_positive,
                            int64_t positive_label = 1,
-                           int64_t negative_label = 0)
+                           int64_t negative_label = 0,
+                           const int64_t *class_labels = nullptr)
       : TreeAggregatorSum<InputType, ThresholdType, OutputType>(
             n_trees, n_targets_or_classes, post_transform, base_values),
         binary_case_(binary_case),
         weights_are_all_positive_(weights_are_all_positive),
-        positive_label_(positive_label), negative_label_(negative_label) {}
+        positive_label_(positive_label), negative_label_(negative_label),
+        class_labels_(class_labels) {}
+
+  inline int64_t class_label(int64_t index) const {
+    return (class_labels_ == nullptr || index < 0) ? index
+                                                   : class_labels_[index];
+  }
 
   void get_max_weight(const InlinedVector<ScoreValue<ThresholdType>> &classes,
                       int64_t &maxclass, ThresholdType &maxweight) const {
@@ -614,12 +684,15 @@ public:
   }
 
   // 1 output
+  // Z (probabilities) or Y (labels) may be null if they are not needed,
+  // the post transform is skipped if Z is null.
 
   void FinalizeScores1(OutputType *Z, ScoreValue<ThresholdType> &prediction,
                        int64_t *Y) const {
     InlinedVector<ThresholdType> scores(2);
     unsigned char has_scores[2] = {1, 0};
 
+    int64_t label;
     int write_additional_scores = -1;
     if (this->base_values_.size() == 2) {
       // add base_values
@@ -628,28 +701,31 @@ public:
       scores[0] = -scores[1];
       // has_score = true;
       has_scores[1] = 1;
-      *Y = _set_score_binary(write_additional_scores, scores[0], has_scores[0],
-                             scores[1], has_scores[1]);
+      label = _set_score_binary(write_additional_scores, scores[0],
+                                has_scores[0], scores[1], has_scores[1]);
     } else if (this->base_values_.size() == 1) {
       // ONNX is vague about two classes and only one base_values.
       prediction.score += this->base_values_[0];
       scores[0] = prediction.score;
       scores.pop_back();
-      *Y = _set_score_binary(write_additional_scores, scores[0], has_scores[0],
-                             0, 0);
+      label = _set_score_binary(write_additional_scores, scores[0],
+                                has_scores[0], 0, 0);
     } else if (this->base_values_.empty()) {
       scores[0] = prediction.score;
       scores.pop_back();
-      *Y = _set_score_binary(write_additional_scores, scores[0], has_scores[0],
-                             0, 0);
+      label = _set_score_binary(write_additional_scores, scores[0],
+                                has_scores[0], 0, 0);
     } else {
       scores[0] = prediction.score;
       scores.pop_back();
-      *Y = _set_score_binary(write_additional_scores, scores[0], has_scores[0],
-                             0, 0);
+      label = _set_score_binary(write_additional_scores, scores[0],
+                                has_scores[0], 0, 0);
     }
 
-    write_scores(scores, this->post_transform_, Z, write_additional_scores);
+    if (Y != nullptr)
+      *Y = class_label(label);
+    if (Z != nullptr)
+      write_scores(scores, this->post_transform_, Z, write_additional_scores);
   }
 
   // N outputs
@@ -657,7 +733,6 @@ public:
   void FinalizeScores(InlinedVector<ScoreValue<ThresholdType>> &predictions,
                       OutputType *Z, int /*add_second_class*/,
                       int64_t *Y = 0) const {
-    EXT_ENFORCE(Y != nullptr)
     ThresholdType maxweight = 0;
     int64_t maxclass = -1;
 
@@ -673,7 +748,6 @@ public:
         }
       }
       get_max_weight(predictions, maxclass, maxweight);
-      *Y = maxclass;
     } else { // binary case
       EXT_ENFORCE(predictions.size() == 2);
       if (this->base_values_.size() == 2) {
@@ -702,15 +776,20 @@ public:
           predictions.pop_back();
       }
 
-      *Y = _set_score_binary(write_additional_scores, predictions);
+      maxclass = _set_score_binary(write_additional_scores, predictions);
     }
-    write_scores(predictions, this->post_transform_, Z,
-                 write_additional_scores);
+    if (Y != nullptr)
+      *Y = class_label(maxclass);
+    if (Z != nullptr)
+      write_scores(predictions, this->post_transform_, Z,
+                   write_additional_scores);
     if (predictions.size() == 1)
       predictions.resize(2);
   }
 
   const char* kind() const { return "CLASSIFICATION"; }
+
+  bool is_binary() const { return binary_case_; }
 };
 
 } // namespace onnx_c_ops
@@ -20,6 +20,9 @@ protected:
   std::vector<int64_t> class_labels_;
 
 public:
+  // Computes the labels and the probabilities in one pass over the rows.
+  // Y (probabilities) or label may be null if the caller does not need them,
+  // the post transform is skipped if Y is null.
   Status Compute(int64_t n_rows, int64_t n_features, const InputType *X,
                  OutputType *Y, int64_t *label) const {
     switch (this->aggregate_function_) {
@@ -28,7 +31,7 @@ public:
       ComputeAggClassifier(
           n_rows, n_features, X, Y, label,
           TreeAggregatorSum<InputType, ThresholdType, OutputType>(
-              this->roots_.size(), this->n_targets_or_classes_,
+              this->n_trees_, this->n_targets_or_classes_,
               this->post_transform_, this->base_values_));
       return Status::OK();
     default:
@@ -88,6 +91,17 @@ public:
     return Status::OK();
   }
 
+  // The predicted labels are class_labels[index] instead of the index
+  // of the predicted class if class_labels is not empty.
+  void set_class_labels(const std::vector<int64_t> &class_labels) {
+    EXT_ENFORCE(class_labels.empty() ||
+                    static_cast<int64_t>(class_labels.size()) ==
+                        this->n_targets_or_classes_,
+                "Expecting ", this->n_targets_or_classes_,
+                " class labels not ", class_labels.size(), ".");
+    class_labels_ = class_labels;
+  }
+
 protected:
   template <typename AGG>
   void ComputeAggClassifier(int64_t n_rows, int64_t n_features,
@@ -97,9 +111,10 @@ protected:
     this->ComputeAgg(
         n_rows, n_features, X, Y, labels,
         TreeAggregatorClassifier<InputType, ThresholdType, OutputType>(
-            this->roots_.size(), this->n_targets_or_classes_,
+            this->n_trees_, this->n_targets_or_classes_,
             this->post_transform_, this->base_values_, binary_case_,
-            weights_are_all_positive_));
+            weights_are_all_positive_, 1, 0,
+            class_labels_.empty() ? nullptr : class_labels_.data()));
   }
 };
 
@@ -90,6 +90,31 @@ in :epkg:`onnxruntime`. Supports float only.
           "Updates parallelization parameters.");
   rgf.def("compute", &RuntimeTreeEnsembleRegressorFloat::compute,
           "Computes the predictions for the random forest.");
+  rgf.def("compute_leaves", &RuntimeTreeEnsembleRegressorFloat::compute_leaves,
+          "Returns the leaf index reached by every row in every tree, "
+          "a matrix [N, n_trees]. The index is the position of the leaf "
+          "among the nodes of its tree.");
+  rgf.def("compute_tree_scores", &RuntimeTreeEnsembleRegressorFloat::compute_tree_scores,
+          "Returns the raw score of every tree, [N, n_trees] or "
+          "[N, n_trees, n_targets], no base values, no post transform.");
+  rgf.def("compute_contributions",
+          &RuntimeTreeEnsembleRegressorFloat::compute_contributions,
+          "Returns the contribution of every feature to the raw score "
+          "computed with TreeSHAP, [N, n_features + 1] or "
+          "[N, n_targets, n_features + 1], the last column is the expected "
+          "value, no post transform.");
+  rgf.def("set_denormal_as_zero",
+          &RuntimeTreeEnsembleRegressorFloat::set_denormal_as_zero,
+          "Flushes denormal numbers to zero (FTZ/DAZ) on every thread "
+          "while computing.");
+  rgf.def("set_reduced_precision",
+          &RuntimeTreeEnsembleRegressorFloat::set_reduced_precision,
+          "Stores thresholds and weights on 16 bits ('FLOAT16', "
+          "'BFLOAT16' or 'NONE'), it must be called before init.");
+  rgf.def("get_reduced_precision_report",
+          &RuntimeTreeEnsembleRegressorFloat::get_reduced_precision_report,
+          "Returns the statistics computed by init when thresholds and "
+          "weights are stored on 16 bits.");
   rgf.def("omp_get_max_threads",
           &RuntimeTreeEnsembleRegressorFloat::omp_get_max_threads,
           "Returns omp_get_max_threads from openmp library.");
@@ -117,6 +142,31 @@ in :epkg:`onnxruntime`. Supports double only.
           "Updates parallelization parameters.");
   rgd.def("compute", &RuntimeTreeEnsembleRegressorDouble::compute,
           "Computes the predictions for the random forest.");
+  rgd.def("compute_leaves", &RuntimeTreeEnsembleRegressorDouble::compute_leaves,
+          "Returns the leaf index reached by every row in every tree, "
+          "a matrix [N, n_trees]. The index is the position of the leaf "
+          "among the nodes of its tree.");
+  rgd.def("compute_tree_scores", &RuntimeTreeEnsembleRegressorDouble::compute_tree_scores,
+          "Returns the raw score of every tree, [N, n_trees] or "
+          "[N, n_trees, n_targets], no base values, no post transform.");
+  rgd.def("compute_contributions",
+          &RuntimeTreeEnsembleRegressorDouble::compute_contributions,
+          "Returns the contribution of every feature to the raw score "
+          "computed with TreeSHAP, [N, n_features + 1] or "
+          "[N, n_targets, n_features + 1], the last column is the expected "
+          "value, no post transform.");
+  rgd.def("set_denormal_as_zero",
+          &RuntimeTreeEnsembleRegressorDouble::set_denormal_as_zero,
+          "Flushes denormal numbers to zero (FTZ/DAZ) on every thread "
+          "while computing.");
+  rgd.def("set_reduced_precision",
+          &RuntimeTreeEnsembleRegressorDouble::set_reduced_precision,
+          "Stores thresholds and weights on 16 bits ('FLOAT16', "
+          "'BFLOAT16' or 'NONE'), it must be called before init.");
+  rgd.def("get_reduced_precision_report",
+          &RuntimeTreeEnsembleRegressorDouble::get_reduced_precision_report,
+          "Returns the statistics computed by init when thresholds and "
+          "weights are stored on 16 bits.");
   rgd.def("omp_get_max_threads",
           &RuntimeTreeEnsembleRegressorDouble::omp_get_max_threads,
           "Returns omp_get_max_threads from openmp library.");
@@ -147,7 +197,49 @@ in :epkg:`onnxruntime`. Supports float only.
   clf.def("set", &RuntimeTreeEnsembleRegressorFloat::set,
           "Updates parallelization parameters.");
   clf.def("compute", &RuntimeTreeEnsembleClassifierFloat::compute,
-          "Computes the predictions for the random forest.");
+          "Computes the labels and the probabilities in one pass, "
+          "an output which is not requested is returned as None.",
+          py::arg("X"), py::arg("with_labels") = true,
+          py::arg("with_probabilities") = true);
+  clf.def("set_class_labels",
+          &RuntimeTreeEnsembleClassifierFloat::set_class_labels,
+          "Replaces the index of the predicted class by the corresponding "
+          "label while computing, an empty list restores the index.");
+  clf.def("compute_leaves", &RuntimeTreeEnsembleClassifierFloat::compute_leaves,
+          "Returns the leaf index reached by every row in every tree, "
+          "a matrix [N, n_trees]. The index is the position of the leaf "
+          "among the nodes of its tree.");
+  clf.def("compute_tree_scores", &RuntimeTreeEnsembleClassifierFloat::compute_tree_scores,
+          "Returns the raw score of every tree, [N, n_trees] or "
+          "[N, n_trees, n_targets], no base values, no post transform.");
+  clf.def("set_early_exit", &RuntimeTreeEnsembleClassifierFloat::set_early_exit,
+          "Evaluates the trees by blocks of block_size trees for a binary "
+          "classifier, a row stops once its label cannot change anymore or "
+          "once its probability is further than margin from the decision "
+          "threshold (margin <= 0 disables that second rule), "
+          "block_size <= 0 disables the early exit.",
+          py::arg("block_size"), py::arg("margin") = 0);
+  clf.def("get_early_exit_report", &RuntimeTreeEnsembleClassifierFloat::get_early_exit_report,
+          "Returns the fraction of rows which exited after every block of "
+          "trees during the last call to compute.");
+  clf.def("compute_contributions",
+          &RuntimeTreeEnsembleClassifierFloat::compute_contributions,
+          "Returns the contribution of every feature to the raw score "
+          "computed with TreeSHAP, [N, n_features + 1] or "
+          "[N, n_targets, n_features + 1], the last column is the expected "
+          "value, no post transform.");
+  clf.def("set_denormal_as_zero",
+          &RuntimeTreeEnsembleClassifierFloat::set_denormal_as_zero,
+          "Flushes denormal numbers to zero (FTZ/DAZ) on every thread "
+          "while computing.");
+  clf.def("set_reduced_precision",
+          &RuntimeTreeEnsembleClassifierFloat::set_reduced_precision,
+          "Stores thresholds and weights on 16 bits ('FLOAT16', "
+          "'BFLOAT16' or 'NONE'), it must be called before init.");
+  clf.def("get_reduced_precision_report",
+          &RuntimeTreeEnsembleClassifierFloat::get_reduced_precision_report,
+          "Returns the statistics computed by init when thresholds and "
+          "weights are stored on 16 bits.");
   clf.def("omp_get_max_threads",
           &RuntimeTreeEnsembleClassifierFloat::omp_get_max_threads,
           "Returns omp_get_max_threads from openmp library.");
@@ -174,7 +266,49 @@ in :epkg:`onnxruntime`. Supports double only.
   cld.def("set", &RuntimeTreeEnsembleRegressorFloat::set,
           "Updates parallelization parameters.");
   cld.def("compute", &RuntimeTreeEnsembleClassifierDouble::compute,
-          "Computes the predictions for the random forest.");
+          "Computes the labels and the probabilities in one pass, "
+          "an output which is not requested is returned as None.",
+          py::arg("X"), py::arg("with_labels") = true,
+          py::arg("with_probabilities") = true);
+  cld.def("set_class_labels",
+          &RuntimeTreeEnsembleClassifierDouble::set_class_labels,
+          "Replaces the index of the predicted class by the corresponding "
+          "label while computing, an empty list restores the index.");
+  cld.def("compute_leaves", &RuntimeTreeEnsembleClassifierDouble::compute_leaves,
+          "Returns the leaf index reached by every row in every tree, "
+          "a matrix [N, n_trees]. The index is the position of the leaf "
+          "among the nodes of its tree.");
+  cld.def("compute_tree_scores", &RuntimeTreeEnsembleClassifierDouble::compute_tree_scores,
+          "Returns the raw score of every tree, [N, n_trees] or "
+          "[N, n_trees, n_targets], no base values, no post transform.");
+  cld.def("set_early_exit", &RuntimeTreeEnsembleClassifierDouble::set_early_exit,
+          "Evaluates the trees by blocks of block_size trees for a binary "
+          "classifier, a row stops once its label cannot change anymore or "
+          "once its probability is further than margin from the decision "
+          "threshold (margin <= 0 disables that second rule), "
+          "block_size <= 0 disables the early exit.",
+          py::arg("block_size"), py::arg("margin") = 0);
+  cld.def("get_early_exit_report", &RuntimeTreeEnsembleClassifierDouble::get_early_exit_report,
+          "Returns the fraction of rows which exited after every block of "
+          "trees during the last call to compute.");
+  cld.def("compute_contributions",
+          &RuntimeTreeEnsembleClassifierDouble::compute_contributions,
+          "Returns the contribution of every feature to the raw score "
+          "computed with TreeSHAP, [N, n_features + 1] or "
+          "[N, n_targets, n_features + 1], the last column is the expected "
+          "value, no post transform.");
+  cld.def("set_denormal_as_zero",
+          &RuntimeTreeEnsembleClassifierDouble::set_denormal_as_zero,
+          "Flushes denormal numbers to zero (FTZ/DAZ) on every thread "
+          "while computing.");
+  cld.def("set_reduced_precision",
+          &RuntimeTreeEnsembleClassifierDouble::set_reduced_precision,
+          "Stores thresholds and weights on 16 bits ('FLOAT16', "
+          "'BFLOAT16' or 'NONE'), it must be called before init.");
+  cld.def("get_reduced_precision_report",
+          &RuntimeTreeEnsembleClassifierDouble::get_reduced_precision_report,
+          "Returns the statistics computed by init when thresholds and "
+          "weights are stored on 16 bits.");
   cld.def("omp_get_max_threads",
           &RuntimeTreeEnsembleClassifierDouble::omp_get_max_threads,
           "Returns omp_get_max_threads from openmp library.");
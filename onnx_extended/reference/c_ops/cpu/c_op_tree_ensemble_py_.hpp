@@ -1,6 +1,12 @@
 #pragma once
 // Implements RuntimeTreeEnsembleCommon.
 
+#include <pybind11/numpy.h>
+#include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
+
+namespace py = pybind11;
+
 #include "c_op_tree_ensemble_common_.hpp"
 
 #define py_array_t_int64_t                                                     \
@@ -25,6 +31,68 @@ py::detail::unchecked_mutable_reference<double, 1> _mutable_unchecked1(
   return Z.mutable_unchecked<1>();
 }
 
+// Implements compute_leaves for regressors and classifiers.
+template <typename NTYPE, typename TREE>
+py::array_t<int32_t> _compute_leaves(const TREE &tree, py_array_t_ntype_t &X) {
+  std::vector<int64_t> x_dims;
+  arrayshape2vector(x_dims, X);
+  if (x_dims.size() != 2)
+    throw std::invalid_argument("X must have 2 dimensions.");
+  py::array_t<int32_t> leaves({x_dims[0], tree.get_tree_count()});
+  const NTYPE *x_data = X.data(0);
+  int32_t *leaves_data = leaves.mutable_data();
+  {
+    py::gil_scoped_release release;
+    tree.ComputeLeaves(x_dims[0], x_dims[1], x_data, leaves_data);
+  }
+  return leaves;
+}
+
+// Implements compute_tree_scores for regressors and classifiers.
+template <typename NTYPE, typename TREE>
+py::array_t<NTYPE> _compute_tree_scores(const TREE &tree,
+                                        py_array_t_ntype_t &X) {
+  std::vector<int64_t> x_dims;
+  arrayshape2vector(x_dims, X);
+  if (x_dims.size() != 2)
+    throw std::invalid_argument("X must have 2 dimensions.");
+  int64_t n_targets = tree.get_target_or_class_count();
+  std::vector<int64_t> shape{x_dims[0], tree.get_tree_count()};
+  if (n_targets > 1)
+    shape.push_back(n_targets);
+  py::array_t<NTYPE> scores(shape);
+  const NTYPE *x_data = X.data(0);
+  NTYPE *scores_data = scores.mutable_data();
+  {
+    py::gil_scoped_release release;
+    tree.ComputeTreeScores(x_dims[0], x_dims[1], x_data, scores_data);
+  }
+  return scores;
+}
+
+// Implements compute_contributions for regressors and classifiers.
+template <typename NTYPE, typename TREE>
+py::array_t<NTYPE> _compute_contributions(const TREE &tree,
+                                          py_array_t_ntype_t &X) {
+  std::vector<int64_t> x_dims;
+  arrayshape2vector(x_dims, X);
+  if (x_dims.size() != 2)
+    throw std::invalid_argument("X must have 2 dimensions.");
+  int64_t n_targets = tree.get_target_or_class_count();
+  std::vector<int64_t> shape{x_dims[0]};
+  if (n_targets > 1)
+    shape.push_back(n_targets);
+  shape.push_back(x_dims[1] + 1);
+  py::array_t<NTYPE> contribs(shape);
+  const NTYPE *x_data = X.data(0);
+  NTYPE *contribs_data = contribs.mutable_data();
+  {
+    py::gil_scoped_release release;
+    tree.ComputeContributions(x_dims[0], x_dims[1], x_data, contribs_data);
+  }
+  return contribs;
+}
+
 template <typename NTYPE>
 class RuntimeTreeEnsembleCommon
     : public TreeEnsembleCommon<NTYPE, NTYPE, NTYPE> {
@@ -167,6 +235,18 @@ public:
     return Z;
   }
 
+  py::array_t<int32_t> compute_leaves(py_array_t_ntype_t X) const {
+    return _compute_leaves<NTYPE>(*this, X);
+  }
+
+  py::array_t<NTYPE> compute_tree_scores(py_array_t_ntype_t X) const {
+    return _compute_tree_scores<NTYPE>(*this, X);
+  }
+
+  py::array_t<NTYPE> compute_contributions(py_array_t_ntype_t X) const {
+    return _compute_contributions<NTYPE>(*this, X);
+  }
+
 private:
   void compute_gil_free(const std::vector<int64_t> &x_dims, int64_t N,
                         int64_t stride, py_array_t_ntype_t &X,
@@ -174,6 +254,7 @@ private:
     auto Z_ = _mutable_unchecked1(Z); // Z.mutable_unchecked<(size_t)1>();
     const NTYPE *x_data = X.data(0);
     NTYPE *z_data = (NTYPE *)Z_.data(0);
+    DenormalAsZeroScope denormal_scope(this->denormal_as_zero_);
 
     this->Compute(x_dims[0], x_dims[1], x_data, z_data, nullptr);
   }
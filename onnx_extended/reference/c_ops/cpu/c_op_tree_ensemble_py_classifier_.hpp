@@ -128,7 +128,10 @@ public:
   // The two following methods uses buffers to avoid
   // spending time allocating buffers. As a consequence,
   // These methods are not thread-safe.
-  py::tuple compute(py_array_t_ntype_t X) {
+  // Labels and probabilities are computed in the same pass,
+  // an output which is not requested is returned as None.
+  py::tuple compute(py_array_t_ntype_t X, bool with_labels = true,
+                    bool with_probabilities = true) {
     std::vector<int64_t> x_dims;
     arrayshape2vector(x_dims, X);
     if (x_dims.size() != 2)
@@ -139,25 +142,40 @@ public:
     int64_t stride = xdims1 ? x_dims[0] : x_dims[1];
     int64_t N = xdims1 ? 1 : x_dims[0];
 
-    py_array_t_ntype_t Z(x_dims[0] * this->n_targets_or_classes_);
-    py_array_t_int64_t label(x_dims[0]);
+    py_array_t_ntype_t Z(with_probabilities
+                             ? x_dims[0] * this->n_targets_or_classes_
+                             : 0);
+    py_array_t_int64_t label(with_labels ? x_dims[0] : 0);
 
     {
       py::gil_scoped_release release;
-      compute_gil_free(x_dims, N, stride, X, Z, label);
+      compute_gil_free(x_dims, N, stride, X, with_probabilities ? &Z : nullptr,
+                       with_labels ? &label : nullptr);
     }
-    return py::make_tuple(label, Z);
+    return py::make_tuple(with_labels ? py::object(label) : py::none(),
+                          with_probabilities ? py::object(Z) : py::none());
+  }
+
+  py::array_t<int32_t> compute_leaves(py_array_t_ntype_t X) const {
+    return _compute_leaves<NTYPE>(*this, X);
+  }
+
+  py::array_t<NTYPE> compute_tree_scores(py_array_t_ntype_t X) const {
+    return _compute_tree_scores<NTYPE>(*this, X);
+  }
+
+  py::array_t<NTYPE> compute_contributions(py_array_t_ntype_t X) const {
+    return _compute_contributions<NTYPE>(*this, X);
   }
 
 private:
   void compute_gil_free(const std::vector<int64_t> &x_dims, int64_t N,
                         int64_t stride, py_array_t_ntype_t &X,
-                        py_array_t_ntype_t &Z, py_array_t_int64_t &label) {
-    auto Z_ = _mutable_unchecked1(Z);
-    auto label_ = _mutable_unchecked1(label);
+                        py_array_t_ntype_t *Z, py_array_t_int64_t *label) {
     const NTYPE *x_data = X.data(0);
-    NTYPE *z_data = (NTYPE *)Z_.data(0);
-    int64_t *l_data = (int64_t *)label_.data(0);
+    NTYPE *z_data = Z == nullptr ? nullptr : Z->mutable_data();
+    int64_t *l_data = label == nullptr ? nullptr : label->mutable_data();
+    DenormalAsZeroScope denormal_scope(this->denormal_as_zero_);
 
     this->Compute(x_dims[0], x_dims[1], x_data, z_data, l_data);
   }
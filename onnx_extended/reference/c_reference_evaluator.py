@@ -22,6 +22,10 @@ class CReferenceEvaluator(ReferenceEvaluator):
     The class automatically replaces a python implementation
     by a C implementation if available. See example :ref:`l-example-conv`.
 
+    :param denormal_as_zero: every C implementation supporting it flushes
+        denormal numbers to zero (FTZ/DAZ) while computing its outputs,
+        see example :ref:`l-example-conv-denorm`
+
     ::
 
         from onnx.reference import ReferenceEvaluator
@@ -81,6 +85,7 @@ class CReferenceEvaluator(ReferenceEvaluator):
         functions: Optional[List[Union[ReferenceEvaluator, FunctionProto]]] = None,
         verbose: int = 0,
         new_ops: Optional[List[OpRun]] = None,
+        denormal_as_zero: bool = False,
         **kwargs,
     ):
         if new_ops is None:
@@ -99,3 +104,14 @@ class CReferenceEvaluator(ReferenceEvaluator):
             new_ops=new_ops,
             **kwargs,
         )
+        if denormal_as_zero:
+            self.set_denormal_as_zero(denormal_as_zero)
+
+    def set_denormal_as_zero(self, denormal_as_zero: bool = True):
+        """
+        Enables or disables the flush-to-zero mode (FTZ/DAZ)
+        for every node having a C implementation supporting it.
+        """
+        for node in self.rt_nodes_:
+            if hasattr(node, "set_denormal_as_zero"):
+                node.set_denormal_as_zero(denormal_as_zero)
@@ -2,6 +2,7 @@
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
 
+#include "cpu_features.h"
 #include "speed_metrics.h"
 #include "vector_sum.h"
 
@@ -17,6 +18,9 @@ PYBIND11_MODULE(_validation, m) {
 #endif
       ;
 
+  // The instruction set is chosen when the module is imported.
+  cpu_features::GetCpuIsa();
+
   m.def("benchmark_cache", &benchmark_cache, py::arg("size"),
         py::arg("verbose") = true,
         R"pbdoc(Runs a benchmark to measure the cache performance.
@@ -95,9 +99,10 @@ by rows or by columns. The computation is parallelized.
   m.def("vector_sum_array_avx", &vector_sum_array_avx, py::arg("n_columns"),
         py::arg("values"),
         R"pbdoc(Computes the sum of all elements in an array
-by rows or by columns. The computation uses AVX instructions
-(see `AVX API
-<https://www.intel.com/content/www/us/en/docs/intrinsics-guide/index.html>`_).
+by rows or by columns. The computation uses AVX or AVX-512 instructions
+(see :func:`cpu_isa <onnx_extended.validation.cpu._validation.cpu_isa>`),
+see `AVX API
+<https://www.intel.com/content/www/us/en/docs/intrinsics-guide/index.html>`_.
 
 :param n_columns: number of columns
 :param values: all values in an array
@@ -107,13 +112,47 @@ by rows or by columns. The computation uses AVX instructions
   m.def("vector_sum_array_avx_parallel", &vector_sum_array_avx_parallel,
         py::arg("n_columns"), py::arg("values"),
         R"pbdoc(Computes the sum of all elements in an array
-by rows or by columns. The computation uses AVX instructions
-and parallelization (see `AVX API
-<https://www.intel.com/content/www/us/en/docs/intrinsics-guide/index.html>`_).
+by rows or by columns. The computation uses AVX or AVX-512 instructions
+(see :func:`cpu_isa <onnx_extended.validation.cpu._validation.cpu_isa>`)
+and parallelization, see `AVX API
+<https://www.intel.com/content/www/us/en/docs/intrinsics-guide/index.html>`_.
 
 :param n_columns: number of columns
 :param values: all values in an array
 :return: sum of all elements
+)pbdoc");
+
+  m.def(
+      "cpu_isa",
+      []() {
+        return std::string(
+            cpu_features::CpuIsaName(cpu_features::GetCpuIsa()));
+      },
+      R"pbdoc(Returns the instruction set the kernels of this package use,
+`'default'` (the compilation flags), `'avx2'` or `'avx512'`.
+It is the best one the processor supports unless environment variable
+`ONNX_EXTENDED_CPU_ISA` is set to a lower one before the module is imported.
+)pbdoc");
+
+  m.def(
+      "cpu_features",
+      []() {
+        const cpu_features::CpuFeatures &f = cpu_features::GetCpuFeatures();
+        py::dict res;
+        res["sse41"] = f.sse41;
+        res["avx"] = f.avx;
+        res["fma"] = f.fma;
+        res["f16c"] = f.f16c;
+        res["avx2"] = f.avx2;
+        res["avx512f"] = f.avx512f;
+        res["avx512bw"] = f.avx512bw;
+        res["avx512vl"] = f.avx512vl;
+        return res;
+      },
+      R"pbdoc(Returns the instruction sets the processor and
+the operating system support, they are detected with CPUID.
+
+:return: dictionary `{name: bool}`
 )pbdoc");
 
   m.def("vector_add", &vector_add,
@@ -1,4 +1,5 @@
 #include "vector_sum.h"
+#include "cpu_features.h"
 
 #include <chrono>
 #include <cstring>
@@ -106,28 +107,66 @@ float vector_sum_array_parallel(int nc, const py_array_float &values_array,
   return totals[0];
 }
 
+// Sums nc floats, the AVX version is compiled with the default flags.
+static float vector_sum_row_avx(int nc, const float *values) {
+  float buffer[8];
+  __m256 t = _mm256_set1_ps(0);
+  int j = 0;
+  for (; j + 8 <= nc; j += 8) {
+    __m256 vec = _mm256_loadu_ps(values + j);
+    t = _mm256_add_ps(vec, t);
+  }
+  _mm256_storeu_ps(buffer, t);
+  float total = 0;
+#pragma unroll
+  for (size_t k = 0; k < 8; ++k) {
+    total += buffer[k];
+  }
+  for (; j < nc; ++j) {
+    total += values[j];
+  }
+  return total;
+}
+
+#if defined(ONNX_EXTENDED_CPU_DISPATCH)
+
+ONNX_EXTENDED_TARGET_AVX512 static float
+vector_sum_row_avx512(int nc, const float *values) {
+  __m512 t = _mm512_setzero_ps();
+  int j = 0;
+  for (; j + 16 <= nc; j += 16) {
+    t = _mm512_add_ps(_mm512_loadu_ps(values + j), t);
+  }
+  if (j < nc) {
+    // the remaining elements are loaded with a mask
+    __mmask16 mask = static_cast<__mmask16>((1u << (nc - j)) - 1);
+    t = _mm512_add_ps(_mm512_maskz_loadu_ps(mask, values + j), t);
+  }
+  return _mm512_reduce_add_ps(t);
+}
+
+#endif
+
+// Chooses the implementation once, see cpu_features.h.
+typedef float (*vector_sum_row_fct)(int nc, const float *values);
+
+static vector_sum_row_fct get_vector_sum_row() {
+#if defined(ONNX_EXTENDED_CPU_DISPATCH)
+  if (cpu_features::GetCpuIsa() == cpu_features::CpuIsa::Avx512)
+    return vector_sum_row_avx512;
+#endif
+  return vector_sum_row_avx;
+}
+
 float vector_sum_array_avx(int nc, const py_array_float &values_array) {
   // https://www.intel.com/content/www/us/en/docs/intrinsics-guide/index.html
+  static vector_sum_row_fct sum_row = get_vector_sum_row();
   const float *values = values_array.data(0);
   float total = 0;
-  float buffer[8];
 
   int nl = values_array.size() / nc;
   for (int i = 0; i < nl; ++i) {
-    __m256 t = _mm256_set1_ps(0);
-    size_t j = 0;
-    for (; j < nc; j += 8) {
-      __m256 vec = _mm256_loadu_ps(&(values[i * nc + j]));
-      t = _mm256_add_ps(vec, t);
-    }
-    _mm256_storeu_ps(buffer, t);
-#pragma unroll
-    for (size_t k = 0; k < 8; ++k) {
-      total += buffer[k];
-    }
-    for (; j < nc; ++j) {
-      total += values[i * nc + j];
-    }
+    total += sum_row(nc, values + i * nc);
   }
   return total;
 }
@@ -135,6 +174,7 @@ float vector_sum_array_avx(int nc, const py_array_float &values_array) {
 float vector_sum_array_avx_parallel(int nc,
                                     const py_array_float &values_array) {
   // https://www.intel.com/content/www/us/en/docs/intrinsics-guide/index.html
+  static vector_sum_row_fct sum_row = get_vector_sum_row();
   int n_threads = omp_get_max_threads();
   const float *values = values_array.data(0);
   std::vector<float> totals(n_threads, 0);
@@ -142,22 +182,8 @@ float vector_sum_array_avx_parallel(int nc,
   int nl = values_array.size() / nc;
 #pragma omp parallel for
   for (int i = 0; i < nl; ++i) {
-    float buffer[8];
-    __m256 t = _mm256_set1_ps(0);
-    size_t j = 0;
-    for (; j < nc; j += 8) {
-      __m256 vec = _mm256_loadu_ps(&(values[i * nc + j]));
-      t = _mm256_add_ps(vec, t);
-    }
-    _mm256_storeu_ps(buffer, t);
     auto th = omp_get_thread_num();
-#pragma unroll
-    for (size_t k = 0; k < 8; ++k) {
-      totals[th] += buffer[k];
-    }
-    for (; j < nc; ++j) {
-      totals[th] += values[i * nc + j];
-    }
+    totals[th] += sum_row(nc, values + i * nc);
   }
   for (size_t i = 1; i < totals.size(); ++i) {
     totals[0] += totals[i];